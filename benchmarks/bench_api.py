@@ -0,0 +1,411 @@
+"""
+Benchmark: the API and task engine end to end, without network or yt-dlp.
+
+The app is built with create_app() (real queue, registry, SQLite task store, change
+feed) and download_video() is replaced by a fake that reports progress ticks for a
+configurable duration and fails a configurable share of downloads. Measures:
+  submit        — POST /download_video latency
+  list          — GET /tasks latency (full body, ?since=, 304) against the history size
+  contention    — GET /tasks?since= latency and task-lock waits with N pollers while M downloads run
+  cancel        — DELETE /tasks/<id> until the task reads "cancelled" (running and queued tasks)
+  memory        — traced Python memory per finished task kept in the registry
+
+Results are written as JSON (with the add-on version) so two runs can be compared.
+
+Run from the repo root:
+    python benchmarks/bench_api.py [--quick] [--output results.json] [--compare benchmarks/results/api-1.0.16.json]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+_REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(_REPO, "yt-dlp-api"))
+
+import app.api as api_module  # noqa: E402
+from app import create_app, metrics  # noqa: E402
+from app.download_queue import DownloadQueue  # noqa: E402
+from app.yt_dlp_manager import DownloadCancelledError  # noqa: E402
+
+_FAKE_BYTES = 50 * 1024 * 1024
+
+
+class FakeDownload:
+    """Stand-in for download_video(): ``ticks`` progress updates spread over ``duration`` seconds.
+
+    Checks stop_check before every tick like yt-dlp's progress hook, and fails a
+    ``fail_rate`` share of downloads with an error that does not trigger an update.
+    """
+
+    def __init__(self, duration: float = 0.0, ticks: int = 10, fail_rate: float = 0.0, seed: int = 1) -> None:
+        self.duration = duration
+        self.ticks = max(1, ticks)
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+
+    def __call__(self, url, output_dir=None, stop_check=None, format_type="mp4", on_progress=None, **kwargs) -> dict:
+        step = self.duration / self.ticks
+        for tick in range(1, self.ticks + 1):
+            if stop_check is not None and stop_check():
+                raise DownloadCancelledError("Cancelled by user")
+            if step:
+                time.sleep(step)
+            if on_progress is not None:
+                on_progress({
+                    "phase": "downloading", "progress": round(tick * 100 / self.ticks, 1),
+                    "downloaded_bytes": _FAKE_BYTES * tick // self.ticks, "total_bytes": _FAKE_BYTES,
+                    "speed": _FAKE_BYTES / self.duration if self.duration else None,
+                    "eta": round(self.duration - tick * step, 1),
+                })
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            raise Exception("HTTP Error 500: simulated failure")
+        return {"title": f"Fake video {url[-11:]}", "id": url[-11:]}
+
+
+_video_counter = 0
+
+
+def _next_url() -> str:
+    """A valid, never repeated YouTube URL (so submissions are not deduplicated)."""
+    global _video_counter
+    _video_counter += 1
+    return f"https://youtu.be/bench{_video_counter:06d}"
+
+
+def _distribution_us(samples: list[float]) -> dict:
+    """mean / p50 / p95 / max of durations in seconds, in µs."""
+    values = sorted(samples)
+    return {
+        "mean_us": round(statistics.fmean(values) * 1e6, 1),
+        "p50_us": round(values[len(values) // 2] * 1e6, 1),
+        "p95_us": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1e6, 1),
+        "max_us": round(values[-1] * 1e6, 1),
+    }
+
+
+def _reset_registry() -> None:
+    with api_module._tasks_lock:
+        for task_id in list(api_module._tasks):
+            api_module._tasks.pop(task_id)
+            api_module._task_feed.publish({"type": "removed", "task_id": task_id})
+        api_module._inflight.clear()
+        api_module._cancel_requested_at.clear()
+
+
+def _wait_idle(timeout: float = 120.0) -> None:
+    """Block until the worker pool is empty and no task is active."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        queue = api_module._download_queue
+        with api_module._tasks_lock:
+            active = any(t["status"] in api_module._ACTIVE_STATUSES for t in api_module._tasks.values())
+        if not active and queue.pending_count() == 0 and queue.active_count() == 0:
+            return
+        time.sleep(0.005)
+    raise RuntimeError("tasks did not finish in time")
+
+
+def _submit(client) -> str:
+    resp = client.post("/download_video", json={"url": _next_url(), "format": "mp4"})
+    if resp.status_code != 202:
+        raise RuntimeError(f"submit failed: {resp.status_code} {resp.get_data(as_text=True)}")
+    return resp.get_json()["task_id"]
+
+
+def _status(task_id: str) -> str | None:
+    with api_module._tasks_lock:
+        return api_module._tasks.get(task_id, {}).get("status")
+
+
+def _wait_status(task_id: str, statuses: tuple[str, ...], timeout: float = 30.0) -> float:
+    """Spin until the task reaches one of ``statuses``; returns the perf_counter time it was seen."""
+    deadline = time.monotonic() + timeout
+    while _status(task_id) not in statuses:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{task_id} stuck in {_status(task_id)}")
+        time.sleep(0.0002)
+    return time.perf_counter()
+
+
+def _lock_wait_totals() -> tuple[int, float]:
+    child = metrics.TASKS_LOCK_WAIT_SECONDS.labels()
+    with child._lock:
+        return child._count, child._sum
+
+
+# --- Scenarios ---------------------------------------------------------------------------
+
+
+def bench_submit(client, fake: FakeDownload, count: int) -> dict:
+    """Latency of accepted POST /download_video requests (downloads finish instantly)."""
+    _reset_registry()
+    fake.duration = 0.0
+    samples = []
+    with patch.object(api_module, "_MAX_TASK_HISTORY", count):
+        for _ in range(count):
+            start = time.perf_counter()
+            _submit(client)
+            samples.append(time.perf_counter() - start)
+        _wait_idle()
+    return {"requests": count, **_distribution_us(samples)}
+
+
+def _fill_history(size: int) -> None:
+    """Put ``size`` finished tasks, shaped like real ones, straight into the registry."""
+    _reset_registry()
+    with api_module._tasks_lock:
+        for i in range(size):
+            url = _next_url()
+            api_module._add_task_locked({
+                "task_id": f"hist-{i:06d}", "status": "completed", "url": url, "format": "mp4",
+                "video_key": api_module.canonical_video_key(url), "cancelled": False, "progress": 100,
+                "title": f"History entry {i}", "downloaded_bytes": _FAKE_BYTES, "total_bytes": _FAKE_BYTES,
+                "timings": {"extracting": 1.2, "downloading": 30.5, "merging": 2.1, "total": 33.8},
+            })
+
+
+def bench_list(client, sizes: list[int], repeat: int) -> dict:
+    """GET /tasks against the history size: cached full body, body after a change, ?since= delta, 304."""
+    results = {}
+    for size in sizes:
+        with patch.object(api_module, "_MAX_TASK_HISTORY", size):
+            _fill_history(size)
+            cached, rebuilt, delta, not_modified = [], [], [], []
+            for i in range(repeat):
+                api_module._update_task(f"hist-{i % size:06d}", title=f"Renamed {i}")
+                revision = api_module._task_feed.revision
+
+                start = time.perf_counter()
+                resp = client.get("/tasks")
+                rebuilt.append(time.perf_counter() - start)
+                etag = resp.headers["ETag"]
+
+                start = time.perf_counter()
+                client.get("/tasks")
+                cached.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                client.get(f"/tasks?since={revision - 1}")
+                delta.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                client.get("/tasks", headers={"If-None-Match": etag})
+                not_modified.append(time.perf_counter() - start)
+            results[str(size)] = {
+                "full_after_change": _distribution_us(rebuilt),
+                "full_cached": _distribution_us(cached),
+                "since": _distribution_us(delta),
+                "not_modified": _distribution_us(not_modified),
+                "body_bytes": len(resp.data),
+            }
+    _reset_registry()
+    return results
+
+
+def bench_contention(app, fake: FakeDownload, tasks: int, pollers: int, seconds: float) -> dict:
+    """Pollers hammer GET /tasks?since= while ``tasks`` downloads report progress every few ms."""
+    _reset_registry()
+    fake.duration, fake.ticks = seconds, max(1, int(seconds / 0.005))
+    submitter = app.test_client()
+    waits_before = _lock_wait_totals()
+    task_ids = [_submit(submitter) for _ in range(tasks)]
+    stop = threading.Event()
+    samples: list[list[float]] = [[] for _ in range(pollers)]
+
+    def poll(out: list[float]) -> None:
+        client = app.test_client()
+        revision = api_module._task_feed.revision
+        while not stop.is_set():
+            start = time.perf_counter()
+            resp = client.get(f"/tasks?since={revision}")
+            out.append(time.perf_counter() - start)
+            revision = resp.get_json()["revision"]
+
+    threads = [threading.Thread(target=poll, args=(out,), daemon=True) for out in samples]
+    for thread in threads:
+        thread.start()
+    for task_id in task_ids:
+        _wait_status(task_id, api_module._TERMINAL_STATUSES, timeout=seconds * tasks + 30)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    _wait_idle()
+    waits_after = _lock_wait_totals()
+    acquires = waits_after[0] - waits_before[0]
+    waited = waits_after[1] - waits_before[1]
+    polls = [sample for out in samples for sample in out]
+    return {
+        "tasks": tasks, "pollers": pollers, "polls": len(polls),
+        "poll": _distribution_us(polls),
+        "lock_acquires": acquires,
+        "lock_wait_mean_us": round(waited / acquires * 1e6, 2) if acquires else 0.0,
+        "lock_wait_total_ms": round(waited * 1e3, 2),
+    }
+
+
+def bench_cancel(client, fake: FakeDownload, count: int, workers: int) -> dict:
+    """Time from DELETE to status "cancelled", for running downloads and for ones still in the backlog."""
+    _reset_registry()
+    fake.duration, fake.ticks = 60.0, 6000  # stop_check every 10 ms, as with a real progress hook
+    running, queued = [], []
+    for _ in range(count):
+        task_ids = [_submit(client) for _ in range(workers + 1)]
+        for task_id in task_ids[:workers]:
+            _wait_status(task_id, ("downloading",))
+        # The extra task waits in the backlog behind the busy workers.
+        for task_id, out in [(task_ids[-1], queued), *[(tid, running) for tid in task_ids[:workers]]]:
+            start = time.perf_counter()
+            client.delete(f"/tasks/{task_id}")
+            out.append(_wait_status(task_id, ("cancelled",)) - start)
+        _wait_idle()
+    return {"running": _distribution_us(running), "queued": _distribution_us(queued)}
+
+
+def bench_memory(client, fake: FakeDownload, count: int) -> dict:
+    """Traced memory retained per finished task (registry entry, change-feed events, idempotency state)."""
+    _reset_registry()
+    fake.duration, fake.ticks = 0.0, 10
+    with patch.object(api_module, "_MAX_TASK_HISTORY", count):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for _ in range(count):
+            _submit(client)
+        _wait_idle()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    _reset_registry()
+    return {"tasks": count, "bytes_per_task": round(retained / count)}
+
+
+# --- Results -----------------------------------------------------------------------------
+
+
+def _addon_version() -> str:
+    try:
+        with open(os.path.join(_REPO, "yt-dlp-api", "config.yaml")) as f:
+            match = re.search(r'^version:\s*"?([^"\s]+)"?', f.read(), re.MULTILINE)
+        return match.group(1) if match else "unknown"
+    except OSError:
+        return "unknown"
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+# Larger is worse for every metric except these counts.
+_NOT_COSTS = ("requests", "tasks", "pollers", "polls", "lock_acquires")
+
+
+def _compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print every metric next to the baseline; returns the names that got worse by more than ``threshold``."""
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    regressions = []
+    print(f"\nvs {baseline['meta']['version']} ({baseline['meta']['timestamp']}):")
+    for name, value in new.items():
+        if name not in old:
+            continue
+        before = old[name]
+        change = (value - before) / before if before else 0.0
+        flag = ""
+        if name.rsplit(".", 1)[-1] not in _NOT_COSTS and change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<52} {before:>12} -> {value:>12} {change:+8.1%}{flag}")
+    return regressions
+
+
+def _print(results: dict) -> None:
+    for name, value in _flatten(results).items():
+        print(f"  {name:<52} {value:>12}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller counts, for a smoke run")
+    parser.add_argument("--workers", type=int, default=2, help="download worker pool size")
+    parser.add_argument("--pollers", type=int, default=8)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of fake downloads that fail")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/api-<version>.json)")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    submits, repeat, sizes, contention_s, cancels, tracked = (
+        (50, 20, [10, 100], 0.5, 2, 50) if args.quick else (500, 100, [10, 100, 1000, 5000], 2.0, 10, 500)
+    )
+    fake = FakeDownload(fail_rate=args.fail_rate)
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(api_module, "download_video", fake), \
+            patch.object(api_module, "check_ytdlp_version", lambda: {}), \
+            patch.object(api_module, "DOWNLOAD_DIR", tmp):
+        app = create_app(state_path=os.path.join(tmp, "update-state.json"), task_db_path=os.path.join(tmp, "tasks.db"))
+        app.config["TESTING"] = True
+        api_module.init_download_queue(DownloadQueue(
+            max_workers=args.workers, on_change=api_module.refresh_queue_positions,
+            client_weights=api_module.CLIENT_WEIGHTS,
+        ))
+        client = app.test_client()
+        results = {
+            "submit": bench_submit(client, fake, submits),
+            "list": bench_list(client, sizes, repeat),
+            "contention": bench_contention(app, fake, args.workers * 2, args.pollers, contention_s),
+            "cancel": bench_cancel(client, fake, cancels, args.workers),
+            "memory": bench_memory(client, fake, tracked),
+        }
+        api_module.shutdown_download_queue()
+        api_module.close_task_store()
+
+    report = {
+        "meta": {
+            "version": _addon_version(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    print(f"API benchmark, add-on {report['meta']['version']}, {args.workers} workers")
+    _print(results)
+
+    output = args.output or os.path.join(_REPO, "benchmarks", "results", f"api-{report['meta']['version']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwritten to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = _compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) slower by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Benchmark: the real download pipeline against a local fake media server.
+
+Each scenario registers a video on benchmarks/fake_media/fake_media_server.py and runs
+it through app.api._run_download() — the worker path with the real download_video(),
+yt-dlp (via the fake_media extractor plugin), ffmpeg merge / mp3 extraction, the
+task timer and the ad-hoc update + retry on error signals. Only `pip install` is
+faked: it takes --update-seconds and "fixes" faults marked until_healed.
+
+Reports per scenario: final status, time to first media byte, throughput, merge /
+transcode time, total time, HTTP statuses seen by the server and updates run. The
+cancel-* scenarios cancel the task as soon as it enters a phase and report the
+cancel latency and the partial files (.part, .temp, unmerged streams) left behind.
+Scenarios that merge or transcode need ffmpeg and are skipped without it.
+
+Run from the repo root:
+    python benchmarks/bench_e2e.py [--repeat 3] [--only dash-merge,info-403-update] [--output e2e.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+from unittest.mock import patch
+
+_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+_REPO = os.path.join(_BENCHMARKS, "..")
+sys.path.insert(0, os.path.join(_REPO, "yt-dlp-api"))
+# Makes yt-dlp find yt_dlp_plugins/extractor/fake_media.py.
+sys.path.insert(0, os.path.join(_BENCHMARKS, "fake_media"))
+
+import app.api as api_module  # noqa: E402
+from app import create_app  # noqa: E402
+from bench_api import _addon_version  # noqa: E402
+from fake_media_server import FakeMediaServer, Fault, Profile, has_ffmpeg  # noqa: E402
+from yt_dlp.plugins import load_all_plugins  # noqa: E402
+
+_MIB = 1024 * 1024
+
+
+@dataclass
+class Scenario:
+    name: str
+    format_type: str
+    profile: Callable[[], Profile]
+    needs_ffmpeg: bool = False
+    cancel_in: str | None = None    # task phase (TaskTimer) in which the task is cancelled
+
+
+SCENARIOS = [
+    Scenario("progressive", "mp4", lambda: Profile()),
+    Scenario("progressive-throttled", "mp4", lambda: Profile(latency=0.2, rate=4 * _MIB)),
+    Scenario("dash-merge", "mp4", lambda: Profile(progressive=False, dash=True), needs_ffmpeg=True),
+    Scenario("dash-both", "both", lambda: Profile(progressive=False, dash=True), needs_ffmpeg=True),
+    Scenario("mp3", "mp3", lambda: Profile(progressive=False, dash=True), needs_ffmpeg=True),
+    Scenario("media-429", "mp4", lambda: Profile(faults=[Fault(429, "media", count=2)])),
+    Scenario("media-500", "mp4", lambda: Profile(faults=[Fault(500, "media", count=1)])),
+    Scenario(
+        "fragment-503", "mp4", lambda: Profile(progressive=False, dash=True, faults=[Fault(503, "media", count=3)]),
+        needs_ffmpeg=True,
+    ),
+    # Extraction broken until yt-dlp is updated: ad-hoc update, then a successful retry.
+    Scenario("info-403-update", "mp4", lambda: Profile(faults=[Fault(403, "info", until_healed=True)])),
+    # Broken whatever the version: the update runs, the retry fails too.
+    Scenario("info-403-persistent", "mp4", lambda: Profile(faults=[Fault(403, "info")])),
+    Scenario("cancel-extracting", "mp4", lambda: Profile(latency=0.3), cancel_in="extracting"),
+    Scenario("cancel-downloading", "mp4", lambda: Profile(rate=1 * _MIB), cancel_in="downloading"),
+    Scenario(
+        "cancel-transcoding", "mp3", lambda: Profile(progressive=False, dash=True), needs_ffmpeg=True,
+        cancel_in="transcoding",
+    ),
+]
+
+# What an interrupted download can leave in the media directory.
+_PARTIAL_FILE = re.compile(r"\.(part|ytdl)$|\.part-Frag|\.temp\.|\.f\d+\.")
+
+
+class FakePip:
+    """Replaces subprocess.run in app.updater: `pip install -U yt-dlp` takes ``seconds`` and heals the server."""
+
+    def __init__(self, server: FakeMediaServer, seconds: float) -> None:
+        self._server = server
+        self._seconds = seconds
+        self.calls = 0
+
+    def __call__(self, args, **kwargs):
+        self.calls += 1
+        time.sleep(self._seconds)
+        self._server.heal()
+        return subprocess.CompletedProcess(args, 0, "", "")
+
+
+def _partial_files() -> int:
+    return sum(1 for name in os.listdir(api_module.DOWNLOAD_DIR) if _PARTIAL_FILE.search(name))
+
+
+def _cancel_in_phase(task_id: str, phase: str, timeout: float = 60.0) -> None:
+    """Cancel the task as soon as its timer reaches ``phase`` (gives up once it finished)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        timer = api_module._task_timers.get(task_id)
+        if timer is not None and timer.phase == phase:
+            api_module._cancel_task(task_id)
+            return
+        with api_module._tasks_lock:
+            if api_module._tasks.get(task_id, {}).get("status") in api_module._TERMINAL_STATUSES:
+                return
+        time.sleep(0.005)
+
+
+def run_scenario(server: FakeMediaServer, pip: FakePip, scenario: Scenario, run: int) -> dict:
+    """One download of ``scenario`` through _run_download(); returns its measurements."""
+    video_id = f"{scenario.name}-{run}-{time.monotonic_ns() % 10**9}"
+    url = server.add_video(video_id, scenario.profile())
+    task_id = f"e2e-{video_id}"
+    with api_module._tasks_lock:
+        api_module._add_task_locked({
+            "task_id": task_id, "status": "queued", "url": url, "format": scenario.format_type,
+            "video_key": api_module.canonical_video_key(url), "cancelled": False,
+        })
+    updates_before, partial_before = pip.calls, _partial_files()
+    if scenario.cancel_in:
+        threading.Thread(target=_cancel_in_phase, args=(task_id, scenario.cancel_in), daemon=True).start()
+    started = time.monotonic()
+    api_module._run_download(task_id, url, scenario.format_type)
+    with api_module._tasks_lock:
+        task = dict(api_module._tasks.get(task_id, {}))
+
+    log = server.log_for(video_id)
+    media_bytes = [e.first_byte for e in log if e.target == "media" and e.first_byte and e.status in (200, 206)]
+    timings, usage = task.get("timings", {}), task.get("usage", {})
+    return {
+        "status": task.get("status"),
+        "error": (task.get("error") or "").replace(video_id, "<id>")[:120] or None,
+        "ttfb_s": round(min(media_bytes) - started, 3) if media_bytes else None,
+        "throughput_mib_s": round(usage["throughput"] / _MIB, 2) if usage.get("throughput") else None,
+        "bytes": usage.get("bytes"),
+        "extracting_s": timings.get("extracting"),
+        "merging_s": timings.get("merging"),
+        "transcoding_s": timings.get("transcoding"),
+        "updating_s": timings.get("updating"),
+        "total_s": timings.get("total"),
+        "requests": dict(sorted(Counter(str(e.status) for e in log).items())),
+        "updates": pip.calls - updates_before,
+        "cancel_s": task.get("cancel", {}).get("latency"),
+        "leftovers": _partial_files() - partial_before if scenario.cancel_in else None,
+    }
+
+
+def _summarize(runs: list[dict]) -> dict:
+    """Median of every numeric field over the runs; statuses, requests and errors as seen."""
+    summary: dict = {"runs": len(runs), "statuses": dict(Counter(r["status"] for r in runs))}
+    for key in runs[0]:
+        if key in ("status", "requests", "error"):
+            continue
+        values = [r[key] for r in runs if isinstance(r[key], (int, float))]
+        summary[key] = round(statistics.median(values), 3) if values else None
+    requests: Counter = Counter()
+    for r in runs:
+        requests.update(r["requests"])
+    summary["requests"] = dict(sorted(requests.items()))
+    summary["errors"] = sorted({r["error"] for r in runs if r["error"]})
+    return summary
+
+
+def _cell(value) -> str:
+    return "-" if value is None else str(value)
+
+
+def _print(results: dict) -> None:
+    columns = (
+        "ttfb_s", "throughput_mib_s", "merging_s", "transcoding_s", "updating_s", "total_s", "updates", "cancel_s",
+        "leftovers",
+    )
+    print(f"  {'scenario':<22} {'status':<16}" + "".join(f"{c:>17}" for c in columns) + "  requests")
+    for name, summary in results.items():
+        if "skipped" in summary:
+            print(f"  {name:<22} skipped: {summary['skipped']}")
+            continue
+        statuses = ",".join(f"{s}x{n}" for s, n in summary["statuses"].items())
+        requests = " ".join(f"{s}:{n}" for s, n in summary["requests"].items())
+        print(f"  {name:<22} {statuses:<16}" + "".join(f"{_cell(summary[c]):>17}" for c in columns) + f"  {requests}")
+        for error in summary["errors"]:
+            print(f"  {'':<22} error: {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="downloads per scenario")
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--media-seconds", type=int, default=20, help="length of the generated media")
+    parser.add_argument("--media-dir", help="where to generate/keep the media (default: a temporary directory)")
+    parser.add_argument("--update-seconds", type=float, default=1.0, help="duration of a faked pip install")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/e2e-<version>.json)")
+    args = parser.parse_args()
+
+    wanted = set(args.only.split(",")) if args.only else None
+    scenarios = [s for s in SCENARIOS if wanted is None or s.name in wanted]
+    load_all_plugins()
+    ffmpeg = has_ffmpeg()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = FakeMediaServer(args.media_dir or os.path.join(tmp, "source"), args.media_seconds).start()
+        pip = FakePip(server, args.update_seconds)
+        downloads = os.path.join(tmp, "media")
+        os.makedirs(downloads)
+        with patch("app.yt_dlp_manager.check_ytdlp_version", lambda: {}), \
+                patch.object(api_module, "DOWNLOAD_DIR", downloads), \
+                patch("app.updater.subprocess.run", pip):
+            create_app(state_path=os.path.join(tmp, "update-state.json"), task_db_path=os.path.join(tmp, "tasks.db"))
+            results = {}
+            for scenario in scenarios:
+                if scenario.needs_ffmpeg and not ffmpeg:
+                    results[scenario.name] = {"skipped": "needs ffmpeg and ffprobe on PATH"}
+                    continue
+                runs = [run_scenario(server, pip, scenario, run) for run in range(args.repeat)]
+                results[scenario.name] = _summarize(runs)
+            api_module.shutdown_download_queue()
+            api_module.close_task_store()
+        server.stop()
+
+    import yt_dlp
+    report = {
+        "meta": {
+            "version": _addon_version(),
+            "yt_dlp": yt_dlp.version.__version__,
+            "ffmpeg": ffmpeg,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "media_seconds": args.media_seconds,
+            "concurrent_fragments": api_module.CONCURRENT_FRAGMENTS,
+        },
+        "results": results,
+    }
+    print(f"End-to-end download benchmark, add-on {report['meta']['version']}, yt-dlp {report['meta']['yt_dlp']}")
+    _print(results)
+
+    output = args.output or os.path.join(_BENCHMARKS, "results", f"e2e-{report['meta']['version']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwritten to {output}")
+
+
+if __name__ == "__main__":
+    main()
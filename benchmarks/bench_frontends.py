@@ -0,0 +1,246 @@
+"""
+Benchmark: WSGI (thread per stream) vs ASGI (coroutine per stream) for /tasks/stream subscribers.
+
+Both front-ends serve the same app built with create_app(). N clients open
+/tasks/stream and stay idle, like dashboards, tablets and extension popups; then a
+task changes and every client must receive the event.
+  wsgi — each subscriber holds a thread iterating the Flask response (what the
+         gthread / werkzeug servers do per connection)
+  asgi — each subscriber is a coroutine on one event loop (app/asgi.py)
+
+Measures per front-end and subscriber count: time until all received their
+snapshot, threads and memory held per idle subscriber (RSS and traced Python
+allocations), and fan-out latency of one change to all of them.
+
+Run from the repo root:
+    python benchmarks/bench_frontends.py [--quick] [--subscribers 100,1000] [--output frontends.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_BENCHMARKS, "..", "yt-dlp-api"))
+
+import app.api as api_module  # noqa: E402
+from app import create_app  # noqa: E402
+from app.asgi import AsgiApp  # noqa: E402
+from bench_api import _addon_version  # noqa: E402
+
+_TASK_ID = "bench-task"
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _marker(name: str) -> bytes:
+    return f'"marker":"{name}"'.encode()
+
+
+def _fanout_stats(published: float, seen: list[float]) -> dict:
+    latencies = sorted((t - published) * 1000 for t in seen)
+    return {
+        "received": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+class _Subscribers:
+    """Common measurement around one batch of subscribers."""
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.all_connected = threading.Event()
+        self.seen: list[float] = []
+        self._connected = 0
+        self._lock = threading.Lock()
+
+    def connected(self) -> None:
+        with self._lock:
+            self._connected += 1
+            if self._connected == self.count:
+                self.all_connected.set()
+
+    def record(self) -> None:
+        with self._lock:
+            self.seen.append(time.perf_counter())
+
+
+def bench_wsgi(app, count: int) -> dict:
+    """``count`` threads, each iterating a /tasks/stream response until the "stop" marker."""
+    subs = _Subscribers(count)
+    client = app.test_client()
+
+    def subscriber() -> None:
+        response = client.get("/tasks/stream", buffered=False)
+        got_snapshot = False
+        for chunk in response.response:
+            if not got_snapshot and b"event: snapshot" in chunk:
+                got_snapshot = True
+                subs.connected()
+            if _marker("change") in chunk:
+                subs.record()
+            if _marker("stop") in chunk:
+                break
+        response.close()
+
+    return _run(subs, lambda: [threading.Thread(target=subscriber, daemon=True) for _ in range(count)], None)
+
+
+def bench_asgi(app, count: int) -> dict:
+    """``count`` coroutines on one loop, each consuming /tasks/stream through AsgiApp."""
+    subs = _Subscribers(count)
+    asgi = AsgiApp(app, threads=4)
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True, name="bench-asgi-loop")
+    loop_thread.start()
+
+    async def subscriber() -> None:
+        gone = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        got_snapshot = False
+
+        async def send(message):
+            nonlocal got_snapshot
+            chunk = message.get("body", b"")
+            if not got_snapshot and b"event: snapshot" in chunk:
+                got_snapshot = True
+                subs.connected()
+            if _marker("change") in chunk:
+                subs.record()
+            if _marker("stop") in chunk:
+                gone.set()
+
+        scope = {"type": "http", "method": "GET", "path": "/tasks/stream", "query_string": b"", "headers": []}
+        await asgi(scope, receive, send)
+
+    def start() -> list:
+        return [asyncio.run_coroutine_threadsafe(subscriber(), loop) for _ in range(count)]
+
+    try:
+        return _run(subs, None, start)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join(timeout=5)
+
+
+def _run(subs: _Subscribers, make_threads, start_coroutines) -> dict:
+    gc.collect()
+    threads_before = threading.active_count()
+    rss_before = _rss_bytes()
+    tracemalloc.start()
+    traced_before = tracemalloc.take_snapshot()
+
+    started = time.perf_counter()
+    if make_threads is not None:
+        workers = make_threads()
+        for worker in workers:
+            worker.start()
+        waiters = [worker.join for worker in workers]
+    else:
+        futures = start_coroutines()
+        waiters = [lambda f=f: f.result(timeout=30) for f in futures]
+    subs.all_connected.wait(timeout=60)
+    connect_s = time.perf_counter() - started
+    time.sleep(0.2)  # Idle: every subscriber is parked on the feed.
+
+    traced = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(traced_before, "filename"))
+    tracemalloc.stop()
+    rss_after = _rss_bytes()
+    threads = threading.active_count() - threads_before
+
+    published = time.perf_counter()
+    api_module._update_task(_TASK_ID, marker="change")
+    deadline = time.monotonic() + 30
+    while len(subs.seen) < subs.count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    fanout = _fanout_stats(published, subs.seen)
+
+    api_module._update_task(_TASK_ID, marker="stop")
+    for wait in waiters:
+        wait()
+    return {
+        "subscribers": subs.count,
+        "connect_s": round(connect_s, 3),
+        "threads": threads,
+        "rss_bytes_per_subscriber": round((rss_after - rss_before) / subs.count) if rss_before else None,
+        "traced_bytes_per_subscriber": round(traced / subs.count),
+        "fanout": fanout,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer subscribers, for a smoke run")
+    parser.add_argument("--subscribers", help="comma-separated subscriber counts (default 100,1000)")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/frontends-<version>.json)")
+    args = parser.parse_args()
+    counts = [int(n) for n in args.subscribers.split(",")] if args.subscribers else ([50, 200] if args.quick else [100, 1000])
+
+    results: dict = {"wsgi": {}, "asgi": {}}
+    with tempfile.TemporaryDirectory() as tmp, patch.object(api_module, "check_ytdlp_version", lambda: {}):
+        app = create_app(state_path=os.path.join(tmp, "update-state.json"), task_db_path=os.path.join(tmp, "tasks.db"))
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": _TASK_ID, "status": "queued", "url": "https://y/bench"})
+        for count in counts:
+            for frontend, bench in (("wsgi", bench_wsgi), ("asgi", bench_asgi)):
+                # The snapshot a subscriber starts with must not contain the previous run's marker.
+                api_module._update_task(_TASK_ID, marker=None)
+                results[frontend][str(count)] = bench(app, count)
+        api_module.close_task_store()
+
+    report = {
+        "meta": {
+            "version": _addon_version(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    print(f"Stream front-end benchmark, add-on {report['meta']['version']}")
+    print(f"  {'front-end':<10}{'subs':>7}{'connect s':>11}{'threads':>9}{'RSS B/sub':>11}{'traced B/sub':>14}"
+          f"{'fan-out p50 ms':>16}{'p95 ms':>9}{'max ms':>9}")
+    for frontend, by_count in results.items():
+        for count, r in by_count.items():
+            print(f"  {frontend:<10}{count:>7}{r['connect_s']:>11}{r['threads']:>9}"
+                  f"{str(r['rss_bytes_per_subscriber']):>11}{r['traced_bytes_per_subscriber']:>14}"
+                  f"{r['fanout']['p50_ms']:>16}{r['fanout']['p95_ms']:>9}{r['fanout']['max_ms']:>9}")
+
+    output = args.output or os.path.join(_BENCHMARKS, "results", f"frontends-{report['meta']['version']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwritten to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: cost of one progress tick with the SQLite task store attached.
+
+Compares, per progress update of a running task:
+  memory       — registry update only (no persistence)
+  write-behind — registry update + TaskStore.put (what the app does)
+  sync-commit  — registry update + one SQLite commit per tick (naive baseline)
+
+Run from the repo root:
+    python benchmarks/bench_task_store.py [--ticks 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "yt-dlp-api"))
+
+import app.api as api_module  # noqa: E402
+from app.task_store import TaskStore  # noqa: E402
+
+
+def _run_ticks(ticks: int) -> float:
+    """Send ``ticks`` progress updates through the registry; return µs per tick."""
+    with api_module._tasks_lock:
+        api_module._tasks.clear()
+        api_module._add_task_locked({"task_id": "bench", "status": "downloading", "url": "https://x", "format": "mp4"})
+    start = time.perf_counter()
+    for i in range(ticks):
+        api_module._update_task("bench", progress=i % 100, downloaded_bytes=i * 65536, speed=1e6 + i, eta=ticks - i)
+    return (time.perf_counter() - start) / ticks * 1e6
+
+
+class _SyncStore(TaskStore):
+    """TaskStore that commits on every put — the naive alternative to batching."""
+
+    def put(self, task: dict, urgent: bool = False) -> None:
+        self._write({task["task_id"]: dict(task)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {"memory": _run_ticks(args.ticks)}
+
+        store = TaskStore(os.path.join(tmp, "write-behind.db"))
+        api_module.init_task_store(store)
+        results["write-behind"] = _run_ticks(args.ticks)
+        flush_start = time.perf_counter()
+        api_module.close_task_store()
+        results["write-behind final flush (ms)"] = (time.perf_counter() - flush_start) * 1e3
+
+        api_module.init_task_store(_SyncStore(os.path.join(tmp, "sync.db")))
+        results["sync-commit"] = _run_ticks(args.ticks)
+        api_module.close_task_store()
+        api_module.init_task_store(None)
+
+    print(f"{args.ticks} progress ticks")
+    for name, value in results.items():
+        unit = "" if name.endswith("(ms)") else " µs/tick"
+        print(f"  {name:<32} {value:10.2f}{unit}")
+
+
+if __name__ == "__main__":
+    main()
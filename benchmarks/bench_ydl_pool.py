@@ -0,0 +1,85 @@
+"""
+Benchmark: per-task YoutubeDL setup cost, fresh object vs warm pooled object.
+
+For each option profile (mp4, mp3, both, info), measures what a worker spends
+before yt-dlp starts extracting:
+  fresh   — construct + enter + exit a new YoutubeDL (what every task paid before)
+  pooled  — YoutubeDLPool.checkout of this thread's warm object (hooks swapped)
+plus the first use of the YouTube extractor, which a fresh object pays again on
+every task and a pooled one only once.
+
+No network access. The numbers matter most on small ARM boards (Raspberry Pi,
+ODROID) running Home Assistant; run it there and compare the per-task column.
+
+Run from the repo root:
+    python benchmarks/bench_ydl_pool.py [--tasks 50]
+"""
+import argparse
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "yt-dlp-api"))
+
+import yt_dlp  # noqa: E402
+
+from app.yt_dlp_manager import YoutubeDLPool, _profile_options  # noqa: E402
+
+
+def _params(profile: str, output_dir: str) -> dict:
+    if profile == "info":
+        return {"quiet": True, "skip_download": True}
+    return _profile_options(profile, output_dir, timeout=1800)
+
+
+def _task_opts() -> dict:
+    return {
+        "progress_hooks": [lambda d: None],
+        "postprocessor_hooks": [lambda d: None],
+        "post_hooks": [lambda path: None],
+        "concurrent_fragment_downloads": 4,
+    }
+
+
+def _fresh(profile: str, output_dir: str, tasks: int) -> float:
+    """ms per task for a new YoutubeDL (plus first YouTube extractor use) every task."""
+    start = time.perf_counter()
+    for _ in range(tasks):
+        with yt_dlp.YoutubeDL({**_params(profile, output_dir), **_task_opts()}) as ydl:
+            ydl.get_info_extractor("Youtube")
+    return (time.perf_counter() - start) / tasks * 1e3
+
+
+def _pooled(profile: str, output_dir: str, tasks: int) -> float:
+    """ms per task for a checkout from a pool (first build included, as a worker would see it)."""
+    pool = YoutubeDLPool(max_uses=tasks + 1)
+    start = time.perf_counter()
+    for _ in range(tasks):
+        with pool.checkout((profile,), _params(profile, output_dir), _task_opts()) as ydl:
+            ydl.get_info_extractor("Youtube")
+    elapsed = (time.perf_counter() - start) / tasks * 1e3
+    pool.clear()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{platform.machine()} / Python {platform.python_version()} / yt-dlp {yt_dlp.version.__version__}")
+    print(f"{args.tasks} tasks per profile, ms of setup per task")
+    print(f"  {'profile':<8} {'fresh':>10} {'pooled':>10} {'saved':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm imports and yt-dlp's lazy extractor loading so neither column pays for them.
+        _fresh("mp4", tmp, 1)
+        for profile in ("mp4", "mp3", "both", "info"):
+            fresh = _fresh(profile, tmp, args.tasks)
+            pooled = _pooled(profile, tmp, args.tasks)
+            print(f"  {profile:<8} {fresh:10.2f} {pooled:10.2f} {fresh - pooled:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
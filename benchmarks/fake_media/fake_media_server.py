@@ -0,0 +1,303 @@
+"""
+Fake media server — a local stand-in for a video site, for offline end-to-end runs.
+
+Owns:
+- the synthetic media (generated once with ffmpeg: a video-only mp4, an m4a audio
+  track and a muxed progressive mp4; random bytes in a progressive mp4 without ffmpeg)
+- per-video profiles: which formats are offered (progressive and/or DASH fragments),
+  latency before the first byte, a throughput cap and injected HTTP errors
+- a request log with time-to-first-byte and bytes sent per response
+
+URLs (the ``fake_media`` yt-dlp plugin extracts ``/watch/<id>``):
+    GET /api/<id>                   video metadata and format list (the "extraction" request)
+    GET /media/<id>/<file>          progressive file, with Range support
+    GET /media/<id>/<file>/<n>      DASH fragment n of a file
+
+Public interface:
+    server = FakeMediaServer(media_dir); server.start(); server.base_url
+    server.add_video(video_id, Profile(...)); server.heal(); server.log_for(video_id); server.stop()
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_CHUNK = 64 * 1024
+FRAGMENT_BYTES = 512 * 1024
+
+
+def has_ffmpeg() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def generate_media(media_dir: str, seconds: int = 20) -> dict[str, str]:
+    """Create the media files (once per directory); returns {role: path}.
+
+    With ffmpeg: ``video`` (H.264, no audio), ``audio`` (AAC m4a) and ``progressive``
+    (both muxed). Without it, only ``progressive``, filled with random bytes — enough for
+    a download that needs no postprocessing.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    paths = {role: os.path.join(media_dir, f"{role}.{ext}")
+             for role, ext in (("video", "mp4"), ("audio", "m4a"), ("progressive", "mp4"))}
+    if not has_ffmpeg():
+        if not os.path.exists(paths["progressive"]):
+            with open(paths["progressive"], "wb") as f:
+                f.write(os.urandom(seconds * 250_000))
+        return {"progressive": paths["progressive"]}
+    video = ["-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}"]
+    audio = ["-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}"]
+    h264 = ["-c:v", "libx264", "-preset", "ultrafast", "-b:v", "2M", "-pix_fmt", "yuv420p"]
+    aac = ["-c:a", "aac", "-b:a", "128k"]
+    commands = {
+        "video": [*video, *h264, "-an"],
+        "audio": [*audio, *aac, "-vn"],
+        "progressive": [*video, *audio, *h264, *aac, "-shortest"],
+    }
+    for role, args in commands.items():
+        if not os.path.exists(paths[role]):
+            subprocess.run(
+                ["ffmpeg", "-v", "error", "-y", *args, "-movflags", "+faststart", paths[role]],
+                check=True, timeout=300,
+            )
+    return paths
+
+
+@dataclass
+class Fault:
+    """Answer matching requests with ``status`` instead of content.
+
+    ``target`` is "info" (the metadata request) or "media" (files and fragments).
+    ``count`` limits it to the first N matching requests; ``until_healed`` keeps it
+    until FakeMediaServer.heal() (the harness heals when a yt-dlp update "succeeds").
+    """
+
+    status: int
+    target: str = "media"
+    count: int | None = None
+    until_healed: bool = False
+    served: int = 0
+
+
+@dataclass
+class Profile:
+    """What one fake video offers and how the server behaves when it is requested."""
+
+    progressive: bool = True
+    dash: bool = False
+    latency: float = 0.0           # seconds before the first byte of every response
+    rate: float | None = None      # bytes/s cap per response
+    faults: list[Fault] = field(default_factory=list)
+
+
+@dataclass
+class LogEntry:
+    video_id: str
+    target: str
+    path: str
+    status: int
+    started: float                  # time.monotonic() when the request arrived
+    first_byte: float | None = None
+    finished: float | None = None
+    bytes_sent: int = 0
+
+
+class FakeMediaServer:
+    """Threaded HTTP server on 127.0.0.1 serving fake videos; see the module docstring."""
+
+    def __init__(self, media_dir: str, media_seconds: int = 20) -> None:
+        self._files = generate_media(media_dir, media_seconds)
+        self._media_seconds = media_seconds
+        self._lock = threading.Lock()
+        self._videos: dict[str, Profile] = {}
+        self._log: list[LogEntry] = []
+        self._healed = False
+        self._httpd: ThreadingHTTPServer | None = None
+
+    @property
+    def formats_available(self) -> set[str]:
+        return set(self._files)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMediaServer":
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self._httpd = _QuietServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True, name="fake-media-server").start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def add_video(self, video_id: str, profile: Profile) -> str:
+        """Register a video; returns its watch URL."""
+        with self._lock:
+            self._videos[video_id] = profile
+            self._healed = False
+        return f"{self.base_url}/watch/{video_id}"
+
+    def heal(self) -> None:
+        """End every ``until_healed`` fault (the site works again after a yt-dlp update)."""
+        with self._lock:
+            self._healed = True
+
+    def log_for(self, video_id: str) -> list[LogEntry]:
+        with self._lock:
+            return [entry for entry in self._log if entry.video_id == video_id]
+
+    # --- Request handling ------------------------------------------------------------
+
+    def _fault_status(self, profile: Profile, target: str) -> int | None:
+        with self._lock:
+            for fault in profile.faults:
+                if fault.target != target or (fault.until_healed and self._healed):
+                    continue
+                if fault.count is not None and fault.served >= fault.count:
+                    continue
+                fault.served += 1
+                return fault.status
+        return None
+
+    def _metadata(self, video_id: str, profile: Profile) -> dict:
+        formats = []
+        if profile.dash and "video" in self._files:
+            for role, ext in (("video", "mp4"), ("audio", "m4a")):
+                size = os.path.getsize(self._files[role])
+                count = -(-size // FRAGMENT_BYTES)
+                formats.append({
+                    "format_id": f"dash-{role}", "ext": ext, "filesize": size,
+                    "vcodec": "avc1.64001f" if role == "video" else "none",
+                    "acodec": "mp4a.40.2" if role == "audio" else "none",
+                    "width": 1280 if role == "video" else None, "height": 720 if role == "video" else None,
+                    "fragments": [f"media/{video_id}/{role}.{ext}/{n}" for n in range(count)],
+                })
+        if profile.progressive:
+            size = os.path.getsize(self._files["progressive"])
+            formats.append({
+                "format_id": "progressive", "ext": "mp4", "filesize": size,
+                "vcodec": "avc1.64001f", "acodec": "mp4a.40.2", "width": 1280, "height": 720,
+                "path": f"media/{video_id}/progressive.mp4",
+            })
+        return {"id": video_id, "title": f"Fake video {video_id}", "duration": self._media_seconds, "formats": formats}
+
+    def _media_slice(self, path_parts: list[str], range_header: str | None) -> tuple[str, int, int, bool] | None:
+        """(file, start, end exclusive, partial) for /media/<id>/<file>[/<n>], or None."""
+        name = path_parts[0]
+        role = os.path.splitext(name)[0]
+        path = self._files.get(role)
+        if path is None:
+            return None
+        size = os.path.getsize(path)
+        if len(path_parts) == 2:
+            n = int(path_parts[1])
+            start = n * FRAGMENT_BYTES
+            return (path, start, min(size, start + FRAGMENT_BYTES), False) if start < size else None
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header or "")
+        if match:
+            start = int(match.group(1))
+            end = min(size, int(match.group(2)) + 1) if match.group(2) else size
+            return (path, start, end, True) if start < size else None
+        return path, 0, size, False
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        """yt-dlp drops connections mid-response on errors and cancels; that is expected here."""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeMediaServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:  # noqa: A002 — silence per-request stderr lines
+        pass
+
+    def do_GET(self) -> None:
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        entry = LogEntry(video_id=parts[1] if len(parts) > 1 else "", target="", path=self.path,
+                         status=404, started=time.monotonic())
+        try:
+            self._serve(parts, entry)
+        finally:
+            entry.finished = time.monotonic()
+            with self.fake._lock:
+                self.fake._log.append(entry)
+
+    def _serve(self, parts: list[str], entry: LogEntry) -> None:
+        fake = self.fake
+        profile = fake._videos.get(entry.video_id)
+        if profile is None or parts[0] not in ("api", "media"):
+            return self._send_status(entry, 404)
+        entry.target = "info" if parts[0] == "api" else "media"
+        if profile.latency:
+            time.sleep(profile.latency)
+        status = fake._fault_status(profile, entry.target)
+        if status is not None:
+            return self._send_status(entry, status)
+        if entry.target == "info":
+            body = json.dumps(fake._metadata(entry.video_id, profile)).encode()
+            return self._send_body(entry, 200, "application/json", body)
+        media = fake._media_slice(parts[2:], self.headers.get("Range"))
+        if media is None:
+            return self._send_status(entry, 404 if len(parts) < 4 else 416)
+        path, start, end, partial = media
+        self.send_response(206 if partial else 200)
+        entry.status = 206 if partial else 200
+        self.send_header("Content-Type", "video/mp4" if path.endswith(".mp4") else "audio/mp4")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{os.path.getsize(path)}")
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            self._stream(entry, f, end - start, profile.rate)
+
+    def _stream(self, entry: LogEntry, f, length: int, rate: float | None) -> None:
+        began = time.monotonic()
+        while entry.bytes_sent < length:
+            chunk = f.read(min(_CHUNK, length - entry.bytes_sent))
+            if not chunk:
+                break
+            if rate:
+                # Hold the response to ``rate`` bytes/s since it started.
+                delay = began + (entry.bytes_sent + len(chunk)) / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            if entry.first_byte is None:
+                entry.first_byte = time.monotonic()
+            entry.bytes_sent += len(chunk)
+
+    def _send_body(self, entry: LogEntry, status: int, content_type: str, body: bytes) -> None:
+        entry.status = status
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        entry.first_byte = time.monotonic()
+        entry.bytes_sent = len(body)
+
+    def _send_status(self, entry: LogEntry, status: int) -> None:
+        messages = {403: b"Forbidden", 404: b"Not Found", 416: b"Range Not Satisfiable", 429: b"Too Many Requests"}
+        self._send_body(entry, status, "text/plain", messages.get(status, b"Server Error"))
@@ -0,0 +1,35 @@
+"""yt-dlp extractor plugin for the benchmark's fake media server (benchmarks/fake_media/fake_media_server.py).
+
+yt-dlp loads it when benchmarks/fake_media is on sys.path. It only matches
+``http://127.0.0.1:<port>/watch/<id>`` (or localhost), so real sites are unaffected.
+"""
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class FakeMediaIE(InfoExtractor):
+    IE_NAME = "fakemedia"
+    _VALID_URL = r"https?://(?P<base>(?:127\.0\.0\.1|localhost):\d+)/watch/(?P<id>[\w-]+)"
+
+    def _real_extract(self, url):
+        base, video_id = self._match_valid_url(url).group("base", "id")
+        base_url = f"http://{base}/"
+        meta = self._download_json(f"{base_url}api/{video_id}", video_id, note="Downloading fake metadata")
+        formats = []
+        for fmt in meta["formats"]:
+            entry = {key: value for key, value in fmt.items() if key not in ("path", "fragments")}
+            if fmt.get("fragments"):
+                entry.update({
+                    "url": f"{base_url}{fmt['fragments'][0]}",
+                    "protocol": "http_dash_segments",
+                    "fragment_base_url": base_url,
+                    "fragments": [{"path": path} for path in fmt["fragments"]],
+                })
+            else:
+                entry["url"] = f"{base_url}{fmt['path']}"
+            formats.append(entry)
+        return {
+            "id": video_id,
+            "title": meta["title"],
+            "duration": meta.get("duration"),
+            "formats": formats,
+        }
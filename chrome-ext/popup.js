@@ -1,6 +1,7 @@
 /* global chrome */
 'use strict';
 
+// Fallback only: status normally arrives over the /tasks/stream SSE connection.
 // 2 s balances responsiveness with API load; adjust if your HA host is slow.
 const POLL_INTERVAL_MS = 2000;
 const STORAGE_KEY_URL = 'haUrl';
@@ -8,6 +9,7 @@ const STORAGE_KEY_HA_FRONTEND = 'haFrontendUrl';
 const STORAGE_KEY_FORMAT = 'format';
 
 let pollTimer = null;
+let taskStream = null;
 let currentTaskId = null;
 let currentHaUrl = null;
 
@@ -21,7 +23,9 @@ const haFrontendInput  = document.getElementById('haFrontendUrl');
 const videoUrlInput    = document.getElementById('videoUrl');
 const formatMp4Radio   = document.getElementById('formatMp4');
 const formatMp3Radio   = document.getElementById('formatMp3');
+const formatBothRadio  = document.getElementById('formatBoth');
 const downloadBtn      = document.getElementById('downloadBtn');
+const downloadAllBtn   = document.getElementById('downloadAllBtn');
 const statusEl         = document.getElementById('status');
 const statusTextEl     = document.getElementById('statusText');
 const statusDetailEl   = document.getElementById('statusDetail');
@@ -113,6 +117,10 @@ function clearStatus() {
 }
 
 function stopPolling() {
+  if (taskStream !== null) {
+    taskStream.close();
+    taskStream = null;
+  }
   if (pollTimer !== null) {
     clearInterval(pollTimer);
     pollTimer = null;
@@ -178,6 +186,8 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     if (result[STORAGE_KEY_FORMAT] === 'mp3') {
       formatMp3Radio.checked = true;
+    } else if (result[STORAGE_KEY_FORMAT] === 'both') {
+      formatBothRadio.checked = true;
     } else {
       formatMp4Radio.checked = true;
     }
@@ -255,7 +265,7 @@ downloadBtn.addEventListener('click', async () => {
 
   // Send only the single-video URL (strip list= / start_radio=) so only this video is downloaded
   const singleVideoUrl = toSingleVideoUrl(videoUrl);
-  const selectedFormat = formatMp3Radio.checked ? 'mp3' : 'mp4';
+  const selectedFormat = formatMp3Radio.checked ? 'mp3' : formatBothRadio.checked ? 'both' : 'mp4';
 
   // Persist URLs
   const haFrontendUrl = haFrontendInput.value.trim();
@@ -272,7 +282,7 @@ downloadBtn.addEventListener('click', async () => {
     const response = await fetch(`${haApiUrl}/download_video`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ url: singleVideoUrl, format: selectedFormat }),
+      body: JSON.stringify({ url: singleVideoUrl, format: selectedFormat, client: 'chrome-ext' }),
     });
 
     const body = await response.json().catch(() => ({}));
@@ -296,10 +306,91 @@ downloadBtn.addEventListener('click', async () => {
   }
 });
 
+// ── Download all tabs ─────────────────────────────────────────────────────────
+// One POST /download_videos for every YouTube video open in this window.
+downloadAllBtn.addEventListener('click', () => {
+  clearStatus();
+  const haApiUrl = haUrlInput.value.trim().replace(/\/$/, '');
+  if (!haApiUrl) {
+    setStatus('error', 'Please enter the yt-dlp API URL in Settings.', { detail: 'Open Settings and set the URL where the add-on or Docker service runs (e.g. http://192.168.1.100:5000).' });
+    settingsPanel.classList.add('open');
+    return;
+  }
+  const selectedFormat = formatMp3Radio.checked ? 'mp3' : formatBothRadio.checked ? 'both' : 'mp4';
+  chrome.storage.sync.set({ [STORAGE_KEY_URL]: haApiUrl, [STORAGE_KEY_FORMAT]: selectedFormat });
+
+  chrome.tabs.query({ currentWindow: true }, async (tabs) => {
+    const urls = [...new Set(tabs
+      .map((t) => t.url)
+      .filter((url) => url && isYouTubeUrl(url) && !isPlaylistUrl(url))
+      .map(toSingleVideoUrl))];
+    if (urls.length === 0) {
+      setStatus('error', 'No YouTube videos open.', { detail: 'Open the videos in tabs of this window first.' });
+      return;
+    }
+    downloadAllBtn.disabled = true;
+    downloadBtn.disabled = true;
+    setStatus('processing', `Queueing ${urls.length} videos…`, { detail: 'Sending request to the API.' });
+    try {
+      const response = await fetch(`${haApiUrl}/download_videos`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ format: selectedFormat, client: 'chrome-ext', items: urls.map((url) => ({ url })) }),
+      });
+      const body = await response.json().catch(() => ({}));
+      if (!response.ok) {
+        throw new Error(body.error || `Server error: ${response.status}`);
+      }
+      const results = body.results || [];
+      const present = results.filter((r) => r.already_present).length;
+      const attached = results.filter((r) => r.deduplicated).length;
+      const notes = [];
+      if (present) notes.push(`${present} already downloaded`);
+      if (attached) notes.push(`${attached} already queued`);
+      if (body.rejected) notes.push(`${body.rejected} rejected`);
+      setStatus('success', `Queued ${body.accepted} of ${urls.length} videos.`, {
+        detail: (notes.length ? `${notes.join(', ')}. ` : '') + 'Downloads continue on the server.',
+      });
+    } catch (err) {
+      setStatus('error', 'Download failed.', {
+        detail: err.message || 'Check that the API URL is correct and the add-on or Docker service is running.',
+      });
+    } finally {
+      downloadAllBtn.disabled = false;
+      downloadBtn.disabled = false;
+    }
+  });
+});
+
 // ── Polling ───────────────────────────────────────────────────────────────────
 function startPolling(haUrl, taskId) {
   stopPolling();
-  pollTimer = setInterval(() => pollTask(haUrl, taskId), POLL_INTERVAL_MS);
+  if (typeof EventSource === 'undefined') {
+    pollTimer = setInterval(() => pollTask(haUrl, taskId), POLL_INTERVAL_MS);
+    return;
+  }
+  // The stream sends a snapshot, then only changed fields; fall back to polling if it never opens.
+  let opened = false;
+  let task = null;
+  const source = new EventSource(`${haUrl}/tasks/stream`);
+  taskStream = source;
+  source.addEventListener('open', () => { opened = true; });
+  source.addEventListener('snapshot', (e) => {
+    task = JSON.parse(e.data).find((t) => t.task_id === taskId) || task;
+    if (task) handleTaskUpdate(haUrl, task);
+  });
+  source.addEventListener('task', (e) => {
+    const change = JSON.parse(e.data);
+    if (change.task_id !== taskId) return;
+    task = { ...(task || {}), ...change };
+    handleTaskUpdate(haUrl, task);
+  });
+  source.addEventListener('error', () => {
+    if (!opened && taskStream === source) {
+      stopPolling();
+      pollTimer = setInterval(() => pollTask(haUrl, taskId), POLL_INTERVAL_MS);
+    }
+  });
 }
 
 async function pollTask(haUrl, taskId) {
@@ -308,89 +399,99 @@ async function pollTask(haUrl, taskId) {
     if (!response.ok) {
       throw new Error(`HTTP ${response.status}`);
     }
-    const task = await response.json();
-
-    switch (task.status) {
-      case 'cancelled':
-        stopPolling();
-        currentTaskId = null;
-        currentHaUrl = null;
-        setStatus('cancelled', 'Cancelled.', { detail: 'Download was stopped.' });
-        downloadBtn.disabled = false;
-        break;
-
-      case 'completed': {
-        stopPolling();
-        currentTaskId = null;
-        currentHaUrl = null;
-        let folderLabel = 'My media';
-        try {
-          const configRes = await fetch(`${haUrl}/config`);
-          if (configRes.ok) {
-            const config = await configRes.json();
-            const subdir = config.media_subdir || 'youtube_downloads';
-            folderLabel = `My media → ${subdir}`;
-          }
-        } catch (_) { /* ignore */ }
-        const title = task.title ? `"${task.title}"` : 'File';
-        chrome.storage.sync.get(STORAGE_KEY_HA_FRONTEND, (result) => {
-          const haFrontend = (result[STORAGE_KEY_HA_FRONTEND] || '').trim().replace(/\/$/, '');
-          // URL must be encoded: comma %2C, colon %3A, slashes %2F (HA Media Browser expects this)
-          const mediaPath = 'media-browser/browser/app%2Cmedia-source%3A%2F%2Fmedia_source';
-          const mediaLinkUrl = haFrontend ? `${haFrontend}/${mediaPath}` : null;
-          setStatus('success', `Saved: ${title}`, {
-            detail: `Folder: ${folderLabel}.`,
-            mediaLinkUrl: mediaLinkUrl || undefined,
-          });
-        });
-        downloadBtn.disabled = false;
-        break;
-      }
-
-      case 'error':
-        stopPolling();
-        currentTaskId = null;
-        currentHaUrl = null;
-        setStatus('error', 'Download failed.', {
-          detail: task.error || 'Unknown error from the server.',
-        });
-        downloadBtn.disabled = false;
-        break;
-
-      case 'queued':
-        setStatus('processing', 'Queued…', { detail: 'Waiting for the server to start the download.' });
-        break;
-
-      case 'downloading':
-        setStatus('processing', 'Downloading…', {
-          detail: 'The file is being downloaded. You can close this popup; the download continues on the server.',
-        });
-        break;
-
-      case 'updating':
-        setStatus('processing', 'Aktualizuję system...', {
-          detail: 'Trwa aktualizacja yt-dlp. Pobieranie zostanie wznowione automatycznie.',
-        });
-        break;
-
-      case 'failed':
-        stopPolling();
-        currentTaskId = null;
-        currentHaUrl = null;
-        setStatus('error', '⚠️ System wymaga uwagi — skontaktuj się z administratorem', {});
-        downloadBtn.disabled = false;
-        break;
-
-      case 'running':  // backward compat — old backend versions
-      default:
-        setStatus('processing', 'Downloading…', {
-          detail: 'The file is being downloaded. You can close this popup; the download continues on the server.',
-        });
-        break;
-    }
+    await handleTaskUpdate(haUrl, await response.json());
   } catch (err) {
     setStatus('processing', 'Downloading…', {
       detail: `Connection issue (retrying): ${err.message}`,
     });
   }
 }
+
+/** "Downloading… 42% · 1.5 MB/s" when the server reports live progress. */
+function progressTitle(task) {
+  const parts = [];
+  if (typeof task.progress === 'number') parts.push(`${Math.round(task.progress)}%`);
+  if (task.speed) parts.push(`${(task.speed / 1048576).toFixed(1)} MB/s`);
+  return parts.length ? `Downloading… ${parts.join(' · ')}` : 'Downloading…';
+}
+
+async function handleTaskUpdate(haUrl, task) {
+  switch (task.status) {
+    case 'cancelled':
+      stopPolling();
+      currentTaskId = null;
+      currentHaUrl = null;
+      setStatus('cancelled', 'Cancelled.', { detail: 'Download was stopped.' });
+      downloadBtn.disabled = false;
+      break;
+
+    case 'completed': {
+      stopPolling();
+      currentTaskId = null;
+      currentHaUrl = null;
+      let folderLabel = 'My media';
+      try {
+        const configRes = await fetch(`${haUrl}/config`);
+        if (configRes.ok) {
+          const config = await configRes.json();
+          const subdir = config.media_subdir || 'youtube_downloads';
+          folderLabel = `My media → ${subdir}`;
+        }
+      } catch (_) { /* ignore */ }
+      const title = task.title ? `"${task.title}"` : 'File';
+      chrome.storage.sync.get(STORAGE_KEY_HA_FRONTEND, (result) => {
+        const haFrontend = (result[STORAGE_KEY_HA_FRONTEND] || '').trim().replace(/\/$/, '');
+        // URL must be encoded: comma %2C, colon %3A, slashes %2F (HA Media Browser expects this)
+        const mediaPath = 'media-browser/browser/app%2Cmedia-source%3A%2F%2Fmedia_source';
+        const mediaLinkUrl = haFrontend ? `${haFrontend}/${mediaPath}` : null;
+        setStatus('success', `Saved: ${title}`, {
+          detail: `Folder: ${folderLabel}.`,
+          mediaLinkUrl: mediaLinkUrl || undefined,
+        });
+      });
+      downloadBtn.disabled = false;
+      break;
+    }
+
+    case 'error':
+      stopPolling();
+      currentTaskId = null;
+      currentHaUrl = null;
+      setStatus('error', 'Download failed.', {
+        detail: task.error || 'Unknown error from the server.',
+      });
+      downloadBtn.disabled = false;
+      break;
+
+    case 'queued':
+      setStatus('processing', 'Queued…', { detail: 'Waiting for the server to start the download.' });
+      break;
+
+    case 'downloading':
+      setStatus('processing', task.phase === 'postprocessing' ? 'Processing…' : progressTitle(task), {
+        detail: 'The file is being downloaded. You can close this popup; the download continues on the server.',
+      });
+      break;
+
+    case 'updating':
+      setStatus('processing', 'Aktualizuję system...', {
+        detail: 'Trwa aktualizacja yt-dlp. Pobieranie zostanie wznowione automatycznie.',
+      });
+      break;
+
+    case 'failed':
+      stopPolling();
+      currentTaskId = null;
+      currentHaUrl = null;
+      setStatus('error', '⚠️ System wymaga uwagi — skontaktuj się z administratorem', {});
+      downloadBtn.disabled = false;
+      break;
+
+    case 'running':  // backward compat — old backend versions
+    default:
+      setStatus('processing', 'Downloading…', {
+        detail: 'The file is being downloaded. You can close this popup; the download continues on the server.',
+      });
+      break;
+  }
+}
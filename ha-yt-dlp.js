@@ -9,10 +9,13 @@
 const DEFAULT_API_URL = "http://localhost:5000";
 const DEFAULT_TITLE = "YouTube Downloader";
 const DEFAULT_MAX_TASKS = 5;
+// Fallback only: task updates normally arrive over the /tasks/stream SSE connection.
 const POLL_INTERVAL_MS = 2000;
 
 const STATUS_COLORS = {
   queued: "#9e9e9e",
+  downloading: "#2196f3",
+  updating: "#ff9800",
   running: "#2196f3",
   processing: "#2196f3",
   completed: "#4caf50",
@@ -23,6 +26,8 @@ const STATUS_COLORS = {
 
 const STATUS_LABELS = {
   queued: "Queued",
+  downloading: "Downloading",
+  updating: "Updating yt-dlp",
   running: "Processing",
   processing: "Processing",
   completed: "Completed",
@@ -168,6 +173,11 @@ const STYLES = `
     border-radius: 4px;
     transition: width 0.4s ease;
   }
+  .progress-detail {
+    margin-top: 2px;
+    font-size: 0.75rem;
+    color: var(--secondary-text-color, #888);
+  }
   .media-link {
     color: var(--primary-color, #03a9f4);
     text-decoration: none;
@@ -216,6 +226,7 @@ class YtDlpCard extends HTMLElement {
     this._busy = false;
     this._message = null;
     this._pollHandle = null;
+    this._eventSource = null;
     this._mediaSubdir = "youtube_downloads";
   }
 
@@ -293,17 +304,64 @@ class YtDlpCard extends HTMLElement {
 
   _startPolling() {
     this._stopPolling();
+    if (typeof EventSource === "undefined") {
+      this._startIntervalPolling();
+      return;
+    }
+    // Server pushes a snapshot, then only changes; EventSource reconnects by itself
+    // and resumes with Last-Event-ID. Fall back to polling if the stream never opens.
+    let opened = false;
+    const source = new EventSource(this._apiUrl("/tasks/stream"));
+    this._eventSource = source;
+    source.addEventListener("open", () => { opened = true; });
+    source.addEventListener("snapshot", (e) => {
+      this._tasks = JSON.parse(e.data);
+      this._updateTasksTable();
+    });
+    source.addEventListener("task", (e) => this._applyTaskChange(JSON.parse(e.data)));
+    source.addEventListener("removed", (e) => {
+      const { task_id: taskId } = JSON.parse(e.data);
+      this._tasks = this._tasks.filter((t) => t.task_id !== taskId);
+      this._updateTasksTable();
+    });
+    source.addEventListener("error", () => {
+      if (!opened && this._eventSource === source) {
+        source.close();
+        this._eventSource = null;
+        this._startIntervalPolling();
+      }
+    });
+  }
+
+  _startIntervalPolling() {
     this._fetchTasks();
     this._pollHandle = setInterval(() => this._fetchTasks(), POLL_INTERVAL_MS);
   }
 
   _stopPolling() {
+    if (this._eventSource !== null) {
+      this._eventSource.close();
+      this._eventSource = null;
+    }
     if (this._pollHandle !== null) {
       clearInterval(this._pollHandle);
       this._pollHandle = null;
     }
   }
 
+  /** Merge a task delta from the stream (null value = field removed). */
+  _applyTaskChange(change) {
+    const idx = this._tasks.findIndex((t) => t.task_id === change.task_id);
+    const task = idx >= 0 ? { ...this._tasks[idx] } : {};
+    for (const [key, value] of Object.entries(change)) {
+      if (value === null) delete task[key];
+      else task[key] = value;
+    }
+    if (idx >= 0) this._tasks[idx] = task;
+    else this._tasks.push(task);
+    this._updateTasksTable();
+  }
+
   async _fetchTasks() {
     try {
       const resp = await fetch(this._apiUrl("/tasks"));
@@ -338,7 +396,7 @@ class YtDlpCard extends HTMLElement {
       const resp = await fetch(this._apiUrl("/download_video"), {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ url: urlToSend, format: this._format }),
+        body: JSON.stringify({ url: urlToSend, format: this._format, client: "ha-card" }),
       });
       const data = await resp.json();
       if (!resp.ok) {
@@ -346,7 +404,7 @@ class YtDlpCard extends HTMLElement {
       } else {
         this._message = { type: "success", text: `Download queued (ID: ${data.task_id})` };
         this._url = "";
-        await this._fetchTasks();
+        if (this._eventSource === null) await this._fetchTasks();
       }
     } catch (e) {
       this._message = { type: "error", text: "Cannot reach API: " + e.message };
@@ -358,14 +416,33 @@ class YtDlpCard extends HTMLElement {
   async _handleCancel(taskId) {
     try {
       const resp = await fetch(this._apiUrl(`/tasks/${taskId}`), { method: "DELETE" });
-      if (resp.ok) await this._fetchTasks();
+      if (resp.ok && this._eventSource === null) await this._fetchTasks();
     } catch (_e) {}
     this._render();
   }
 
-  _progressForStatus(status) {
+  _progressForTask(task) {
+    if (typeof task.progress === "number" && task.status !== "failed" && task.status !== "cancelled") {
+      return task.progress;
+    }
     const map = { queued: 5, running: 50, processing: 50, completed: 100, error: 100, failed: 100, cancelled: 100 };
-    return map[status] || 0;
+    return map[task.status] || 0;
+  }
+
+  /** "3.2 / 10.0 MB · 1.5 MB/s · 0:07 left" from live progress fields. */
+  _progressDetail(task) {
+    if (task.phase === "postprocessing") return "Processing file…";
+    if (task.phase !== "downloading") return "";
+    const mb = (bytes) => (bytes / 1048576).toFixed(1);
+    const parts = [];
+    if (task.downloaded_bytes) {
+      parts.push(task.total_bytes ? `${mb(task.downloaded_bytes)} / ${mb(task.total_bytes)} MB` : `${mb(task.downloaded_bytes)} MB`);
+    }
+    if (task.speed) parts.push(`${mb(task.speed)} MB/s`);
+    if (typeof task.eta === "number") {
+      parts.push(`${Math.floor(task.eta / 60)}:${String(task.eta % 60).padStart(2, "0")} left`);
+    }
+    return parts.join(" · ");
   }
 
   _render() {
@@ -389,6 +466,7 @@ class YtDlpCard extends HTMLElement {
           <select class="format-select" id="format-select">
             <option value="mp4"${this._format === "mp4" ? " selected" : ""}>MP4 (Video)</option>
             <option value="mp3"${this._format === "mp3" ? " selected" : ""}>MP3 (Audio)</option>
+            <option value="both"${this._format === "both" ? " selected" : ""}>MP4 + MP3</option>
           </select>
           <button
             class="btn-download"
@@ -449,15 +527,17 @@ class YtDlpCard extends HTMLElement {
       const status = t.status || "unknown";
       const color = STATUS_COLORS[status] || "#9e9e9e";
       const label = STATUS_LABELS[status] || status;
-      const progress = this._progressForStatus(status);
-      const isActive = status === "running" || status === "processing";
-      const canCancel = status === "queued" || status === "running" || status === "processing";
+      const progress = this._progressForTask(t);
+      const isActive = status === "downloading" || status === "running" || status === "processing";
+      const canCancel = ["queued", "downloading", "updating", "running", "processing"].includes(status);
+      const detail = this._progressDetail(t);
       const taskId = t.task_id || "";
 
       const progressBar = `
         <div class="progress-bar-wrap">
           <div class="progress-bar-fill" style="width:${progress}%;${isActive ? "animation:none" : ""}"></div>
         </div>
+        ${detail ? `<div class="progress-detail">${this._esc(detail)}</div>` : ""}
       `;
 
       const actionCell = status === "completed"
@@ -1,8 +1,22 @@
+import contextlib
+import time
+
 import pytest
 
 from app import create_app
 
 
+def wait_for(predicate, timeout=5.0, lock=None):
+    """Poll ``predicate`` (under ``lock`` when given) until it is true; False after ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with lock if lock is not None else contextlib.nullcontext():
+            if predicate():
+                return True
+        time.sleep(0.01)
+    return False
+
+
 @pytest.fixture
 def app(tmp_path):
     state_file = tmp_path / "update-state.json"
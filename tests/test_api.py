@@ -557,3 +557,172 @@ class TestHasActiveTasks:
             api_module._tasks["t1"] = {"status": TASK_STATUS_COMPLETED, "cancelled": False}
             api_module._tasks["t2"] = {"status": TASK_STATUS_DOWNLOADING, "cancelled": False}
         assert api_module.has_active_tasks() is True
+
+
+class TestLiveProgress:
+    def setup_method(self, method):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def test_progress_written_to_task_and_cleared_on_completion(self):
+        _make_task()
+        seen = {}
+
+        def fake_download(*args, on_progress=None, **kwargs):
+            on_progress({"phase": "downloading", "downloaded_bytes": 500, "total_bytes": 1000,
+                         "speed": 2048, "eta": 1, "progress": 50.0})
+            with api_module._tasks_lock:
+                seen.update(api_module._tasks[_TASK_ID])
+            return {"title": "Test"}
+
+        with patch("app.api.download_video", side_effect=fake_download):
+            api_module._run_download(_TASK_ID, "https://youtube.com/watch?v=test", "mp4")
+
+        assert seen["progress"] == 50.0
+        assert seen["speed"] == 2048
+        assert seen["phase"] == "downloading"
+        with api_module._tasks_lock:
+            task = api_module._tasks[_TASK_ID]
+        assert task["status"] == TASK_STATUS_COMPLETED
+        assert task["progress"] == 100
+        assert task["downloaded_bytes"] == 500
+        assert "speed" not in task and "eta" not in task and "phase" not in task
+
+    def test_task_detail_exposes_progress(self, client):
+        _make_task()
+        api_module._update_task(_TASK_ID, status=TASK_STATUS_DOWNLOADING, progress=12.5, speed=100)
+        data = client.get(f"/tasks/{_TASK_ID}").get_json()
+        assert data["progress"] == 12.5
+        assert data["speed"] == 100
+
+
+class TestDuplicateSubmissions:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+            api_module._idempotency_keys.clear()
+
+    def _post(self, client, payload, headers=None):
+        with patch("app.api._run_download"):
+            return client.post("/download_video", json=payload, headers=headers or {})
+
+    def test_same_video_in_flight_attaches_to_existing_task(self, client):
+        first = self._post(client, {"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}).get_json()
+        second = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ?si=share"})
+        assert second.status_code == 202
+        assert second.get_json() == {"status": "processing", "task_id": first["task_id"], "deduplicated": True}
+        with api_module._tasks_lock:
+            assert len(api_module._tasks) == 1
+
+    def test_other_format_is_a_separate_download(self, client):
+        first = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ"}).get_json()
+        second = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ", "format": "mp3"}).get_json()
+        assert second["task_id"] != first["task_id"]
+        assert "deduplicated" not in second
+
+    @pytest.mark.parametrize("changes", [
+        {"status": TASK_STATUS_COMPLETED},
+        {"status": TASK_STATUS_FAILED},
+        {"cancelled": True},
+    ])
+    def test_finished_or_cancelled_task_is_not_reused(self, client, changes):
+        first = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ"}).get_json()
+        api_module._update_task(first["task_id"], **changes)
+        second = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ"}).get_json()
+        assert second["task_id"] != first["task_id"]
+
+    def test_idempotency_key_replays_same_task_after_completion(self, client):
+        headers = {"Idempotency-Key": "automation-run-1"}
+        first = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ"}, headers).get_json()
+        api_module._update_task(first["task_id"], status=TASK_STATUS_COMPLETED)
+        second = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ"}, headers).get_json()
+        assert second["task_id"] == first["task_id"]
+        assert second["deduplicated"] is True
+
+    def test_idempotency_key_reused_for_other_download_422(self, client):
+        headers = {"Idempotency-Key": "k1"}
+        self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ"}, headers)
+        resp = self._post(client, {"url": "https://youtu.be/dQw4w9WgXcQ", "format": "mp3"}, headers)
+        assert resp.status_code == 422
+
+
+def test_download_video_already_present_completes_immediately(client, tmp_path):
+    from app.yt_dlp_manager import DownloadArchive
+    with api_module._tasks_lock:
+        api_module._inflight.clear()
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "Song.mp4").write_bytes(b"video")
+    archive = DownloadArchive(str(tmp_path / "archive.json"))
+    archive.record(["youtube dQw4w9WgXcQ"], "mp4", str(media / "Song.mp4"), title="Song")
+    with patch.object(api_module, "_download_archive", archive), \
+            patch.object(api_module, "DOWNLOAD_DIR", str(media)), \
+            patch("app.api._run_download") as mock_run:
+        resp = client.post("/download_video", json={"url": "https://youtu.be/dQw4w9WgXcQ"})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["status"] == TASK_STATUS_COMPLETED and data["already_present"] is True
+    task = client.get(f"/tasks/{data['task_id']}").get_json()
+    assert task["status"] == TASK_STATUS_COMPLETED
+    assert task["title"] == "Song"
+    mock_run.assert_not_called()
+
+
+def test_download_video_both_already_present_needs_mp4_and_mp3(client, tmp_path):
+    from app.yt_dlp_manager import DownloadArchive
+    with api_module._tasks_lock:
+        api_module._inflight.clear()
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "Song.mp4").write_bytes(b"video")
+    archive = DownloadArchive(str(tmp_path / "archive.json"))
+    archive.record(["youtube dQw4w9WgXcQ"], "mp4", str(media / "Song.mp4"), title="Song")
+    body = {"url": "https://youtu.be/dQw4w9WgXcQ", "format": "both"}
+    with patch.object(api_module, "_download_archive", archive), \
+            patch.object(api_module, "DOWNLOAD_DIR", str(media)), \
+            patch("app.api._run_download"):
+        resp = client.post("/download_video", json=body)
+        # Only the mp4 is there: the download is queued.
+        assert resp.get_json()["status"] == "processing"
+        with api_module._tasks_lock:
+            api_module._inflight.clear()
+        (media / "Song.mp3").write_bytes(b"audio")
+        archive.record(["youtube dQw4w9WgXcQ"], "mp3", str(media / "Song.mp3"), title="Song")
+        data = client.post("/download_video", json=body).get_json()
+    assert data["status"] == TASK_STATUS_COMPLETED and data["already_present"] is True
+    assert data["task_id"] != resp.get_json()["task_id"]
+
+
+def test_download_video_both_format_is_one_download(client):
+    with api_module._tasks_lock:
+        api_module._inflight.clear()
+    with patch("app.api._run_download"):
+        resp = client.post("/download_video", json={"url": "https://youtu.be/bothformat1", "format": "both"})
+    assert resp.status_code == 202
+    with api_module._tasks_lock:
+        assert api_module._tasks[resp.get_json()["task_id"]]["format"] == "both"
+
+    _make_task(fmt="both")
+    with patch("app.api.download_video", return_value={"title": "Song"}) as mock_dl:
+        api_module._run_download(_TASK_ID, "https://youtu.be/bothformat1", "both")
+    mock_dl.assert_called_once()
+    assert mock_dl.call_args.kwargs["format_type"] == "both"
+
+
+def test_download_uses_connection_budget_lease():
+    from app.yt_dlp_manager import ConnectionBudget
+    seen = {}
+
+    def fake_download(*args, connections=1, **kwargs):
+        seen["connections"] = connections
+        seen["in_use"] = budget.in_use
+        return {}
+
+    budget = ConnectionBudget(6, slots=2)
+    with patch.object(api_module, "_connection_budget", budget), \
+            patch.object(api_module, "CONCURRENT_FRAGMENTS", 4), \
+            patch("app.api.download_video", side_effect=fake_download):
+        api_module._download("t", "https://youtu.be/x", "mp4", lambda: False)
+    assert seen == {"connections": 3, "in_use": 3}
+    assert budget.in_use == 0
@@ -0,0 +1,144 @@
+"""Tests for the ASGI front-end: native /tasks/stream, the WSGI bridge and the feed watcher."""
+import asyncio
+import json
+import threading
+
+import app.api as api_module
+from app.asgi import AsgiApp, FeedWatcher
+from app.task_events import ChangeFeed
+
+
+class _Client:
+    """Drives one ASGI HTTP request: feeds the request body, collects what the app sends."""
+
+    def __init__(self, asgi, method="GET", path="/", query=b"", headers=(), body=b""):
+        self.scope = {
+            "type": "http", "method": method, "path": path, "query_string": query, "root_path": "",
+            "headers": [(k.encode(), v.encode()) for k, v in headers], "http_version": "1.1",
+            "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+        }
+        self._asgi = asgi
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._incoming.put_nowait({"type": "http.request", "body": body, "more_body": False})
+        self.messages: asyncio.Queue = asyncio.Queue()
+
+    def start(self) -> asyncio.Task:
+        return asyncio.ensure_future(self._asgi(self.scope, self._incoming.get, self.messages.put))
+
+    def disconnect(self) -> None:
+        self._incoming.put_nowait({"type": "http.disconnect"})
+
+    async def body_text(self, timeout=2.0) -> str:
+        message = await asyncio.wait_for(self.messages.get(), timeout)
+        return message["body"].decode()
+
+
+async def _request(asgi, method, path, body=b"", headers=()):
+    client = _Client(asgi, method, path, headers=headers, body=body)
+    await asyncio.wait_for(client.start(), 5)
+    start = client.messages.get_nowait()
+    chunks = []
+    while not client.messages.empty():
+        chunks.append(client.messages.get_nowait()["body"])
+    return start["status"], dict(start["headers"]), b"".join(chunks)
+
+
+class TestWsgiBridge:
+    def test_routes_are_served_by_flask(self, app):
+        async def run():
+            asgi = AsgiApp(app, threads=2)
+            status, headers, body = await _request(asgi, "GET", "/config")
+            assert status == 200
+            assert headers[b"access-control-allow-origin"] == b"*"
+            assert "media_subdir" in json.loads(body)
+
+            status, _, body = await _request(
+                asgi, "POST", "/download_video", body=b'{"url": "not a url"}',
+                headers=[("content-type", "application/json")],
+            )
+            assert status == 400
+            assert "error" in json.loads(body)
+        asyncio.run(run())
+
+
+class TestTaskStream:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def test_snapshot_then_changes_until_disconnect(self, app):
+        async def run():
+            asgi = AsgiApp(app, threads=2)
+            with api_module._tasks_lock:
+                api_module._add_task_locked({"task_id": "t1", "status": "queued"})
+            client = _Client(asgi, path="/tasks/stream")
+            task = client.start()
+            start = await asyncio.wait_for(client.messages.get(), 2)
+            assert dict(start["headers"])[b"content-type"].startswith(b"text/event-stream")
+            assert (await client.body_text()).startswith("retry:")
+            snapshot = await client.body_text()
+            assert "event: snapshot" in snapshot and '"t1"' in snapshot
+
+            # Published from a worker thread, as downloads do.
+            threading.Thread(target=api_module._update_task, args=("t1",), kwargs={"progress": 50}).start()
+            change = await client.body_text()
+            assert "event: task" in change and '"progress":50' in change
+
+            client.disconnect()
+            await asyncio.wait_for(task, 2)
+        asyncio.run(run())
+
+    def test_resume_replays_missed_changes(self, app):
+        async def run():
+            asgi = AsgiApp(app, threads=2)
+            with api_module._tasks_lock:
+                api_module._add_task_locked({"task_id": "t1", "status": "queued"})
+            seen = api_module._task_feed.revision
+            api_module._update_task("t1", title="Song")
+            client = _Client(asgi, path="/tasks/stream", headers=[("last-event-id", str(seen))])
+            task = client.start()
+            await client.messages.get()
+            await client.body_text()
+            replay = await client.body_text()
+            assert "event: task" in replay and '"title":"Song"' in replay
+            client.disconnect()
+            await asyncio.wait_for(task, 2)
+        asyncio.run(run())
+
+    def test_idle_streams_use_no_threads(self, app):
+        async def run():
+            asgi = AsgiApp(app, threads=2)
+            clients = [_Client(asgi, path="/tasks/stream", headers=[("last-event-id", "0")]) for _ in range(200)]
+            before = threading.active_count()
+            tasks = [c.start() for c in clients]
+            await asyncio.sleep(0.1)
+            assert threading.active_count() <= before + 2
+            for c in clients:
+                c.disconnect()
+            await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        asyncio.run(run())
+
+
+class TestFeedWatcher:
+    def test_one_publish_wakes_all_waiters(self):
+        async def run():
+            feed = ChangeFeed()
+            watcher = FeedWatcher(feed, asyncio.get_running_loop())
+            waiters = [asyncio.ensure_future(watcher.wait(0, timeout=2)) for _ in range(50)]
+            await asyncio.sleep(0)
+            threading.Thread(target=feed.publish, args=({"type": "task", "task_id": "t1", "changes": {}},)).start()
+            results = await asyncio.gather(*waiters)
+            assert all([rev for rev, _ in events] == [1] for events in results)
+            watcher.close()
+        asyncio.run(run())
+
+    def test_timeout_and_resync(self):
+        async def run():
+            feed = ChangeFeed(history=1)
+            watcher = FeedWatcher(feed, asyncio.get_running_loop())
+            assert await watcher.wait(0, timeout=0.01) == []
+            feed.publish({"type": "task"})
+            feed.publish({"type": "task"})
+            assert await watcher.wait(0, timeout=1) is None
+            watcher.close()
+        asyncio.run(run())
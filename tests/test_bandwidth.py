@@ -0,0 +1,208 @@
+"""Tests for the shared bandwidth governor, off-peak profiles and /bandwidth."""
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+import app.api as api_module
+from app.bandwidth import BandwidthGovernor, BandwidthPolicy, format_window, parse_rate, parse_window
+
+_NIGHT = datetime(2026, 1, 1, 3, 0)
+_DAY = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), ("", None), ("unlimited", None), (0, None),
+    (2048, 2048), ("2M", 2 * 1024 * 1024), ("500K", 500 * 1024), ("2MB/s", 2 * 1024 * 1024),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == expected
+
+
+@pytest.mark.parametrize("value", ["fast", -1, True, "2X"])
+def test_parse_rate_invalid(value):
+    with pytest.raises(ValueError):
+        parse_rate(value)
+
+
+def test_parse_window():
+    assert parse_window("01:00-06:30") == (60, 390)
+    assert parse_window("") is None
+    assert format_window((1380, 360)) == "23:00-06:00"
+    for bad in ("1-6", "25:00-06:00", "06:00-06:00"):
+        with pytest.raises(ValueError):
+            parse_window(bad)
+
+
+def test_policy_window_crossing_midnight():
+    policy = BandwidthPolicy(peak_limit=100, off_peak_limit=None, off_peak_window=(23 * 60, 6 * 60))
+    assert policy.is_off_peak(datetime(2026, 1, 1, 23, 30))
+    assert policy.is_off_peak(datetime(2026, 1, 1, 5, 59))
+    assert not policy.is_off_peak(datetime(2026, 1, 1, 6, 0))
+    assert policy.limit_at(_DAY) == 100
+    assert policy.limit_at(datetime(2026, 1, 1, 1, 0)) is None
+
+
+class TestBandwidthGovernor:
+    def test_unlimited_never_blocks(self):
+        governor = BandwidthGovernor()
+        start = time.monotonic()
+        for _ in range(1000):
+            governor.consume(10 ** 9)
+        assert time.monotonic() - start < 0.5
+
+    def test_shared_rate_across_threads(self):
+        governor = BandwidthGovernor(rate=400_000)
+
+        def download():
+            for _ in range(4):
+                governor.consume(50_000)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=download) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 400 kB at 400 kB/s shared by both threads.
+        assert 0.8 < time.monotonic() - start < 2.0
+
+    def test_lifting_the_limit_wakes_waiters(self):
+        governor = BandwidthGovernor(rate=1000)
+        threading.Timer(0.1, governor.set_rate, args=(None,)).start()
+        start = time.monotonic()
+        governor.consume(1_000_000)
+        assert time.monotonic() - start < 1.0
+
+    def test_stop_check_ends_wait(self):
+        governor = BandwidthGovernor(rate=1000)
+        start = time.monotonic()
+        governor.consume(1_000_000, stop_check=lambda: True)
+        assert time.monotonic() - start < 0.5
+
+
+def test_download_video_pays_received_bytes():
+    from app.yt_dlp_manager import download_video
+    captured = {}
+
+    def fake_ydl(opts):
+        captured.update(opts)
+        instance = MagicMock()
+        instance.__enter__ = MagicMock(return_value=instance)
+        instance.__exit__ = MagicMock(return_value=False)
+        instance.extract_info.return_value = {}
+        return instance
+
+    governor = MagicMock()
+    with patch("yt_dlp.YoutubeDL", side_effect=fake_ydl):
+        download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", bandwidth=governor)
+    hook = captured["progress_hooks"][0]
+    hook({"status": "downloading", "filename": "v", "downloaded_bytes": 100})
+    hook({"status": "downloading", "filename": "a", "downloaded_bytes": 30})
+    hook({"status": "downloading", "filename": "v", "downloaded_bytes": 250})
+    assert [c.args[0] for c in governor.consume.call_args_list] == [100, 30, 150]
+
+
+class TestOffPeakTasks:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+        self._policy = BandwidthPolicy(peak_limit=2_000_000, off_peak_limit=None, off_peak_window=(60, 360))
+        self._patches = [
+            patch.object(api_module, "_bandwidth_policy", self._policy),
+            patch.object(api_module, "_bandwidth", BandwidthGovernor()),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self._patches:
+            p.stop()
+        api_module.apply_bandwidth_profile()
+
+    def _post(self, client, url, **extra):
+        with patch("app.api._run_download"):
+            return client.post("/download_video", json={"url": url, **extra}).get_json()["task_id"]
+
+    def test_profile_sets_shared_limit(self):
+        api_module.apply_bandwidth_profile(_DAY)
+        assert api_module._bandwidth.rate == 2_000_000
+        api_module.apply_bandwidth_profile(_NIGHT)
+        assert api_module._bandwidth.rate is None
+
+    def test_off_peak_task_waits_for_window(self, client):
+        api_module.apply_bandwidth_profile(_DAY)
+        queue = MagicMock()
+        with patch.object(api_module, "_download_queue", queue):
+            task_id = self._post(client, "https://youtu.be/offpeak0001", off_peak=True)
+            with api_module._tasks_lock:
+                assert api_module._tasks[task_id]["waiting_for"] == "off_peak"
+            queue.submit.assert_not_called()
+
+            api_module.apply_bandwidth_profile(_NIGHT)
+            assert queue.submit.call_args.args[0] == task_id
+            with api_module._tasks_lock:
+                assert "waiting_for" not in api_module._tasks[task_id]
+
+    def test_window_end_takes_unstarted_tasks_back(self, client):
+        api_module.apply_bandwidth_profile(_NIGHT)
+        queue = MagicMock()
+        queue.remove.return_value = True
+        with patch.object(api_module, "_download_queue", queue):
+            task_id = self._post(client, "https://youtu.be/offpeak0002", off_peak=True)
+            normal_id = self._post(client, "https://youtu.be/offpeak0003")
+            api_module.apply_bandwidth_profile(_DAY)
+        queue.remove.assert_called_once_with(task_id)
+        with api_module._tasks_lock:
+            assert api_module._tasks[task_id]["waiting_for"] == "off_peak"
+            assert "waiting_for" not in api_module._tasks[normal_id]
+
+    def test_cancel_waiting_task(self, client):
+        api_module.apply_bandwidth_profile(_DAY)
+        task_id = self._post(client, "https://youtu.be/offpeak0004", off_peak=True)
+        client.delete(f"/tasks/{task_id}")
+        with api_module._tasks_lock:
+            task = api_module._tasks[task_id]
+        assert task["status"] == "cancelled"
+        assert "waiting_for" not in task
+
+    def test_off_peak_must_be_bool(self, client):
+        resp = client.post("/download_video", json={"url": "https://youtu.be/x", "off_peak": "yes"})
+        assert resp.status_code == 400
+
+
+class TestBandwidthEndpoint:
+    def setup_method(self):
+        self._policy_patch = patch.object(api_module, "_bandwidth_policy", BandwidthPolicy())
+        self._policy_patch.start()
+
+    def teardown_method(self):
+        self._policy_patch.stop()
+        app_module.schedule_bandwidth_profiles()
+
+    def test_get_defaults_unlimited(self, client):
+        data = client.get("/bandwidth").get_json()
+        assert data["limit"] is None
+        assert data["off_peak_window"] is None
+
+    def test_put_updates_limit_and_schedules_window_jobs(self, client):
+        resp = client.put("/bandwidth", json={"peak_limit": "2M", "off_peak_window": "01:00-06:00"})
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["peak_limit"] == 2 * 1024 * 1024
+        assert data["off_peak_window"] == "01:00-06:00"
+        assert data["limit"] == (None if data["off_peak"] else 2 * 1024 * 1024)
+        start_job = app_module._scheduler.get_job("bandwidth_off_peak_start")
+        assert str(start_job.trigger.fields[5]) == "1"  # hour
+        assert app_module._scheduler.get_job("bandwidth_off_peak_end") is not None
+
+        client.put("/bandwidth", json={"off_peak_window": None})
+        assert app_module._scheduler.get_job("bandwidth_off_peak_start") is None
+
+    @pytest.mark.parametrize("body", [{"peak_limit": "fast"}, {"off_peak_window": "1-6"}, ["x"]])
+    def test_put_invalid_400(self, client, body):
+        assert client.put("/bandwidth", json=body).status_code == 400
@@ -0,0 +1,116 @@
+"""Tests for POST /download_videos (batch submission)."""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app.api as api_module
+from app.yt_dlp_manager import TASK_STATUS_COMPLETED, TASK_STATUS_FAILED
+from app.download_queue import QueueShutDownError
+
+
+class TestBatchSubmission:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+        self._queue = MagicMock()
+        self._patches = [
+            patch.object(api_module, "_download_queue", self._queue),
+            patch.object(api_module, "_download_archive", None),
+            patch("app.api.check_ytdlp_version", return_value={}),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self._patches:
+            p.stop()
+
+    def test_queues_every_valid_item_and_reports_errors_per_item(self, client):
+        resp = client.post("/download_videos", json={"items": [
+            {"url": "https://youtu.be/batch000001"},
+            {"url": "not a url"},
+            {"url": "https://www.youtube.com/playlist?list=PL123"},
+            {"url": "https://youtu.be/batch000002", "format": "mp3", "priority": "high"},
+        ]})
+        assert resp.status_code == 202
+        data = resp.get_json()
+        assert (data["accepted"], data["rejected"]) == (2, 2)
+        results = data["results"]
+        assert [r["index"] for r in results] == [0, 1, 2, 3]
+        assert results[1]["error"] == "invalid url"
+        assert "Playlist" in results[2]["error"]
+        assert results[3]["url"] == "https://youtu.be/batch000002"
+        submitted = [c.args[0] for c in self._queue.submit.call_args_list]
+        assert submitted == [results[0]["task_id"], results[3]["task_id"]]
+        with api_module._tasks_lock:
+            task = api_module._tasks[results[3]["task_id"]]
+        assert (task["format"], task["priority"]) == ("mp3", 1)
+
+    def test_bare_list_with_top_level_defaults(self, client):
+        resp = client.post("/download_videos", json=[{"url": "https://youtu.be/batch000003"}],
+                           headers={"X-Client": "chrome-ext"})
+        task_id = resp.get_json()["results"][0]["task_id"]
+        resp = client.post("/download_videos", json={"format": "mp3", "items": [{"url": "https://youtu.be/batch000004"}]})
+        mp3_id = resp.get_json()["results"][0]["task_id"]
+        with api_module._tasks_lock:
+            assert api_module._tasks[task_id]["client"] == "chrome-ext"
+            assert api_module._tasks[mp3_id]["format"] == "mp3"
+
+    def test_duplicates_inside_batch_and_with_running_tasks_attach(self, client):
+        first = client.post("/download_video", json={"url": "https://youtu.be/batch000005"}).get_json()["task_id"]
+        results = client.post("/download_videos", json={"items": [
+            {"url": "https://www.youtube.com/watch?v=batch000005"},
+            {"url": "https://youtu.be/batch000006"},
+            {"url": "https://youtu.be/batch000006?si=x"},
+        ]}).get_json()["results"]
+        assert results[0] == {"status": "processing", "task_id": first, "deduplicated": True, "index": 0,
+                              "url": "https://www.youtube.com/watch?v=batch000005"}
+        assert results[2]["deduplicated"] is True
+        assert results[2]["task_id"] == results[1]["task_id"]
+        assert self._queue.submit.call_count == 2
+
+    def test_registry_lock_taken_once(self, client):
+        items = [{"url": f"https://youtu.be/batch1{i:05d}"} for i in range(20)]
+        real_lock = api_module._tasks_lock
+        acquisitions = []
+
+        class CountingLock:
+            def __enter__(self):
+                acquisitions.append(1)
+                return real_lock.__enter__()
+
+            def __exit__(self, *exc):
+                return real_lock.__exit__(*exc)
+
+        with patch.object(api_module, "_tasks_lock", CountingLock()):
+            resp = client.post("/download_videos", json={"items": items})
+        assert resp.get_json()["accepted"] == 20
+        assert len(acquisitions) == 1
+
+    def test_already_downloaded_items_complete_without_queueing(self, client):
+        archive = MagicMock()
+        archive.lookup.return_value = {"path": "/media/Song.mp4", "title": "Song"}
+        with patch.object(api_module, "_download_archive", archive):
+            results = client.post("/download_videos", json=[{"url": "https://youtu.be/batch000007"}]).get_json()["results"]
+        assert results[0]["status"] == TASK_STATUS_COMPLETED and results[0]["already_present"] is True
+        self._queue.submit.assert_not_called()
+
+    @pytest.mark.parametrize("body", [None, [], {"items": []}, {"items": "x"}, [{"url": "bad"}]])
+    def test_nothing_accepted_400(self, client, body):
+        assert client.post("/download_videos", json=body).status_code == 400
+
+    def test_too_many_items_400(self, client):
+        items = [{"url": "https://youtu.be/x"}] * (api_module._MAX_BATCH_SIZE + 1)
+        assert client.post("/download_videos", json=items).status_code == 400
+
+    def test_shutdown_fails_unsubmitted_tasks(self, client):
+        self._queue.submit.side_effect = [None, QueueShutDownError()]
+        resp = client.post("/download_videos", json=[
+            {"url": "https://youtu.be/batch000008"}, {"url": "https://youtu.be/batch000009"},
+            {"url": "https://youtu.be/batch000010"},
+        ])
+        assert resp.status_code == 503
+        with api_module._tasks_lock:
+            statuses = [t["status"] for t in api_module._tasks.values()]
+        assert statuses == ["queued", TASK_STATUS_FAILED, TASK_STATUS_FAILED]
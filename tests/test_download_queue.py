@@ -0,0 +1,246 @@
+"""Tests for the bounded download worker pool (app.download_queue)."""
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import app.api as api_module
+from conftest import wait_for
+from app.download_queue import DownloadQueue, FairScheduler, QueueShutDownError
+
+
+class TestDownloadQueue:
+    def test_never_runs_more_than_max_workers(self):
+        queue = DownloadQueue(max_workers=2)
+        release = threading.Event()
+        running = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def job():
+            with lock:
+                running.append(1)
+                peak[0] = max(peak[0], len(running))
+            release.wait(2)
+            with lock:
+                running.pop()
+
+        for i in range(6):
+            queue.submit(f"t{i}", job)
+        assert wait_for(lambda: queue.active_count() == 2)
+        assert queue.pending_count() == 4
+        release.set()
+        assert wait_for(lambda: queue.pending_count() == 0 and queue.active_count() == 0)
+        assert peak[0] == 2
+        queue.shutdown()
+
+    def test_backlog_is_fifo_with_positions(self):
+        queue = DownloadQueue(max_workers=1)
+        release = threading.Event()
+        order = []
+        queue.submit("blocker", release.wait, 2)
+        assert wait_for(lambda: queue.active_count() == 1)
+        assert queue.submit("a", order.append, "a") == 1
+        assert queue.submit("b", order.append, "b") == 2
+        assert queue.positions() == {"a": 1, "b": 2}
+        release.set()
+        assert wait_for(lambda: order == ["a", "b"])
+        queue.shutdown()
+
+    def test_remove_only_affects_backlog(self):
+        queue = DownloadQueue(max_workers=1)
+        release = threading.Event()
+        queue.submit("running", release.wait, 2)
+        assert wait_for(lambda: queue.active_count() == 1)
+        queue.submit("waiting", lambda: None)
+        assert queue.remove("waiting") is True
+        assert queue.remove("running") is False
+        assert queue.positions() == {}
+        release.set()
+        queue.shutdown()
+
+    def test_failing_task_does_not_kill_worker(self):
+        queue = DownloadQueue(max_workers=1)
+        done = threading.Event()
+
+        def boom():
+            raise RuntimeError("boom")
+
+        queue.submit("bad", boom)
+        queue.submit("good", done.set)
+        assert done.wait(2)
+        queue.shutdown()
+
+    def test_shutdown_drops_backlog_and_rejects_new_work(self):
+        queue = DownloadQueue(max_workers=1)
+        release = threading.Event()
+        queue.submit("running", release.wait, 2)
+        assert wait_for(lambda: queue.active_count() == 1)
+        queue.submit("waiting", lambda: None)
+        release.set()
+        assert queue.shutdown(wait=True, timeout=2) == ["waiting"]
+        with pytest.raises(QueueShutDownError):
+            queue.submit("late", lambda: None)
+
+    def test_on_change_called_for_backlog_changes(self):
+        calls = []
+        queue = DownloadQueue(max_workers=1, on_change=lambda: calls.append(1))
+        done = threading.Event()
+        queue.submit("t1", done.set)
+        assert done.wait(2)
+        assert len(calls) >= 2  # submit + dequeue
+        queue.shutdown()
+
+
+class TestFairScheduler:
+    def _drain(self, scheduler):
+        order = []
+        while len(scheduler):
+            order.append(scheduler.pop()[0])
+        return order
+
+    def test_same_flow_is_fifo(self):
+        s = FairScheduler()
+        for name in ("a", "b", "c"):
+            s.push(name, None)
+        assert self._drain(s) == ["a", "b", "c"]
+
+    def test_higher_priority_runs_first(self):
+        s = FairScheduler()
+        s.push("low", None, priority=-1)
+        s.push("normal", None)
+        s.push("high", None, priority=1)
+        assert self._drain(s) == ["high", "normal", "low"]
+
+    def test_clients_are_interleaved(self):
+        s = FairScheduler()
+        for i in range(3):
+            s.push(f"card-{i}", None, client="ha-card", cost=4)
+        s.push("ext-0", None, client="chrome-ext", cost=4)
+        order = self._drain(s)
+        assert order.index("ext-0") <= 1
+
+    def test_weights_give_proportional_share(self):
+        s = FairScheduler(weights={"ha-card": 2})
+        for i in range(4):
+            s.push(f"card-{i}", None, client="ha-card")
+            s.push(f"ext-{i}", None, client="chrome-ext")
+        first_six = self._drain(s)[:6]
+        assert sum(1 for t in first_six if t.startswith("card")) == 4
+
+    def test_short_audio_job_bypasses_long_video_backlog(self):
+        s = FairScheduler()
+        for i in range(5):
+            s.push(f"video-{i}", None, client="api", cost=4, lane="video")
+        s.push("song", None, client="api", cost=1, lane="audio")
+        assert self._drain(s).index("song") <= 1
+
+    def test_remove_and_ordered_ids(self):
+        s = FairScheduler()
+        s.push("a", None)
+        s.push("b", None, priority=1)
+        assert s.ordered_ids() == ["b", "a"]
+        assert s.remove("b") is True
+        assert s.remove("b") is False
+        assert s.ordered_ids() == ["a"]
+
+    def test_push_returns_position_in_serving_order(self):
+        s = FairScheduler()
+        assert s.push("a", None) == 1
+        assert s.push("b", None) == 2
+        assert s.push("urgent", None, priority=1) == 1
+        assert s.push("low", None, priority=-1) == 4
+        assert s.ordered_ids() == ["urgent", "a", "b", "low"]
+
+
+def _occupy_all_workers(release):
+    queue = api_module._download_queue
+    for i in range(queue.max_workers):
+        queue.submit(f"blocker-{i}", release.wait, 2)
+    assert wait_for(lambda: queue.active_count() == queue.max_workers)
+
+
+class TestQueueIntegration:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def test_queued_tasks_get_queue_position(self, client):
+        release = threading.Event()
+        _occupy_all_workers(release)
+        try:
+            with patch("app.api._run_download"):
+                resp = client.post("/download_video", json={"url": "https://youtube.com/watch?v=abc"})
+            task_id = resp.get_json()["task_id"]
+            data = client.get(f"/tasks/{task_id}").get_json()
+            assert data["status"] == "queued"
+            assert data["queue_position"] == 1
+        finally:
+            release.set()
+
+    def test_cancel_queued_task_removes_it_from_backlog(self, client):
+        release = threading.Event()
+        _occupy_all_workers(release)
+        try:
+            with patch("app.api._run_download") as mock_run:
+                resp = client.post("/download_video", json={"url": "https://youtube.com/watch?v=abc"})
+                task_id = resp.get_json()["task_id"]
+                client.delete(f"/tasks/{task_id}")
+            with api_module._tasks_lock:
+                task = api_module._tasks[task_id]
+            assert task["status"] == "cancelled"
+            assert "queue_position" not in task
+            assert task_id not in api_module._download_queue.positions()
+        finally:
+            release.set()
+        mock_run.assert_not_called()
+
+
+class TestPriorityAndClient:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def _post(self, client, payload, headers=None):
+        with patch("app.api._run_download"):
+            return client.post("/download_video", json=payload, headers=headers or {})
+
+    def test_priority_and_client_stored_on_task(self, client):
+        resp = self._post(client, {"url": "https://youtube.com/watch?v=abc", "priority": "high", "client": "HA-Card"})
+        task_id = resp.get_json()["task_id"]
+        with api_module._tasks_lock:
+            task = api_module._tasks[task_id]
+        assert task["priority"] == 1
+        assert task["client"] == "ha-card"
+
+    def test_client_from_header_and_defaults(self, client):
+        resp = self._post(client, {"url": "https://youtube.com/watch?v=abc"}, headers={"X-Client": "automation"})
+        task_id = resp.get_json()["task_id"]
+        resp2 = self._post(client, {"url": "https://youtube.com/watch?v=def", "client": "bad client!"})
+        task_id2 = resp2.get_json()["task_id"]
+        with api_module._tasks_lock:
+            assert api_module._tasks[task_id]["client"] == "automation"
+            assert api_module._tasks[task_id2]["client"] == "api"
+            assert api_module._tasks[task_id2]["priority"] == 0
+
+    @pytest.mark.parametrize("priority", ["urgent", 99, True, 1.5])
+    def test_invalid_priority_400(self, client, priority):
+        resp = self._post(client, {"url": "https://youtube.com/watch?v=abc", "priority": priority})
+        assert resp.status_code == 400
+        assert "priority" in resp.get_json()["error"]
+
+    def test_high_priority_task_gets_first_queue_position(self, client):
+        release = threading.Event()
+        _occupy_all_workers(release)
+        try:
+            first = self._post(client, {"url": "https://youtube.com/watch?v=a"}).get_json()["task_id"]
+            urgent = self._post(client, {"url": "https://youtube.com/watch?v=b", "priority": "high"}).get_json()["task_id"]
+            with api_module._tasks_lock:
+                assert api_module._tasks[urgent]["queue_position"] == 1
+                assert api_module._tasks[first]["queue_position"] == 2
+        finally:
+            release.set()
+
+
+def test_parse_client_weights():
+    assert api_module._parse_client_weights("ha-card=2, Chrome-Ext=0.5,bad,x=y") == {"ha-card": 2.0, "chrome-ext": 0.5}
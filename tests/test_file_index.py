@@ -0,0 +1,128 @@
+"""Tests for the media file index and the paginated /files listing."""
+import os
+from unittest.mock import patch
+
+import pytest
+
+import app.api as api_module
+from app.file_index import FileIndex
+from app.yt_dlp_manager import DownloadArchive
+
+_OLD = 1_600_000_000
+
+
+def _write(directory, name, size, mtime):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _settle(directory):
+    """Backdate the directory mtime so the index trusts it (see _MTIME_TRUST_NS)."""
+    os.utime(directory, (_OLD, _OLD))
+
+
+class TestFileIndex:
+    def test_scans_once_until_the_directory_changes(self, tmp_path):
+        _write(tmp_path, "b.mp4", 20, _OLD + 2)
+        _write(tmp_path, "a.mp3", 10, _OLD + 1)
+        (tmp_path / "sub").mkdir()
+        _settle(tmp_path)
+        index = FileIndex(str(tmp_path))
+        with patch("app.file_index.os.scandir", wraps=os.scandir) as scandir:
+            fingerprint, files = index.snapshot()
+            assert index.snapshot()[0] == fingerprint
+            assert scandir.call_count == 1
+        assert [f["name"] for f in files] == ["a.mp3", "b.mp4"]
+        assert files[0] == {"name": "a.mp3", "size": 10, "mtime": _OLD + 1, "duration": None}
+
+        _write(tmp_path, "c.mp4", 5, _OLD + 3)
+        _settle(tmp_path)
+        os.utime(tmp_path, (_OLD + 10, _OLD + 10))
+        new_fingerprint, files = index.snapshot()
+        assert new_fingerprint != fingerprint
+        assert [f["name"] for f in files] == ["a.mp3", "b.mp4", "c.mp4"]
+
+    def test_recent_directory_mtime_is_rescanned(self, tmp_path):
+        index = FileIndex(str(tmp_path))
+        index.snapshot()
+        # Same second as the previous scan: the directory mtime alone cannot tell.
+        _write(tmp_path, "new.mp4", 1, _OLD)
+        assert [f["name"] for f in index.snapshot()[1]] == ["new.mp4"]
+
+    def test_unchanged_rescan_keeps_fingerprint(self, tmp_path):
+        _write(tmp_path, "a.mp4", 1, _OLD)
+        index = FileIndex(str(tmp_path))
+        fingerprint, _ = index.snapshot()
+        index.invalidate()
+        assert index.snapshot()[0] == fingerprint
+
+    def test_fingerprint_depends_only_on_the_listing(self, tmp_path):
+        # Two worker processes each have their own index of the same directory.
+        first, second = tmp_path / "first", tmp_path / "second"
+        for directory in (first, second):
+            directory.mkdir()
+            _write(directory, "a.mp4", 1, _OLD)
+        _write(second, "b.mp4", 2, _OLD)
+        same_dir = FileIndex(str(first)), FileIndex(str(first))
+        assert same_dir[0].snapshot()[0] == same_dir[1].snapshot()[0]
+        assert FileIndex(str(second)).snapshot()[0] != same_dir[0].snapshot()[0]
+
+    def test_sorted_views(self, tmp_path):
+        _write(tmp_path, "a.mp4", 30, _OLD + 1)
+        _write(tmp_path, "b.mp4", 10, _OLD + 3)
+        _write(tmp_path, "c.mp4", 20, _OLD + 2)
+        index = FileIndex(str(tmp_path))
+        assert [f["name"] for f in index.sorted_files("mtime", True)[1]] == ["b.mp4", "c.mp4", "a.mp4"]
+        assert [f["name"] for f in index.sorted_files("size", False)[1]] == ["b.mp4", "c.mp4", "a.mp4"]
+        assert [f["name"] for f in index.sorted_files("name", True)[1]] == ["c.mp4", "b.mp4", "a.mp4"]
+
+    def test_missing_directory_is_empty(self, tmp_path):
+        assert FileIndex(str(tmp_path / "missing")).snapshot()[1] == []
+
+    def test_duration_from_archive(self, tmp_path):
+        media = tmp_path / "media"
+        media.mkdir()
+        path = _write(media, "Song.mp4", 4, _OLD)
+        archive = DownloadArchive(str(tmp_path / "archive.json"))
+        archive.record(["youtube abc"], "mp4", str(path), title="Song", duration=213)
+        index = FileIndex(str(media), describe=lambda: archive.describe(str(media)))
+        assert index.snapshot()[1][0]["duration"] == 213
+
+
+class TestFilesEndpoint:
+    @pytest.fixture(autouse=True)
+    def media(self, tmp_path):
+        media = tmp_path / "media"
+        media.mkdir()
+        for i, (size, mtime) in enumerate([(300, 3), (100, 1), (200, 2)]):
+            _write(media, f"clip{i}.mp4", size, _OLD + mtime)
+        _write(media, "Song.mp3", 50, _OLD + 4)
+        with patch.object(api_module, "_file_index", FileIndex(str(media))):
+            yield media
+
+    def test_bare_listing_is_a_name_list(self, client):
+        assert client.get("/files").get_json() == ["Song.mp3", "clip0.mp4", "clip1.mp4", "clip2.mp4"]
+
+    def test_pagination_and_sort(self, client):
+        data = client.get("/files?sort=mtime&limit=2").get_json()
+        assert (data["total"], data["offset"], data["limit"]) == (4, 0, 2)
+        assert [f["name"] for f in data["files"]] == ["Song.mp3", "clip0.mp4"]
+        page = client.get("/files?sort=size&order=asc&offset=1&limit=2").get_json()["files"]
+        assert [(f["name"], f["size"]) for f in page] == [("clip1.mp4", 100), ("clip2.mp4", 200)]
+
+    def test_search(self, client):
+        data = client.get("/files?q=SONG").get_json()
+        assert data["total"] == 1 and data["files"][0]["name"] == "Song.mp3"
+
+    def test_etag_304(self, client):
+        first = client.get("/files?limit=10")
+        etag = first.headers["ETag"]
+        again = client.get("/files?limit=10", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert client.get("/files", headers={"If-None-Match": etag}).status_code == 304
+
+    @pytest.mark.parametrize("query", ["sort=date", "order=up", "limit=0", "offset=-1", "limit=x"])
+    def test_invalid_arguments_400(self, client, query):
+        assert client.get(f"/files?{query}").status_code == 400
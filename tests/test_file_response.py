@@ -0,0 +1,97 @@
+"""Tests for GET /files/<name>: ranges, conditional requests and path containment."""
+import os
+from unittest.mock import patch
+
+import pytest
+
+import app.api as api_module
+
+_DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+class _ServerFileWrapper:
+    """Stand-in for a server's wsgi.file_wrapper (e.g. gunicorn's sendfile path): records where it starts."""
+
+    instances: list = []
+
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        self.block_size = block_size
+        self.start = file.tell()
+        _ServerFileWrapper.instances.append(self)
+
+    def __iter__(self):
+        while chunk := self.file.read(self.block_size):
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+@pytest.fixture
+def media(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "clip.mp4").write_bytes(_DATA)
+    (tmp_path / "secret.txt").write_text("secret")
+    with patch.object(api_module, "DOWNLOAD_DIR", str(media)):
+        yield media
+
+
+def test_full_file(client, media):
+    resp = client.get("/files/clip.mp4")
+    assert resp.status_code == 200
+    assert resp.data == _DATA
+    assert resp.headers["Content-Type"] == "video/mp4"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert resp.headers["Content-Length"] == str(len(_DATA))
+
+
+def test_closed_range(client, media):
+    resp = client.get("/files/clip.mp4", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.data == _DATA[100:200]
+    assert resp.headers["Content-Range"] == f"bytes 100-199/{len(_DATA)}"
+
+
+def test_open_ended_range_is_left_to_the_server_file_wrapper(client, media):
+    _ServerFileWrapper.instances.clear()
+    resp = client.get(
+        "/files/clip.mp4", headers={"Range": "bytes=9000-"},
+        environ_overrides={"wsgi.file_wrapper": _ServerFileWrapper},
+    )
+    assert resp.status_code == 206
+    assert resp.data == _DATA[9000:]
+    # Positioned by a seek, not by reading the first 9000 bytes through Python.
+    assert _ServerFileWrapper.instances[0].start == 0
+    assert resp.headers["Content-Length"] == str(len(_DATA) - 9000)
+
+
+def test_closed_range_with_server_wrapper_seeks(client, media):
+    resp = client.get(
+        "/files/clip.mp4", headers={"Range": "bytes=5000-5009"},
+        environ_overrides={"wsgi.file_wrapper": _ServerFileWrapper},
+    )
+    assert resp.data == _DATA[5000:5010]
+
+
+def test_unsatisfiable_range_416(client, media):
+    assert client.get("/files/clip.mp4", headers={"Range": "bytes=99999-"}).status_code == 416
+
+
+def test_conditional_get(client, media):
+    etag = client.get("/files/clip.mp4").headers["ETag"]
+    assert client.get("/files/clip.mp4", headers={"If-None-Match": etag}).status_code == 304
+    os.utime(media / "clip.mp4", (1_600_000_000, 1_600_000_000))
+    assert client.get("/files/clip.mp4", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_download_disposition(client, media):
+    resp = client.get("/files/clip.mp4?download=1")
+    assert resp.headers["Content-Disposition"] == "attachment; filename=clip.mp4"
+
+
+@pytest.mark.parametrize("name", ["../secret.txt", "..%2Fsecret.txt", "%2Fetc%2Fpasswd", "missing.mp4", "link.txt"])
+def test_outside_or_missing_404(client, media, name):
+    (media / "link.txt").symlink_to(media.parent / "secret.txt")
+    assert client.get(f"/files/{name}", follow_redirects=True).status_code == 404
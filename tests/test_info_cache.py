@@ -0,0 +1,199 @@
+"""Tests for the info cache, GET /info and downloads reusing a cached extraction."""
+import http.server
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+import yt_dlp
+
+import app.api as api_module
+from app.info_cache import InfoCache
+from app.yt_dlp_manager import download_video, extract_info, summarize_info
+
+_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+_KEY = "youtube dQw4w9WgXcQ"
+
+_EXTRACTION = {
+    "id": "dQw4w9WgXcQ", "title": "Song", "duration": 213, "thumbnail": "https://i.ytimg.com/x.jpg",
+    "uploader": "Rick", "extractor_key": "Youtube", "webpage_url": _URL,
+    "formats": [
+        {"format_id": "18", "ext": "mp4", "vcodec": "avc1", "acodec": "mp4a", "height": 360, "url": "https://x/18"},
+        {"format_id": "sb0", "ext": "mhtml", "vcodec": "none", "acodec": "none", "url": "https://x/sb"},
+    ],
+}
+
+
+class TestInfoCache:
+    def test_lru_eviction_by_entry_count(self):
+        cache = InfoCache(max_entries=2)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+        cache.put("c", {"n": 3})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"n": 1} and cache.get("c") == {"n": 3}
+
+    def test_byte_budget(self):
+        cache = InfoCache(max_bytes=100)
+        cache.put("a", {"x": "a" * 60})
+        cache.put("b", {"x": "b" * 60})
+        assert cache.get("a") is None
+        assert cache.stats["bytes"] <= 100
+        cache.put("huge", {"x": "h" * 200})
+        assert cache.get("huge") is None
+        assert cache.get("b") is not None
+
+    def test_ttl(self):
+        cache = InfoCache(ttl=60)
+        with patch("app.info_cache.time.monotonic", return_value=1000.0):
+            cache.put("a", {"n": 1})
+        with patch("app.info_cache.time.monotonic", return_value=1059.0):
+            assert cache.get("a") == {"n": 1}
+        with patch("app.info_cache.time.monotonic", return_value=1061.0):
+            assert cache.get("a") is None
+        assert cache.stats["entries"] == 0 and cache.stats["bytes"] == 0
+
+
+def test_summarize_info_omits_formats_unless_asked():
+    summary = summarize_info(_EXTRACTION)
+    assert summary["title"] == "Song" and summary["duration"] == 213
+    assert "formats" not in summary
+    formats = summarize_info(_EXTRACTION, formats=True)["formats"]
+    # Storyboards are not downloadable media; stream URLs are never exposed.
+    assert formats == [{"format_id": "18", "ext": "mp4", "vcodec": "avc1", "acodec": "mp4a", "height": 360}]
+
+
+def test_extract_info_does_not_select_formats_and_drops_subtitles():
+    ydl = MagicMock()
+    ydl.__enter__ = MagicMock(return_value=ydl)
+    ydl.__exit__ = MagicMock(return_value=False)
+    ydl.extract_info.return_value = {**_EXTRACTION, "automatic_captions": {"en": []}, "subtitles": {}}
+    with patch("yt_dlp.YoutubeDL", return_value=ydl):
+        info = extract_info(_URL)
+    assert ydl.extract_info.call_args.kwargs == {"download": False, "process": False}
+    assert "automatic_captions" not in info and "subtitles" not in info
+    assert info["formats"] == _EXTRACTION["formats"]
+
+
+def test_extract_info_keeps_best_thumbnail_when_dropping_the_list():
+    ydl = MagicMock()
+    ydl.__enter__ = MagicMock(return_value=ydl)
+    ydl.__exit__ = MagicMock(return_value=False)
+    thumbnails = [{"url": "https://i.ytimg.com/small.jpg"}, {"url": "https://i.ytimg.com/large.jpg"}]
+    ydl.extract_info.return_value = {**_EXTRACTION, "thumbnail": None, "thumbnails": thumbnails}
+    with patch("yt_dlp.YoutubeDL", return_value=ydl):
+        info = extract_info(_URL)
+    assert "thumbnails" not in info
+    assert summarize_info(info)["thumbnail"] == "https://i.ytimg.com/large.jpg"
+
+
+class TestInfoEndpoint:
+    def setup_method(self):
+        self._cache = InfoCache()
+        self._patch = patch.object(api_module, "_info_cache", self._cache)
+        self._patch.start()
+
+    def teardown_method(self):
+        self._patch.stop()
+
+    def test_extracts_once_then_serves_from_cache(self, client):
+        with patch("app.api.extract_info", return_value=_EXTRACTION) as extract:
+            first = client.get("/info", query_string={"url": _URL}).get_json()
+            second = client.get("/info", query_string={"url": "https://youtu.be/dQw4w9WgXcQ?si=abc"}).get_json()
+        assert extract.call_count == 1
+        assert first["title"] == "Song" and first["cached"] is False
+        assert second["cached"] is True and second["video_key"] == _KEY
+        assert "formats" not in first
+
+    def test_formats_on_request(self, client):
+        with patch("app.api.extract_info", return_value=_EXTRACTION):
+            data = client.get("/info", query_string={"url": _URL, "formats": "1"}).get_json()
+        assert [f["format_id"] for f in data["formats"]] == ["18"]
+
+    def test_extraction_error_422_and_not_cached(self, client):
+        with patch("app.api.extract_info", side_effect=yt_dlp.utils.DownloadError("Video unavailable")):
+            resp = client.get("/info", query_string={"url": _URL})
+        assert resp.status_code == 422
+        assert "Video unavailable" in resp.get_json()["error"]
+        assert self._cache.stats["entries"] == 0
+
+    def test_live_streams_are_not_cached(self, client):
+        with patch("app.api.extract_info", return_value={**_EXTRACTION, "live_status": "is_live"}):
+            client.get("/info", query_string={"url": _URL})
+        assert self._cache.stats["entries"] == 0
+
+    @pytest.mark.parametrize("url", ["", "not a url", "https://www.youtube.com/playlist?list=PL123"])
+    def test_invalid_or_playlist_url_400(self, client, url):
+        assert client.get("/info", query_string={"url": url}).status_code == 400
+
+    def test_queued_download_reuses_cached_extraction(self, client):
+        self._cache.put(_KEY, _EXTRACTION)
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "info-t1", "status": "queued", "url": _URL, "cancelled": False})
+        with patch("app.api.download_video", return_value={"title": "Song"}) as download:
+            api_module._run_download("info-t1", _URL, "mp4")
+        assert download.call_args.kwargs["info"] is _EXTRACTION
+
+    def test_failed_download_drops_cached_extraction(self):
+        self._cache.put(_KEY, _EXTRACTION)
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "info-t2", "status": "queued", "url": _URL, "cancelled": False})
+        with patch("app.api.download_video", side_effect=Exception("HTTP Error 403")), \
+                patch.object(api_module, "_updater", None):
+            api_module._run_download("info-t2", _URL, "mp4")
+        assert self._cache.get(_KEY) is None
+
+
+class TestDownloadFromExtraction:
+    """Runs the real yt-dlp downloader against a local server, starting from an extraction."""
+
+    def _serve(self, missing=()):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.strip("/") in missing:
+                    self.send_error(403)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", "4")
+                self.end_headers()
+                self.wfile.write(b"data")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_port}"
+
+    def _extraction(self, base, path):
+        return {
+            "id": "vid", "title": "Clip", "extractor": "test", "extractor_key": "Test", "webpage_url": base,
+            "formats": [{"format_id": "18", "url": f"{base}/{path}", "ext": "mp4", "vcodec": "avc1", "acodec": "mp4a"}],
+        }
+
+    def test_download_skips_extraction(self, tmp_path):
+        server, base = self._serve()
+        extraction = self._extraction(base, "ok")
+        try:
+            with patch.object(yt_dlp.YoutubeDL, "extract_info", side_effect=AssertionError("extracted again")):
+                info = download_video(base, output_dir=str(tmp_path), info=extraction)
+        finally:
+            server.shutdown()
+        assert (tmp_path / "Clip.mp4").read_bytes() == b"data"
+        assert info["filepaths"] == {"mp4": str(tmp_path / "Clip.mp4")}
+        # The cached extraction itself is left untouched for later downloads.
+        assert "requested_formats" not in extraction and "filepath" not in extraction
+
+    def test_stale_extraction_falls_back_to_extracting(self, tmp_path):
+        server, base = self._serve(missing=("expired",))
+        fresh = self._extraction(base, "ok")
+
+        def extract(ydl, url, download=True, **kwargs):
+            return ydl.process_ie_result(dict(fresh), download=download)
+        try:
+            with patch.object(yt_dlp.YoutubeDL, "extract_info", autospec=True, side_effect=extract) as extract_mock:
+                download_video(base, output_dir=str(tmp_path), info=self._extraction(base, "expired"))
+        finally:
+            server.shutdown()
+        extract_mock.assert_called_once()
+        assert (tmp_path / "Clip.mp4").read_bytes() == b"data"
@@ -0,0 +1,160 @@
+"""Tests for the metrics module and GET /metrics."""
+import re
+import subprocess
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app.api as api_module
+from app import metrics
+from app.updater import Updater
+
+
+def _sample(text: str, name: str, **labels) -> float | None:
+    """Value of one sample line in an exposition, or None."""
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{label_text}}}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+@pytest.fixture
+def registry():
+    """Metrics created in a test are dropped from the process registry afterwards."""
+    before = list(metrics._registry)
+    yield
+    metrics._registry[:] = before
+
+
+class TestExposition:
+    def test_counter_and_gauge(self, registry):
+        counter = metrics.Counter("t_events_total", "Events.", ("kind",))
+        counter.labels(kind="a").inc()
+        counter.labels(kind="a").inc(2)
+        gauge = metrics.Gauge("t_level", "Level.")
+        gauge.set(1.5)
+        text = metrics.render()
+        assert "# TYPE t_events_total counter" in text
+        assert _sample(text, "t_events_total", kind="a") == 3
+        assert _sample(text, "t_level") == 1.5
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        histogram = metrics.Histogram("t_seconds", "Durations.", buckets=(1.0, 5.0))
+        for value in (0.5, 2.0, 10.0):
+            histogram.observe(value)
+        text = metrics.render()
+        assert _sample(text, "t_seconds_bucket", le="1") == 1
+        assert _sample(text, "t_seconds_bucket", le="5") == 2
+        assert _sample(text, "t_seconds_bucket", le="+Inf") == 3
+        assert _sample(text, "t_seconds_count") == 3
+        assert _sample(text, "t_seconds_sum") == 12.5
+
+    def test_label_values_are_escaped(self, registry):
+        metrics.Counter("t_labels_total", "Labels.", ("v",)).labels(v='a"b\\c').inc()
+        assert 't_labels_total{v="a\\"b\\\\c"} 1' in metrics.render()
+
+    def test_wrong_labels_rejected(self, registry):
+        with pytest.raises(ValueError):
+            metrics.Counter("t_bad_total", "Bad.", ("a",)).labels(b="x")
+
+
+def test_timed_lock_records_contended_wait(registry):
+    histogram = metrics.Histogram("t_lock_wait_seconds", "Waits.", buckets=(0.01, 1.0))
+    lock = metrics.TimedLock(histogram)
+    lock.acquire()
+    threading.Timer(0.05, lock.release).start()
+    with lock:
+        pass
+    text = metrics.render()
+    assert _sample(text, "t_lock_wait_seconds_count") == 2
+    assert _sample(text, "t_lock_wait_seconds_bucket", le="0.01") == 1  # the uncontended first acquire
+    assert _sample(text, "t_lock_wait_seconds_sum") >= 0.04
+    assert lock.acquire(blocking=False) and not lock.acquire(blocking=False)
+    lock.release()
+
+
+def test_timed_lock_works_with_condition(registry):
+    lock = metrics.TimedLock(metrics.Histogram("t_cond_wait_seconds", "Waits."))
+    cond = threading.Condition(lock)
+    with cond:
+        assert cond.wait(timeout=0.01) is False
+
+
+class TestMetricsEndpoint:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+
+    def test_queue_and_registry_gauges(self, client):
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "m1", "status": "queued", "url": "u"})
+            api_module._add_task_locked({"task_id": "m2", "status": "failed", "url": "u"})
+        queue = MagicMock(max_workers=3)
+        queue.pending_count.return_value = 4
+        queue.active_count.return_value = 2
+        with patch.object(api_module, "_download_queue", queue):
+            resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.content_type.startswith("text/plain; version=0.0.4")
+        text = resp.get_data(as_text=True)
+        assert _sample(text, "ytdlp_queue_pending") == 4
+        assert _sample(text, "ytdlp_queue_active_workers") == 2
+        assert _sample(text, "ytdlp_queue_max_workers") == 3
+        assert _sample(text, "ytdlp_tasks", status="queued") == 1
+        assert _sample(text, "ytdlp_tasks", status="failed") == 1
+        assert "ytdlp_tasks_lock_wait_seconds_count" in text
+
+    def test_finished_tasks_and_cancel_latency(self, client):
+        before = metrics.render()
+        finished = _sample(before, "ytdlp_tasks_finished_total", status="cancelled") or 0
+        cancels = _sample(before, "ytdlp_cancel_latency_seconds_count", phase="queued") or 0
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "m3", "status": "queued", "url": "u", "waiting_for": "off_peak"})
+        client.delete("/tasks/m3")
+        text = client.get("/metrics").get_data(as_text=True)
+        assert _sample(text, "ytdlp_tasks_finished_total", status="cancelled") == finished + 1
+        assert _sample(text, "ytdlp_cancel_latency_seconds_count", phase="queued") == cancels + 1
+        assert "m3" not in api_module._cancel_requested_at
+
+    def test_download_timings(self):
+        def fake_download(url, on_progress, **kwargs):
+            on_progress({"phase": "downloading", "downloaded_bytes": 5 * 1024 * 1024})
+            time.sleep(0.02)
+            on_progress({"phase": "postprocessing", "postprocessor": "Merger"})
+            return {"title": "x"}
+
+        before = metrics.render()
+        count = _sample(before, "ytdlp_postprocess_duration_seconds_count", format="mp4") or 0
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "m4", "status": "queued", "url": "u", "cancelled": False})
+        with patch("app.api.download_video", side_effect=fake_download):
+            api_module._run_download("m4", "https://youtu.be/metrics0001", "mp4")
+        text = metrics.render()
+        assert _sample(text, "ytdlp_postprocess_duration_seconds_count", format="mp4") == count + 1
+        assert _sample(text, "ytdlp_download_bytes_count", format="mp4") >= 1
+        assert _sample(text, "ytdlp_download_duration_seconds_count", format="mp4") >= 1
+
+
+def test_update_duration_and_outcome(tmp_path):
+    updater = Updater(state_path=str(tmp_path / "state.json"))
+    before = _sample(metrics.render(), "ytdlp_updates_total", reason="ad-hoc", outcome="failure") or 0
+    with patch("app.updater.subprocess.run", return_value=subprocess.CompletedProcess([], 1, "", "")), \
+            patch.object(updater, "_send_ha_notification"):
+        assert updater.update_if_needed("ad-hoc").success is False
+    text = metrics.render()
+    assert _sample(text, "ytdlp_updates_total", reason="ad-hoc", outcome="failure") == before + 1
+    assert _sample(text, "ytdlp_update_duration_seconds_count", reason="ad-hoc", outcome="failure") >= 1
+
+
+def test_version_check_latency():
+    import app.yt_dlp_manager as manager
+    manager._version_cache = {}
+    before = _sample(metrics.render(), "ytdlp_version_check_duration_seconds_count", outcome="error") or 0
+    with patch("urllib.request.urlopen", side_effect=OSError("offline")):
+        manager.check_ytdlp_version()
+    manager._version_cache = {}
+    text = metrics.render()
+    assert _sample(text, "ytdlp_version_check_duration_seconds_count", outcome="error") == before + 1
@@ -0,0 +1,150 @@
+"""Tests for opt-in playlist downloads: lazy expansion into child tasks under a per-playlist cap."""
+import contextlib
+import functools
+import time
+from unittest.mock import MagicMock, patch
+
+import app.api as api_module
+from app.yt_dlp_manager import TASK_STATUS_COMPLETED, TASK_STATUS_FAILED, _flat_entries, _playlist_videos
+from conftest import wait_for
+
+# The predicates read the task registry, so they are polled under its lock.
+_wait_for = functools.partial(wait_for, lock=api_module._tasks_lock)
+
+_PLAYLIST_URL = "https://www.youtube.com/playlist?list=PLtest"
+
+
+def test_flat_entries_reads_paged_lists_page_by_page():
+    from yt_dlp.utils import OnDemandPagedList
+    fetched = []
+
+    def page(n):
+        fetched.append(n)
+        return [{"id": f"v{n}-{i}"} for i in range(10)]
+
+    entries = _flat_entries(OnDemandPagedList(page, 10))
+    first = [next(entries) for _ in range(3)]
+    assert [e["id"] for e in first] == ["v0-0", "v0-1", "v0-2"]
+    assert len(fetched) <= 5  # one window of _PLAYLIST_PAGE_SIZE, not the whole (endless) list
+
+
+def test_playlist_videos_skips_nested_playlists():
+    entries = [
+        {"url": "https://youtu.be/aaaaaaaaaaa", "id": "aaaaaaaaaaa", "title": "A"},
+        {"_type": "playlist", "url": "https://www.youtube.com/playlist?list=PLx"},
+        {"url": "https://www.youtube.com/@x/videos", "ie_key": "YoutubeTab"},
+        {"id": "bbbbbbbbbbb"},
+    ]
+    assert [v["id"] for v in _playlist_videos(entries)] == ["aaaaaaaaaaa"]
+
+
+class TestPlaylistTasks:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+        self._queue = MagicMock()
+        self._consumed = []
+        self._patches = [
+            patch.object(api_module, "_download_queue", self._queue),
+            patch.object(api_module, "_download_archive", None),
+            patch.object(api_module, "PLAYLIST_CONCURRENCY", 2),
+            patch("app.api.check_ytdlp_version", return_value={}),
+            patch("app.api.open_playlist", self._open_playlist),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in reversed(self._patches):
+            p.stop()
+
+    def _open_playlist(self, url, timeout=1800, count=1000):
+        @contextlib.contextmanager
+        def opened():
+            def videos():
+                for i in range(count):
+                    self._consumed.append(i)
+                    yield {"url": f"https://youtu.be/pl{i:09d}", "id": f"pl{i:09d}", "title": f"Video {i}"}
+            yield {"title": "Mix", "playlist_count": count}, videos()
+        return opened()
+
+    def _children(self, parent_id):
+        return [t for t in api_module._tasks.values() if t.get("parent_id") == parent_id]
+
+    def _start(self, client, **extra):
+        resp = client.post("/download_video", json={"url": _PLAYLIST_URL, "playlist": True, **extra})
+        assert resp.status_code == 202
+        return resp.get_json()["task_id"]
+
+    def test_playlist_url_needs_opt_in(self, client):
+        resp = client.post("/download_video", json={"url": _PLAYLIST_URL})
+        assert resp.status_code == 400
+        assert '"playlist": true' in resp.get_json()["error"]
+        assert client.post("/download_video", json={"url": _PLAYLIST_URL, "playlist": "yes"}).status_code == 400
+
+    def test_expands_lazily_under_the_cap(self, client):
+        parent_id = self._start(client, format="mp3")
+        assert _wait_for(lambda: len(self._children(parent_id)) == 2)
+        time.sleep(0.1)
+        with api_module._tasks_lock:
+            children = self._children(parent_id)
+            parent = dict(api_module._tasks[parent_id])
+        # Two of 1000 entries read: the playlist is not enumerated up front.
+        assert len(children) == 2 and len(self._consumed) <= 3
+        assert parent["title"] == "Mix" and parent["entries_total"] == 1000
+        assert [c["playlist_index"] for c in children] == [1, 2]
+        assert all(c["format"] == "mp3" for c in children)
+        assert [c.args[0] for c in self._queue.submit.call_args_list] == [c["task_id"] for c in children]
+
+        api_module._finish_task(children[0]["task_id"], TASK_STATUS_COMPLETED)
+        assert _wait_for(lambda: len(self._children(parent_id)) == 3)
+        with api_module._tasks_lock:
+            parent = api_module._tasks[parent_id]
+            assert parent["entries_done"] == 1 and parent["progress"] == 0.1
+        client.delete(f"/tasks/{parent_id}")
+
+    def test_aggregates_and_completes(self, client):
+        with patch("app.api.open_playlist", lambda url: self._open_playlist(url, count=3)):
+            parent_id = self._start(client)
+            for index in range(3):
+                assert _wait_for(lambda: len(self._children(parent_id)) > index)
+                with api_module._tasks_lock:
+                    child_id = self._children(parent_id)[index]["task_id"]
+                status = TASK_STATUS_FAILED if index == 1 else TASK_STATUS_COMPLETED
+                api_module._finish_task(child_id, status)
+            assert _wait_for(lambda: api_module._tasks[parent_id]["status"] == TASK_STATUS_COMPLETED)
+        with api_module._tasks_lock:
+            parent = api_module._tasks[parent_id]
+            assert (parent["entries_done"], parent["entries_failed"], parent["entries_total"]) == (2, 1, 3)
+            assert parent["progress"] == 100
+
+    def test_cancel_stops_expansion_and_cancels_children(self, client):
+        self._queue.remove.return_value = True
+        parent_id = self._start(client)
+        assert _wait_for(lambda: len(self._children(parent_id)) == 2)
+        assert client.delete(f"/tasks/{parent_id}").status_code == 200
+        assert _wait_for(lambda: api_module._tasks[parent_id]["status"] == "cancelled")
+        with api_module._tasks_lock:
+            children = self._children(parent_id)
+            assert len(children) == 2
+            assert all(c["status"] == "cancelled" for c in children)
+        assert len(self._consumed) <= 3
+
+    def test_duplicate_playlist_request_attaches(self, client):
+        parent_id = self._start(client)
+        resp = client.post("/download_video", json={"url": _PLAYLIST_URL + "&si=x", "playlist": True})
+        assert resp.get_json() == {"status": "processing", "task_id": parent_id, "deduplicated": True}
+        client.delete(f"/tasks/{parent_id}")
+        assert _wait_for(lambda: api_module._tasks[parent_id]["status"] == "cancelled")
+
+    def test_expansion_error_fails_playlist(self, client):
+        @contextlib.contextmanager
+        def broken(url):
+            raise RuntimeError("This playlist does not exist")
+            yield
+        with patch("app.api.open_playlist", broken):
+            parent_id = self._start(client)
+            assert _wait_for(lambda: api_module._tasks[parent_id]["status"] == TASK_STATUS_FAILED)
+        with api_module._tasks_lock:
+            assert "does not exist" in api_module._tasks[parent_id]["error"]
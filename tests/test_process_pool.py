@@ -0,0 +1,173 @@
+"""Tests for the download process pool: child processes, progress over the pipe, hard cancel and recycling."""
+import os
+import subprocess
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+import yt_dlp
+
+import app.api as api_module
+from app.bandwidth import BandwidthGovernor
+from app.process_pool import DownloadProcessPool, WorkerCrashedError
+from app.yt_dlp_manager import TASK_STATUS_COMPLETED, DownloadCancelledError
+
+# --- Targets run inside the child (imported there by name) --------------------------------
+
+
+def fake_download(url, output_dir=None, on_progress=None, bandwidth=None, **kwargs):
+    for pct in (50, 100):
+        if on_progress is not None:
+            on_progress({"phase": "downloading", "progress": pct, "downloaded_bytes": pct * 10000})
+    if bandwidth is not None:
+        bandwidth.consume(1024 * 1024)
+    return {"title": f"pid {os.getpid()}", "id": url, "http_headers": {"unused": True}}
+
+
+def hanging_download(url, output_dir=None, **kwargs):
+    """Starts a long-running child like ffmpeg, records both pids, then never finishes."""
+    helper = subprocess.Popen(["sleep", "60"])
+    with open(os.path.join(output_dir, "pids"), "w") as f:
+        f.write(f"{os.getpid()} {helper.pid}")
+    time.sleep(60)
+
+
+def partial_download(url, output_dir=None, partial_files=None, **kwargs):
+    """Leaves a .part file behind, as a stream download does, then hangs."""
+    part = os.path.join(output_dir, "Song.mp4.part")
+    partial_files.progress_hook({"status": "downloading", "filename": part[:-5], "tmpfilename": part})
+    open(part, "wb").close()
+    time.sleep(60)
+
+
+def failing_download(url, **kwargs):
+    raise yt_dlp.utils.DownloadError("ERROR: HTTP Error 403: Forbidden")
+
+
+def crashing_download(url, **kwargs):
+    os._exit(3)
+
+
+def _target(name: str) -> str:
+    return f"{__name__}:{name}"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed grandchild stays a zombie until init reaps it.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(") ", 1)[1][0] != "Z"
+    except OSError:
+        return False
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(target, **kwargs):
+        pool = DownloadProcessPool(target=_target(target), **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+class TestDownloadProcessPool:
+    def test_download_runs_in_warm_child_and_streams_progress(self, make_pool, tmp_path):
+        pool = make_pool("fake_download")
+        progress, usage = [], []
+        info = pool.download_video(
+            "u1", output_dir=str(tmp_path), on_progress=progress.append, on_usage=usage.append,
+            bandwidth=BandwidthGovernor(None),
+        )
+        assert info["title"] != f"pid {os.getpid()}"
+        assert "http_headers" not in info  # Only the fields the API uses come back.
+        assert [p["progress"] for p in progress] == [50, 100]
+        assert set(usage[0]) == {"cpu_seconds", "rss"}
+
+        again = pool.download_video("u2", output_dir=str(tmp_path))
+        assert again["title"] == info["title"]
+        assert pool.stats()["started"] == 1
+
+    def test_recycles_after_max_tasks_and_rss_ceiling(self, make_pool, tmp_path):
+        pool = make_pool("fake_download", max_tasks=2)
+        pids = [pool.download_video(f"u{i}", output_dir=str(tmp_path))["title"] for i in range(3)]
+        assert pids[0] == pids[1] != pids[2]
+        assert pool.stats()["exits"] == {"max_tasks": 1}
+
+        small = make_pool("fake_download", max_rss=1)
+        first = small.download_video("u", output_dir=str(tmp_path))["title"]
+        assert small.download_video("u", output_dir=str(tmp_path))["title"] != first
+        assert small.stats()["exits"]["rss"] >= 1
+
+    def test_cancel_kills_child_and_its_process_group(self, make_pool, tmp_path):
+        pool = make_pool("hanging_download")
+        cancelled = threading.Event()
+        pids_file = tmp_path / "pids"
+
+        def cancel_when_started():
+            while not pids_file.exists() or not pids_file.read_text():
+                time.sleep(0.02)
+            cancelled.set()
+
+        threading.Thread(target=cancel_when_started, daemon=True).start()
+        with pytest.raises(DownloadCancelledError):
+            pool.download_video("u", output_dir=str(tmp_path), stop_check=cancelled.is_set)
+        child, helper = (int(pid) for pid in pids_file.read_text().split())
+        assert not _alive(child)
+        deadline = time.monotonic() + 2
+        while _alive(helper) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not _alive(helper)
+        assert pool.stats()["exits"] == {"cancelled": 1}
+
+    def test_cancel_removes_partial_files_the_child_reported(self, make_pool, tmp_path):
+        pool = make_pool("partial_download")
+        (tmp_path / "Other.mp4").write_bytes(b"kept")
+        part = tmp_path / "Song.mp4.part"
+        with pytest.raises(DownloadCancelledError):
+            pool.download_video("u", output_dir=str(tmp_path), stop_check=part.exists)
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["Other.mp4"]
+
+    def test_errors_keep_their_type_and_message(self, make_pool, tmp_path):
+        pool = make_pool("failing_download")
+        with pytest.raises(yt_dlp.utils.DownloadError, match="HTTP Error 403"):
+            pool.download_video("u", output_dir=str(tmp_path))
+        assert pool.stats()["workers"] == 1  # An ordinary failure keeps the child.
+
+    def test_crashed_child_is_reported_and_replaced(self, make_pool, tmp_path):
+        pool = make_pool("crashing_download")
+        with pytest.raises(WorkerCrashedError, match="exit code 3"):
+            pool.download_video("u", output_dir=str(tmp_path))
+        with pytest.raises(WorkerCrashedError):
+            pool.download_video("u", output_dir=str(tmp_path))
+        assert pool.stats()["started"] == 2
+
+
+class TestApiWithProcessPool:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def teardown_method(self):
+        api_module.init_process_pool(None)
+
+    def test_download_task_runs_in_child(self, client, tmp_path):
+        api_module.init_process_pool(DownloadProcessPool(target=_target("fake_download")))
+        with patch.object(api_module, "DOWNLOAD_DIR", str(tmp_path)):
+            task_id = client.post("/download_video", json={"url": "https://youtube.com/watch?v=abc"}).get_json()["task_id"]
+            deadline = time.monotonic() + 10
+            while client.get(f"/tasks/{task_id}").get_json()["status"] != TASK_STATUS_COMPLETED:
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+        task = client.get(f"/tasks/{task_id}").get_json()
+        assert task["title"] != f"pid {os.getpid()}"
+        assert task["usage"]["peak_rss_bytes"] > 0
@@ -0,0 +1,343 @@
+"""Tests for multi-process serving: the shared task registry, leader election and the process locks."""
+import sqlite3
+import subprocess
+import sys
+import textwrap
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app.api as api_module
+from app.process_lock import FileLock
+from app.shared_registry import RegistryBusyError, SharedRegistry
+from app.updater import Updater
+from conftest import wait_for
+
+
+def _append(registry, event, task):
+    with registry.write():
+        return registry.append(event, task)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tasks.db")
+
+
+class TestSharedRegistry:
+    def test_changes_reach_other_process_in_order(self, db_path):
+        a, b = SharedRegistry(db_path), SharedRegistry(db_path)
+        seen = []
+        b.attach(lambda revision, event: seen.append((revision, event)), lambda revision, tasks: None)
+        try:
+            assert a.epoch == b.epoch
+            first = _append(a, {"type": "task", "task_id": "t1", "changes": {"status": "queued"}}, {"status": "queued"})
+            second = _append(a, {"type": "removed", "task_id": "t1"}, None)
+            b.poll()
+            assert [r for r, _ in seen] == [first, second]
+            assert seen[1][1]["type"] == "removed"
+            assert b.revision == second
+            assert b.snapshot() == (second, [])
+        finally:
+            a.close()
+            b.close()
+
+    def test_own_changes_are_not_applied_again(self, db_path):
+        a = SharedRegistry(db_path)
+        applied = []
+        a.attach(lambda revision, event: applied.append(revision), lambda revision, tasks: None)
+        try:
+            _append(a, {"type": "task", "task_id": "t1", "changes": {}}, {})
+            a.poll()
+            assert applied == []
+        finally:
+            a.close()
+
+    def test_idempotency_keys_are_shared_and_trimmed(self, db_path):
+        a, b = SharedRegistry(db_path, keep_keys=1), SharedRegistry(db_path)
+        try:
+            with a.write():
+                a.record_idempotency_key("k1", "t1", "youtube x", "mp4")
+            with a.write():
+                a.record_idempotency_key("k2", "t2", "youtube y", "mp3")
+            with b.write():
+                assert b.idempotency_key("k1") == ("t1", "youtube x", "mp4")
+            a.trim()
+            with b.write():
+                assert b.idempotency_key("k1") is None
+                assert b.idempotency_key("k2") == ("t2", "youtube y", "mp3")
+        finally:
+            a.close()
+            b.close()
+
+    def test_write_gives_up_while_another_process_writes(self, db_path):
+        a = SharedRegistry(db_path, timeout=0.05)
+        other = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            with pytest.raises(RegistryBusyError):
+                with a.write():
+                    pytest.fail("the write should not start")
+            assert not a.writing
+            other.execute("COMMIT")
+            _append(a, {"type": "task", "task_id": "t1", "changes": {}}, {})
+        finally:
+            other.close()
+            a.close()
+
+    def test_falling_behind_trimmed_log_resyncs(self, db_path):
+        a, b = SharedRegistry(db_path, keep=1), SharedRegistry(db_path)
+        resynced = []
+        b.attach(lambda revision, event: pytest.fail("expected a resync"), lambda *args: resynced.append(args))
+        try:
+            for i in range(3):
+                _append(a, {"type": "task", "task_id": f"t{i}", "changes": {}}, {"status": "queued"})
+            a.trim()
+            b.poll()
+            revision, tasks = resynced[0]
+            assert revision == 3
+            assert [t["task_id"] for t in tasks] == ["t0", "t1", "t2"]
+        finally:
+            a.close()
+            b.close()
+
+
+class TestSharedApi:
+    """This process mirrors the registry; ``other`` plays another worker process."""
+
+    def setup_method(self):
+        api_module.init_task_store(None)
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+
+    def teardown_method(self):
+        api_module.close_shared_registry()
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+
+    def test_leader_runs_tasks_created_elsewhere(self, db_path):
+        other = SharedRegistry(db_path)
+        queue = MagicMock()
+        queue.remove.return_value = True
+        with patch.object(api_module, "_download_queue", queue):
+            api_module.init_shared_registry(SharedRegistry(db_path))
+            assert api_module.is_leader()
+            task = {"task_id": "t1", "status": "queued", "url": "https://y/1", "format": "mp4"}
+            _append(other, {"type": "task", "task_id": "t1", "changes": task}, task)
+            assert wait_for(lambda: queue.submit.called)
+            assert queue.submit.call_args.args[:2] == ("t1", api_module._run_download)
+
+            _append(other, {"type": "task", "task_id": "t1", "changes": {"cancelled": True}}, {**task, "cancelled": True})
+            assert wait_for(lambda: api_module._tasks.get("t1", {}).get("status") == "cancelled")
+        queue.remove.assert_called_with("t1")
+        other.poll()
+        assert other.snapshot()[1][0]["status"] == "cancelled"
+        other.close()
+
+    def test_follower_registers_and_next_leader_takes_over(self, client, db_path):
+        leader = FileLock(db_path + ".leader")
+        assert leader.acquire()
+        queue = MagicMock()
+        with patch.object(api_module, "_download_queue", queue):
+            api_module.init_shared_registry(SharedRegistry(db_path), FileLock(db_path + ".leader"))
+            assert not api_module.is_leader()
+            with patch("app.api.canonical_video_key", return_value="youtube:abc"):
+                resp = client.post("/download_video", json={"url": "https://www.youtube.com/watch?v=abc"})
+            assert resp.status_code == 202
+            task_id = resp.get_json()["task_id"]
+            queue.submit.assert_not_called()
+
+            other = SharedRegistry(db_path)
+            assert [t["task_id"] for t in other.snapshot()[1]] == [task_id]
+            other.close()
+
+            leader.release()  # The leading process exited.
+            assert wait_for(lambda: queue.submit.called)
+        assert api_module.is_leader()
+        assert queue.submit.call_args.args[0] == task_id
+
+    def test_progress_is_coalesced_and_unchanged_fields_are_not_logged(self, db_path):
+        other = SharedRegistry(db_path)
+        seen = []
+        other.attach(lambda revision, event: seen.append(event["changes"]), lambda revision, tasks: None)
+        queue = MagicMock()
+        queue.positions.return_value = {}
+        # Only this process's own writes log the pending changes here, not the sync thread.
+        with patch.object(api_module, "SHARED_POLL_INTERVAL", 60), patch.object(api_module, "_download_queue", queue):
+            api_module.init_shared_registry(SharedRegistry(db_path))
+            with api_module._tasks_lock:
+                api_module._add_task_locked({"task_id": "t1", "status": "downloading", "url": "https://y/1"})
+            registry = api_module._shared.registry
+            other.snapshot()
+            logged = registry.revision
+            for pct in (10, 20, 30):
+                api_module._update_task("t1", progress=pct)
+                api_module.refresh_queue_positions()
+            assert api_module._tasks["t1"]["progress"] == 30
+            assert registry.revision == logged
+            api_module._update_task("t1", status="completed")
+        other.poll()
+        other.close()
+        assert seen == [{"progress": 30}, {"status": "completed"}]
+
+    def test_idempotency_key_used_on_another_worker_is_replayed(self, client, db_path):
+        leader = FileLock(db_path + ".leader")
+        assert leader.acquire()
+        api_module.init_shared_registry(SharedRegistry(db_path), FileLock(db_path + ".leader"))
+        other = SharedRegistry(db_path)
+        task = {"task_id": "t1", "status": "queued", "url": "https://www.youtube.com/watch?v=abc", "format": "mp4",
+                "video_key": "youtube:abc"}
+        # The first POST landed on the other worker: task and key are registered together.
+        with other.write():
+            other.append({"type": "task", "task_id": "t1", "changes": task}, task)
+            other.record_idempotency_key("retry-1", "t1", "youtube:abc", "mp4")
+        other.close()
+        with patch("app.api.canonical_video_key", return_value="youtube:abc"):
+            resp = client.post("/download_video", json={"url": task["url"]}, headers={"Idempotency-Key": "retry-1"})
+        assert resp.get_json()["task_id"] == "t1"
+        with patch("app.api.canonical_video_key", return_value="youtube:xyz"):
+            resp = client.post("/download_video", json={"url": "https://www.youtube.com/watch?v=xyz"},
+                               headers={"Idempotency-Key": "retry-1"})
+        assert resp.status_code == 422
+        assert list(api_module._tasks) == ["t1"]
+        leader.release()
+
+    def test_batch_catches_up_before_deduplicating(self, client, db_path):
+        leader = FileLock(db_path + ".leader")
+        assert leader.acquire()
+        # The sync thread must not apply the other worker's task first.
+        with patch.object(api_module, "SHARED_POLL_INTERVAL", 60):
+            api_module.init_shared_registry(SharedRegistry(db_path), FileLock(db_path + ".leader"))
+            other = SharedRegistry(db_path)
+            task = {"task_id": "t1", "status": "queued", "url": "https://www.youtube.com/watch?v=abc", "format": "mp4",
+                    "video_key": "youtube:abc"}
+            _append(other, {"type": "task", "task_id": "t1", "changes": task}, task)
+            other.close()
+            with patch("app.api.canonical_video_key", side_effect=lambda url: "youtube:" + url[-3:]):
+                resp = client.post("/download_videos", json={"items": [
+                    {"url": "https://www.youtube.com/watch?v=abc"}, {"url": "https://www.youtube.com/watch?v=xyz"},
+                ]})
+        results = resp.get_json()["results"]
+        assert results[0]["task_id"] == "t1" and results[0]["deduplicated"] is True
+        assert "deduplicated" not in results[1]
+        leader.release()
+
+    def test_busy_registry_defers_task_updates_and_rejects_requests(self, client, db_path):
+        with patch.object(api_module, "SHARED_POLL_INTERVAL", 0.05):
+            api_module.init_shared_registry(SharedRegistry(db_path, timeout=0.05))
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "t1", "status": "downloading", "url": "https://y/1"})
+        other = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            api_module._update_task("t1", status="completed")
+            assert api_module._tasks["t1"]["status"] == "completed"
+            with patch("app.api.canonical_video_key", return_value="youtube:abc"):
+                resp = client.post("/download_video", json={"url": "https://www.youtube.com/watch?v=abc"})
+            assert resp.status_code == 503 and resp.headers["Retry-After"] == "1"
+            assert list(api_module._tasks) == ["t1"]
+            other.execute("COMMIT")
+        finally:
+            other.close()
+        reader = SharedRegistry(db_path)
+        try:
+            assert wait_for(lambda: reader.snapshot()[1][0]["status"] == "completed")
+        finally:
+            reader.close()
+
+    def test_take_over_waits_for_a_busy_registry(self, db_path):
+        task = {"task_id": "t1", "status": "downloading", "url": "https://y/1", "format": "mp4"}
+        other = SharedRegistry(db_path)
+        _append(other, {"type": "task", "task_id": "t1", "changes": task}, task)
+        other.close()
+        registry = SharedRegistry(db_path, timeout=0.05)
+        blocker = sqlite3.connect(db_path, isolation_level=None)
+        queue = MagicMock()
+        try:
+            blocker.execute("BEGIN IMMEDIATE")
+            with patch.object(api_module, "_download_queue", queue), \
+                    patch.object(api_module, "SHARED_POLL_INTERVAL", 0.05):
+                api_module.init_shared_registry(registry, FileLock(db_path + ".leader"))
+                assert not api_module.is_leader()
+                blocker.execute("COMMIT")
+                assert wait_for(lambda: queue.submit.called)
+        finally:
+            blocker.close()
+        assert api_module.is_leader()
+        assert api_module._tasks["t1"]["status"] == "queued"
+
+    def test_tasks_etag_is_shared(self, client, db_path):
+        api_module.init_shared_registry(SharedRegistry(db_path))
+        other = SharedRegistry(db_path)
+        try:
+            assert client.get("/tasks").headers["ETag"].startswith(f'"{other.epoch}-')
+        finally:
+            other.close()
+
+
+def test_file_lock_excludes_other_processes(tmp_path):
+    path = str(tmp_path / "x.lock")
+    holder = subprocess.Popen(
+        [sys.executable, "-c", textwrap.dedent(f"""
+            import fcntl, os, sys
+            fd = os.open({path!r}, os.O_RDWR | os.O_CREAT)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            print("locked", flush=True)
+            sys.stdin.read()
+        """)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    lock = FileLock(path)
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        assert lock.locked()
+        assert not lock.acquire()
+    finally:
+        holder.communicate("")
+    assert lock.acquire()
+    assert lock.held
+    lock.release()
+
+
+def test_file_lock_falls_back_to_this_process_when_file_cannot_be_created(tmp_path):
+    (tmp_path / "data").write_text("not a directory")
+    lock = FileLock(str(tmp_path / "data" / "x.lock"))
+    assert not lock.locked()
+    assert lock.acquire()
+    assert lock.held and lock.locked()
+    assert not lock.acquire()
+    lock.release()
+    assert not lock.held and not lock.locked()
+
+
+def test_updater_update_with_unwritable_lock_path(tmp_path):
+    (tmp_path / "data").write_text("not a directory")
+    updater = Updater(state_path=str(tmp_path / "update-state.json"), lock_path=str(tmp_path / "data" / "x.lock"))
+    assert not updater.is_updating()
+    with patch.object(updater, "_run_update", return_value=MagicMock(success=True)) as run:
+        updater.update_if_needed("ad-hoc")
+    run.assert_called_once()
+
+
+def test_single_worker_updater_has_no_lock_file(app, tmp_path):
+    assert api_module._updater._process_lock is None
+    assert not list(tmp_path.glob("*.lock"))
+
+
+def test_updater_skips_while_another_process_updates(tmp_path):
+    state = str(tmp_path / "update-state.json")
+    other = FileLock(state + ".lock")
+    assert other.acquire()
+    updater = Updater(state_path=state, lock_path=state + ".lock")
+    try:
+        assert updater.is_updating()
+        with patch("app.updater.subprocess.run") as run:
+            result = updater.update_if_needed("ad-hoc")
+        assert not result.success
+        assert result.error == "update already in progress"
+        run.assert_not_called()
+    finally:
+        other.release()
+    assert not updater.is_updating()
@@ -0,0 +1,137 @@
+"""Tests for the SQLite task store and restoring tasks on startup."""
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app.api as api_module
+from app import create_app
+from app.task_store import TaskStore
+from app.yt_dlp_manager import TASK_STATUS_COMPLETED, TASK_STATUS_DOWNLOADING
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = TaskStore(str(tmp_path / "tasks.db"), flush_interval=60)
+    yield s
+    s.close()
+
+
+class TestTaskStore:
+    def test_roundtrip_keeps_insertion_order(self, store):
+        store.put({"task_id": "a", "status": "queued"})
+        store.put({"task_id": "b", "status": "queued"})
+        store.flush()
+        store.put({"task_id": "a", "status": TASK_STATUS_COMPLETED})
+        store.flush()
+        assert store.load() == [
+            {"task_id": "a", "status": TASK_STATUS_COMPLETED},
+            {"task_id": "b", "status": "queued"},
+        ]
+
+    def test_put_snapshots_task(self, store):
+        task = {"task_id": "a", "progress": 1}
+        store.put(task)
+        task["progress"] = 50
+        store.flush()
+        assert store.load()[0]["progress"] == 1
+
+    def test_writes_are_batched_until_flush(self, store):
+        for pct in range(10):
+            store.put({"task_id": "a", "progress": pct})
+        assert store.load() == []
+        with patch.object(store, "_write", wraps=store._write) as write:
+            store.flush()
+        assert write.call_count == 1
+        assert store.load()[0]["progress"] == 9
+
+    def test_delete(self, store):
+        store.put({"task_id": "a"})
+        store.flush()
+        store.delete("a")
+        store.flush()
+        assert store.load() == []
+
+    def test_urgent_put_wakes_writer(self, store):
+        store.put({"task_id": "a", "status": TASK_STATUS_COMPLETED}, urgent=True)
+        deadline = time.monotonic() + 2
+        while not store.load() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.load()[0]["status"] == TASK_STATUS_COMPLETED
+
+    def test_close_flushes_and_reopen_reads(self, tmp_path):
+        path = str(tmp_path / "tasks.db")
+        s = TaskStore(path, flush_interval=60)
+        s.put({"task_id": "a", "status": "queued"})
+        s.close()
+        reopened = TaskStore(path)
+        try:
+            assert [t["task_id"] for t in reopened.load()] == ["a"]
+        finally:
+            reopened.close()
+
+
+class TestRegistryPersistence:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def teardown_method(self):
+        api_module.init_task_store(None)
+
+    def test_registry_changes_and_pruning_are_persisted(self, store):
+        api_module.init_task_store(store)
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "t1", "status": "queued"})
+        api_module._update_task("t1", status=TASK_STATUS_DOWNLOADING, progress=40)
+        store.flush()
+        assert store.load() == [{"task_id": "t1", "status": TASK_STATUS_DOWNLOADING, "progress": 40}]
+
+        with api_module._tasks_lock:
+            api_module._tasks["t1"]["status"] = TASK_STATUS_COMPLETED
+            for i in range(api_module._MAX_TASK_HISTORY):
+                api_module._add_task_locked({"task_id": f"n-{i}", "status": TASK_STATUS_COMPLETED})
+            api_module._prune_completed_tasks()
+        store.flush()
+        assert "t1" not in {t["task_id"] for t in store.load()}
+
+    def test_restore_requeues_interrupted_and_keeps_history(self, store):
+        store.put({"task_id": "done", "status": TASK_STATUS_COMPLETED, "url": "https://y/1", "format": "mp4"})
+        store.put({"task_id": "running", "status": TASK_STATUS_DOWNLOADING, "url": "https://y/2",
+                   "format": "mp3", "priority": 1, "client": "ha-card", "speed": 100.0, "queue_position": 1})
+        store.put({"task_id": "waiting", "status": "queued", "url": "https://y/3", "format": "mp4"})
+        store.put({"task_id": "stopped", "status": "queued", "url": "https://y/4", "format": "mp4",
+                   "cancelled": True})
+        store.flush()
+
+        queue = MagicMock()
+        with patch.object(api_module, "_download_queue", queue):
+            api_module.init_task_store(store)
+
+        with api_module._tasks_lock:
+            tasks = {tid: dict(t) for tid, t in api_module._tasks.items()}
+        assert list(tasks) == ["done", "running", "waiting", "stopped"]
+        assert tasks["done"]["status"] == TASK_STATUS_COMPLETED
+        assert tasks["running"]["status"] == "queued"
+        assert "speed" not in tasks["running"] and "queue_position" not in tasks["running"]
+        assert tasks["stopped"]["status"] == "cancelled"
+
+        submitted = [c.args[0] for c in queue.submit.call_args_list]
+        assert submitted == ["running", "waiting"]
+        running_call = queue.submit.call_args_list[0]
+        assert running_call.args[1:] == (api_module._run_download, "running", "https://y/2", "mp3")
+        assert running_call.kwargs["priority"] == 1
+        assert running_call.kwargs["client"] == "ha-card"
+
+
+def test_create_app_survives_unusable_task_db(tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    create_app(state_path=str(tmp_path / "state.json"), task_db_path=str(blocker / "tasks.db"))
+    assert api_module._task_store is None
+
+
+def test_create_app_defaults_task_db_next_to_state(tmp_path, monkeypatch):
+    monkeypatch.delenv("TASK_DB_PATH", raising=False)
+    create_app(state_path=str(tmp_path / "state.json"))
+    assert api_module._task_store.path == str(tmp_path / "tasks.db")
@@ -0,0 +1,216 @@
+"""Tests for the task change feed, the /tasks/stream SSE endpoint and revision-based /tasks queries."""
+import json
+import threading
+from unittest.mock import patch
+
+import app.api as api_module
+from app.task_events import ChangeFeed
+from app.yt_dlp_manager import TASK_STATUS_COMPLETED
+
+
+def _parse(message: str) -> dict:
+    """Parse one SSE message into {"id", "event", "data"}."""
+    fields = {}
+    for line in message.strip().splitlines():
+        key, _, value = line.partition(": ")
+        fields[key] = value
+    fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+class TestChangeFeed:
+    def test_publish_bumps_revision(self):
+        feed = ChangeFeed()
+        assert feed.revision == 0
+        assert feed.publish({"type": "task"}) == 1
+        assert feed.publish({"type": "task"}) == 2
+        assert [rev for rev, _ in feed.since(0)] == [1, 2]
+        assert feed.since(2) == []
+
+    def test_since_returns_none_when_history_evicted_or_unknown(self):
+        feed = ChangeFeed(history=2)
+        for _ in range(4):
+            feed.publish({"type": "task"})
+        assert feed.since(0) is None
+        assert feed.since(2) is not None
+        assert feed.since(99) is None
+
+    def test_wait_times_out_with_empty_list(self):
+        feed = ChangeFeed()
+        assert feed.wait(0, timeout=0.01) == []
+
+    def test_wait_wakes_on_publish(self):
+        feed = ChangeFeed()
+        threading.Timer(0.05, feed.publish, args=({"type": "task"},)).start()
+        events = feed.wait(0, timeout=2)
+        assert [rev for rev, _ in events] == [1]
+
+
+class TestTaskChangePublishing:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+
+    def _events_after(self, revision):
+        return [event for _, event in api_module._task_feed.since(revision)]
+
+    def test_only_changed_fields_are_published(self):
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "t1", "status": "queued", "cancelled": False})
+        rev = api_module._task_feed.revision
+        api_module._update_task("t1", status="queued", title="Song")
+        assert self._events_after(rev) == [{"type": "task", "task_id": "t1", "changes": {"title": "Song"}}]
+
+    def test_unchanged_update_publishes_nothing(self):
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "t1", "status": "queued"})
+        rev = api_module._task_feed.revision
+        api_module._update_task("t1", status="queued")
+        assert api_module._task_feed.revision == rev
+
+    def test_none_removes_field(self):
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "t1", "status": "queued", "queue_position": 3})
+        api_module._update_task("t1", queue_position=None)
+        with api_module._tasks_lock:
+            assert "queue_position" not in api_module._tasks["t1"]
+
+    def test_run_download_publishes_status_transitions(self):
+        with api_module._tasks_lock:
+            api_module._add_task_locked({"task_id": "t1", "status": "queued", "cancelled": False})
+        rev = api_module._task_feed.revision
+        with patch("app.api.download_video", return_value={"title": "Test"}):
+            api_module._run_download("t1", "https://youtube.com/watch?v=x", "mp4")
+        statuses = [e["changes"].get("status") for e in self._events_after(rev)]
+        assert statuses == ["downloading", TASK_STATUS_COMPLETED]
+
+    def test_pruning_publishes_removed(self):
+        with api_module._tasks_lock:
+            for i in range(api_module._MAX_TASK_HISTORY + 1):
+                api_module._add_task_locked({"task_id": f"old-{i}", "status": TASK_STATUS_COMPLETED})
+            rev = api_module._task_feed.revision
+            api_module._prune_completed_tasks()
+        assert self._events_after(rev) == [{"type": "removed", "task_id": "old-0"}]
+
+
+class TestSseStream:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._add_task_locked({"task_id": "t1", "status": "queued"})
+
+    def test_starts_with_retry_and_snapshot(self):
+        stream = api_module._sse_stream(None, keepalive=0.01)
+        assert next(stream).startswith("retry:")
+        snapshot = _parse(next(stream))
+        assert snapshot["event"] == "snapshot"
+        assert [t["task_id"] for t in snapshot["data"]] == ["t1"]
+        assert int(snapshot["id"]) == api_module._task_feed.revision
+        stream.close()
+
+    def test_pushes_deltas_and_keepalives(self):
+        stream = api_module._sse_stream(None, keepalive=0.01)
+        next(stream), next(stream)
+        assert next(stream) == ": keepalive\n\n"
+        api_module._update_task("t1", status="downloading")
+        message = _parse(next(stream))
+        assert message["event"] == "task"
+        assert message["data"] == {"task_id": "t1", "status": "downloading"}
+        stream.close()
+
+    def test_resumes_from_last_event_id(self):
+        rev = api_module._task_feed.revision
+        api_module._update_task("t1", status="downloading")
+        stream = api_module._sse_stream(str(rev), keepalive=0.01)
+        next(stream)
+        message = _parse(next(stream))
+        assert message["event"] == "task"
+        assert message["data"]["status"] == "downloading"
+        stream.close()
+
+    def test_unknown_last_event_id_falls_back_to_snapshot(self):
+        stream = api_module._sse_stream("999999999", keepalive=0.01)
+        next(stream)
+        assert _parse(next(stream))["event"] == "snapshot"
+        stream.close()
+
+
+def test_tasks_stream_endpoint(client):
+    resp = client.get("/tasks/stream", buffered=False)
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    assert resp.headers["Cache-Control"] == "no-cache"
+    chunks = iter(resp.response)
+    assert next(chunks).startswith(b"retry:")
+    assert b"event: snapshot" in next(chunks)
+    resp.close()
+
+
+class TestTasksRevisionQueries:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            for tid in ("a", "b", "c"):
+                api_module._add_task_locked({"task_id": tid, "status": "queued"})
+
+    def test_full_list_has_etag_and_revision(self, client):
+        resp = client.get("/tasks")
+        assert resp.status_code == 200
+        assert [t["task_id"] for t in resp.get_json()] == ["a", "b", "c"]
+        assert resp.headers["X-Tasks-Revision"] == str(api_module._task_feed.revision)
+        assert resp.headers["ETag"]
+
+    def test_unchanged_registry_returns_304(self, client):
+        etag = client.get("/tasks").headers["ETag"]
+        resp = client.get("/tasks", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.data == b""
+
+    def test_change_invalidates_etag_and_cached_body(self, client):
+        etag = client.get("/tasks").headers["ETag"]
+        api_module._update_task("b", status="downloading")
+        resp = client.get("/tasks", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.get_json()[1]["status"] == "downloading"
+
+    def test_full_body_serialized_once_per_revision(self, client):
+        client.get("/tasks")
+        with patch.object(api_module, "_task_snapshot_locked", side_effect=AssertionError("re-serialized")):
+            assert client.get("/tasks").status_code == 200
+
+    def test_since_returns_only_changed_and_removed(self, client):
+        rev = int(client.get("/tasks").headers["X-Tasks-Revision"])
+        api_module._update_task("b", title="Song")
+        with api_module._tasks_lock:
+            del api_module._tasks["c"]
+            api_module._task_feed.publish({"type": "removed", "task_id": "c"})
+        data = client.get(f"/tasks?since={rev}").get_json()
+        assert data["full"] is False
+        assert data["revision"] == api_module._task_feed.revision
+        assert [t["task_id"] for t in data["tasks"]] == ["b"]
+        assert data["tasks"][0]["title"] == "Song"
+        assert data["removed"] == ["c"]
+
+    def test_since_current_revision_is_empty(self, client):
+        rev = api_module._task_feed.revision
+        data = client.get(f"/tasks?since={rev}").get_json()
+        assert data["tasks"] == [] and data["removed"] == []
+
+    def test_since_too_old_returns_full(self, client):
+        data = client.get("/tasks?since=999999999").get_json()
+        assert data["full"] is True
+        assert len(data["tasks"]) == 3
+
+    def test_since_invalid_400(self, client):
+        assert client.get("/tasks?since=abc").status_code == 400
+
+    def test_bulk_ids_lookup(self, client):
+        data = client.get("/tasks?ids=c,missing,a").get_json()
+        assert [t["task_id"] for t in data] == ["c", "a"]
+
+    def test_since_combined_with_ids(self, client):
+        rev = api_module._task_feed.revision
+        api_module._update_task("a", title="x")
+        api_module._update_task("b", title="y")
+        data = client.get(f"/tasks?since={rev}&ids=b").get_json()
+        assert [t["task_id"] for t in data["tasks"]] == ["b"]
@@ -0,0 +1,164 @@
+"""Tests for per-task phase timing, resource accounting and GET /tasks/stats."""
+from unittest.mock import patch
+
+import pytest
+
+import app.api as api_module
+from app.task_timing import TaskStats, TaskTimer
+from app.yt_dlp_manager import TASK_STATUS_COMPLETED, TASK_STATUS_FAILED, DownloadCancelledError
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = _Clock()
+    with patch("app.task_timing.time.monotonic", clock):
+        yield clock
+
+
+class TestTaskTimer:
+    def test_phases_from_progress_fields(self, clock):
+        timer = TaskTimer()
+        timer.enter("extracting")
+        clock.now += 2
+        timer.progress({"phase": "downloading", "downloaded_bytes": 1000})
+        clock.now += 4
+        timer.progress({"phase": "downloading", "downloaded_bytes": 8000})
+        clock.now += 1
+        timer.progress({"phase": "postprocessing", "postprocessor": "Merger"})
+        clock.now += 3
+        timer.progress({"phase": "postprocessing", "postprocessor": "ExtractAudio"})
+        clock.now += 5
+        timer.progress({"phase": "postprocessing", "postprocessor": "MoveFiles"})
+        clock.now += 0.5
+        summary = timer.summary()
+        assert summary["timings"] == {
+            "extracting": 2, "downloading": 5, "merging": 3, "transcoding": 5, "postprocessing": 0.5, "total": 15.5,
+        }
+        assert summary["usage"]["bytes"] == 8000
+        assert summary["usage"]["throughput"] == 1600
+        assert summary["usage"]["cpu_seconds"] >= 0
+        assert summary["usage"]["child_cpu_seconds"] >= 0
+
+    def test_repeated_phases_accumulate(self, clock):
+        timer = TaskTimer()
+        timer.enter("extracting")
+        clock.now += 1
+        timer.enter("updating")
+        clock.now += 10
+        timer.enter("extracting")
+        clock.now += 1
+        assert timer.summary()["timings"] == {"extracting": 2, "updating": 10, "total": 12}
+
+    def test_peak_rss_is_the_largest_sample(self):
+        samples = iter([100, 300, 200, 150])
+        with patch("app.task_timing._rss_bytes", lambda: next(samples)):
+            timer = TaskTimer()
+            timer.progress({"phase": "downloading", "downloaded_bytes": 1})
+            timer.progress({"phase": "downloading", "downloaded_bytes": 2})
+            assert timer.summary()["usage"]["peak_rss_bytes"] == 300
+
+
+def test_stats_aggregate_per_site_and_format():
+    stats = TaskStats(window=3)
+    for seconds in (1.0, 2.0, 3.0, 10.0):
+        stats.record("youtube", "mp4", TASK_STATUS_COMPLETED, {
+            "timings": {"downloading": seconds, "total": seconds + 1}, "usage": {"throughput": 100, "cpu_seconds": 0.5},
+        })
+    stats.record("vimeo", "mp3", TASK_STATUS_FAILED, {"timings": {"extracting": 4.0, "total": 4.0}, "usage": {}})
+    snapshot = stats.snapshot()
+    assert (snapshot["window"], snapshot["tasks"]) == (3, 3)
+    youtube = snapshot["sites"]["youtube"]
+    assert youtube["count"] == 2 and youtube["statuses"] == {TASK_STATUS_COMPLETED: 2}
+    assert youtube["timings"]["downloading"] == {"mean": 6.5, "p50": 3.0, "p95": 10.0}
+    assert youtube["usage"]["throughput"]["mean"] == 100
+    assert snapshot["formats"]["mp3"]["statuses"] == {TASK_STATUS_FAILED: 1}
+
+
+class TestTaskRecords:
+    def setup_method(self):
+        with api_module._tasks_lock:
+            api_module._tasks.clear()
+            api_module._inflight.clear()
+        self._stats = TaskStats()
+        self._patch = patch.object(api_module, "_task_stats", self._stats)
+        self._patch.start()
+
+    def teardown_method(self):
+        self._patch.stop()
+
+    def _add(self, task_id, url="https://www.youtube.com/watch?v=dQw4w9WgXcQ"):
+        with api_module._tasks_lock:
+            api_module._add_task_locked({
+                "task_id": task_id, "status": "queued", "url": url, "format": "mp4",
+                "video_key": api_module.canonical_video_key(url), "cancelled": False,
+            })
+
+    def test_completed_task_carries_breakdown(self, client):
+        def fake_download(url, on_progress, **kwargs):
+            on_progress({"phase": "downloading", "downloaded_bytes": 4096})
+            on_progress({"phase": "postprocessing", "postprocessor": "Merger"})
+            return {"title": "Song"}
+
+        self._add("timed-1")
+        with patch("app.api.download_video", side_effect=fake_download):
+            api_module._run_download("timed-1", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "mp4")
+        task = client.get("/tasks/timed-1").get_json()
+        assert task["status"] == TASK_STATUS_COMPLETED
+        assert set(task["timings"]) == {"extracting", "downloading", "merging", "total"}
+        assert task["usage"]["bytes"] == 4096
+        assert "timed-1" not in api_module._task_timers
+
+        stats = client.get("/tasks/stats").get_json()
+        assert stats["sites"]["youtube"]["count"] == 1
+        assert stats["formats"]["mp4"]["statuses"] == {TASK_STATUS_COMPLETED: 1}
+
+    def test_cancelled_task_reports_latency_and_phase(self, client):
+        def fake_download(url, on_progress, stop_check, **kwargs):
+            on_progress({"phase": "postprocessing", "postprocessor": "ExtractAudio"})
+            client.delete("/tasks/timed-4")
+            assert stop_check()
+            raise DownloadCancelledError("Cancelled by user")
+
+        self._add("timed-4")
+        with patch("app.api.download_video", side_effect=fake_download):
+            api_module._run_download("timed-4", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "mp4")
+        task = client.get("/tasks/timed-4").get_json()
+        assert task["status"] == "cancelled"
+        assert task["cancel"]["phase"] == "transcoding"
+        assert 0 <= task["cancel"]["latency"] < 1
+        latency = client.get("/tasks/stats").get_json()["formats"]["mp4"]["cancel_latency"]
+        assert latency["transcoding"]["p95"] == task["cancel"]["latency"]
+
+    def test_adhoc_update_is_its_own_phase(self):
+        class FakeUpdater:
+            def contains_error_signal(self, error):
+                return True
+
+            def update_if_needed(self, reason):
+                from app.updater import UpdateResult
+                return UpdateResult(success=True)
+
+        self._add("timed-2")
+        with patch.object(api_module, "_updater", FakeUpdater()), \
+                patch("app.api.download_video", side_effect=[Exception("HTTP Error 403"), {"title": "Song"}]):
+            api_module._run_download("timed-2", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "mp4")
+        with api_module._tasks_lock:
+            task = api_module._tasks["timed-2"]
+        assert task["status"] == TASK_STATUS_COMPLETED
+        assert "updating" in task["timings"] and "extracting" in task["timings"]
+
+    def test_failed_task_from_other_site(self):
+        self._add("timed-3", url="https://example.com/video.mp4")
+        with patch("app.api.download_video", side_effect=Exception("boom")), patch.object(api_module, "_updater", None):
+            api_module._run_download("timed-3", "https://example.com/video.mp4", "mp4")
+        snapshot = self._stats.snapshot()
+        site = next(iter(snapshot["sites"]))
+        assert snapshot["sites"][site]["statuses"] == {TASK_STATUS_FAILED: 1}
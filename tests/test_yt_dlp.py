@@ -1,3 +1,5 @@
+import os
+
 import pytest
 from unittest.mock import patch, MagicMock
 
@@ -79,3 +81,644 @@ def test_download_timeout():
 
         with pytest.raises(Exception, match="socket timeout"):
             download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", timeout=1)
+
+
+def _capture_opts():
+    """Return (captured_opts, fake YoutubeDL class) for inspecting download_video options."""
+    captured_opts = {}
+
+    def fake_ydl_class(opts):
+        captured_opts.update(opts)
+        instance = MagicMock()
+        instance.__enter__ = MagicMock(return_value=instance)
+        instance.__exit__ = MagicMock(return_value=False)
+        instance.extract_info.return_value = {"title": "Test"}
+        return instance
+
+    return captured_opts, fake_ydl_class
+
+
+def test_download_video_reports_progress_fields():
+    """progress_hook data (bytes, speed, eta) is forwarded to on_progress."""
+    from app.yt_dlp_manager import download_video
+
+    reports = []
+    captured_opts, fake = _capture_opts()
+    with patch("yt_dlp.YoutubeDL", side_effect=fake):
+        download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", on_progress=reports.append)
+
+    hook = captured_opts["progress_hooks"][0]
+    hook({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": 250,
+          "total_bytes": 1000, "speed": 1234.5, "eta": 3})
+    assert reports == [{
+        "phase": "downloading", "downloaded_bytes": 250, "total_bytes": 1000,
+        "speed": 1234, "eta": 3, "progress": 25.0,
+    }]
+
+
+def test_download_video_progress_is_rate_limited():
+    """Downloading ticks inside PROGRESS_REPORT_INTERVAL are dropped; 'finished' always reported."""
+    from app.yt_dlp_manager import download_video
+
+    reports = []
+    captured_opts, fake = _capture_opts()
+    with patch("yt_dlp.YoutubeDL", side_effect=fake):
+        download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", on_progress=reports.append)
+
+    hook = captured_opts["progress_hooks"][0]
+    with patch("app.yt_dlp_manager.time.monotonic", return_value=1000.0):
+        for done in (100, 200, 300):
+            hook({"status": "downloading", "filename": "a.mp4", "downloaded_bytes": done, "total_bytes": 1000})
+        hook({"status": "finished", "filename": "a.mp4", "downloaded_bytes": 1000, "total_bytes": 1000})
+    assert [r["downloaded_bytes"] for r in reports] == [100, 1000]
+    assert reports[-1]["progress"] == 100.0
+
+
+def test_download_video_progress_sums_merged_streams():
+    """Video + audio streams are summed against the size of all requested formats."""
+    from app.yt_dlp_manager import download_video
+
+    reports = []
+    captured_opts, fake = _capture_opts()
+    with patch("yt_dlp.YoutubeDL", side_effect=fake):
+        download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", on_progress=reports.append)
+
+    info = {"requested_formats": [{"filesize": 900}, {"filesize": 100}]}
+    hook = captured_opts["progress_hooks"][0]
+    hook({"status": "finished", "filename": "v.f137.mp4", "downloaded_bytes": 900, "info_dict": info})
+    hook({"status": "finished", "filename": "a.f140.m4a", "downloaded_bytes": 50, "total_bytes": 100, "info_dict": info})
+    assert reports[0]["progress"] == 90.0
+    assert reports[1]["downloaded_bytes"] == 950
+    assert reports[1]["total_bytes"] == 1000
+
+
+def test_download_video_reports_postprocessing_phase():
+    """postprocessor_hooks 'started' is reported as phase=postprocessing."""
+    from app.yt_dlp_manager import download_video
+
+    reports = []
+    captured_opts, fake = _capture_opts()
+    with patch("yt_dlp.YoutubeDL", side_effect=fake):
+        download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ", format_type="mp3", on_progress=reports.append)
+
+    captured_opts["postprocessor_hooks"][0]({"status": "started", "postprocessor": "ExtractAudio"})
+    assert reports[-1]["phase"] == "postprocessing"
+    assert reports[-1]["postprocessor"] == "ExtractAudio"
+
+
+def test_download_video_without_on_progress_has_no_pp_hooks():
+    from app.yt_dlp_manager import download_video
+
+    captured_opts, fake = _capture_opts()
+    with patch("yt_dlp.YoutubeDL", side_effect=fake):
+        download_video("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    assert captured_opts["postprocessor_hooks"] == []
+
+
+@pytest.mark.parametrize("url", [
+    "https://youtu.be/dQw4w9WgXcQ?si=abc123",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+    "https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+])
+def test_canonical_video_key_youtube_forms(url):
+    from app.yt_dlp_manager import canonical_video_key
+    assert canonical_video_key(url) == "youtube dQw4w9WgXcQ"
+
+
+def test_canonical_video_key_unknown_site_normalizes_url():
+    from app.yt_dlp_manager import canonical_video_key
+    a = canonical_video_key("https://Example.com/v.mp4?b=2&utm_source=x&a=1#t=5")
+    b = canonical_video_key("https://example.com/v.mp4?a=1&b=2")
+    assert a == b == "https://example.com/v.mp4?a=1&b=2"
+
+
+_VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class TestDownloadArchive:
+    def _archive(self, tmp_path):
+        from app.yt_dlp_manager import DownloadArchive
+        return DownloadArchive(str(tmp_path / "data" / "download-archive.json"))
+
+    def _media_file(self, tmp_path, name="Song.mp4", content=b"video"):
+        media = tmp_path / "media"
+        media.mkdir(exist_ok=True)
+        path = media / name
+        path.write_bytes(content)
+        return path
+
+    def test_record_lookup_and_reload(self, tmp_path):
+        from app.yt_dlp_manager import DownloadArchive
+        path = self._media_file(tmp_path)
+        archive = self._archive(tmp_path)
+        archive.record(["youtube dQw4w9WgXcQ"], "mp4", str(path), title="Song")
+        reloaded = DownloadArchive(str(tmp_path / "data" / "download-archive.json"))
+        entry = reloaded.lookup("youtube dQw4w9WgXcQ", "mp4", str(tmp_path / "media"))
+        assert entry["path"] == str(path) and entry["size"] == 5 and entry["title"] == "Song"
+        assert reloaded.lookup("youtube dQw4w9WgXcQ", "mp3", str(tmp_path / "media")) is None
+
+    def test_deleted_changed_or_moved_files_do_not_count(self, tmp_path):
+        path = self._media_file(tmp_path)
+        archive = self._archive(tmp_path)
+        archive.record(["k"], "mp4", str(path))
+        assert archive.lookup("k", "mp4", str(tmp_path / "elsewhere")) is None
+
+        archive.record(["k"], "mp4", str(path))
+        path.write_bytes(b"truncated-and-rewritten")
+        assert archive.lookup("k", "mp4", str(tmp_path / "media")) is None
+
+        path.write_bytes(b"video")
+        archive.record(["k"], "mp4", str(path))
+        path.unlink()
+        assert archive.lookup("k", "mp4", str(tmp_path / "media")) is None
+
+    def test_download_video_skips_network_when_present(self, tmp_path):
+        from app.yt_dlp_manager import download_video
+        path = self._media_file(tmp_path)
+        archive = self._archive(tmp_path)
+        archive.record(["youtube dQw4w9WgXcQ"], "mp4", str(path), title="Song")
+        with patch("yt_dlp.YoutubeDL") as ydl:
+            info = download_video("https://youtu.be/dQw4w9WgXcQ?si=x", output_dir=str(tmp_path / "media"),
+                                  archive=archive)
+        ydl.assert_not_called()
+        assert info == {"title": "Song", "filepath": str(path), "filepaths": {"mp4": str(path)},
+                        "already_present": True}
+
+    def test_mp3_derived_locally_from_archived_mp4(self, tmp_path):
+        from app.yt_dlp_manager import download_video
+        mp4 = self._media_file(tmp_path)
+        mp3 = self._media_file(tmp_path, "Song.mp3", b"audio")
+        archive = self._archive(tmp_path)
+        archive.record(["youtube dQw4w9WgXcQ"], "mp4", str(mp4), title="Song")
+
+        pp = MagicMock()
+        pp.run.return_value = ([str(mp4)], {"filepath": str(mp3), "ext": "mp3"})
+        with patch("app.yt_dlp_manager.FFmpegExtractAudioPP", return_value=pp) as pp_class, \
+                patch("app.yt_dlp_manager.yt_dlp.YoutubeDL.extract_info") as extract:
+            info = download_video(_VIDEO_URL, output_dir=str(tmp_path / "media"), format_type="mp3",
+                                  archive=archive)
+        extract.assert_not_called()
+        assert pp_class.call_args.kwargs["preferredcodec"] == "mp3"
+        assert pp.run.call_args.args[0]["filepath"] == str(mp4)
+        assert info["filepath"] == str(mp3)
+        assert mp4.exists()
+        assert archive.lookup("youtube dQw4w9WgXcQ", "mp3", str(tmp_path / "media"))["path"] == str(mp3)
+
+    def test_network_download_is_recorded_under_archive_id(self, tmp_path):
+        from app.yt_dlp_manager import download_video
+        path = self._media_file(tmp_path)
+        archive = self._archive(tmp_path)
+        captured_opts, fake = _capture_opts()
+
+        def fake_with_post_hook(opts):
+            instance = fake(opts)
+
+            def extract_info(url, download):
+                opts["post_hooks"][0](str(path))
+                return {"title": "Song", "id": "dQw4w9WgXcQ", "extractor_key": "Youtube"}
+            instance.extract_info.side_effect = extract_info
+            return instance
+
+        with patch("yt_dlp.YoutubeDL", side_effect=fake_with_post_hook):
+            download_video(_VIDEO_URL, output_dir=str(tmp_path / "media"), archive=archive)
+        assert archive.lookup("youtube dQw4w9WgXcQ", "mp4", str(tmp_path / "media"))["title"] == "Song"
+
+
+class TestBothFormats:
+    def test_merged_download_leaves_only_mp4_and_mp3(self, tmp_path):
+        from app.yt_dlp_manager import DownloadArchive, download_video
+        mp4, mp3 = tmp_path / "Song.mp4", tmp_path / "Song.mp3"
+        archive = DownloadArchive(str(tmp_path / "archive.json"))
+        calls = []
+        captured_opts, fake = _capture_opts()
+
+        def fake_ydl(opts):
+            calls.append(opts)
+            instance = fake(opts)
+
+            def extract_info(url, download):
+                streams = [tmp_path / "Song.f137.mp4", tmp_path / "Song.f140.m4a"]
+                for stream in streams:
+                    stream.write_bytes(b"stream")
+                # What yt-dlp's Merger does: it keeps the streams only with keepvideo.
+                mp4.write_bytes(b"video")
+                if not opts.get("keepvideo"):
+                    for stream in streams:
+                        stream.unlink()
+                opts["post_hooks"][0](str(mp4))
+                return {"title": "Song", "id": "dQw4w9WgXcQ", "extractor_key": "Youtube"}
+            instance.extract_info.side_effect = extract_info
+            return instance
+
+        def extract_audio(info):
+            mp3.write_bytes(b"audio")
+            return [], {**info, "filepath": str(mp3), "ext": "mp3"}
+
+        pp = MagicMock()
+        pp.run.side_effect = extract_audio
+        with patch("yt_dlp.YoutubeDL", side_effect=fake_ydl), \
+                patch("app.yt_dlp_manager.FFmpegExtractAudioPP", return_value=pp):
+            info = download_video(_VIDEO_URL, output_dir=str(tmp_path), format_type="both", archive=archive)
+
+        # One fetch; the other YoutubeDL only hosts the local ffmpeg step.
+        assert [opts["format"] for opts in calls if "format" in opts] == [captured_opts["format"]]
+        assert "bestvideo" in captured_opts["format"]
+        assert not any("postprocessors" in opts or "keepvideo" in opts for opts in calls)
+        assert pp.run.call_args.args[0]["filepath"] == str(mp4)
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["Song.mp3", "Song.mp4", "archive.json"]
+        assert info["filepaths"] == {"mp4": str(mp4), "mp3": str(mp3)}
+        for fmt in ("mp4", "mp3"):
+            assert archive.lookup("youtube dQw4w9WgXcQ", fmt, str(tmp_path)) is not None
+
+    def test_archived_mp4_only_needs_local_extraction(self, tmp_path):
+        from app.yt_dlp_manager import DownloadArchive, download_video
+        mp4, mp3 = tmp_path / "Song.mp4", tmp_path / "Song.mp3"
+        mp4.write_bytes(b"video")
+        mp3.write_bytes(b"audio")
+        archive = DownloadArchive(str(tmp_path / "archive.json"))
+        archive.record(["youtube dQw4w9WgXcQ"], "mp4", str(mp4), title="Song")
+        pp = MagicMock()
+        pp.run.return_value = ([], {"filepath": str(mp3), "ext": "mp3"})
+        with patch("app.yt_dlp_manager.FFmpegExtractAudioPP", return_value=pp), \
+                patch("app.yt_dlp_manager.yt_dlp.YoutubeDL.extract_info") as extract:
+            info = download_video(_VIDEO_URL, output_dir=str(tmp_path), format_type="both", archive=archive)
+        extract.assert_not_called()
+        assert info["filepaths"] == {"mp4": str(mp4), "mp3": str(mp3)}
+        assert "already_present" not in info
+
+    def test_archived_mp3_only_fetches_video_without_extraction(self, tmp_path):
+        from app.yt_dlp_manager import DownloadArchive, download_video
+        mp3 = tmp_path / "Song.mp3"
+        mp3.write_bytes(b"audio")
+        archive = DownloadArchive(str(tmp_path / "archive.json"))
+        archive.record(["youtube dQw4w9WgXcQ"], "mp3", str(mp3), title="Song")
+        captured_opts, fake = _capture_opts()
+        with patch("yt_dlp.YoutubeDL", side_effect=fake):
+            download_video(_VIDEO_URL, output_dir=str(tmp_path), format_type="both", archive=archive)
+        assert "postprocessors" not in captured_opts
+        assert captured_opts["merge_output_format"] == "mp4"
+
+
+class TestConnectionBudget:
+    def test_lease_shares_budget_between_worker_slots(self):
+        from app.yt_dlp_manager import ConnectionBudget
+        budget = ConnectionBudget(8, slots=2)
+        with budget.lease(8) as first:
+            with budget.lease(8) as second:
+                assert (first, second) == (4, 4)
+                assert budget.in_use == 8
+        assert budget.in_use == 0
+
+    def test_lease_never_grants_more_than_wanted_or_less_than_one(self):
+        from app.yt_dlp_manager import ConnectionBudget
+        budget = ConnectionBudget(2, slots=1)
+        with budget.lease(1) as small:
+            assert small == 1
+            with budget.lease(4) as starved:
+                assert starved == 1
+
+
+class TestIntraTaskParallelism:
+    def test_single_connection_keeps_plain_sequential_download(self):
+        from app.yt_dlp_manager import download_video
+        captured_opts, fake = _capture_opts()
+        with patch("yt_dlp.YoutubeDL", side_effect=fake):
+            download_video(_VIDEO_URL)
+        assert captured_opts["concurrent_fragment_downloads"] == 1
+        assert "formats" not in captured_opts["extractor_args"]["youtube"]
+
+    def test_connections_split_between_parallel_streams(self):
+        from app.yt_dlp_manager import download_video
+        captured_opts, fake = _capture_opts()
+        with patch("app.yt_dlp_manager._ParallelStreamsYoutubeDL", side_effect=fake):
+            download_video(_VIDEO_URL, connections=8)
+        assert captured_opts["concurrent_fragment_downloads"] == 4
+        assert captured_opts["extractor_args"]["youtube"]["formats"] == ["dashy"]
+        assert captured_opts["extractor_args"]["youtube"]["player_client"]
+
+    def test_audio_only_uses_all_connections_for_fragments(self):
+        from app.yt_dlp_manager import download_video
+        captured_opts, fake = _capture_opts()
+        with patch("yt_dlp.YoutubeDL", side_effect=fake):
+            download_video(_VIDEO_URL, format_type="mp3", connections=4)
+        assert captured_opts["concurrent_fragment_downloads"] == 4
+
+
+class TestParallelStreamsYoutubeDL:
+    """Runs the real yt-dlp HTTP downloader against a local server."""
+
+    def _serve(self, delay, missing=()):
+        import http.server
+        import threading
+        import time as _time
+
+        starts = {}
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.strip("/") in missing:
+                    self.send_error(404)
+                    return
+                starts.setdefault(self.path, _time.monotonic())
+                self.send_response(200)
+                self.send_header("Content-Length", "4")
+                self.end_headers()
+                _time.sleep(delay)
+                self.wfile.write(b"data")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_port}", starts
+
+    def _info(self, base):
+        return {
+            "id": "vid", "title": "Clip", "extractor": "test", "extractor_key": "Test", "webpage_url": base,
+            "formats": [
+                {"format_id": "v", "url": f"{base}/v", "ext": "mp4", "vcodec": "avc1", "acodec": "none"},
+                {"format_id": "a", "url": f"{base}/a", "ext": "m4a", "vcodec": "none", "acodec": "mp4a"},
+            ],
+        }
+
+    def _opts(self, tmp_path):
+        # No ffmpeg in the test environment: download the components without merging them.
+        return {"format": "v+a", "allow_unplayable_formats": True, "quiet": True, "noprogress": True,
+                "outtmpl": f"{tmp_path}/%(title)s.%(ext)s", "logger": MagicMock()}
+
+    def test_components_download_at_the_same_time(self, tmp_path):
+        from app.yt_dlp_manager import _ParallelStreamsYoutubeDL
+        server, base, starts = self._serve(delay=0.3)
+        try:
+            with _ParallelStreamsYoutubeDL(self._opts(tmp_path)) as ydl:
+                ydl.process_ie_result(self._info(base), download=True)
+        finally:
+            server.shutdown()
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["Clip.fa.m4a", "Clip.fv.mp4"]
+        assert abs(starts["/v"] - starts["/a"]) < 0.25
+
+    def test_component_failure_is_raised(self, tmp_path):
+        from app.yt_dlp_manager import _ParallelStreamsYoutubeDL
+        server, base, _ = self._serve(delay=0.0, missing=("a",))
+        try:
+            with pytest.raises(Exception, match="404"):
+                with _ParallelStreamsYoutubeDL(self._opts(tmp_path)) as ydl:
+                    ydl.process_ie_result(self._info(base), download=True)
+        finally:
+            server.shutdown()
+
+
+class TestYoutubeDLPool:
+    def test_reuses_object_per_thread_and_profile(self):
+        import threading
+        from app.yt_dlp_manager import YoutubeDLPool
+        pool = YoutubeDLPool()
+        params = {"quiet": True}
+        with pool.checkout(("mp4",), params) as first:
+            pass
+        with pool.checkout(("mp4",), params) as again:
+            pass
+        with pool.checkout(("mp3",), params) as other_profile:
+            pass
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(pool.checkout(("mp4",), params).__enter__()))
+        thread.start()
+        thread.join()
+        assert again is first
+        assert other_profile is not first
+        assert seen[0] is not first
+        assert pool.stats == {"created": 3, "reused": 1}
+
+    def test_recycled_after_max_uses_and_discarded_on_error(self):
+        from app.yt_dlp_manager import YoutubeDLPool
+        pool = YoutubeDLPool(max_uses=2)
+        objects = []
+        for _ in range(3):
+            with pool.checkout(("info",), {"quiet": True}) as ydl:
+                objects.append(ydl)
+        assert objects[0] is objects[1] and objects[2] is not objects[1]
+        with pytest.raises(RuntimeError):
+            with pool.checkout(("info",), {"quiet": True}) as ydl:
+                assert ydl is objects[2]
+                raise RuntimeError("boom")
+        with pool.checkout(("info",), {"quiet": True}) as ydl:
+            assert ydl is not objects[2]
+
+    def test_task_options_are_swapped_between_downloads(self, tmp_path):
+        from app.yt_dlp_manager import YoutubeDLPool
+        server, base, _ = TestParallelStreamsYoutubeDL()._serve(delay=0.0)
+        pool = YoutubeDLPool()
+        params = {"format": "v", "allow_unplayable_formats": True, "quiet": True, "noprogress": True,
+                  "outtmpl": f"{tmp_path}/%(title)s.%(ext)s", "logger": MagicMock()}
+        info = TestParallelStreamsYoutubeDL()._info(base)
+        finished: list[tuple[int, str]] = []
+        try:
+            for task in (1, 2):
+                hook = (lambda t: lambda d: d["status"] == "finished" and finished.append((t, d["status"])))(task)
+                task_opts = {"progress_hooks": [hook], "post_hooks": [lambda path: finished.append((0, path))],
+                             "concurrent_fragment_downloads": task}
+                with pool.checkout(("mp4",), params, task_opts) as ydl:
+                    ydl.process_ie_result({**info, "title": f"Clip{task}"}, download=True)
+                    assert ydl.params["concurrent_fragment_downloads"] == task
+        finally:
+            server.shutdown()
+        assert pool.stats["reused"] == 1
+        assert [entry for entry in finished if entry[0] == 2] == [(2, "finished")]
+        assert [entry for entry in finished if entry[0] == 1] == [(1, "finished")]
+        assert [path for t, path in finished if t == 0] == [f"{tmp_path}/Clip1.mp4", f"{tmp_path}/Clip2.mp4"]
+
+    def test_rebound_instance_matches_fresh_one(self):
+        import yt_dlp
+        from app.yt_dlp_manager import YoutubeDLPool, _profile_options
+        pool = YoutubeDLPool()
+        params = _profile_options("mp3", "/tmp", 1800)
+
+        def task(n):
+            hook = lambda d: None  # noqa: E731
+            return {"progress_hooks": [hook], "postprocessor_hooks": [hook], "post_hooks": [hook],
+                    "concurrent_fragment_downloads": n,
+                    "extractor_args": {"youtube": {"formats": ["dashy"]}} if n > 1 else params["extractor_args"]}
+
+        with pool.checkout(("mp3",), params, task(4)):
+            pass
+        second = task(1)
+        with pool.checkout(("mp3",), params, second) as rebound:
+            pass
+        with yt_dlp.YoutubeDL({**params, **second}) as fresh:
+            def postprocessors(ydl):
+                # Each postprocessor's own report_progress is bound to it, so compare the functions; a
+                # new YoutubeDL registers its hooks on a postprocessor twice (yt-dlp's set_downloader).
+                return {when: [(type(pp), list(dict.fromkeys(getattr(h, "__func__", h) for h in pp._progress_hooks)))
+                               for pp in pps]
+                        for when, pps in ydl._pps.items()}
+            assert pool.stats["reused"] == 1
+            assert rebound.params == fresh.params
+            assert postprocessors(rebound) == postprocessors(fresh)
+            for attr in ("_progress_hooks", "_postprocessor_hooks", "_post_hooks"):
+                assert getattr(rebound, attr) == getattr(fresh, attr)
+
+    def test_not_reused_after_update_or_without_known_internals(self):
+        from app.yt_dlp_manager import YoutubeDLPool
+        pool = YoutubeDLPool()
+        with pool.checkout(("info",), {"quiet": True}) as first:
+            pass
+        with patch("yt_dlp.version.__version__", "2099.01.01"):
+            with pool.checkout(("info",), {"quiet": True}) as updated:
+                pass
+        assert updated is not first
+        del updated._playlist_urls
+        with patch("yt_dlp.version.__version__", "2099.01.01"):
+            with pool.checkout(("info",), {"quiet": True}) as changed:
+                pass
+        assert changed is not updated
+        assert pool.stats == {"created": 3, "reused": 0}
+
+    def test_download_video_reuses_pooled_object(self):
+        from app.yt_dlp_manager import YoutubeDLPool, download_video
+        pool = YoutubeDLPool()
+        captured_opts, fake = _capture_opts()
+        instances = []
+        with patch("yt_dlp.YoutubeDL", side_effect=lambda opts: instances.append(fake(opts)) or instances[-1]):
+            download_video(_VIDEO_URL, format_type="mp3", pool=pool)
+            download_video(_VIDEO_URL, format_type="mp3", on_progress=lambda f: None, pool=pool)
+        assert len(instances) == 1
+        assert pool.stats == {"created": 1, "reused": 1}
+        # The second task's hooks are added to the warm object instead of a new constructor call.
+        assert instances[0].add_progress_hook.call_count == 1
+        assert instances[0].add_postprocessor_hook.call_count == 1
+
+
+class TestCancellation:
+    """Cancel in the phases without progress hooks: extraction requests and ffmpeg steps."""
+
+    def _cancel_when(self, condition):
+        import threading
+        import time as _time
+
+        cancelled = threading.Event()
+        at: list[float] = []
+
+        def watch():
+            while not condition():
+                _time.sleep(0.01)
+            at.append(_time.monotonic())
+            cancelled.set()
+
+        threading.Thread(target=watch, daemon=True).start()
+        return cancelled, at
+
+    def test_cancel_during_extraction_stops_requests(self, tmp_path):
+        import time as _time
+        import yt_dlp
+        from app.yt_dlp_manager import DownloadCancelledError, download_video
+
+        server, base, _ = TestParallelStreamsYoutubeDL()._serve(delay=0.05)
+        requests = []
+
+        def extract_info(self, url, download=True):
+            # Page after page of a slow extraction (webpage, API calls, player JS).
+            for i in range(200):
+                self.urlopen(f"{base}/page{i}").read()
+                requests.append(i)
+            return {"title": "never"}
+
+        cancelled, at = self._cancel_when(lambda: len(requests) >= 3)
+        try:
+            with patch.object(yt_dlp.YoutubeDL, "extract_info", autospec=True, side_effect=extract_info):
+                with pytest.raises(DownloadCancelledError):
+                    download_video(_VIDEO_URL, output_dir=str(tmp_path), stop_check=cancelled.is_set)
+            stopped = _time.monotonic()
+        finally:
+            # Not part of the latency: shutdown() waits for serve_forever's next poll (up to 0.5 s).
+            server.shutdown()
+        assert stopped - at[0] < 0.5
+        assert len(requests) < 20
+
+    def test_cancel_during_postprocessing_kills_ffmpeg_and_removes_partial_files(self, tmp_path):
+        import subprocess
+        import time as _time
+        import yt_dlp
+        from app.yt_dlp_manager import DownloadCancelledError, download_video
+
+        (tmp_path / "Other.mp4").write_bytes(b"kept")
+        video, audio = tmp_path / "Song.f137.mp4", tmp_path / "Song.f140.m4a"
+
+        def extract_info(self, url, download=True):
+            for stream, format_id in ((video, "137"), (audio, "140")):
+                part = f"{stream}.part"
+                open(part, "wb").close()
+                for ph in self._progress_hooks:
+                    ph({"status": "downloading", "filename": str(stream), "tmpfilename": part,
+                        "downloaded_bytes": 1, "info_dict": {"format_id": format_id}})
+                os.rename(part, stream)
+            merge = {"filepath": str(tmp_path / "Song.mp4"), "__files_to_merge": [str(video), str(audio)]}
+            for ph in self._postprocessor_hooks:
+                ph({"status": "started", "postprocessor": "Merger", "info_dict": merge})
+            self.run_pp(FakeMerger(), merge)
+
+        class FakeMerger:
+            def run(self, info):
+                temp = str(tmp_path / "Song.temp.mp4")
+                self.real_run_ffmpeg([(p, []) for p in info["__files_to_merge"]], [(temp, [])])
+
+            def real_run_ffmpeg(self, input_path_opts, output_path_opts, *, expected_retcodes=(0,)):
+                out = output_path_opts[0][0]
+                with open(out, "wb") as f:
+                    f.write(b"half")
+                # Stands in for ffmpeg: a child process whose last argument is the output file.
+                returncode = subprocess.run(["sh", "-c", "sleep 30", "sh", f"file:{out}"]).returncode
+                raise yt_dlp.utils.PostProcessingError(f"ffmpeg exited with code {returncode}")
+
+        cancelled, at = self._cancel_when(lambda: (tmp_path / "Song.temp.mp4").exists())
+        with patch.object(yt_dlp.YoutubeDL, "extract_info", autospec=True, side_effect=extract_info):
+            with pytest.raises(DownloadCancelledError):
+                download_video(_VIDEO_URL, output_dir=str(tmp_path), stop_check=cancelled.is_set)
+        assert _time.monotonic() - at[0] < 1.0
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["Other.mp4"]
+
+    def test_cancel_points_only_on_app_built_objects(self):
+        import yt_dlp
+        from app.yt_dlp_manager import _add_cancel_points, _track_ffmpeg
+
+        # yt-dlp's own classes (used by the updater and anything else) stay as they are.
+        assert yt_dlp.YoutubeDL.urlopen.__module__ == "yt_dlp.YoutubeDL"
+        assert yt_dlp.utils.Popen.__init__.__module__.startswith("yt_dlp.utils")
+        # A yt-dlp without the wrapped methods gets no hooks instead of an error.
+        bare = type("Bare", (), {})()
+        _add_cancel_points(bare)
+        _track_ffmpeg(bare)
+        assert vars(bare) == {}
+
+    def test_failure_without_cancel_keeps_partial_files(self, tmp_path):
+        import yt_dlp
+        from app.yt_dlp_manager import download_video
+
+        def extract_info(self, url, download=True):
+            part = tmp_path / "Song.mp4.part"
+            part.write_bytes(b"resume me")
+            for ph in self._progress_hooks:
+                ph({"status": "downloading", "filename": str(tmp_path / "Song.mp4"), "tmpfilename": str(part)})
+            raise yt_dlp.utils.DownloadError("ERROR: HTTP Error 403: Forbidden")
+
+        with patch.object(yt_dlp.YoutubeDL, "extract_info", autospec=True, side_effect=extract_info):
+            with pytest.raises(yt_dlp.utils.DownloadError):
+                download_video(_VIDEO_URL, output_dir=str(tmp_path), stop_check=lambda: False)
+        assert (tmp_path / "Song.mp4.part").exists()
+
+    def test_partial_files_spare_finished_outputs(self, tmp_path):
+        from app.yt_dlp_manager import PartialFiles
+
+        existing = tmp_path / "Old [1].mp3"
+        existing.write_bytes(b"earlier download")
+        source = tmp_path / "Old [1].mp4"
+        source.write_bytes(b"video")
+        partial = PartialFiles()
+        partial.postprocessor_hook(
+            {"status": "started", "postprocessor": "ExtractAudio", "info_dict": {"filepath": str(source)}},
+            keep_source=True,
+        )
+        (tmp_path / "Old [1].temp.mp4").write_bytes(b"half")
+        assert partial.remove() == [str(tmp_path / "Old [1].temp.mp4")]
+        assert existing.exists() and source.exists()
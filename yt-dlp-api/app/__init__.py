@@ -1,5 +1,7 @@
 import atexit
 import logging
+import os
+import sqlite3
 import threading
 from datetime import datetime, timedelta, timezone
 
@@ -33,6 +35,11 @@ def update_yt_dlp_scheduled() -> None:
     # _updater is accessed at call time (not captured as None during init).
     from . import api as _api_module
 
+    # With several worker processes only the one running the downloads updates yt-dlp.
+    if not _api_module.is_leader():
+        _scheduler.reschedule_job("yt_dlp_update", trigger=CronTrigger(hour=3))
+        return
+
     _updater = _api_module._updater
 
     if _api_module.has_active_tasks() or (_updater and _updater.is_updating()):
@@ -54,7 +61,55 @@ def update_yt_dlp_scheduled() -> None:
         _scheduler.reschedule_job("yt_dlp_update", trigger=CronTrigger(hour=3))
 
 
-def create_app(state_path: str = "/data/update-state.json") -> Flask:
+_BANDWIDTH_JOB_IDS = ("bandwidth_off_peak_start", "bandwidth_off_peak_end")
+
+
+def schedule_bandwidth_profiles() -> None:
+    """(Re)create the jobs that switch bandwidth profiles at the off-peak window edges.
+
+    Also applies the profile for the current time, so a changed window or limit takes
+    effect immediately. Called at startup and by PUT /bandwidth.
+    """
+    from . import api as _api_module
+
+    if _scheduler is None:
+        _api_module.apply_bandwidth_profile()
+        return
+    for job_id in _BANDWIDTH_JOB_IDS:
+        if _scheduler.get_job(job_id):
+            _scheduler.remove_job(job_id)
+    window = _api_module._bandwidth_policy.off_peak_window
+    if window is not None:
+        for job_id, minute_of_day in zip(_BANDWIDTH_JOB_IDS, window):
+            _scheduler.add_job(
+                _api_module.apply_bandwidth_profile,
+                trigger=CronTrigger(hour=minute_of_day // 60, minute=minute_of_day % 60),
+                id=job_id,
+            )
+    _api_module.apply_bandwidth_profile()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning("Ignoring %s: not an integer", name)
+        return default
+
+
+def _env_workers() -> int:
+    """WEB_WORKERS (gunicorn worker processes serving this app); 1 when unset or malformed."""
+    return max(1, _env_int("WEB_WORKERS", 1))
+
+
+def create_app(state_path: str = "/data/update-state.json", task_db_path: str | None = None) -> Flask:
+    """Build the Flask app.
+
+    ``task_db_path`` is the SQLite task store; defaults to $TASK_DB_PATH or
+    tasks.db next to ``state_path`` (i.e. /data/tasks.db in the add-on).
+    With WEB_WORKERS > 1 (gunicorn worker processes, see gunicorn.conf.py) the same
+    database holds the task registry shared by all of them.
+    """
     global _scheduler
 
     app = Flask(__name__)
@@ -64,7 +119,72 @@ def create_app(state_path: str = "/data/update-state.json") -> Flask:
     # Initialize Updater (loads state_path; gracefully handles missing file)
     from .updater import Updater
     from .api import init_updater
-    init_updater(Updater(state_path=state_path))
+    # Several worker processes share the state file; a lock file keeps them from updating at once.
+    lock_path = state_path + ".lock" if _env_workers() > 1 else None
+    init_updater(Updater(state_path=state_path, lock_path=lock_path))
+
+    # Bounded worker pool: at most MAX_CONCURRENT_DOWNLOADS downloads run at once,
+    # the rest wait in a priority + per-client fair backlog. Workers start lazily on the first submit.
+    from .download_queue import DownloadQueue
+    from .api import (
+        CLIENT_WEIGHTS,
+        MAX_CONCURRENT_DOWNLOADS,
+        init_download_queue,
+        refresh_queue_positions,
+        shutdown_download_queue,
+    )
+    init_download_queue(DownloadQueue(
+        max_workers=MAX_CONCURRENT_DOWNLOADS,
+        on_change=refresh_queue_positions,
+        client_weights=CLIENT_WEIGHTS,
+    ))
+
+    # DOWNLOAD_EXECUTOR=process: each worker thread hands its downloads to a child process,
+    # recycled after DOWNLOAD_WORKER_MAX_TASKS downloads or above DOWNLOAD_WORKER_MAX_RSS_MB.
+    from .process_pool import DownloadProcessPool
+    from .api import init_process_pool, shutdown_process_pool
+    if os.environ.get("DOWNLOAD_EXECUTOR", "thread").strip().lower() == "process":
+        max_rss_mb = _env_int("DOWNLOAD_WORKER_MAX_RSS_MB", 1024)
+        init_process_pool(DownloadProcessPool(
+            max_tasks=_env_int("DOWNLOAD_WORKER_MAX_TASKS", 50),
+            max_rss=max_rss_mb * 1024 * 1024 if max_rss_mb > 0 else None,
+        ))
+    else:
+        init_process_pool(None)
+    # atexit runs LIFO: the children are killed after the queue shutdown gave running downloads their grace period.
+    atexit.register(shutdown_process_pool)
+
+    # Index of finished downloads (next to the updater state): repeat requests for a
+    # video already in the media directory complete without touching the network.
+    from .yt_dlp_manager import DownloadArchive
+    from .api import init_download_archive
+    init_download_archive(DownloadArchive(os.path.join(os.path.dirname(state_path), "download-archive.json")))
+
+    # Durable task store: history and unfinished downloads survive restarts.
+    # Restoring re-submits interrupted tasks, so it runs after the queue is injected.
+    # If the database cannot be opened, tasks are kept in memory only (as before).
+    from .task_store import TaskStore
+    from .api import close_task_store, init_task_store
+    if task_db_path is None:
+        task_db_path = os.environ.get("TASK_DB_PATH") or os.path.join(os.path.dirname(state_path), "tasks.db")
+    if _env_workers() > 1:
+        # Several worker processes: tasks live in one shared registry; one process (the
+        # leader, holding the .leader lock) runs the downloads. Not optional — without it
+        # each process would see only its own tasks.
+        from .process_lock import FileLock
+        from .shared_registry import SharedRegistry
+        from .api import close_shared_registry, init_shared_registry
+        init_shared_registry(SharedRegistry(task_db_path), FileLock(task_db_path + ".leader"))
+        atexit.register(close_shared_registry)
+    else:
+        try:
+            init_task_store(TaskStore(task_db_path))
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("[TASK-STORE] Cannot open %s, tasks will not survive restarts: %s", task_db_path, exc)
+            init_task_store(None)
+        atexit.register(close_task_store)
+    # atexit runs LIFO: stop the workers first, then flush their last task updates.
+    atexit.register(shutdown_download_queue)
 
     # Kick off a background version check at startup so the cache is warm
     # and a WARNING is emitted early if yt-dlp is outdated.
@@ -76,6 +196,10 @@ def create_app(state_path: str = "/data/update-state.json") -> Flask:
     # atexit ensures graceful shutdown when the Flask process exits.
     _scheduler = BackgroundScheduler()
     _scheduler.add_job(update_yt_dlp_scheduled, trigger=CronTrigger(hour=3), id="yt_dlp_update")
+    # Bandwidth profiles: off-peak limit inside OFF_PEAK_WINDOW, peak limit outside it.
+    from .api import init_bandwidth_schedule
+    init_bandwidth_schedule(schedule_bandwidth_profiles)
+    schedule_bandwidth_profiles()
     atexit.register(lambda: _scheduler.shutdown() if _scheduler and _scheduler.running else None)
     _scheduler.start()
 
@@ -83,8 +207,8 @@ def create_app(state_path: str = "/data/update-state.json") -> Flask:
     @app.after_request
     def _cors_headers(response):
         response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Idempotency-Key, X-Client"
         return response
 
     @app.before_request
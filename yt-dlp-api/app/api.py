@@ -1,28 +1,292 @@
+import contextlib
+import json
+import logging
 import os
+import re
 import threading
+import time
 import uuid
-from urllib.parse import urlparse
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 
+from . import metrics
+
+from .bandwidth import BandwidthGovernor, BandwidthPolicy, format_window, parse_rate, parse_window
+from .download_queue import DEFAULT_CLIENT, PRIORITY_LEVELS, DownloadQueue, QueueShutDownError
+from .file_index import SORT_KEYS, FileIndex
+from .file_response import send_media_file
+from .info_cache import InfoCache
+from .process_pool import DownloadProcessPool
+from .process_lock import FileLock
+from .shared_mirror import SharedMirror
+from .shared_registry import RegistryBusyError, SharedRegistry
+from .task_events import ChangeFeed
+from .task_store import TaskStore
+from .task_timing import TaskStats, TaskTimer
 from .updater import Updater
 from .yt_dlp_manager import (
+    ConnectionBudget,
+    DownloadArchive,
     DownloadCancelledError,
     TASK_STATUS_DOWNLOADING,
     TASK_STATUS_UPDATING,
     TASK_STATUS_COMPLETED,
     TASK_STATUS_FAILED,
+    YoutubeDLPool,
+    canonical_video_key,
     check_ytdlp_version,
     download_video,
+    extract_info,
+    open_playlist,
+    summarize_info,
 )
 
+logger = logging.getLogger(__name__)
+
 api = Blueprint("api", __name__)
 
 _tasks: dict[str, dict] = {}
-_tasks_lock = threading.Lock()
+# Lock waits are exported as ytdlp_tasks_lock_wait_seconds (see /metrics).
+_tasks_lock = metrics.TimedLock(metrics.TASKS_LOCK_WAIT_SECONDS)
+
+# Every change to _tasks is published here; /tasks/stream subscribers wait on it.
+# Its revision doubles as the registry revision behind /tasks ETags and ?since= queries.
+_task_feed = ChangeFeed()
+
+# Revisions restart at 0 with the process; the epoch keeps old ETags from matching after a restart.
+_REGISTRY_EPOCH = uuid.uuid4().hex[:8]
+
+# (revision, serialized /tasks body) — many dashboards polling an unchanged registry share one encoding.
+_tasks_body_cache: tuple[int, bytes] | None = None
 
 _MAX_TASK_HISTORY = 100  # Max terminal-state tasks kept in memory; oldest pruned on completion
 
+# Durable copy of _tasks (SQLite). Reads never touch it; writes are batched by the store.
+_task_store: TaskStore | None = None
+
+# Multi-process serving (WEB_WORKERS > 1): syncs _tasks with the registry shared by the
+# worker processes and tells whether this one runs the downloads. None when one process serves.
+_shared: SharedMirror | None = None
+SHARED_POLL_INTERVAL = 0.1
+
+_ACTIVE_STATUSES = ("queued", TASK_STATUS_DOWNLOADING, TASK_STATUS_UPDATING)
+_TERMINAL_STATUSES = (TASK_STATUS_COMPLETED, TASK_STATUS_FAILED, "cancelled")
+
+# When cancellation of a still unfinished task was requested (monotonic clock) and the phase it was in,
+# for the cancel latency metric and the task's "cancel" field.
+_cancel_requested_at: dict[str, tuple[float, str]] = {}
+
+# Playlist expanders wait on this for a child to finish (or their playlist to be cancelled).
+_playlist_cond = threading.Condition(_tasks_lock)
+
+# (video_key, format) → task_id of the unfinished task downloading it. Identical
+# submissions attach to that task instead of downloading the same file twice.
+_inflight: dict[tuple[str, str], str] = {}
+
+# Idempotency-Key header → (task_id, video_key, format); oldest keys are forgotten first.
+# With a shared registry the keys are kept there instead, so every worker process sees them.
+_idempotency_keys: OrderedDict[str, tuple[str, str, str]] = OrderedDict()
+_MAX_IDEMPOTENCY_KEYS = 1000
+
+# Changes to these fields are written through promptly; progress ticks and queue
+# positions ride along with the next batch.
+_URGENT_FIELDS = frozenset({"status", "cancelled"})
+
+
+def _persist_locked(task_id: str, urgent: bool) -> None:
+    """Hand the current version of a task to the task store. Must be called with _tasks_lock held."""
+    if _task_store is not None and task_id in _tasks:
+        _task_store.put({**_tasks[task_id], "task_id": task_id}, urgent=urgent)
+
+
+def _publish_locked(event: dict) -> None:
+    """Publish a registry change. Must be called with _tasks_lock held.
+
+    With a shared registry the change is logged there first, which assigns its revision.
+    """
+    if _shared is None:
+        _task_feed.publish(event)
+        return
+    task = _tasks.get(event["task_id"])
+    with _shared.write_locked():
+        revision = _shared.registry.append(event, {**task, "task_id": event["task_id"]} if task is not None else None)
+    _task_feed.publish(event, revision)
+
+
+def _publish_deferred_locked(task_id: str, delta: dict) -> None:
+    """Log a change the shared mirror deferred (SharedMirror flush callback). Inside a shared write, _tasks_lock held."""
+    task = _tasks.get(task_id)
+    if task is None:
+        return
+    # Catching up may have applied another process's older value of the same field.
+    for key, value in delta.items():
+        if value is None:
+            task.pop(key, None)
+        else:
+            task[key] = value
+    _publish_locked({"type": "task", "task_id": task_id, "changes": delta})
+
+
+def _add_task_locked(task: dict) -> None:
+    """Insert a new task and publish it. Must be called with _tasks_lock held."""
+    _tasks[task["task_id"]] = task
+    if task.get("video_key") and task.get("status") in _ACTIVE_STATUSES and not task.get("cancelled"):
+        _inflight[(task["video_key"], task.get("format", "mp4"))] = task["task_id"]
+    _publish_locked({"type": "task", "task_id": task["task_id"], "changes": dict(task)})
+    _persist_locked(task["task_id"], urgent=True)
+
+
+def _remove_task_locked(task_id: str) -> None:
+    """Drop a task from the registry and publish the removal. Must be called with _tasks_lock held."""
+    if _shared is not None and not _shared.writing:
+        with _shared.write_locked():
+            _remove_task_locked(task_id)
+        return
+    if _tasks.pop(task_id, None) is None:
+        return
+    _publish_locked({"type": "removed", "task_id": task_id})
+    if _task_store is not None:
+        _task_store.delete(task_id)
+
+
+def _inflight_task_locked(video_key: str, format_type: str) -> str | None:
+    """ID of the unfinished, not cancelled task for this video and format. Must be called with _tasks_lock held."""
+    task_id = _inflight.get((video_key, format_type))
+    task = _tasks.get(task_id) if task_id else None
+    if task is None or task.get("status") not in _ACTIVE_STATUSES or task.get("cancelled"):
+        _inflight.pop((video_key, format_type), None)
+        return None
+    return task_id
+
+
+def _cancel_phase_locked(task_id: str, task: dict) -> str:
+    """Phase a cancel request found the task in: its timer's phase while running, else its status."""
+    timer = _task_timers.get(task_id)
+    phase = timer.phase if timer is not None else None
+    return phase or task.get("status", "queued")
+
+
+def _apply_task_changes_locked(task_id: str, changes: dict) -> None:
+    """Apply field changes to a task and publish only what actually changed.
+
+    Must be called with _tasks_lock held. A value of None removes the field.
+    With a shared registry, changes that match the mirror are not logged at all, and
+    changes without urgent fields are left to the sync thread (SharedMirror.defer_locked),
+    as are urgent ones while another process keeps the registry busy.
+    """
+    deferred = False
+    if _shared is not None and not _shared.writing:
+        task = _tasks.get(task_id)
+        if task is not None and not _changes_task(task, changes):
+            return
+        deferred = task is not None and _URGENT_FIELDS.isdisjoint(changes)
+        if not deferred:
+            try:
+                # Other processes' changes first, so this one is decided on the current task.
+                with _shared.write_locked():
+                    _apply_task_changes_locked(task_id, changes)
+                return
+            except RegistryBusyError as exc:
+                logger.warning("[SHARED] Registry busy, logging the change to %s later: %s", task_id, exc)
+                deferred = True
+    task = _tasks.get(task_id)
+    if task is None:
+        return
+    delta: dict = {}
+    for key, value in changes.items():
+        if value is None:
+            if key in task:
+                del task[key]
+                delta[key] = None
+        elif key not in task or task[key] != value:
+            task[key] = value
+            delta[key] = value
+    if delta:
+        if delta.get("cancelled"):
+            _cancel_requested_at[task_id] = (time.monotonic(), _cancel_phase_locked(task_id, task))
+        if "status" in delta and task["status"] in _TERMINAL_STATUSES:
+            requested = _cancel_requested_at.pop(task_id, None)
+            if requested is not None and task["status"] == "cancelled":
+                latency = time.monotonic() - requested[0]
+                metrics.CANCEL_LATENCY_SECONDS.labels(phase=requested[1]).observe(latency)
+                task["cancel"] = delta["cancel"] = {"phase": requested[1], "latency": round(latency, 3)}
+        if task.get("status") not in _ACTIVE_STATUSES or task.get("cancelled"):
+            key = (task.get("video_key"), task.get("format", "mp4"))
+            if _inflight.get(key) == task_id:
+                del _inflight[key]
+        if deferred:
+            _shared.defer_locked(task_id, delta)
+        else:
+            _publish_locked({"type": "task", "task_id": task_id, "changes": delta})
+        _persist_locked(task_id, urgent=not _URGENT_FIELDS.isdisjoint(delta))
+        if "status" in delta and task["status"] in _TERMINAL_STATUSES:
+            metrics.TASKS_FINISHED.labels(status=task["status"]).inc()
+        if task.get("parent_id"):
+            if "status" in delta and task["status"] in _TERMINAL_STATUSES:
+                _count_playlist_child_locked(task["parent_id"], task["status"] == TASK_STATUS_COMPLETED)
+            _playlist_cond.notify_all()
+        elif task.get("playlist") and "cancelled" in delta:
+            _playlist_cond.notify_all()
+
+
+def _changes_task(task: dict, changes: dict) -> bool:
+    """True when applying ``changes`` (None removes a field) would modify ``task``."""
+    return any(key in task if value is None else key not in task or task[key] != value
+               for key, value in changes.items())
+
+
+def _count_playlist_child_locked(parent_id: str, succeeded: bool) -> None:
+    """Add a finished child to its playlist's counters and aggregate progress. Must be called with _tasks_lock held."""
+    parent = _tasks.get(parent_id)
+    if parent is None:
+        return
+    done = parent.get("entries_done", 0) + (1 if succeeded else 0)
+    failed = parent.get("entries_failed", 0) + (0 if succeeded else 1)
+    total = parent.get("entries_total")
+    changes = {"entries_done": done, "entries_failed": failed}
+    if total:
+        changes["progress"] = round(min(100.0, 100.0 * (done + failed) / total), 1)
+    _apply_task_changes_locked(parent_id, changes)
+
+
+def _task_snapshot_locked() -> list[dict]:
+    """Copy of every task as a list (insertion order). Must be called with _tasks_lock held."""
+    return [{**t, "task_id": tid} for tid, t in _tasks.items()]
+
+
+def _update_task(task_id: str, **changes) -> None:
+    """Apply field changes to a task under _tasks_lock (see _apply_task_changes_locked)."""
+    with _tasks_lock:
+        _apply_task_changes_locked(task_id, changes)
+
+
+# Live progress fields written by download_video's on_progress; cleared when a task ends.
+_LIVE_PROGRESS_CLEARED = {"phase": None, "postprocessor": None, "speed": None, "eta": None}
+
+
+# Timer of each task a worker is running; _finish_task() attaches its summary to the terminal update.
+_task_timers: dict[str, TaskTimer] = {}
+
+
+def _finish_task(task_id: str, status: str, **changes) -> None:
+    """Move a task to a terminal state and drop its live progress fields."""
+    timer = _task_timers.pop(task_id, None)
+    summary = timer.summary() if timer is not None else {}
+    _update_task(task_id, status=status, **{**_LIVE_PROGRESS_CLEARED, **changes, **summary})
+    if summary:
+        _record_task_timing(task_id, summary)
+
+
+def _progress_reporter(task_id: str):
+    """on_progress callback for download_video — already rate-limited by yt_dlp_manager."""
+    def report(fields: dict) -> None:
+        _update_task(task_id, **fields)
+    return report
+
 
 def _prune_completed_tasks() -> None:
     """Remove oldest terminal-state tasks when count exceeds _MAX_TASK_HISTORY.
@@ -31,14 +295,24 @@ def _prune_completed_tasks() -> None:
     Only removes tasks in terminal states (completed/failed/cancelled) — never active tasks.
     Preserves insertion order so oldest completed tasks are removed first.
     """
-    _TERMINAL = (TASK_STATUS_COMPLETED, TASK_STATUS_FAILED, "cancelled")
-    terminal_ids = [tid for tid, t in _tasks.items() if t.get("status") in _TERMINAL]
+    if _shared is not None and not _shared.writing:
+        try:
+            with _shared.write_locked():
+                _prune_completed_tasks()
+        except RegistryBusyError as exc:
+            logger.info("[SHARED] Registry busy, pruning task history later: %s", exc)
+        return
+    terminal_ids = [tid for tid, t in _tasks.items() if t.get("status") in _TERMINAL_STATUSES]
     excess = len(terminal_ids) - _MAX_TASK_HISTORY
     if excess > 0:
         for tid in terminal_ids[:excess]:
-            del _tasks[tid]
+            _remove_task_locked(tid)
 
 _updater: Updater | None = None
+_download_queue: DownloadQueue | None = None
+_download_archive: DownloadArchive | None = None
+# DOWNLOAD_EXECUTOR=process: downloads run in child processes of this pool instead of the worker threads.
+_process_pool: DownloadProcessPool | None = None
 
 
 def init_updater(updater: Updater) -> None:
@@ -47,6 +321,266 @@ def init_updater(updater: Updater) -> None:
     _updater = updater
 
 
+def init_download_queue(queue: DownloadQueue) -> None:
+    """Called by create_app() to inject the shared DownloadQueue; shuts down any previous one."""
+    global _download_queue
+    old, _download_queue = _download_queue, queue
+    if old is not None and old is not queue:
+        old.shutdown(wait=False)
+
+
+def init_download_archive(archive: DownloadArchive | None) -> None:
+    """Called by create_app() to inject the DownloadArchive (index of files already on disk)."""
+    global _download_archive
+    _download_archive = archive
+
+
+def init_process_pool(pool: DownloadProcessPool | None) -> None:
+    """Called by create_app() to inject the DownloadProcessPool (None: downloads run in the worker threads).
+
+    Shuts down any previous pool.
+    """
+    global _process_pool
+    old, _process_pool = _process_pool, pool
+    if old is not None and old is not pool:
+        old.shutdown()
+
+
+def shutdown_process_pool() -> None:
+    """Kill the download child processes (registered with atexit, runs after the queue shutdown)."""
+    if _process_pool is not None:
+        _process_pool.shutdown()
+
+
+def shutdown_download_queue(timeout: float = 5.0) -> None:
+    """Stop the worker pool: no new tasks start, queued tasks stay 'queued'."""
+    if _download_queue is not None:
+        _download_queue.shutdown(wait=True, timeout=timeout)
+
+
+# Tasks found in one of these states on startup were interrupted by a restart and are queued again.
+_RESUMABLE_STATUSES = _ACTIVE_STATUSES
+
+
+def init_task_store(store: TaskStore | None) -> None:
+    """Called by create_app() to inject the TaskStore (after the DownloadQueue).
+
+    Restores stored tasks into the registry: finished ones as history, interrupted
+    ones back to "queued" and re-submitted to the worker pool (cancelled ones are
+    finished as "cancelled" instead). Closes any previous store.
+    """
+    global _task_store
+    old, _task_store = _task_store, store
+    if old is not None and old is not store:
+        old.close()
+    if store is None:
+        return
+    resumed = []
+    resumed_playlists: set[str] = set()
+    with _tasks_lock:
+        for task in store.load():
+            if task["task_id"] in _tasks:
+                continue
+            if task.get("parent_id") in resumed_playlists and task.get("status") in _RESUMABLE_STATUSES:
+                # The playlist is read again from the start and re-creates its unfinished videos.
+                store.delete(task["task_id"])
+                continue
+            task.pop("queue_position", None)
+            if task.get("status") in _RESUMABLE_STATUSES:
+                for key in _LIVE_PROGRESS_CLEARED:
+                    task.pop(key, None)
+                if task.get("cancelled"):
+                    task.update(status="cancelled", error="Cancelled by user")
+                else:
+                    task["status"] = "queued"
+                    resumed.append(task)
+                    if task.get("playlist"):
+                        resumed_playlists.add(task["task_id"])
+            _add_task_locked(task)
+        _prune_completed_tasks()
+    for task in resumed:
+        try:
+            _submit_task(task)
+        except QueueShutDownError:
+            break
+    if resumed:
+        logger.info("[TASK-STORE] Re-queued %d interrupted task(s) from %s", len(resumed), store.path)
+
+
+def close_task_store() -> None:
+    """Flush pending task writes and close the store (registered with atexit after the queue shutdown)."""
+    if _task_store is not None:
+        _task_store.close()
+
+
+def _apply_remote_locked(revision: int, event: dict) -> None:
+    """Mirror a change another worker process made (SharedRegistry apply callback).
+
+    Must be called with _tasks_lock held. Work the change leaves for this process
+    (it is the leader) is queued as a follow-up; the sync thread does it unlocked.
+    """
+    if event.get("type") == "bandwidth":
+        _shared.follow_up_locked("bandwidth", event["changes"])
+        return
+    task_id = event["task_id"]
+    if event["type"] == "removed":
+        if _tasks.pop(task_id, None) is not None:
+            _task_feed.publish(event, revision)
+        return
+    changes = event["changes"]
+    task = _tasks.get(task_id)
+    created = task is None
+    if created:
+        task = _tasks[task_id] = {}
+    for key, value in changes.items():
+        if value is None:
+            task.pop(key, None)
+        else:
+            task[key] = value
+    _task_feed.publish(event, revision)
+    key = (task.get("video_key"), task.get("format", "mp4"))
+    if task.get("video_key") and task.get("status") in _ACTIVE_STATUSES and not task.get("cancelled"):
+        _inflight[key] = task_id
+    elif _inflight.get(key) == task_id:
+        del _inflight[key]
+    if task.get("parent_id") or task.get("playlist"):
+        _playlist_cond.notify_all()
+    if changes.get("status") in _TERMINAL_STATUSES and "timings" in changes:
+        _task_stats.record(_task_site(task), task.get("format", "mp4"), task["status"], {
+            "timings": task["timings"], "usage": task.get("usage", {}),
+        })
+    if _shared.leading and task.get("status") == "queued":
+        if created and not task.get("cancelled"):
+            _shared.follow_up_locked("submit", task_id)
+        elif changes.get("cancelled"):
+            _shared.follow_up_locked("cancel", task_id)
+
+
+def _resync_locked(revision: int, tasks: list[dict]) -> None:
+    """Replace the mirror with the shared registry's tasks (SharedRegistry resync callback). _tasks_lock held."""
+    _tasks.clear()
+    _inflight.clear()
+    for task in tasks:
+        task = dict(task)
+        task_id = task.pop("task_id")
+        _tasks[task_id] = task
+        if task.get("video_key") and task.get("status") in _ACTIVE_STATUSES and not task.get("cancelled"):
+            _inflight[(task["video_key"], task.get("format", "mp4"))] = task_id
+    _task_feed.rebase(revision)
+    _playlist_cond.notify_all()
+
+
+def init_shared_registry(registry: SharedRegistry, leader_lock: FileLock | None = None) -> None:
+    """Called by create_app() (instead of init_task_store) when several worker processes serve the API.
+
+    Loads the shared registry into _tasks and keeps it in sync from a background thread.
+    Only the process holding ``leader_lock`` (None: this one) runs downloads; the
+    others register tasks and cancellations, which the leader picks up. When the
+    leader exits, the next process to take the lock resumes its unfinished tasks.
+    """
+    global _shared, _REGISTRY_EPOCH
+    close_shared_registry()
+    mirror = SharedMirror(
+        registry, _tasks_lock,
+        apply=_apply_remote_locked,
+        resync=_resync_locked,
+        flush=_publish_deferred_locked,
+        take_over=_take_over_unfinished_locked,
+        follow_up=_run_followup,
+        leader_lock=leader_lock,
+        poll_interval=SHARED_POLL_INTERVAL,
+    )
+    with _tasks_lock:
+        _shared = mirror
+        mirror.load_locked()
+        _REGISTRY_EPOCH = registry.epoch
+    mirror.start()
+
+
+def close_shared_registry() -> None:
+    """Stop syncing, give up leadership and close the shared registry (registered with atexit)."""
+    global _shared
+    mirror = _shared
+    if mirror is None:
+        return
+    mirror.stop()
+    with _tasks_lock:
+        mirror.close_locked()
+        _shared = None
+
+
+def is_leader() -> bool:
+    """True when this process runs downloads and scheduled jobs (always, unless WEB_WORKERS > 1)."""
+    return _shared is None or _shared.leading
+
+
+def _take_over_unfinished_locked() -> list[str]:
+    """Re-queue the previous leader's active tasks like init_task_store() does; returns the IDs to submit.
+
+    One shared write: a busy registry (RegistryBusyError) leaves everything for the next attempt.
+    """
+    if not _shared.writing:
+        with _shared.write_locked():
+            return _take_over_unfinished_locked()
+    resumed = []
+    resumed_playlists: set[str] = set()
+    for task_id, task in list(_tasks.items()):
+        if task.get("status") not in _RESUMABLE_STATUSES:
+            continue
+        if task.get("parent_id") in resumed_playlists:
+            _remove_task_locked(task_id)
+            continue
+        cleared = {**_LIVE_PROGRESS_CLEARED, "queue_position": None}
+        if task.get("cancelled"):
+            _apply_task_changes_locked(task_id, {**cleared, "status": "cancelled", "error": "Cancelled by user"})
+            continue
+        _apply_task_changes_locked(task_id, {**cleared, "status": "queued", "waiting_for": None})
+        resumed.append(task_id)
+        if task.get("playlist"):
+            resumed_playlists.add(task_id)
+    _prune_completed_tasks()
+    return resumed
+
+
+def _run_followup(kind: str, value) -> None:
+    """Do work another process's change left for the leader (SharedMirror follow_up callback)."""
+    if kind == "bandwidth":
+        _set_bandwidth_policy(value)
+        return
+    with _tasks_lock:
+        task = _tasks.get(value)
+        queued = task is not None and task.get("status") == "queued"
+        task = {**task, "task_id": value} if queued else None
+    if task is None:
+        return
+    if kind == "cancel":
+        _finish_queued_cancel(value)
+    elif not task.get("cancelled"):
+        try:
+            _submit_task(task)
+        except QueueShutDownError:
+            pass
+
+
+# Task IDs that got a queue_position at the last refresh. Guarded by _tasks_lock.
+_queue_positioned: set[str] = set()
+
+
+def refresh_queue_positions() -> None:
+    """Copy backlog positions into queued tasks as ``queue_position`` (DownloadQueue on_change hook)."""
+    queue = _download_queue
+    if queue is None:
+        return
+    global _queue_positioned
+    with _tasks_lock:
+        positions = queue.positions()
+        # Only tasks in the backlog now or at the last refresh can have a position to set or clear.
+        for tid in _queue_positioned | positions.keys():
+            if tid in _tasks:
+                _apply_task_changes_locked(tid, {"queue_position": positions.get(tid)})
+        _queue_positioned = set(positions)
+
+
 def has_active_tasks() -> bool:
     """Return True if any task is currently downloading or updating."""
     with _tasks_lock:
@@ -55,8 +589,257 @@ def has_active_tasks() -> bool:
             for t in _tasks.values()
         )
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
 DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "/config/media")
 MEDIA_SUBDIR = os.environ.get("MEDIA_SUBDIR", "youtube_downloads")
+# Worker pool size: how many yt-dlp/ffmpeg pipelines may run at once; the rest wait as "queued".
+MAX_CONCURRENT_DOWNLOADS = max(1, _env_int("MAX_CONCURRENT_DOWNLOADS", 2))
+# Parallelism inside one download: fragments fetched at once per stream (video/audio),
+# capped for all running downloads together by MAX_CONNECTIONS.
+CONCURRENT_FRAGMENTS = max(1, _env_int("CONCURRENT_FRAGMENTS", 4))
+MAX_CONNECTIONS = max(1, _env_int("MAX_CONNECTIONS", 8))
+
+_connection_budget = ConnectionBudget(MAX_CONNECTIONS, slots=MAX_CONCURRENT_DOWNLOADS)
+
+# Each worker thread keeps a warm YoutubeDL per format and reuses it for YDL_MAX_USES tasks.
+YDL_MAX_USES = max(1, _env_int("YDL_MAX_USES", 25))
+_ydl_pool = YoutubeDLPool(max_uses=YDL_MAX_USES)
+
+# Videos of one playlist that may be queued or downloading at the same time; the
+# playlist is read further only as they finish.
+PLAYLIST_CONCURRENCY = max(1, _env_int("PLAYLIST_CONCURRENCY", 2))
+
+# Extractions made for /info, reused by a download of the same video within INFO_CACHE_TTL seconds.
+INFO_CACHE_TTL = max(0, _env_int("INFO_CACHE_TTL", 600))
+INFO_CACHE_MB = max(1, _env_int("INFO_CACHE_MB", 32))
+_info_cache = InfoCache(ttl=INFO_CACHE_TTL, max_bytes=INFO_CACHE_MB * 1024 * 1024)
+
+
+def _describe_media_files() -> dict[str, dict]:
+    return _download_archive.describe(DOWNLOAD_DIR) if _download_archive is not None else {}
+
+
+# Timing summaries of recently finished downloads, aggregated by GET /tasks/stats.
+_task_stats = TaskStats(window=max(1, _env_int("TASK_STATS_WINDOW", 500)))
+
+# Listing behind /files; re-scanned only when the media directory changes.
+_file_index = FileIndex(DOWNLOAD_DIR, describe=_describe_media_files)
+
+
+def _env_setting(name: str, parse, default=None):
+    """Parse an env setting with ``parse``; log and use ``default`` when malformed."""
+    try:
+        return parse(os.environ.get(name, ""))
+    except ValueError as exc:
+        logger.warning("Ignoring %s: %s", name, exc)
+        return default
+
+
+# Shared download rate limit: BANDWIDTH_LIMIT normally, OFF_PEAK_LIMIT inside OFF_PEAK_WINDOW
+# (e.g. "01:00-06:00"). Switched at the window edges by APScheduler jobs; adjustable via /bandwidth.
+_bandwidth_policy = BandwidthPolicy(
+    peak_limit=_env_setting("BANDWIDTH_LIMIT", parse_rate),
+    off_peak_limit=_env_setting("OFF_PEAK_LIMIT", parse_rate),
+    off_peak_window=_env_setting("OFF_PEAK_WINDOW", parse_window),
+)
+_bandwidth = BandwidthGovernor(_bandwidth_policy.limit_at(datetime.now()))
+
+# True while inside the off-peak window; tasks submitted with off_peak wait for it. Guarded by _tasks_lock.
+_off_peak_active = False
+_bandwidth_rescheduler: Callable[[], None] | None = None
+
+
+def init_bandwidth_schedule(reschedule: Callable[[], None]) -> None:
+    """Called by create_app() with the function that (re)creates the off-peak window jobs."""
+    global _bandwidth_rescheduler
+    _bandwidth_rescheduler = reschedule
+
+
+def apply_bandwidth_profile(now: datetime | None = None) -> None:
+    """Switch to the peak or off-peak profile for ``now`` (APScheduler job at the window edges).
+
+    Sets the shared rate limit. Entering the window submits the off-peak-only tasks that
+    were waiting; leaving it takes those that have not started yet back out of the backlog.
+    """
+    global _off_peak_active
+    now = now or datetime.now()
+    off_peak = _bandwidth_policy.is_off_peak(now)
+    _bandwidth.set_rate(_bandwidth_policy.limit_at(now))
+    with _tasks_lock:
+        _off_peak_active = off_peak
+        if not is_leader():
+            return
+        waiting = [
+            {**t, "task_id": tid} for tid, t in _tasks.items()
+            if t.get("status") == "queued" and t.get("off_peak") and not t.get("cancelled")
+        ]
+        if off_peak:
+            for task in waiting:
+                _apply_task_changes_locked(task["task_id"], {"waiting_for": None})
+    for task in waiting:
+        if off_peak and task.get("waiting_for"):
+            try:
+                _submit_task(task)
+            except QueueShutDownError:
+                return
+        elif not off_peak and not task.get("waiting_for") and _download_queue is not None:
+            if _download_queue.remove(task["task_id"]):
+                _update_task(task["task_id"], waiting_for="off_peak")
+
+
+def _parse_client_weights(raw: str) -> dict[str, float]:
+    """Parse CLIENT_WEIGHTS, e.g. "ha-card=2,chrome-ext=1". Malformed entries are ignored."""
+    weights: dict[str, float] = {}
+    for part in raw.split(","):
+        name, sep, value = part.partition("=")
+        try:
+            if sep and name.strip():
+                weights[name.strip().lower()] = float(value)
+        except ValueError:
+            continue
+    return weights
+
+
+# Fair-share weight per client for the download queue; unlisted clients get 1.
+CLIENT_WEIGHTS = _parse_client_weights(os.environ.get("CLIENT_WEIGHTS", ""))
+
+# Scheduling cost per format: audio-only jobs are short and run in their own lane,
+# so a quick mp3 is not stuck behind the same client's long video backlog.
+_FORMAT_COST = {"mp3": 1.0, "mp4": 4.0, "both": 5.0}
+_FORMAT_LANE = {"mp3": "audio", "mp4": "video", "both": "video"}
+
+_CLIENT_RE = re.compile(r"^[a-z0-9][a-z0-9_.-]{0,31}$")
+_MAX_PRIORITY = 10
+
+_PLAYLIST_ERROR = (
+    "Playlist URLs are not allowed. Use a single video URL (e.g. youtube.com/watch?v=...), "
+    'or send "playlist": true to download every video of the playlist.'
+)
+
+
+def _parse_priority(value) -> int | None:
+    """Return an int priority (higher runs first) from "low"/"normal"/"high" or -10..10; None if invalid."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        if value.lower() in PRIORITY_LEVELS:
+            return PRIORITY_LEVELS[value.lower()]
+        try:
+            value = int(value)
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        return None
+    return value if -_MAX_PRIORITY <= value <= _MAX_PRIORITY else None
+
+
+def _client_id(data: dict) -> str:
+    """Client identity for fair scheduling: JSON "client" or X-Client header (e.g. ha-card, chrome-ext)."""
+    raw = data.get("client") or request.headers.get("X-Client") or ""
+    client = str(raw).strip().lower()
+    return client if _CLIENT_RE.match(client) else DEFAULT_CLIENT
+
+
+def _submit_task(task: dict) -> None:
+    """Hand a queued task to the worker pool. Raises QueueShutDownError when shutting down.
+
+    Off-peak-only tasks outside the off-peak window are marked ``waiting_for: "off_peak"``
+    instead; apply_bandwidth_profile() submits them when the window opens. Playlist tasks
+    get their own expander thread (see _run_playlist), not a worker slot. Only the
+    leader runs tasks; in other worker processes this is a no-op (the leader picks
+    the task up from the shared registry).
+    """
+    if not is_leader():
+        return
+    if task.get("off_peak"):
+        with _tasks_lock:
+            if not _off_peak_active:
+                _apply_task_changes_locked(task["task_id"], {"waiting_for": "off_peak"})
+                return
+    if task.get("playlist"):
+        threading.Thread(
+            target=_run_playlist, args=(task["task_id"],), daemon=True, name=f"playlist-{task['task_id'][:8]}",
+        ).start()
+        return
+    format_type = task.get("format", "mp4")
+    _download_queue.submit(  # type: ignore[union-attr]
+        task["task_id"], _run_download, task["task_id"], task["url"], format_type,
+        priority=task.get("priority", 0), client=task.get("client", DEFAULT_CLIENT),
+        cost=_FORMAT_COST.get(format_type, 1.0), lane=_FORMAT_LANE.get(format_type, "default"),
+    )
+
+
+def _completion_fields(info: dict) -> dict:
+    """Task fields for a finished download_video() call."""
+    fields = {"title": info.get("title", ""), "progress": 100}
+    if info.get("already_present"):
+        fields["already_present"] = True
+    return fields
+
+
+def _download(task_id: str, url: str, format_type: str, stop_check, timer: TaskTimer | None = None) -> dict:
+    """Run download_video() for a task within its share of the connection budget; phases go to ``timer``."""
+    streams = 1 if format_type == "mp3" else 2
+    report = _progress_reporter(task_id)
+    timer = timer or TaskTimer()
+
+    def on_progress(fields: dict) -> None:
+        timer.progress(fields)
+        report(fields)
+
+    timer.enter("extracting")
+    with _connection_budget.lease(CONCURRENT_FRAGMENTS * streams) as connections:
+        options = dict(
+            output_dir=DOWNLOAD_DIR, stop_check=stop_check, format_type=format_type, on_progress=on_progress,
+            archive=_download_archive, connections=connections, bandwidth=_bandwidth,
+            info=_info_cache.get(canonical_video_key(url)),
+        )
+        if _process_pool is not None:
+            info = _process_pool.download_video(url, on_usage=timer.add_process_usage, **options)
+        else:
+            info = download_video(url, pool=_ydl_pool, **options)
+    # The archive entry (duration) is written after the file appeared; list it with it.
+    _file_index.invalidate()
+    return info
+
+
+def _task_site(task: dict) -> str:
+    """Site a task downloads from: the yt-dlp extractor of its video key, else the URL host."""
+    key = task.get("video_key") or ""
+    if " " in key:
+        return key.split(" ", 1)[0]
+    host = urlparse(task.get("url", "")).hostname or "unknown"
+    return host.removeprefix("www.")
+
+
+_POSTPROCESS_PHASES = ("merging", "transcoding", "postprocessing")
+
+
+def _record_task_timing(task_id: str, summary: dict) -> None:
+    """Feed a finished run's timing summary into the rolling stats and the metrics."""
+    with _tasks_lock:
+        task = _tasks.get(task_id)
+        if task is None:
+            return
+        status, site, already_present = task["status"], _task_site(task), task.get("already_present")
+        format_type = task.get("format", "mp4")
+        if status == "cancelled" and task.get("cancel"):
+            summary = {**summary, "cancel": task["cancel"]}
+    _task_stats.record(site, format_type, status, summary)
+    if status == TASK_STATUS_COMPLETED and not already_present:
+        timings, usage = summary["timings"], summary["usage"]
+        metrics.DOWNLOAD_SECONDS.labels(format=format_type).observe(timings["total"] - timings.get("updating", 0.0))
+        if usage["bytes"]:
+            metrics.DOWNLOAD_BYTES.labels(format=format_type).observe(usage["bytes"])
+        postprocessing = [timings[phase] for phase in _POSTPROCESS_PHASES if phase in timings]
+        if postprocessing:
+            metrics.POSTPROCESS_SECONDS.labels(format=format_type).observe(sum(postprocessing))
 
 
 def _run_download(task_id: str, url: str, format_type: str = "mp4") -> None:
@@ -64,81 +847,151 @@ def _run_download(task_id: str, url: str, format_type: str = "mp4") -> None:
         with _tasks_lock:
             return _tasks.get(task_id, {}).get("cancelled") is True
 
+    timer = _task_timers[task_id] = TaskTimer()
     try:
-        with _tasks_lock:
-            _tasks[task_id]["status"] = TASK_STATUS_DOWNLOADING
+        _update_task(task_id, status=TASK_STATUS_DOWNLOADING)
         try:
-            formats = ["mp4", "mp3"] if format_type == "both" else [format_type]
-            info = {}
-            for fmt in formats:
-                if stop_check():
-                    raise DownloadCancelledError("Cancelled by user")
-                info = download_video(url, output_dir=DOWNLOAD_DIR, stop_check=stop_check, format_type=fmt)
-            with _tasks_lock:
-                _tasks[task_id]["status"] = TASK_STATUS_COMPLETED
-                _tasks[task_id]["title"] = info.get("title", "")
+            if stop_check():
+                raise DownloadCancelledError("Cancelled by user")
+            info = _download(task_id, url, format_type, stop_check, timer)
+            _finish_task(task_id, TASK_STATUS_COMPLETED, **_completion_fields(info))
         except DownloadCancelledError:
-            with _tasks_lock:
-                _tasks[task_id]["status"] = "cancelled"
-                _tasks[task_id]["error"] = "Cancelled by user"
+            _finish_task(task_id, "cancelled", error="Cancelled by user")
         except Exception as exc:
             error_str = str(exc)
+            # Don't hand a failed extraction to the retry (or the next request for this video).
+            _info_cache.pop(canonical_video_key(url))
             if _updater is not None and _updater.contains_error_signal(error_str):
                 if stop_check():
                     # Task was cancelled between download failure and update start — skip pip install
-                    with _tasks_lock:
-                        _tasks[task_id]["status"] = "cancelled"
-                        _tasks[task_id]["error"] = "Cancelled by user"
+                    _finish_task(task_id, "cancelled", error="Cancelled by user")
                 else:
-                    _trigger_adhoc_update_and_retry(task_id, url, format_type, error_str, stop_check)
+                    _trigger_adhoc_update_and_retry(task_id, url, format_type, error_str, stop_check, timer)
             else:
-                with _tasks_lock:
-                    _tasks[task_id]["status"] = TASK_STATUS_FAILED
-                    _tasks[task_id]["error"] = error_str
+                _finish_task(task_id, TASK_STATUS_FAILED, error=error_str)
     finally:
+        _task_timers.pop(task_id, None)
         with _tasks_lock:
             _prune_completed_tasks()
 
 
 def _trigger_adhoc_update_and_retry(
-    task_id: str, url: str, format_type: str, original_error: str, stop_check
+    task_id: str, url: str, format_type: str, original_error: str, stop_check, timer: TaskTimer
 ) -> None:
     """Called when download fails with a recognized error signal."""
-    with _tasks_lock:
-        _tasks[task_id]["status"] = TASK_STATUS_UPDATING
+    _update_task(task_id, status=TASK_STATUS_UPDATING)
+    timer.enter("updating")
 
     result = _updater.update_if_needed("ad-hoc")  # type: ignore[union-attr]
 
     if not result.success:
-        with _tasks_lock:
-            _tasks[task_id]["status"] = TASK_STATUS_FAILED
-            _tasks[task_id]["error"] = original_error
+        _finish_task(task_id, TASK_STATUS_FAILED, error=original_error)
         return
 
     # Check cancellation before retry — user may have cancelled during pip install
     if stop_check():
-        with _tasks_lock:
-            _tasks[task_id]["status"] = "cancelled"
-            _tasks[task_id]["error"] = "Cancelled by user"
+        _finish_task(task_id, "cancelled", error="Cancelled by user")
         return
 
     # Update succeeded — retry the download
     try:
-        formats = ["mp4", "mp3"] if format_type == "both" else [format_type]
-        info = {}
-        for fmt in formats:
-            info = download_video(url, output_dir=DOWNLOAD_DIR, format_type=fmt, stop_check=stop_check)
-        with _tasks_lock:
-            _tasks[task_id]["status"] = TASK_STATUS_COMPLETED
-            _tasks[task_id]["title"] = info.get("title", "")
+        info = _download(task_id, url, format_type, stop_check, timer)
+        _finish_task(task_id, TASK_STATUS_COMPLETED, **_completion_fields(info))
     except DownloadCancelledError:
-        with _tasks_lock:
-            _tasks[task_id]["status"] = "cancelled"
-            _tasks[task_id]["error"] = "Cancelled by user"
+        _finish_task(task_id, "cancelled", error="Cancelled by user")
     except Exception as retry_exc:
+        _finish_task(task_id, TASK_STATUS_FAILED, error=str(retry_exc))
+
+
+def _playlist_slot_free_locked(task_id: str) -> bool:
+    """Wait until fewer than PLAYLIST_CONCURRENCY children of the playlist are unfinished.
+
+    Must be called with _tasks_lock held. Returns False if the playlist was cancelled (or removed).
+    """
+    while True:
+        parent = _tasks.get(task_id)
+        if parent is None or parent.get("cancelled"):
+            return False
+        unfinished = parent.get("entries_started", 0) - parent.get("entries_done", 0) - parent.get("entries_failed", 0)
+        if unfinished < PLAYLIST_CONCURRENCY:
+            return True
+        _playlist_cond.wait(timeout=5)
+
+
+def _run_playlist(task_id: str) -> None:
+    """Expand a playlist task into child download tasks as its videos are enumerated.
+
+    At most PLAYLIST_CONCURRENCY children are unfinished at a time; the next page of the
+    playlist is only fetched when one finishes. Children are ordinary tasks with a
+    ``parent_id`` (deduplicated against other downloads like any request); the parent
+    counts ``entries_started`` / ``entries_done`` / ``entries_failed`` and, once the
+    playlist size is known, shows their share as ``progress``.
+    """
+    with _tasks_lock:
+        parent = dict(_tasks.get(task_id) or {})
+    if not parent or parent.get("cancelled"):
+        return
+    _update_task(task_id, status=TASK_STATUS_DOWNLOADING, entries_started=0, entries_done=0, entries_failed=0,
+                 progress=0)
+    children: list[str] = []
+    error = None
+    try:
+        with open_playlist(parent["url"]) as (info, videos):
+            _update_task(task_id, title=info.get("title") or None, entries_total=info.get("playlist_count") or None)
+            for index, video in enumerate(videos, 1):
+                child, error = _new_download_task({
+                    "url": video["url"], "format": parent.get("format", "mp4"),
+                    "priority": parent.get("priority", 0), "client": parent.get("client", DEFAULT_CLIENT),
+                    "off_peak": bool(parent.get("off_peak")),
+                })
+                if error is not None:
+                    logger.info("[PLAYLIST] %s: skipping entry %d (%s): %s", task_id, index, video["url"], error)
+                    error = None
+                    continue
+                child.update(parent_id=task_id, playlist_index=index)
+                if video.get("title"):
+                    child["title"] = video["title"]
+                present = _archived_entry(child["video_key"], child["format"])
+                with _tasks_lock:
+                    if not _playlist_slot_free_locked(task_id):
+                        break
+                    existing = _register_download_locked(child, present)
+                    _apply_task_changes_locked(task_id, {"entries_started": _tasks[task_id].get("entries_started", 0) + 1})
+                    if existing is not None or child["status"] == TASK_STATUS_COMPLETED:
+                        # Already on disk, or already being downloaded by another task.
+                        _count_playlist_child_locked(task_id, succeeded=True)
+                        continue
+                children.append(child["task_id"])
+                _submit_task(dict(child))
+    except QueueShutDownError:
+        _update_task(children[-1], status=TASK_STATUS_FAILED, error="Service is shutting down")
+        error = "Service is shutting down"
+    except Exception as exc:
+        logger.warning("[PLAYLIST] %s: reading %s failed: %s", task_id, parent["url"], exc)
+        error = str(exc)
+
+    with _tasks_lock:
+        while not _tasks.get(task_id, {}).get("cancelled") and any(
+            _tasks.get(cid, {}).get("status") in _ACTIVE_STATUSES for cid in children
+        ):
+            _playlist_cond.wait(timeout=5)
+        parent = _tasks.get(task_id)
+        if parent is None:
+            return
+        cancelled = bool(parent.get("cancelled"))
+        unfinished = [cid for cid in children if _tasks.get(cid, {}).get("status") in _ACTIVE_STATUSES]
+    for cid in unfinished:
+        _cancel_task(cid)
+    if cancelled:
+        _finish_task(task_id, "cancelled", error="Cancelled by user")
+    elif error is not None:
+        _finish_task(task_id, TASK_STATUS_FAILED, error=error)
+    else:
         with _tasks_lock:
-            _tasks[task_id]["status"] = TASK_STATUS_FAILED
-            _tasks[task_id]["error"] = str(retry_exc)
+            started = _tasks[task_id].get("entries_started", 0)
+        _finish_task(task_id, TASK_STATUS_COMPLETED, entries_total=started, progress=100)
+    with _tasks_lock:
+        _prune_completed_tasks()
 
 
 def _is_valid_url(url: str) -> bool:
@@ -165,6 +1018,13 @@ def _is_playlist_url(url: str) -> bool:
         return False
 
 
+@api.errorhandler(RegistryBusyError)
+def registry_busy(exc: RegistryBusyError):
+    """WEB_WORKERS > 1: another worker process kept the shared registry locked; nothing was changed."""
+    logger.warning("[SHARED] Registry busy, rejecting %s %s: %s", request.method, request.path, exc)
+    return jsonify({"error": "Task registry is busy, try again"}), 503, {"Retry-After": "1"}
+
+
 @api.route("/health", methods=["GET"])
 def health():
     response: dict = {"status": "healthy"}
@@ -178,71 +1038,593 @@ def health():
     return jsonify(response), 200
 
 
+@api.route("/metrics", methods=["GET"])
+def metrics_exposition():
+    """Prometheus text exposition: queue, task outcomes, download/update timings, lock waits."""
+    with _tasks_lock:
+        counts: dict[str, int] = {}
+        for task in _tasks.values():
+            counts[task.get("status", "")] = counts.get(task.get("status", ""), 0) + 1
+    for status in ("queued", TASK_STATUS_DOWNLOADING, TASK_STATUS_UPDATING, *_TERMINAL_STATUSES):
+        metrics.TASKS.labels(status=status).set(counts.get(status, 0))
+    queue = _download_queue
+    metrics.QUEUE_PENDING.set(queue.pending_count() if queue is not None else 0)
+    metrics.QUEUE_ACTIVE.set(queue.active_count() if queue is not None else 0)
+    metrics.QUEUE_WORKERS.set(queue.max_workers if queue is not None else 0)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @api.route("/config", methods=["GET"])
 def config():
     """Return public config (e.g. media path for Lovelace card)."""
     return jsonify({"media_subdir": MEDIA_SUBDIR}), 200
 
 
-@api.route("/download_video", methods=["POST"])
-def download_video_endpoint():
-    data = request.get_json(silent=True) or {}
-    url = data.get("url", "")
-    format_type = data.get("format", "mp4")
-    if format_type not in ("mp4", "mp3"):
-        format_type = "mp4"
+def _bandwidth_state() -> dict:
+    return {
+        "limit": _bandwidth.rate,
+        "off_peak": _off_peak_active,
+        "peak_limit": _bandwidth_policy.peak_limit,
+        "off_peak_limit": _bandwidth_policy.off_peak_limit,
+        "off_peak_window": format_window(_bandwidth_policy.off_peak_window),
+    }
+
+
+@api.route("/bandwidth", methods=["GET"])
+def bandwidth():
+    """Current shared download limit (bytes/s, null = unlimited) and the peak/off-peak profile."""
+    return jsonify(_bandwidth_state()), 200
+
+
+@api.route("/bandwidth", methods=["PUT"])
+def bandwidth_update():
+    """Change ``peak_limit``, ``off_peak_limit`` (bytes/s or "2M", null = unlimited) and/or
+    ``off_peak_window`` ("HH:MM-HH:MM", null = none). Applies immediately; not persisted."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "expected a JSON object"}), 400
+    changes = {key: data[key] for key in _BANDWIDTH_PARSERS if key in data}
+    try:
+        parsed = _parse_bandwidth_changes(changes)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if _shared is not None:
+        # The other worker processes (and the leader's downloads) follow the same profile.
+        with _tasks_lock, _shared.write_locked():
+            _shared.registry.append({"type": "bandwidth", "changes": changes}, None)
+    _apply_bandwidth_changes(parsed)
+    return jsonify(_bandwidth_state()), 200
+
+
+_BANDWIDTH_PARSERS = {"peak_limit": parse_rate, "off_peak_limit": parse_rate, "off_peak_window": parse_window}
+
+
+def _set_bandwidth_policy(changes: dict) -> None:
+    """Parse and apply /bandwidth fields (raw request values), then switch to the matching profile.
+
+    Raises ValueError (nothing applied) when a value is malformed.
+    """
+    _apply_bandwidth_changes(_parse_bandwidth_changes(changes))
+
+
+def _parse_bandwidth_changes(changes: dict) -> dict:
+    """Parsed /bandwidth fields. Raises ValueError when a value is malformed."""
+    return {key: _BANDWIDTH_PARSERS[key](value) for key, value in changes.items()}
+
+
+def _apply_bandwidth_changes(parsed: dict) -> None:
+    for key, value in parsed.items():
+        setattr(_bandwidth_policy, key, value)
+    if _bandwidth_rescheduler is not None:
+        _bandwidth_rescheduler()
+    else:
+        apply_bandwidth_profile()
+
+
+@api.route("/info", methods=["GET"])
+def info():
+    """Title, duration, thumbnail, uploader etc. of ``?url=`` without downloading.
+
+    ``?formats=1`` adds the available formats. Extractions are cached per video
+    (``cached`` tells whether this one was) and a download of the same video queued
+    within INFO_CACHE_TTL seconds starts from the cached extraction.
+    """
+    url = request.args.get("url", "")
     if not _is_valid_url(url):
         return jsonify({"error": "invalid url"}), 400
     if _is_playlist_url(url):
-        return jsonify({
-            "error": "Playlist URLs are not allowed. Use a single video URL (e.g. youtube.com/watch?v=...).",
-        }), 400
-    task_id = str(uuid.uuid4())
-    with _tasks_lock:
-        _tasks[task_id] = {"task_id": task_id, "status": "queued", "url": url, "cancelled": False, "format": format_type}
-    thread = threading.Thread(target=_run_download, args=(task_id, url, format_type), daemon=True)
-    thread.start()
-    response: dict = {"status": "processing", "task_id": task_id}
+        return jsonify({"error": _PLAYLIST_ERROR}), 400
+    video_key = canonical_video_key(url)
+    extracted = _info_cache.get(video_key)
+    cached = extracted is not None
+    if extracted is None:
+        try:
+            extracted = extract_info(url, pool=_ydl_pool)
+        except Exception as exc:
+            return jsonify({"error": str(exc)}), 422
+        # Only single, finished videos: redirects and live streams are not worth reusing.
+        if extracted.get("_type", "video") == "video" and extracted.get("live_status") not in ("is_live", "is_upcoming"):
+            _info_cache.put(video_key, extracted)
+    with_formats = request.args.get("formats", "").lower() in ("1", "true", "yes")
+    return jsonify({**summarize_info(extracted, formats=with_formats), "video_key": video_key, "cached": cached}), 200
+
+
+# Most items accepted by one POST /download_videos.
+_MAX_BATCH_SIZE = 500
+
+
+def _new_download_task(data: dict, defaults: dict | None = None) -> tuple[dict | None, str | None]:
+    """Validate one download request (url, format, priority, client, off_peak) into a new queued task.
+
+    Returns (task, None) or (None, error message). Fields missing from ``data`` come from ``defaults``.
+    """
+    defaults = defaults or {}
+    url = data.get("url", "")
+    format_type = data.get("format", defaults.get("format", "mp4"))
+    if format_type not in ("mp4", "mp3", "both"):
+        format_type = "mp4"
+    priority = _parse_priority(data.get("priority", defaults.get("priority")))
+    off_peak = data.get("off_peak", defaults.get("off_peak", False))
+    playlist = data.get("playlist", defaults.get("playlist", False))
+    if not isinstance(url, str) or not _is_valid_url(url):
+        return None, "invalid url"
+    if priority is None:
+        return None, "invalid priority (use low/normal/high or an integer -10..10)"
+    if not isinstance(off_peak, bool):
+        return None, "off_peak must be true or false"
+    if not isinstance(playlist, bool):
+        return None, "playlist must be true or false"
+    if _is_playlist_url(url) and not playlist:
+        return None, _PLAYLIST_ERROR
+    task = {
+        "task_id": str(uuid.uuid4()),
+        "status": "queued",
+        "url": url,
+        "video_key": _playlist_key(url) if playlist else canonical_video_key(url),
+        "cancelled": False,
+        "format": format_type,
+        "priority": priority,
+        "client": _client_id({**defaults, **data}),
+    }
+    if off_peak:
+        task["off_peak"] = True
+    if playlist:
+        task["playlist"] = True
+    return task, None
+
+
+def _playlist_key(url: str) -> str:
+    """Dedup key of a playlist request: its list= ID when present, else the canonical URL."""
+    list_id = parse_qs(urlparse(url).query).get("list")
+    return f"playlist {list_id[0]}" if list_id else f"playlist {canonical_video_key(url)}"
+
+
+def _archived_entry(video_key: str, format_type: str) -> dict | None:
+    """Archive entry of a finished download of this video and format in DOWNLOAD_DIR, or None.
+
+    "both" is archived as its mp4 and mp3 files; it counts only while both are there.
+    """
+    if _download_archive is None:
+        return None
+    present = None
+    for fmt in ("mp4", "mp3") if format_type == "both" else (format_type,):
+        entry = _download_archive.lookup(video_key, fmt, DOWNLOAD_DIR)
+        if entry is None:
+            return None
+        present = present or entry
+    return present
+
+
+def _register_download_locked(task: dict, present: dict | None, existing: str | None = None) -> str | None:
+    """Add a validated task unless the same video and format is already in flight. Must be called with _tasks_lock held.
+
+    Returns the ID of the unfinished task to attach to (nothing is added then), else None.
+    ``present`` is the task's _archived_entry(), looked up before taking the lock: a file
+    already in the media directory completes the new task right away.
+    """
+    existing = existing or _inflight_task_locked(task["video_key"], task["format"])
+    if existing is not None:
+        return existing
+    if present is not None:
+        # Already in the media directory: finish right away, no queue slot, no network.
+        task.update(status=TASK_STATUS_COMPLETED, title=present["title"], progress=100, already_present=True)
+    _add_task_locked(task)
+    return None
+
+
+def _download_result(task: dict, existing: str | None) -> dict:
+    """Response body for one accepted download request."""
+    if existing is not None:
+        # Same video and format already requested: attach to that task, nothing new is queued.
+        return {"status": "processing", "task_id": existing, "deduplicated": True}
+    if task["status"] == TASK_STATUS_COMPLETED:
+        return {"status": TASK_STATUS_COMPLETED, "task_id": task["task_id"], "already_present": True}
+    return {"status": "processing", "task_id": task["task_id"]}
+
+
+def _yt_dlp_warning() -> str | None:
     version_info = check_ytdlp_version()
     if version_info.get("is_outdated") and version_info.get("warning"):
-        response["yt_dlp_warning"] = version_info["warning"]
-    return jsonify(response), 202
+        return version_info["warning"]
+    return None
+
+
+def _idempotency_lookup_locked(key: str) -> tuple[str, str, str] | None:
+    """(task_id, video_key, format) recorded for an Idempotency-Key. _tasks_lock (and any shared write) held."""
+    if _shared is not None:
+        return _shared.registry.idempotency_key(key)
+    return _idempotency_keys.get(key)
+
+
+def _idempotency_record_locked(key: str, entry: tuple[str, str, str]) -> None:
+    """Remember the task an Idempotency-Key refers to. _tasks_lock (and any shared write) held."""
+    if _shared is not None:
+        _shared.registry.record_idempotency_key(key, *entry)
+        return
+    _idempotency_keys[key] = entry
+    _idempotency_keys.move_to_end(key)
+    while len(_idempotency_keys) > _MAX_IDEMPOTENCY_KEYS:
+        _idempotency_keys.popitem(last=False)
+
+
+@api.route("/download_video", methods=["POST"])
+def download_video_endpoint():
+    data = request.get_json(silent=True) or {}
+    task, error = _new_download_task(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    idempotency_key = request.headers.get("Idempotency-Key", "").strip()[:255]
+    task_id, video_key, format_type = task["task_id"], task["video_key"], task["format"]
+    present = _archived_entry(video_key, format_type)
+    with _tasks_lock, _shared.write_locked() if _shared is not None else contextlib.nullcontext():
+        # Shared registry: the key is looked up and recorded in the transaction that registers the task.
+        existing = None
+        known = _idempotency_lookup_locked(idempotency_key) if idempotency_key else None
+        if known is not None:
+            known_id, known_video, known_format = known
+            if (known_video, known_format) != (video_key, format_type):
+                return jsonify({"error": "Idempotency-Key was already used for a different download"}), 422
+            existing = known_id if known_id in _tasks else None
+        existing = _register_download_locked(task, present, existing)
+        if existing is None and task["status"] == TASK_STATUS_COMPLETED:
+            _prune_completed_tasks()
+        if idempotency_key:
+            _idempotency_record_locked(idempotency_key, (existing or task_id, video_key, format_type))
+    result = _download_result(task, existing)
+    if existing is not None:
+        return jsonify(result), 202
+    if task["status"] == TASK_STATUS_COMPLETED:
+        return jsonify(result), 200
+    try:
+        _submit_task(dict(task))
+    except QueueShutDownError:
+        _update_task(task_id, status=TASK_STATUS_FAILED, error="Service is shutting down")
+        return jsonify({"error": "Service is shutting down"}), 503
+    warning = _yt_dlp_warning()
+    if warning:
+        result["yt_dlp_warning"] = warning
+    return jsonify(result), 202
+
+
+@api.route("/download_videos", methods=["POST"])
+def download_videos_endpoint():
+    """Queue many downloads at once.
+
+    Body: ``{"items": [{"url", "format"?, "priority"?, "off_peak"?}, ...]}`` (or just the list);
+    top-level ``format`` / ``priority`` / ``off_peak`` / ``client`` are defaults for every item.
+    Each item is validated and deduplicated like POST /download_video; all tasks are added
+    under one registry lock. ``results`` holds one entry per item, in order: the
+    /download_video response for that URL, or ``{"error"}`` for an invalid or playlist URL.
+    """
+    data = request.get_json(silent=True)
+    defaults: dict = {}
+    if isinstance(data, dict):
+        defaults = {key: data[key] for key in ("format", "priority", "off_peak", "playlist", "client") if key in data}
+        data = data.get("items")
+    if not isinstance(data, list) or not data:
+        return jsonify({"error": "expected a non-empty list of {url, format} items"}), 400
+    if len(data) > _MAX_BATCH_SIZE:
+        return jsonify({"error": f"at most {_MAX_BATCH_SIZE} items per request"}), 400
+
+    parsed = [
+        _new_download_task(item, defaults) if isinstance(item, dict) else (None, "expected an object with url")
+        for item in data
+    ]
+    # Disk checks first, so the registry lock is only held for the bookkeeping.
+    present = [_archived_entry(task["video_key"], task["format"]) if task else None for task, _ in parsed]
+    results: list[dict] = []
+    new_tasks: list[dict] = []
+    with _tasks_lock, _shared.write_locked() if _shared is not None else contextlib.nullcontext():
+        for (task, error), archived in zip(parsed, present):
+            if error is not None:
+                results.append({"error": error})
+                continue
+            existing = _register_download_locked(task, archived)
+            results.append(_download_result(task, existing))
+            if existing is None and task["status"] != TASK_STATUS_COMPLETED:
+                new_tasks.append(dict(task))
+        _prune_completed_tasks()
+    for position, task in enumerate(new_tasks):
+        try:
+            _submit_task(task)
+        except QueueShutDownError:
+            for unsubmitted in new_tasks[position:]:
+                _update_task(unsubmitted["task_id"], status=TASK_STATUS_FAILED, error="Service is shutting down")
+            return jsonify({"error": "Service is shutting down"}), 503
+    for index, (item, result) in enumerate(zip(data, results)):
+        result["index"] = index
+        if isinstance(item, dict) and isinstance(item.get("url"), str):
+            result["url"] = item["url"]
+    accepted = sum(1 for r in results if "error" not in r)
+    response: dict = {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
+    warning = _yt_dlp_warning() if new_tasks else None
+    if warning:
+        response["yt_dlp_warning"] = warning
+    return jsonify(response), 202 if accepted else 400
+
+
+def _tasks_etag(revision: int) -> str:
+    return f"{_REGISTRY_EPOCH}-{revision}"
+
+
+def _full_tasks_body() -> tuple[bytes, int]:
+    """Serialized list of all tasks and its revision; re-encoded only when the registry changed."""
+    global _tasks_body_cache
+    with _tasks_lock:
+        revision = _task_feed.revision
+        cached = _tasks_body_cache
+        if cached is not None and cached[0] == revision:
+            return cached[1], revision
+        snapshot = _task_snapshot_locked()
+    body = current_app.json.dumps(snapshot).encode("utf-8")
+    _tasks_body_cache = (revision, body)
+    return body, revision
+
+
+def _tasks_since_locked(since: int) -> dict:
+    """Tasks changed after revision ``since`` plus IDs pruned since then. Must be called with _tasks_lock held.
+
+    Falls back to every task with ``full: true`` when ``since`` is older than the change feed history.
+    """
+    events = _task_feed.since(since)
+    if events is None:
+        return {"full": True, "tasks": _task_snapshot_locked(), "removed": []}
+    touched = list(dict.fromkeys(event["task_id"] for _, event in events))
+    return {
+        "full": False,
+        "tasks": [{**_tasks[tid], "task_id": tid} for tid in touched if tid in _tasks],
+        "removed": [tid for tid in touched if tid not in _tasks],
+    }
 
 
 @api.route("/tasks", methods=["GET"])
 def tasks():
+    """List tasks.
+
+    ``?ids=a,b,c`` returns only those tasks (unknown IDs are skipped). ``?since=<revision>``
+    returns ``{"revision", "full", "tasks", "removed"}`` with only what changed after that
+    revision (take ``revision`` from the response or the ``X-Tasks-Revision`` header).
+    Every response carries an ETag; a matching If-None-Match gets 304 without touching the registry.
+    """
+    since_arg = request.args.get("since")
+    ids_arg = request.args.get("ids")
+    try:
+        since = int(since_arg) if since_arg is not None else None
+    except ValueError:
+        return jsonify({"error": "since must be an integer revision"}), 400
+    wanted = [tid for tid in ids_arg.split(",") if tid] if ids_arg is not None else None
+
+    current = _task_feed.revision
+    if request.if_none_match.contains(_tasks_etag(current)):
+        response = Response(status=304)
+        revision = current
+    elif since is None and wanted is None:
+        body, revision = _full_tasks_body()
+        response = Response(body, mimetype="application/json")
+    else:
+        with _tasks_lock:
+            revision = _task_feed.revision
+            if since is not None:
+                payload: dict | list = {"revision": revision, **_tasks_since_locked(since)}
+            else:
+                payload = [{**_tasks[tid], "task_id": tid} for tid in wanted if tid in _tasks]
+        if since is not None and wanted is not None:
+            payload["tasks"] = [t for t in payload["tasks"] if t["task_id"] in wanted]
+            payload["removed"] = [tid for tid in payload["removed"] if tid in wanted]
+        response = jsonify(payload)
+    response.set_etag(_tasks_etag(revision))
+    response.headers["X-Tasks-Revision"] = str(revision)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+_SSE_KEEPALIVE_S = 15.0  # Comment line keeps proxies from closing idle streams and detects gone clients
+_SSE_RETRY_MS = 3000
+
+
+def _sse_message(event: str, data, revision: int) -> str:
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"id: {revision}\nevent: {event}\ndata: {payload}\n\n"
+
+
+def _sse_resume_events(last_event_id: str | None) -> list[tuple[int, dict]] | None:
+    """Events a client that saw ``Last-Event-ID`` missed; None when it needs a snapshot."""
+    try:
+        revision = int(last_event_id) if last_event_id else None
+    except ValueError:
+        revision = None
+    return _task_feed.since(revision) if revision is not None else None
+
+
+def _sse_snapshot() -> tuple[str, int]:
+    """``snapshot`` message of all tasks and the revision it reflects."""
     with _tasks_lock:
-        snapshot = [{**t, "task_id": tid} for tid, t in _tasks.items()]
-    return jsonify(snapshot), 200
+        snapshot = _task_snapshot_locked()
+        revision = _task_feed.revision
+    return _sse_message("snapshot", snapshot, revision), revision
+
+
+def _sse_change_messages(events: list[tuple[int, dict]]) -> str:
+    """One ``task`` message per change (changed fields only), ``removed`` per pruned task."""
+    return "".join(
+        _sse_message("removed", {"task_id": event["task_id"]}, rev) if event["type"] == "removed"
+        else _sse_message("task", {**event["changes"], "task_id": event["task_id"]}, rev)
+        for rev, event in events
+    )
+
+
+def _sse_stream(last_event_id: str | None, keepalive: float = _SSE_KEEPALIVE_S):
+    """Yield Server-Sent Events for task changes.
+
+    Starts with a ``snapshot`` of all tasks (or, when ``Last-Event-ID`` is still in the
+    change feed, replays only what was missed), then sends one ``task`` event per
+    change with just the changed fields, and ``removed`` when a task is pruned.
+    Between changes the generator sleeps on the feed; nothing is serialized.
+    (app/asgi.py serves the same stream from an event loop.)
+    """
+    events = _sse_resume_events(last_event_id)
+    yield f"retry: {_SSE_RETRY_MS}\n\n"
+    while True:
+        if events is None:
+            message, revision = _sse_snapshot()
+            yield message
+        elif not events:
+            yield ": keepalive\n\n"
+        else:
+            yield _sse_change_messages(events)
+            revision = events[-1][0]
+        events = _task_feed.wait(revision, timeout=keepalive)
+
+
+@api.route("/tasks/stream", methods=["GET"])
+def tasks_stream():
+    """Server-Sent Events stream of task changes (replaces polling /tasks)."""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    return Response(
+        _sse_stream(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api.route("/tasks/stats", methods=["GET"])
+def task_stats():
+    """Phase timings and resource use of the last TASK_STATS_WINDOW finished downloads, per site and format."""
+    return jsonify(_task_stats.snapshot()), 200
 
 
 @api.route("/tasks/<task_id>", methods=["GET"])
 def task_detail(task_id: str):
     with _tasks_lock:
         task = _tasks.get(task_id)
+        task = dict(task) if task is not None else None
     if task is None:
         return jsonify({"error": "task not found"}), 404
     return jsonify(task), 200
 
 
-@api.route("/tasks/<task_id>", methods=["DELETE"])
-def task_cancel(task_id: str):
-    """Request cancellation of a queued or running task. Idempotent."""
+def _cancel_task(task_id: str) -> str | None:
+    """Request cancellation of a task; returns its status when it had already finished, None if unknown."""
     with _tasks_lock:
         task = _tasks.get(task_id)
         if task is None:
-            return jsonify({"error": "task not found"}), 404
-        if task["status"] not in ("queued", TASK_STATUS_DOWNLOADING, TASK_STATUS_UPDATING):
-            return jsonify({"status": task["status"], "message": "Task already finished."}), 200
-        task["cancelled"] = True
+            return None
+        if task["status"] not in _ACTIVE_STATUSES:
+            return task["status"]
+        _apply_task_changes_locked(task_id, {"cancelled": True})
+        was_queued = task["status"] == "queued"
+    if was_queued:
+        _finish_queued_cancel(task_id)
+    return "cancelling"
+
+
+def _finish_queued_cancel(task_id: str) -> None:
+    """Finish a cancelled task that has not started yet.
+
+    A task still in the backlog (or waiting for the off-peak window) never reaches a worker —
+    finish it here instead of waiting. A playlist's expander cancels its children itself.
+    """
+    with _tasks_lock:
+        task = _tasks.get(task_id)
+        if task is None or task["status"] != "queued":
+            return
+        waiting = "waiting_for" in task
+    if waiting or (_download_queue is not None and _download_queue.remove(task_id)):
+        with _tasks_lock:
+            _apply_task_changes_locked(
+                task_id, {"status": "cancelled", "error": "Cancelled by user", "waiting_for": None},
+            )
+            _prune_completed_tasks()
+
+
+@api.route("/tasks/<task_id>", methods=["DELETE"])
+def task_cancel(task_id: str):
+    """Request cancellation of a queued or running task (for a playlist: of all its unfinished videos). Idempotent."""
+    status = _cancel_task(task_id)
+    if status is None:
+        return jsonify({"error": "task not found"}), 404
+    if status != "cancelling":
+        return jsonify({"status": status, "message": "Task already finished."}), 200
     return jsonify({"status": "cancelling", "message": "Cancellation requested."}), 200
 
 
+_FILES_QUERY_ARGS = ("limit", "offset", "sort", "order", "q")
+_FILES_DEFAULT_LIMIT = 100
+_FILES_MAX_LIMIT = 1000
+
+
 @api.route("/files", methods=["GET"])
 def files():
+    """List the files in the media directory.
+
+    Without query arguments: a list of file names (sorted). With any of ``limit``,
+    ``offset``, ``sort`` (name/mtime/size), ``order`` (asc/desc; default desc for
+    mtime and size) or ``q`` (case-insensitive name substring): one page as
+    ``{"total", "offset", "limit", "files": [{"name", "size", "mtime", "duration"}]}``.
+    Responses carry an ETag of the listing; a matching If-None-Match gets 304.
+    """
+    args = request.args
+    sort = args.get("sort", "name")
+    order = args.get("order", "asc" if sort == "name" else "desc")
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+    if order not in ("asc", "desc"):
+        return jsonify({"error": "order must be asc or desc"}), 400
     try:
-        entries = os.listdir(DOWNLOAD_DIR)
-        file_list = [f for f in entries if os.path.isfile(os.path.join(DOWNLOAD_DIR, f))]
-    except FileNotFoundError:
-        file_list = []
-    return jsonify(file_list), 200
+        limit = int(args.get("limit", _FILES_DEFAULT_LIMIT))
+        offset = int(args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({"error": "limit must be positive and offset not negative"}), 400
+    limit = min(limit, _FILES_MAX_LIMIT)
+
+    # The listing's own fingerprint: the same in every worker process and across restarts.
+    fingerprint, listing = _file_index.sorted_files(sort, order == "desc")
+    etag = f"f-{fingerprint}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif not any(name in args for name in _FILES_QUERY_ARGS):
+        response = jsonify([f["name"] for f in listing])
+    else:
+        query = args.get("q", "").casefold()
+        if query:
+            listing = [f for f in listing if query in f["name"].casefold()]
+        response = jsonify({
+            "total": len(listing), "offset": offset, "limit": limit, "files": listing[offset:offset + limit],
+        })
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@api.route("/files/<path:name>", methods=["GET"])
+def file_download(name: str):
+    """Serve one file of the media directory (Range and conditional requests supported).
+
+    ``?download=1`` asks the browser to save it instead of playing it.
+    """
+    response = send_media_file(DOWNLOAD_DIR, name, request, as_attachment=request.args.get("download") == "1")
+    if response is None:
+        return jsonify({"error": "file not found"}), 404
+    return response
@@ -0,0 +1,278 @@
+"""
+ASGI front-end — the API's routes on an event loop, for many concurrent stream clients.
+
+Owns:
+- GET /tasks/stream served natively: each subscriber is a coroutine, not a thread.
+  All subscribers of a loop wait on one FeedWatcher, woken by the change feed.
+- a WSGI bridge for every other route: the Flask app (same blueprint, same
+  create_app()) runs in a thread pool, so blocking work — yt-dlp extraction,
+  registry locks, file reads — never blocks the loop
+- the lifespan protocol (startup/shutdown acknowledged; create_app's atexit hooks
+  still do the cleanup)
+
+Served by uvicorn (WEB_SERVER=asgi in run.sh):
+    uvicorn --factory app.asgi:create_asgi_app --host 0.0.0.0 --port 5000 [--workers N]
+
+Public interface:
+    create_asgi_app(state_path=..., task_db_path=None) -> AsgiApp
+    AsgiApp(flask_app, threads)        (ASGI 3 callable)
+    FeedWatcher(feed, loop).wait(revision, timeout) -> list | None   (async ChangeFeed.wait)
+"""
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from flask import Flask
+
+from . import api as api_module
+from . import create_app
+from .task_events import ChangeFeed
+
+logger = logging.getLogger(__name__)
+
+_STREAM_PATH = "/tasks/stream"
+_STREAM_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+    # Same CORS header create_app() adds to Flask responses.
+    (b"access-control-allow-origin", b"*"),
+]
+
+
+class FeedWatcher:
+    """Wakes the coroutines of one event loop waiting for task changes.
+
+    The feed calls _on_change() from the publishing thread; it schedules at most one
+    wake-up on the loop at a time, however fast progress updates arrive. Waiters
+    then read the events themselves with feed.since(), which never blocks for long.
+    """
+
+    def __init__(self, feed: ChangeFeed, loop: asyncio.AbstractEventLoop) -> None:
+        self._feed = feed
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self._scheduled = False
+        feed.add_listener(self._on_change)
+
+    def close(self) -> None:
+        self._feed.remove_listener(self._on_change)
+
+    async def wait(self, revision: int, timeout: float) -> list[tuple[int, dict]] | None:
+        """Events newer than ``revision`` once there are some, [] after ``timeout``, None to resync."""
+        deadline = self._loop.time() + timeout
+        while True:
+            changed = self._changed
+            events = self._feed.since(revision)
+            if events != []:
+                return events
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return []
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except TimeoutError:
+                return []
+
+    def _on_change(self) -> None:
+        if self._scheduled:
+            return
+        self._scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:  # loop closed
+            pass
+
+    def _wake(self) -> None:
+        self._scheduled = False
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class AsgiApp:
+    """ASGI 3 application: /tasks/stream natively, everything else through the Flask app."""
+
+    def __init__(self, flask_app: Flask, threads: int = 16) -> None:
+        self._wsgi = flask_app.wsgi_app
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi-wsgi")
+        self._watchers: dict[asyncio.AbstractEventLoop, FeedWatcher] = {}
+        self.keepalive = api_module._SSE_KEEPALIVE_S
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == _STREAM_PATH and scope["method"] == "GET":
+                await self._stream(scope, receive, send)
+            else:
+                await self._bridge(scope, receive, send)
+
+    # ------------------------------------------------------------------
+    # /tasks/stream
+    # ------------------------------------------------------------------
+
+    def _watcher(self) -> FeedWatcher:
+        loop = asyncio.get_running_loop()
+        watcher = self._watchers.get(loop)
+        if watcher is None:
+            watcher = self._watchers[loop] = FeedWatcher(api_module._task_feed, loop)
+        return watcher
+
+    async def _stream(self, scope, receive, send) -> None:
+        """Same messages as api._sse_stream(); a client disconnect cancels the coroutine."""
+        last_event_id = _header(scope, b"last-event-id") or _query_arg(scope, "last_event_id")
+        watcher = self._watcher()
+        loop = asyncio.get_running_loop()
+        streamer = asyncio.current_task()
+
+        async def watch_disconnect() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            streamer.cancel()
+
+        disconnect = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": _STREAM_HEADERS})
+            await _send_body(send, f"retry: {api_module._SSE_RETRY_MS}\n\n")
+            events = api_module._sse_resume_events(last_event_id)
+            while True:
+                if events is None:
+                    # Takes the registry lock and serializes every task: off the loop.
+                    message, revision = await loop.run_in_executor(self._executor, api_module._sse_snapshot)
+                    await _send_body(send, message)
+                elif not events:
+                    await _send_body(send, ": keepalive\n\n")
+                else:
+                    await _send_body(send, api_module._sse_change_messages(events))
+                    revision = events[-1][0]
+                events = await watcher.wait(revision, self.keepalive)
+        except (asyncio.CancelledError, OSError):
+            pass
+        finally:
+            disconnect.cancel()
+
+    # ------------------------------------------------------------------
+    # WSGI bridge
+    # ------------------------------------------------------------------
+
+    async def _bridge(self, scope, receive, send) -> None:
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._run_wsgi, _environ(scope, bytes(body)), loop, send)
+
+    def _run_wsgi(self, environ: dict, loop: asyncio.AbstractEventLoop, send) -> None:
+        """Run the Flask app on an executor thread; each chunk is sent (and awaited) on the loop."""
+        response_start: dict = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start.update(
+                type="http.response.start",
+                status=int(status.split(" ", 1)[0]),
+                headers=[(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+            )
+
+        def send_sync(message: dict) -> None:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        result = self._wsgi(environ, start_response)
+        try:
+            started = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not started:
+                    send_sync(response_start)
+                    started = True
+                send_sync({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not started:
+                send_sync(response_start)
+            send_sync({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+
+    # ------------------------------------------------------------------
+    # Lifespan
+    # ------------------------------------------------------------------
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for watcher in self._watchers.values():
+                    watcher.close()
+                self._watchers.clear()
+                self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _send_body(send, text: str) -> None:
+    await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+
+def _header(scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _query_arg(scope, name: str) -> str | None:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name)
+    return values[0] if values else None
+
+
+def _environ(scope, body: bytes) -> dict:
+    """WSGI environ (PEP 3333) for an ASGI HTTP scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for key, value in scope["headers"]:
+        name = key.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            name = f"HTTP_{name}"
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def create_asgi_app(state_path: str = "/data/update-state.json", task_db_path: str | None = None) -> AsgiApp:
+    """create_app() wrapped for an ASGI server; WEB_THREADS sizes the pool running the Flask routes."""
+    try:
+        threads = max(1, int(os.environ.get("WEB_THREADS", "16")))
+    except ValueError:
+        threads = 16
+    return AsgiApp(create_app(state_path=state_path, task_db_path=task_db_path), threads=threads)
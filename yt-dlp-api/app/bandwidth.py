@@ -0,0 +1,144 @@
+"""
+Bandwidth governor — one download rate limit shared by all running downloads.
+
+Owns:
+- the token bucket every download's progress hook pays into (bytes/s, None = unlimited)
+- the peak / off-peak profile: a daily off-peak window with its own limit
+  (e.g. unlimited 01:00–06:00, 2 MiB/s otherwise)
+
+APScheduler jobs in create_app() switch profiles at the window edges; the API can
+change the limits and the window at runtime.
+
+Public interface:
+    governor.rate -> int | None
+    governor.set_rate(rate)
+    governor.consume(nbytes, stop_check=None)     (blocks while over the limit)
+    policy.is_off_peak(now) -> bool
+    policy.limit_at(now) -> int | None
+    parse_rate(value) -> int | None               (raises ValueError)
+    parse_window(value) -> (start_min, end_min) | None
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from yt_dlp.utils import parse_bytes
+
+# Longest single sleep in consume(); waiters re-check cancellation and rate changes this often.
+_WAIT_SLICE = 0.25
+# Unused allowance is kept for at most this many seconds of traffic (burst size).
+_BURST_SECONDS = 1.0
+
+_WINDOW_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def parse_rate(value) -> int | None:
+    """Bytes/s from an int or a string like "2M", "500K", "2MB/s"; None/""/0/"unlimited" → None."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"invalid rate: {value!r}")
+    if isinstance(value, (int, float)):
+        if value < 0:
+            raise ValueError(f"invalid rate: {value!r}")
+        return int(value) or None
+    text = str(value).strip()
+    if text.lower() in ("", "0", "unlimited", "none"):
+        return None
+    text = re.sub(r"(?i)(i?b)?(/s)?$", "", text)
+    rate = parse_bytes(text)
+    if rate is None or rate < 0:
+        raise ValueError(f"invalid rate: {value!r}")
+    return rate or None
+
+
+def parse_window(value: str | None) -> tuple[int, int] | None:
+    """(start, end) minutes after midnight from "HH:MM-HH:MM"; empty → None. Windows may cross midnight."""
+    if not value or not str(value).strip():
+        return None
+    match = _WINDOW_RE.match(str(value))
+    if not match:
+        raise ValueError(f"invalid window (use HH:MM-HH:MM): {value!r}")
+    h1, m1, h2, m2 = map(int, match.groups())
+    if h1 > 23 or h2 > 23 or m1 > 59 or m2 > 59 or (h1, m1) == (h2, m2):
+        raise ValueError(f"invalid window (use HH:MM-HH:MM): {value!r}")
+    return h1 * 60 + m1, h2 * 60 + m2
+
+
+def format_window(window: tuple[int, int] | None) -> str | None:
+    if window is None:
+        return None
+    start, end = window
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+
+@dataclass
+class BandwidthPolicy:
+    """Limit outside (``peak_limit``) and inside (``off_peak_limit``) the daily off-peak window."""
+
+    peak_limit: int | None = None
+    off_peak_limit: int | None = None
+    off_peak_window: tuple[int, int] | None = None
+
+    def is_off_peak(self, now: datetime) -> bool:
+        if self.off_peak_window is None:
+            return False
+        start, end = self.off_peak_window
+        minute = now.hour * 60 + now.minute
+        return start <= minute < end if start < end else minute >= start or minute < end
+
+    def limit_at(self, now: datetime) -> int | None:
+        return self.off_peak_limit if self.is_off_peak(now) else self.peak_limit
+
+
+class BandwidthGovernor:
+    """
+    Token bucket shared by all downloads.
+
+    consume() takes the bytes just received and, when the bucket is in debt, blocks
+    the calling download thread until the debt is paid back at ``rate``. Debt is
+    shared, so N concurrent downloads together stay at the limit. Changing the rate
+    wakes all waiters; with no limit consume() returns immediately.
+    """
+
+    def __init__(self, rate: int | None = None) -> None:
+        self._cond = threading.Condition()
+        self._rate = rate
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self) -> int | None:
+        with self._cond:
+            return self._rate
+
+    def set_rate(self, rate: int | None) -> None:
+        with self._cond:
+            self._refill_locked()
+            self._rate = rate
+            self._tokens = min(self._tokens, 0.0) if rate else 0.0
+            self._cond.notify_all()
+
+    def consume(self, nbytes: int, stop_check: Callable[[], bool] | None = None) -> None:
+        """Account for ``nbytes`` received; block while over the limit (returns early if stop_check())."""
+        if self._rate is None or nbytes <= 0:
+            return
+        with self._cond:
+            if self._rate is None:
+                return
+            self._refill_locked()
+            self._tokens -= nbytes
+            while self._rate is not None and self._tokens < 0:
+                if stop_check and stop_check():
+                    return
+                self._cond.wait(min(_WAIT_SLICE, -self._tokens / self._rate))
+                self._refill_locked()
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        if self._rate is not None:
+            self._tokens = min(self._rate * _BURST_SECONDS, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
@@ -0,0 +1,242 @@
+"""
+Download queue — bounded worker pool for download tasks.
+
+Owns:
+- a fixed number of worker threads (started lazily on first submit)
+- the backlog of tasks waiting for a free worker, ordered by FairScheduler
+  (priority first, then weighted fair queuing across clients)
+- shutdown (stop accepting work, drop the backlog, optionally wait for workers)
+
+Public interface:
+    queue.submit(task_id, fn, *args, priority=, client=, cost=, lane=) -> int   (queue position, 1-based)
+    queue.remove(task_id) -> bool                   (drop a task still in the backlog)
+    queue.positions() -> dict[str, int]
+    queue.pending_count() / queue.active_count()
+    queue.shutdown(wait, timeout) -> list[str]      (task IDs dropped from the backlog)
+"""
+import heapq
+import itertools
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_CLIENT = "api"
+
+# Named priorities accepted by the API; plain integers are accepted too (higher runs first).
+PRIORITY_LEVELS = {"low": -1, "normal": 0, "high": 1}
+
+
+class QueueShutDownError(RuntimeError):
+    """Raised when submitting to a queue that has been shut down."""
+
+
+class FairScheduler:
+    """
+    Priority + weighted fair queuing (self-clocked WFQ) over per-client flows.
+
+    Every job belongs to a flow ``(client, lane)``. On push it gets a virtual
+    finish tag ``max(V, last_finish[flow]) + cost / weight(client)`` where V is
+    the tag of the last job handed to a worker. Jobs are served by
+    ``(-priority, finish tag, arrival)``, so a client with a long backlog only
+    delays its own later jobs, a client with weight 2 gets twice the share, and
+    a cheap job in its own lane (e.g. audio-only) is not stuck behind the same
+    client's long video jobs. Not thread-safe — DownloadQueue holds its lock.
+    """
+
+    def __init__(self, weights: dict[str, float] | None = None) -> None:
+        self._weights = dict(weights or {})
+        self._heap: list[tuple] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: dict[tuple[str, str], float] = {}
+        # ordered_ids() result, kept until the heap changes (positions are read on every queue change).
+        self._order: list[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def weight(self, client: str) -> float:
+        return max(self._weights.get(client, 1.0), 0.01)
+
+    def push(self, task_id: str, item, priority: int = 0, client: str = DEFAULT_CLIENT,
+             cost: float = 1.0, lane: str = "default") -> int:
+        """Add a job; returns its 1-based position in serving order (one pass, no sort)."""
+        flow = (client, lane)
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + max(cost, 0.0) / self.weight(client)
+        self._last_finish[flow] = finish
+        key = (-priority, finish, next(self._seq))
+        position = 1 + sum(1 for entry in self._heap if entry[:3] < key)
+        heapq.heappush(self._heap, (*key, task_id, item))
+        self._order = None
+        return position
+
+    def pop(self) -> tuple[str, object]:
+        _, finish, _, task_id, item = heapq.heappop(self._heap)
+        self._order = None
+        self._virtual_time = max(self._virtual_time, finish)
+        # Idle flows restart from V; drop tags that can no longer delay anything.
+        self._last_finish = {f: t for f, t in self._last_finish.items() if t > self._virtual_time}
+        return task_id, item
+
+    def remove(self, task_id: str) -> bool:
+        for i, entry in enumerate(self._heap):
+            if entry[3] == task_id:
+                self._heap.pop(i)
+                heapq.heapify(self._heap)
+                self._order = None
+                return True
+        return False
+
+    def ordered_ids(self) -> list[str]:
+        """Task IDs in the order they will be served (sorted once per change of the heap)."""
+        if self._order is None:
+            self._order = [entry[3] for entry in sorted(self._heap)]
+        return list(self._order)
+
+    def clear(self) -> list[str]:
+        ids = self.ordered_ids()
+        self._heap.clear()
+        self._order = None
+        return ids
+
+
+class DownloadQueue:
+    """
+    Fixed-size worker pool with a fair-scheduled backlog.
+
+    Tasks wait in the backlog until one of ``max_workers`` threads is free, so a
+    burst of submissions never runs more than ``max_workers`` yt-dlp/ffmpeg
+    pipelines at once. ``on_change`` is called (without the queue lock held)
+    whenever the backlog changes, so callers can refresh queue positions.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        on_change: Callable[[], None] | None = None,
+        client_weights: dict[str, float] | None = None,
+    ) -> None:
+        self._max_workers = max(1, int(max_workers))
+        self._on_change = on_change
+        self._cond = threading.Condition()
+        self._backlog = FairScheduler(client_weights)
+        self._active: set[str] = set()
+        self._workers: list[threading.Thread] = []
+        self._shutdown = False
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        task_id: str,
+        fn: Callable,
+        *args,
+        priority: int = 0,
+        client: str = DEFAULT_CLIENT,
+        cost: float = 1.0,
+        lane: str = "default",
+    ) -> int:
+        """Add a task to the backlog and return its 1-based queue position.
+
+        priority: higher runs first; client/cost/lane: see FairScheduler.
+        """
+        with self._cond:
+            if self._shutdown:
+                raise QueueShutDownError("download queue is shut down")
+            position = self._backlog.push(task_id, (fn, args), priority=priority, client=client, cost=cost, lane=lane)
+            self._ensure_workers()
+            self._cond.notify()
+        self._notify_change()
+        return position
+
+    def remove(self, task_id: str) -> bool:
+        """Remove a task that is still waiting in the backlog. Returns False if it already started."""
+        with self._cond:
+            if not self._backlog.remove(task_id):
+                return False
+        self._notify_change()
+        return True
+
+    def positions(self) -> dict[str, int]:
+        """Return {task_id: 1-based position} for every task waiting in the backlog."""
+        with self._cond:
+            return {tid: pos for pos, tid in enumerate(self._backlog.ordered_ids(), start=1)}
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._backlog)
+
+    def active_count(self) -> int:
+        with self._cond:
+            return len(self._active)
+
+    def shutdown(self, wait: bool = True, timeout: float | None = None) -> list[str]:
+        """
+        Stop accepting work and drop the backlog.
+
+        Running tasks are not interrupted; with ``wait=True`` the call blocks until
+        the workers finish their current task (or ``timeout`` seconds elapse).
+        Returns the IDs of tasks dropped from the backlog so callers can mark them.
+        """
+        with self._cond:
+            self._shutdown = True
+            dropped = self._backlog.clear()
+            self._cond.notify_all()
+            workers = list(self._workers)
+        if dropped:
+            self._notify_change()
+        if wait:
+            for worker in workers:
+                worker.join(timeout)
+        return dropped
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _ensure_workers(self) -> None:
+        """Start worker threads up to max_workers. Must be called with _cond held."""
+        while len(self._workers) < self._max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                daemon=True,
+                name=f"download-worker-{len(self._workers) + 1}",
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._backlog and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown:
+                    return
+                task_id, (fn, args) = self._backlog.pop()
+                self._active.add(task_id)
+            self._notify_change()
+            try:
+                fn(*args)
+            except Exception:  # noqa: BLE001 — a failing task must never kill the worker
+                logger.exception("[QUEUE] Task %s raised an unhandled exception", task_id)
+            finally:
+                with self._cond:
+                    self._active.discard(task_id)
+
+    def _notify_change(self) -> None:
+        if self._on_change is None:
+            return
+        try:
+            self._on_change()
+        except Exception:  # noqa: BLE001
+            logger.exception("[QUEUE] on_change callback failed")
@@ -0,0 +1,111 @@
+"""
+File index — in-memory listing of the media directory behind GET /files.
+
+Owns:
+- one os.scandir pass per change of the directory (entry type and stat come from
+  the scan; no per-file isfile/stat round trips on every request)
+- change detection by the directory's mtime, with a re-scan on every call while
+  that mtime is too recent to be trusted (coarse NAS/FAT timestamps)
+- a fingerprint of the listing (hash of every file's name, size, mtime and duration)
+  for ETags: it changes only when the listing does, and every process serving the
+  same directory computes the same one
+- per-order sorted views, built once per listing
+
+Files written in place (no create/rename/delete in the directory) are only seen
+after the next directory change or invalidate(); downloads always end with a
+rename, and the API invalidates the index when a download finishes.
+
+Public interface:
+    index.snapshot() -> (fingerprint, files)          (files sorted by name)
+    index.sorted_files(key, descending) -> (fingerprint, files)
+    index.invalidate()
+
+Each file is ``{"name", "size", "mtime", "duration"}``; ``describe()`` (optional)
+returns extra metadata per file name, e.g. durations from the download archive.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+
+SORT_KEYS = ("name", "mtime", "size")
+
+# A directory mtime this close to "now" may still change within the same timestamp tick.
+_MTIME_TRUST_NS = 2_000_000_000
+
+
+class FileIndex:
+    """Thread-safe, lazily refreshed index of the regular files directly in ``directory``."""
+
+    def __init__(self, directory: str, describe: Callable[[], dict[str, dict]] | None = None) -> None:
+        self._directory = directory
+        self._describe = describe
+        self._lock = threading.Lock()
+        self._stamp: int | None = None  # directory mtime_ns the listing is known to match
+        self._files: list[dict] = []
+        self._fingerprint = self._fingerprint_of(self._files)
+        self._views: dict[tuple[str, bool], list[dict]] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stamp = None
+
+    def snapshot(self) -> tuple[str, list[dict]]:
+        return self.sorted_files("name", False)
+
+    def sorted_files(self, key: str, descending: bool) -> tuple[str, list[dict]]:
+        """The listing ordered by ``key`` (one of SORT_KEYS; ties by name). Callers must not mutate it."""
+        with self._lock:
+            self._refresh_locked()
+            view = self._views.get((key, descending))
+            if view is None:
+                view = sorted(self._files, key=lambda f: f["name"], reverse=descending)
+                if key != "name":
+                    view.sort(key=lambda f: f[key], reverse=descending)
+                self._views[(key, descending)] = view
+            return self._fingerprint, view
+
+    def _refresh_locked(self) -> None:
+        try:
+            mtime_ns = os.stat(self._directory).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if mtime_ns is not None and mtime_ns == self._stamp:
+            return
+        files = self._scan() if mtime_ns is not None else []
+        if files != self._files:
+            self._files = files
+            self._views = {}
+            self._fingerprint = self._fingerprint_of(files)
+        recent = mtime_ns is None or time.time_ns() - mtime_ns < _MTIME_TRUST_NS
+        self._stamp = None if recent else mtime_ns
+
+    @staticmethod
+    def _fingerprint_of(files: list[dict]) -> str:
+        data = json.dumps([[f["name"], f["size"], f["mtime"], f["duration"]] for f in files]).encode()
+        return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+    def _scan(self) -> list[dict]:
+        described = self._describe() if self._describe is not None else {}
+        files = []
+        try:
+            with os.scandir(self._directory) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue  # removed while scanning
+                    files.append({
+                        "name": entry.name,
+                        "size": st.st_size,
+                        "mtime": st.st_mtime,
+                        "duration": described.get(entry.name, {}).get("duration"),
+                    })
+        except OSError:
+            return []
+        files.sort(key=lambda f: f["name"])
+        return files
@@ -0,0 +1,82 @@
+"""
+File response — serve one file of the media directory with conditional and Range support.
+
+Owns:
+- resolving a requested name inside the media directory (no ``..``, absolute
+  paths or symlinks pointing out of it)
+- ETag / Last-Modified validators and 304 / 412 / 206 / 416 handling (werkzeug's
+  make_conditional)
+- handing the open file to the WSGI server's ``wsgi.file_wrapper`` (gunicorn sends
+  it with os.sendfile, never through Python buffers) when the body is the rest of
+  the file from some offset: whole files and open-ended ranges (``bytes=N-``, what
+  players send when seeking). Closed ranges, and servers without a file wrapper,
+  get werkzeug's chunked reader, which also seeks to the start of the range first.
+
+Public interface:
+    send_media_file(directory, name, request, as_attachment=False) -> Response | None
+        (None: no such regular file inside ``directory``)
+"""
+import mimetypes
+import os
+
+from flask import Request, Response
+from werkzeug.security import safe_join
+from werkzeug.wsgi import FileWrapper, wrap_file
+
+_BLOCK_SIZE = 256 * 1024
+
+
+class _FileResponse(Response):
+    """Response streaming an open file; open-ended ranges stay with the server's file wrapper."""
+
+    def __init__(self, file, environ: dict, size: int, **kwargs) -> None:
+        self._file = file
+        self._size = size
+        self._server_wrapper = environ.get("wsgi.file_wrapper") is not None
+        super().__init__(wrap_file(environ, file, _BLOCK_SIZE), direct_passthrough=True, **kwargs)
+
+    def _wrap_range_response(self, start: int, length: int) -> None:
+        if self.status_code != 206:
+            return
+        if self._server_wrapper and start + length == self._size:
+            # The server's wrapper sends from the current offset to the end of the file.
+            self._file.seek(start)
+            return
+        # werkzeug's own wrapper is seekable, so the range reader skips to ``start`` instead of reading up to it.
+        self.response = FileWrapper(self._file, _BLOCK_SIZE)
+        super()._wrap_range_response(start, length)
+
+
+def _resolve(directory: str, name: str) -> str | None:
+    path = safe_join(directory, name)
+    if path is None:
+        return None
+    root = os.path.realpath(directory)
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+        return None
+    return real
+
+
+def send_media_file(directory: str, name: str, request: Request, as_attachment: bool = False) -> Response | None:
+    path = _resolve(directory, name)
+    if path is None:
+        return None
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return None
+    try:
+        st = os.fstat(file.fileno())
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = _FileResponse(file, request.environ, st.st_size, mimetype=mimetype)
+        response.content_length = st.st_size
+        response.last_modified = int(st.st_mtime)
+        response.set_etag(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+        response.cache_control.no_cache = True
+        if as_attachment:
+            response.headers.set("Content-Disposition", "attachment", filename=os.path.basename(path))
+        return response.make_conditional(request, accept_ranges=True, complete_length=st.st_size)
+    except BaseException:
+        file.close()
+        raise
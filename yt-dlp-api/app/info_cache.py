@@ -0,0 +1,88 @@
+"""
+Info cache — recent yt-dlp extractions, keyed by canonical video key.
+
+Owns:
+- an LRU of extraction results bounded by entry count, total size (bytes of their
+  JSON encoding) and age (TTL)
+
+GET /info fills it; a download queued for the same video shortly after reuses the
+entry instead of extracting again. Entries expire well before the stream URLs in
+them do.
+
+Public interface:
+    cache.get(key) -> dict | None       (None when missing or expired)
+    cache.put(key, info)                (too-large entries are not cached)
+    cache.pop(key)
+    cache.stats -> dict
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 600.0
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class InfoCache:
+    """Thread-safe LRU with a TTL and a byte budget. Cached dicts are shared; callers must not mutate them."""
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self._ttl = ttl
+        self._max_entries = max(1, max_entries)
+        self._max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        # key → (info, size in bytes, expiry on the monotonic clock); oldest use first.
+        self._entries: OrderedDict[str, tuple[dict, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._drop_locked(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: str, info: dict) -> None:
+        size = len(json.dumps(info, default=str))
+        with self._lock:
+            self._drop_locked(key)
+            if self._ttl <= 0 or size > self._max_bytes:
+                return
+            self._entries[key] = (info, size, time.monotonic() + self._ttl)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._drop_locked(next(iter(self._entries)))
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._drop_locked(key)
+
+    def _drop_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
@@ -0,0 +1,275 @@
+"""
+Metrics — Prometheus text exposition without a client library.
+
+Owns:
+- the process-wide metric registry and every metric in it (module-level objects,
+  like prometheus_client; the modules that measure something import them)
+- counters, gauges and histograms, each optionally labelled
+- TimedLock: a drop-in threading.Lock that observes how long acquirers waited
+
+Public interface:
+    render() -> str                               (text format 0.0.4, served by GET /metrics)
+    counter.labels(**labels).inc(amount=1)
+    gauge.set(value) / gauge.labels(**labels).set(value)
+    histogram.labels(**labels).observe(value) / histogram.time()
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a lock hand-over to a multi-hour download.
+_LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+_SECONDS_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+_BYTES_BUCKETS = tuple(float(2 ** n) for n in range(20, 36, 2))  # 1 MiB … 32 GiB
+
+_registry: list["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(pairs: tuple[tuple[str, str], ...]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple[str, ...], object] = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            children = list(self._children.items())
+        lines = []
+        for key, child in children:
+            lines.extend(child.samples(self.name, tuple(zip(self.labelnames, key))))
+        return lines
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class _Value:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = float(value)
+
+    @property
+    def value(self) -> float:
+        with self._lock:
+            return self._value
+
+    def samples(self, name: str, labels) -> list[str]:
+        return [f"{name}{_label_text(labels)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count. Unlabelled counters are used directly (``counter.inc()``)."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Current value. The API sets the queue and registry gauges when /metrics is scraped."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name: str, labels) -> list[str]:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self._buckets, counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_label_text(labels + (('le', _format_value(bound)),))} {cumulative}")
+        lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_label_text(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution in cumulative buckets (upper bounds, +Inf added)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = _SECONDS_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self._buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class TimedLock:
+    """threading.Lock that records the time each acquire() waited in ``histogram``.
+
+    Uncontended acquires are counted as zero wait without reading the clock.
+    Usable as the lock of a threading.Condition.
+    """
+
+    def __init__(self, histogram: Histogram) -> None:
+        self._lock = threading.Lock()
+        self._wait = histogram.labels()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self._wait.observe(0.0)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        self._wait.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc) -> None:
+        self._lock.release()
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics of this service --------------------------------------------------------------
+
+QUEUE_PENDING = Gauge("ytdlp_queue_pending", "Downloads waiting in the backlog for a worker.")
+QUEUE_ACTIVE = Gauge("ytdlp_queue_active_workers", "Workers currently running a download.")
+QUEUE_WORKERS = Gauge("ytdlp_queue_max_workers", "Size of the download worker pool.")
+TASKS = Gauge("ytdlp_tasks", "Tasks in the registry by status.", ("status",))
+TASKS_FINISHED = Counter("ytdlp_tasks_finished_total", "Tasks that reached a terminal state.", ("status",))
+DOWNLOAD_SECONDS = Histogram(
+    "ytdlp_download_duration_seconds", "Wall time of a download, from worker start to the final file.", ("format",),
+)
+DOWNLOAD_BYTES = Histogram(
+    "ytdlp_download_bytes", "Bytes received per finished download.", ("format",), buckets=_BYTES_BUCKETS,
+)
+POSTPROCESS_SECONDS = Histogram(
+    "ytdlp_postprocess_duration_seconds", "Time spent in ffmpeg (merge, mp3 extraction) per download.", ("format",),
+)
+CANCEL_LATENCY_SECONDS = Histogram(
+    "ytdlp_cancel_latency_seconds", "Time from a cancel request to the task reaching 'cancelled', by the phase it was in.",
+    ("phase",), buckets=_LATENCY_BUCKETS + (10.0, 30.0),
+)
+VERSION_CHECK_SECONDS = Histogram(
+    "ytdlp_version_check_duration_seconds", "Latency of the latest-release lookup on GitHub.", ("outcome",),
+    buckets=_LATENCY_BUCKETS + (10.0,),
+)
+UPDATE_SECONDS = Histogram(
+    "ytdlp_update_duration_seconds", "Duration of pip install -U yt-dlp runs.", ("reason", "outcome"),
+)
+UPDATES = Counter("ytdlp_updates_total", "yt-dlp update attempts by reason and outcome.", ("reason", "outcome"))
+DOWNLOAD_WORKER_EXITS = Counter(
+    "ytdlp_download_worker_exits_total",
+    "Download child processes replaced (DOWNLOAD_EXECUTOR=process), by reason: max_tasks, rss, cancelled, crashed.",
+    ("reason",),
+)
+TASKS_LOCK_WAIT_SECONDS = Histogram(
+    "ytdlp_tasks_lock_wait_seconds", "Time spent waiting to acquire the task registry lock.", buckets=_LATENCY_BUCKETS,
+)
+SHARED_REGISTRY_BUSY = Counter(
+    "ytdlp_shared_registry_busy_total",
+    "Shared task registry writes (WEB_WORKERS > 1) that gave up waiting for another worker process.",
+)
@@ -0,0 +1,91 @@
+"""
+Process lock — an exclusive advisory lock on a file, held by at most one process on the host.
+
+Owns:
+- the lock file and, while the lock is held, its open descriptor (fcntl.flock);
+  the OS releases the lock when the holding process exits or dies
+
+Used for leader election between WSGI worker processes and by the updater, so two
+processes never run pip at the same time. Without fcntl (Windows dev machines), or
+when the lock file cannot be created (read-only or missing data directory), the lock
+only guards the current process, which is enough for single-process serving.
+
+Public interface:
+    lock = FileLock(path)
+    lock.acquire(blocking=False) -> bool
+    lock.release()
+    lock.held -> bool         (held by this object)
+    lock.locked() -> bool     (held by anyone)
+"""
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """flock()-based lock on ``path``. Thread-safe; not reentrant."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._guard = threading.Lock()
+        self._fd: int | None = None
+        self._held = False
+        self._warned = False
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    def acquire(self, blocking: bool = False) -> bool:
+        with self._guard:
+            if self._held:
+                return False
+            fd = self._open()
+            if fd is not None and fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except OSError:
+                    os.close(fd)
+                    return False
+            self._fd, self._held = fd, True
+            return True
+
+    def _open(self) -> int | None:
+        """Descriptor of the lock file; None (process-local locking) when it cannot be created."""
+        try:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            return os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as exc:
+            if not self._warned:
+                self._warned = True
+                logger.warning("[LOCK] Cannot open %s, locking within this process only: %s", self._path, exc)
+            return None
+
+    def release(self) -> None:
+        with self._guard:
+            fd, self._fd, self._held = self._fd, None, False
+        if fd is not None:
+            # Closing the descriptor drops the flock.
+            os.close(fd)
+
+    def locked(self) -> bool:
+        """True while this or any other process holds the lock."""
+        if self._held:
+            return True
+        if not self.acquire():
+            return True
+        self.release()
+        return False
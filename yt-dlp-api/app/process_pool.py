@@ -0,0 +1,362 @@
+"""
+Download process pool — runs each download in a child process instead of a worker thread.
+
+Owns:
+- one child process per download worker thread, started lazily (spawn) and kept
+  warm between tasks: yt-dlp imports and the child's own YoutubeDLPool stay loaded
+- the pipe protocol between a worker thread and its child: the request goes down,
+  progress fields, bandwidth requests and the result come back
+- hard cancellation: the child leads its own process group, so killing the group
+  also stops ffmpeg and the JS runtime it started; the child reports the partial
+  files of its download as it goes, and they are removed after the kill
+- recycling: a child is replaced after ``max_tasks`` downloads, or when its RSS
+  after a download exceeds ``max_rss``; one that died is replaced on the next task
+
+Extraction, signature solving and postprocessing run outside the API process, so
+they neither hold its GIL nor leave leaked memory behind. The API process keeps
+the task registry, the connection budget and the shared bandwidth governor: the
+child pays for received bytes by asking the worker thread, in batches.
+
+Public interface:
+    pool = DownloadProcessPool(max_tasks=50, max_rss=512 * 2**20)
+    pool.download_video(url, ..., stop_check, on_progress, on_usage) -> dict   (as yt_dlp_manager.download_video)
+    pool.stats() -> dict
+    pool.shutdown()
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import yt_dlp
+
+from .bandwidth import BandwidthGovernor
+from .metrics import DOWNLOAD_WORKER_EXITS
+from .yt_dlp_manager import DownloadArchive, DownloadCancelledError, PartialFiles
+
+try:
+    import resource
+except ImportError:  # Windows dev machines
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting worker thread looks at stop_check (bounds hard-cancel latency).
+CANCEL_POLL_INTERVAL = 0.1
+# Bytes a child accumulates before asking the API process's bandwidth governor for them.
+_METER_BATCH = 256 * 1024
+# Seconds a recycled child gets to exit on its own before it is killed.
+_STOP_TIMEOUT = 5.0
+# Fields of the info dict the API uses; the full yt-dlp dict is large and not always picklable.
+_RESULT_KEYS = ("id", "title", "duration", "ext", "filepath", "filepaths", "already_present", "webpage_url")
+
+_DEFAULT_TARGET = "app.yt_dlp_manager:download_video"
+
+
+class WorkerCrashedError(Exception):
+    """The child process running a download exited without a result (e.g. killed for memory)."""
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.process.BaseProcess
+    conn: object
+    tasks: int = 0
+
+
+class DownloadProcessPool:
+    """Child processes for the download worker threads; at most one per thread."""
+
+    def __init__(self, max_tasks: int = 50, max_rss: int | None = None, target: str = _DEFAULT_TARGET) -> None:
+        self._max_tasks = max(1, max_tasks)
+        self._max_rss = max_rss
+        # "module:function" the child calls; tests point it at a fake.
+        self._target = target
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._workers: dict[int, _Worker] = {}
+        self._closed = False
+        self._started = 0
+        self._exits: dict[str, int] = {}
+
+    def stats(self) -> dict:
+        """``{"workers", "started", "exits": {reason: count}}`` (reasons as in DOWNLOAD_WORKER_EXITS)."""
+        with self._lock:
+            return {"workers": len(self._workers), "started": self._started, "exits": dict(self._exits)}
+
+    def download_video(
+        self,
+        url: str,
+        output_dir: str = "/config/media",
+        timeout: int = 1800,
+        stop_check: Callable[[], bool] | None = None,
+        format_type: str = "mp4",
+        on_progress: Callable[[dict], None] | None = None,
+        archive: DownloadArchive | None = None,
+        connections: int = 1,
+        bandwidth: BandwidthGovernor | None = None,
+        info: dict | None = None,
+        on_usage: Callable[[dict], None] | None = None,
+    ) -> dict:
+        """download_video() in this thread's child process; blocks until it finished.
+
+        Cancelling (stop_check) kills the child and everything it started, removes the
+        download's partial files and raises DownloadCancelledError within
+        CANCEL_POLL_INTERVAL. ``on_usage`` receives the child's ``{"cpu_seconds", "rss"}``
+        for the download.
+        """
+        request = {
+            "url": url, "output_dir": output_dir, "timeout": timeout, "format_type": format_type,
+            "progress": on_progress is not None, "archive": archive.path if archive is not None else None,
+            "connections": connections, "metered": bandwidth is not None, "info": info,
+        }
+        partial_files = PartialFiles()
+        worker = self._checkout()
+        try:
+            try:
+                worker.conn.send(("download", request))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # A cached extraction that does not pickle: the child extracts again.
+                worker.conn.send(("download", {**request, "info": None}))
+        except (OSError, ValueError):
+            self._discard(worker, "crashed")
+            raise WorkerCrashedError("Download worker exited unexpectedly")
+        while True:
+            if stop_check and stop_check():
+                _drain_partial_files(worker, partial_files)
+                self._discard(worker, "cancelled")
+                partial_files.remove()
+                raise DownloadCancelledError("Cancelled by user")
+            try:
+                if not worker.conn.poll(CANCEL_POLL_INTERVAL):
+                    continue
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                code = self._discard(worker, "crashed")
+                raise WorkerCrashedError(f"Download worker exited unexpectedly (exit code {code})")
+            kind = message[0]
+            if kind == "progress":
+                if on_progress is not None:
+                    on_progress(message[1])
+            elif kind == "partial":
+                partial_files.add(message[1])
+            elif kind == "consume":
+                bandwidth.consume(message[1], stop_check)  # type: ignore[union-attr]
+                worker.conn.send(("granted",))
+            else:
+                break
+
+        usage = message[-1]
+        if on_usage is not None:
+            on_usage(usage)
+        worker.tasks += 1
+        if worker.tasks >= self._max_tasks:
+            self._recycle(worker, "max_tasks", usage)
+        elif self._max_rss and (usage.get("rss") or 0) > self._max_rss:
+            self._recycle(worker, "rss", usage)
+        if kind == "done":
+            return message[1]
+        error_kind, text = message[1], message[2]
+        if error_kind == "cancelled":
+            raise DownloadCancelledError(text)
+        if error_kind == "download":
+            raise yt_dlp.utils.DownloadError(text)
+        raise RuntimeError(text)
+
+    def shutdown(self) -> None:
+        """Kill every child (running downloads end as WorkerCrashedError); no new ones start."""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            _kill(worker)
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _checkout(self) -> _Worker:
+        key = threading.get_ident()
+        with self._lock:
+            if self._closed:
+                raise WorkerCrashedError("Download process pool is shut down")
+            worker = self._workers.get(key)
+            if worker is not None and worker.process.is_alive():
+                return worker
+            if worker is not None:
+                del self._workers[key]
+                self._count_exit_locked("crashed")
+                _kill(worker)  # Reaps it, and whatever it left in its process group.
+            parent_conn, child_conn = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main, args=(child_conn, self._target), daemon=True,
+                name=f"download-{threading.current_thread().name}",
+            )
+            process.start()
+            child_conn.close()
+            worker = self._workers[key] = _Worker(process, parent_conn)
+            self._started += 1
+        logger.debug("[PROCESS-POOL] Started download worker pid %d", process.pid)
+        return worker
+
+    def _count_exit_locked(self, reason: str) -> None:
+        self._exits[reason] = self._exits.get(reason, 0) + 1
+        DOWNLOAD_WORKER_EXITS.labels(reason=reason).inc()
+
+    def _release(self, worker: _Worker, reason: str) -> None:
+        with self._lock:
+            for key, current in list(self._workers.items()):
+                if current is worker:
+                    del self._workers[key]
+            self._count_exit_locked(reason)
+
+    def _discard(self, worker: _Worker, reason: str) -> int | None:
+        self._release(worker, reason)
+        return _kill(worker)
+
+    def _recycle(self, worker: _Worker, reason: str, usage: dict) -> None:
+        self._release(worker, reason)
+        logger.info(
+            "[PROCESS-POOL] Recycling download worker pid %d (%s) after %d task(s), RSS %s",
+            worker.process.pid, reason, worker.tasks, usage.get("rss"),
+        )
+        try:
+            worker.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        # Off the worker thread: the next task should not wait for the old child to exit.
+        threading.Thread(target=_stop, args=(worker,), daemon=True, name="download-worker-stop").start()
+
+
+def _drain_partial_files(worker: _Worker, partial_files: PartialFiles) -> None:
+    """Take the partial files the child reported but the worker thread has not read yet."""
+    try:
+        while worker.conn.poll(0):
+            message = worker.conn.recv()
+            if message[0] == "partial":
+                partial_files.add(message[1])
+    except (EOFError, OSError):
+        pass
+
+
+def _stop(worker: _Worker) -> None:
+    worker.process.join(_STOP_TIMEOUT)
+    if worker.process.is_alive():
+        _kill(worker)
+    else:
+        worker.conn.close()
+
+
+def _kill(worker: _Worker) -> int | None:
+    """SIGKILL the child's process group (ffmpeg, node included); returns its exit code."""
+    pid = worker.process.pid
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        # Not (yet) a group leader, already gone, or no process groups (Windows).
+        worker.process.kill()
+    worker.process.join(_STOP_TIMEOUT)
+    worker.conn.close()
+    return worker.process.exitcode
+
+
+# ----------------------------------------------------------------------
+# Child process
+# ----------------------------------------------------------------------
+
+
+class _MeteredBandwidth:
+    """BandwidthGovernor stand-in in the child: batches received bytes and waits for the API process to grant them."""
+
+    def __init__(self, conn, send_lock: threading.Lock) -> None:
+        self._conn = conn
+        self._send_lock = send_lock
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def consume(self, nbytes: int, stop_check: Callable[[], bool] | None = None) -> None:
+        with self._lock:
+            self._pending += max(0, nbytes)
+            if self._pending < _METER_BATCH:
+                return
+            pending, self._pending = self._pending, 0
+            with self._send_lock:
+                self._conn.send(("consume", pending))
+            # Only this object reads from the pipe while a download runs.
+            self._conn.recv()
+
+
+def _process_cpu() -> float:
+    """CPU seconds of this process and its finished children (ffmpeg)."""
+    if resource is None:
+        return time.process_time()
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _exit_with_parent(parent: int) -> None:
+    while os.getppid() == parent:
+        time.sleep(1.0)
+    os.killpg(0, signal.SIGKILL)
+
+
+def _worker_main(conn, target: str) -> None:
+    """Child process: serve download requests until told to stop or the pipe closes."""
+    # Own process group, so a hard cancel reaches everything this child starts.
+    if hasattr(os, "setsid"):
+        os.setsid()
+        # multiprocessing terminates daemon children on exit, and the API process may die
+        # without a word: either way take ffmpeg & co. along instead of leaving them running.
+        signal.signal(signal.SIGTERM, lambda signum, frame: os.killpg(0, signal.SIGKILL))
+        threading.Thread(target=_exit_with_parent, args=(os.getppid(),), daemon=True).start()
+    from .task_timing import _rss_bytes
+    from .yt_dlp_manager import YoutubeDLPool
+
+    module, _, name = target.partition(":")
+    download = getattr(importlib.import_module(module), name)
+    pool = YoutubeDLPool()
+    archives: dict[str, DownloadArchive] = {}
+    send_lock = threading.Lock()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] != "download":
+            return
+        request = message[1]
+        cpu_started = _process_cpu()
+        archive = None
+        if request["archive"]:
+            archive = archives.get(request["archive"])
+            if archive is None:
+                archive = archives[request["archive"]] = DownloadArchive(request["archive"])
+        try:
+            info = download(
+                request["url"], output_dir=request["output_dir"], timeout=request["timeout"],
+                format_type=request["format_type"],
+                on_progress=(lambda fields: send(("progress", fields))) if request["progress"] else None,
+                archive=archive, connections=request["connections"],
+                bandwidth=_MeteredBandwidth(conn, send_lock) if request["metered"] else None,
+                pool=pool, info=request["info"],
+                partial_files=PartialFiles(on_add=lambda pattern: send(("partial", pattern))),
+            )
+            outcome: tuple = ("done", {key: info[key] for key in _RESULT_KEYS if key in (info or {})})
+        except DownloadCancelledError as exc:
+            outcome = ("failed", "cancelled", str(exc))
+        except Exception as exc:
+            kind = "download" if type(exc).__name__ == "DownloadError" else "error"
+            outcome = ("failed", kind, str(exc))
+        send((*outcome, {"cpu_seconds": round(_process_cpu() - cpu_started, 3), "rss": _rss_bytes()}))
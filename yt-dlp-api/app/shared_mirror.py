@@ -0,0 +1,203 @@
+"""
+Shared mirror — this process's side of the shared task registry (WEB_WORKERS > 1).
+
+Owns:
+- the SharedRegistry and the background thread that applies other processes' changes
+  to this process's registry (the mirror) every ``poll_interval`` seconds
+- leadership: only the process holding the leader lock runs downloads; the thread keeps
+  trying to take the lock, so another process takes over when the leader exits
+- write-behind: task changes without urgent fields (progress ticks, queue positions) are
+  merged per task and logged by the thread, or earlier with this process's next write.
+  Same idea as the task store; the mirror has them immediately
+- the work other processes' changes leave for the leader (follow-ups such as starting a
+  task registered elsewhere), done by the thread after it released the registry lock
+
+The registry itself stays in api.py. It passes its lock (held around every call named
+``*_locked``, and taken here around the registry calls) and callbacks:
+    apply(revision, event), resync(revision, tasks)   mirror other processes' changes
+    flush(task_id, delta)                             log one deferred change (inside a write)
+    take_over() -> [task_id]                          re-queue the old leader's tasks in one write (lock held)
+    follow_up(kind, value)                            do one follow-up (lock not held)
+
+A write waits at most the registry's timeout for other processes (RegistryBusyError,
+counted in ytdlp_shared_registry_busy_total); callers decide whether to defer the change
+or fail the request.
+
+Public interface:
+    mirror = SharedMirror(registry, lock, apply=..., resync=..., flush=..., take_over=..., follow_up=...,
+                          leader_lock=None, poll_interval=0.1)
+    mirror.load_locked(); mirror.start()
+    mirror.registry, mirror.leading, mirror.writing
+    with mirror.write_locked(): mirror.registry.append(event, task)
+    mirror.defer_locked(task_id, delta); mirror.follow_up_locked(kind, value)
+    mirror.stop(); mirror.close_locked()
+"""
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+from . import metrics
+from .process_lock import FileLock
+from .shared_registry import RegistryBusyError, SharedRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 0.1
+# How often the leader drops old log entries and idempotency keys.
+DEFAULT_TRIM_INTERVAL = 60.0
+
+
+class SharedMirror:
+    """Keeps one process's task registry in step with the other worker processes and elects the leader."""
+
+    def __init__(
+        self,
+        registry: SharedRegistry,
+        lock,
+        apply: Callable[[int, dict], None],
+        resync: Callable[[int, list[dict]], None],
+        flush: Callable[[str, dict], None],
+        take_over: Callable[[], list[str]],
+        follow_up: Callable[[str, object], None],
+        leader_lock: FileLock | None = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        trim_interval: float = DEFAULT_TRIM_INTERVAL,
+    ) -> None:
+        self._registry = registry
+        self._lock = lock
+        self._apply, self._resync = apply, resync
+        self._flush, self._take_over, self._follow_up = flush, take_over, follow_up
+        self._leader_lock = leader_lock
+        self._poll_interval = poll_interval
+        self._trim_interval = trim_interval
+        self._leading = False
+        # Guarded by the registry lock.
+        self._pending: dict[str, dict] = {}
+        self._followups: list[tuple[str, object]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def registry(self) -> SharedRegistry:
+        return self._registry
+
+    @property
+    def leading(self) -> bool:
+        """True when this process runs the downloads (it holds the leader lock, or there is none)."""
+        return self._leading
+
+    @property
+    def writing(self) -> bool:
+        return self._registry.writing
+
+    def load_locked(self) -> None:
+        """Replace the mirror with the shared registry's tasks and follow its changes from then on."""
+        self._registry.attach(self._apply, self._resync)
+        self._resync(*self._registry.snapshot())
+
+    def start(self) -> None:
+        """Try to lead, then start the sync thread."""
+        self._try_to_lead()
+        self._thread = threading.Thread(target=self._sync_loop, daemon=True, name="shared-registry")
+        self._thread.start()
+
+    @contextlib.contextmanager
+    def write_locked(self):
+        """Registry write that catches up and logs the deferred changes first.
+
+        Raises RegistryBusyError (nothing written or applied) when another process held the
+        database for longer than the registry's timeout.
+        """
+        try:
+            with self._registry.write():
+                pending, self._pending = self._pending, {}
+                for task_id, delta in pending.items():
+                    self._flush(task_id, delta)
+                yield
+        except RegistryBusyError:
+            # Only an outermost write waits for the database, before anything ran.
+            metrics.SHARED_REGISTRY_BUSY.inc()
+            raise
+
+    def defer_locked(self, task_id: str, delta: dict) -> None:
+        """Leave a task change for the sync thread (or this process's next write) to log."""
+        self._pending.setdefault(task_id, {}).update(delta)
+
+    def follow_up_locked(self, kind: str, value) -> None:
+        """Queue work for the sync thread to do once the registry lock is released."""
+        self._followups.append((kind, value))
+
+    def stop(self) -> None:
+        """Stop the sync thread and give up leadership. Call close_locked() next."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        if self._leader_lock is not None:
+            self._leader_lock.release()
+        self._leading = False
+
+    def close_locked(self) -> None:
+        """Log the deferred changes (best effort) and close the registry."""
+        if self._pending:
+            try:
+                with self.write_locked():
+                    pass
+            except sqlite3.Error as exc:
+                logger.warning("[SHARED] Could not log the last task changes: %s", exc)
+        self._pending.clear()
+        self._registry.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _try_to_lead(self) -> None:
+        """Become the leader if no other process is: take over the unfinished tasks and start them."""
+        if self._leading:
+            return
+        # Still held when a busy registry put off the take-over.
+        lock = self._leader_lock
+        if lock is not None and not lock.held and not lock.acquire():
+            return
+        with self._lock:
+            try:
+                resumed = self._take_over()
+            except RegistryBusyError as exc:
+                logger.warning("[SHARED] Registry busy, taking over the downloads later: %s", exc)
+                return
+            self._leading = True
+            # The take-over starts every queued task, including those already waiting here.
+            self._followups.clear()
+        for task_id in resumed:
+            self._follow_up("submit", task_id)
+        logger.info("[SHARED] Leading the worker processes (pid %d); resumed %d task(s)", os.getpid(), len(resumed))
+
+    def _sync_loop(self) -> None:
+        """Poll other processes' changes; the leader also does the work they leave and trims the log."""
+        trimmed = time.monotonic()
+        while not self._stop.wait(self._poll_interval):
+            try:
+                with self._lock:
+                    if self._stop.is_set():
+                        return
+                    if self._pending:
+                        with self.write_locked():  # also catches up, like poll()
+                            pass
+                    else:
+                        self._registry.poll()
+                    followups, self._followups = self._followups, []
+                self._try_to_lead()
+                for kind, value in followups:
+                    self._follow_up(kind, value)
+                if self._leading and time.monotonic() - trimmed > self._trim_interval:
+                    with self._lock:
+                        if not self._stop.is_set():
+                            self._registry.trim()
+                    trimmed = time.monotonic()
+            except sqlite3.Error as exc:
+                logger.warning("[SHARED] Registry sync failed: %s", exc)
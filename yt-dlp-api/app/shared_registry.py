@@ -0,0 +1,253 @@
+"""
+Shared registry — the task registry of several worker processes, kept in one SQLite file.
+
+Owns:
+- the change log (table task_changes): every registry change of every process, in
+  one global order; its row id is the registry revision all processes report
+- the current version of every task (table tasks, the same table TaskStore uses, so
+  single- and multi-process serving read each other's history)
+- the registry epoch shared by all processes (ETags stay valid across workers)
+- the Idempotency-Key → task table, so a retried POST finds its task on any worker
+
+Each process keeps its in-memory registry as a mirror. Reads never touch the database.
+A write opens an IMMEDIATE transaction, first applies what other processes appended
+since this process last looked, then appends its own change. Writes of all processes
+are serialized by SQLite, so every mirror applies the same changes in the same order.
+A write waits at most ``timeout`` seconds for another process's transaction, then
+raises RegistryBusyError (the callers hold the registry lock meanwhile).
+poll() picks up other processes' changes between writes. A process that fell behind
+the trimmed part of the log reloads the whole registry from the tasks table.
+
+Callers serialize all calls (SharedMirror holds the API's _tasks_lock around them).
+
+Public interface:
+    registry = SharedRegistry(path, keep=10000, keep_keys=1000, timeout=1.0)
+    registry.attach(apply, resync)          apply(revision, event); resync(revision, tasks)
+    registry.snapshot() -> (revision, tasks)
+    with registry.write(): registry.append(event, task) -> revision   (RegistryBusyError)
+    with registry.write(): registry.idempotency_key(key) -> (task_id, video_key, format) | None
+    with registry.write(): registry.record_idempotency_key(key, task_id, video_key, format)
+    registry.poll()
+    registry.trim(); registry.close()
+"""
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Callable
+
+from .task_store import _SCHEMA as _TASKS_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# Changes kept in the log; a process further behind reloads the registry instead.
+DEFAULT_KEEP = 10000
+# Idempotency keys kept; the least recently used are forgotten first.
+DEFAULT_KEEP_KEYS = 1000
+# Seconds a write waits for other processes' transactions; each holds the lock for one change.
+DEFAULT_TIMEOUT = 1.0
+
+_SCHEMA = (
+    _TASKS_SCHEMA,
+    """
+    CREATE TABLE IF NOT EXISTS task_changes (
+        revision INTEGER PRIMARY KEY AUTOINCREMENT,
+        origin   TEXT NOT NULL,
+        event    TEXT NOT NULL
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS registry_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key       TEXT PRIMARY KEY,
+        task_id   TEXT NOT NULL,
+        video_key TEXT NOT NULL,
+        format    TEXT NOT NULL,
+        used_at   REAL NOT NULL
+    )
+    """,
+)
+
+
+class RegistryBusyError(sqlite3.OperationalError):
+    """Another process kept the registry locked for longer than the write timeout; nothing was written."""
+
+
+class SharedRegistry:
+    """SQLite change log + task table shared by the worker processes of one host."""
+
+    def __init__(
+        self, path: str, keep: int = DEFAULT_KEEP, keep_keys: int = DEFAULT_KEEP_KEYS, timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self._path = path
+        self._keep = keep
+        self._keep_keys = keep_keys
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO registry_meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],),
+        )
+        self.epoch: str = self._conn.execute("SELECT value FROM registry_meta WHERE key = 'epoch'").fetchone()[0]
+        self.origin = uuid.uuid4().hex[:12]
+        self._revision = 0
+        self._depth = 0
+        self._apply: Callable[[int, dict], None] = lambda revision, event: None
+        self._resync: Callable[[int, list[dict]], None] = lambda revision, tasks: None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def revision(self) -> int:
+        """Last revision applied to this process's mirror."""
+        return self._revision
+
+    @property
+    def writing(self) -> bool:
+        return self._depth > 0
+
+    def attach(self, apply: Callable[[int, dict], None], resync: Callable[[int, list[dict]], None]) -> None:
+        """Set the callbacks that mirror other processes' changes: one event, or a full reload."""
+        self._apply, self._resync = apply, resync
+
+    def snapshot(self) -> tuple[int, list[dict]]:
+        """(revision, every task in insertion order); the mirror continues from that revision."""
+        self._conn.execute("BEGIN")
+        try:
+            revision = self._last_revision()
+            rows = self._conn.execute("SELECT task_id, data FROM tasks ORDER BY rowid").fetchall()
+        finally:
+            self._conn.execute("COMMIT")
+        tasks = []
+        for task_id, data in rows:
+            try:
+                task = json.loads(data)
+            except json.JSONDecodeError:
+                logger.warning("[SHARED] Skipping unreadable task %s", task_id)
+                continue
+            task["task_id"] = task_id
+            tasks.append(task)
+        self._revision = revision
+        return revision, tasks
+
+    @contextlib.contextmanager
+    def write(self):
+        """Transaction for local changes; catches up on other processes first. Nested uses join the outer one."""
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as exc:
+            raise RegistryBusyError(str(exc)) from exc
+        self._depth = 1
+        try:
+            self._catch_up()
+            yield
+        except BaseException:
+            self._depth = 0
+            self._conn.execute("ROLLBACK")
+            raise
+        self._depth = 0
+        try:
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            # The mirror already has the change; other processes will not see it.
+            logger.error("[SHARED] Failed to commit registry change: %s", exc)
+            self._conn.execute("ROLLBACK")
+
+    def append(self, event: dict, task: dict | None) -> int:
+        """Log one change and store the task's new version (None: it was removed). Only inside write()."""
+        if not self._depth:
+            raise RuntimeError("append() outside of write()")
+        cursor = self._conn.execute(
+            "INSERT INTO task_changes (origin, event) VALUES (?, ?)", (self.origin, json.dumps(event)),
+        )
+        task_id = event.get("task_id")
+        if task_id is not None:
+            if task is None:
+                self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            else:
+                self._conn.execute(
+                    "INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (task_id, json.dumps(task), time.time()),
+                )
+        self._revision = cursor.lastrowid
+        return self._revision
+
+    def idempotency_key(self, key: str) -> tuple[str, str, str] | None:
+        """(task_id, video_key, format) recorded for an Idempotency-Key, or None. Only inside write()."""
+        if not self._depth:
+            raise RuntimeError("idempotency_key() outside of write()")
+        row = self._conn.execute(
+            "SELECT task_id, video_key, format FROM idempotency_keys WHERE key = ?", (key,),
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def record_idempotency_key(self, key: str, task_id: str, video_key: str, format_type: str) -> None:
+        """Remember (or refresh) which task an Idempotency-Key created. Only inside write()."""
+        if not self._depth:
+            raise RuntimeError("record_idempotency_key() outside of write()")
+        self._conn.execute(
+            "INSERT INTO idempotency_keys (key, task_id, video_key, format, used_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET task_id = excluded.task_id, used_at = excluded.used_at",
+            (key, task_id, video_key, format_type, time.time()),
+        )
+
+    def poll(self) -> None:
+        """Apply what other processes appended since the last write or poll."""
+        if self._depth:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._catch_up()
+        finally:
+            self._conn.execute("COMMIT")
+
+    def trim(self) -> None:
+        """Drop log entries older than the last ``keep`` changes and all but the ``keep_keys`` newest idempotency keys."""
+        self._conn.execute("DELETE FROM task_changes WHERE revision <= ?", (self._last_revision() - self._keep,))
+        self._conn.execute(
+            "DELETE FROM idempotency_keys WHERE key NOT IN "
+            "(SELECT key FROM idempotency_keys ORDER BY used_at DESC LIMIT ?)", (self._keep_keys,),
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _last_revision(self) -> int:
+        row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'task_changes'").fetchone()
+        return row[0] if row else 0
+
+    def _catch_up(self) -> None:
+        rows = self._conn.execute(
+            "SELECT revision, event FROM task_changes WHERE revision > ? ORDER BY revision", (self._revision,),
+        ).fetchall()
+        if rows and rows[0][0] != self._revision + 1:
+            logger.warning("[SHARED] Fell behind the change log (at %d, oldest %d); reloading", self._revision, rows[0][0])
+            rows = self._conn.execute("SELECT task_id, data FROM tasks ORDER BY rowid").fetchall()
+            self._revision = self._last_revision()
+            self._resync(self._revision, [{**json.loads(data), "task_id": task_id} for task_id, data in rows])
+            return
+        for revision, event in rows:
+            self._revision = revision
+            self._apply(revision, json.loads(event))
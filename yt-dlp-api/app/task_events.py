@@ -0,0 +1,103 @@
+"""
+Task change feed — revisioned log of task registry changes.
+
+Owns:
+- the registry revision (monotonically increasing, one step per change)
+- a bounded ring buffer of recent change events
+- blocking waits so stream subscribers (SSE) wake only when something changed
+- change listeners, for subscribers that cannot block a thread (the ASGI event loop)
+
+Public interface:
+    feed.publish(event, revision=None) -> int       (new revision; given by the shared registry in multi-process mode)
+    feed.rebase(revision)                           (drop history after the registry was reloaded)
+    feed.revision -> int
+    feed.since(revision) -> list | None             (None: revision too old, resync needed)
+    feed.wait(revision, timeout) -> list | None     (blocks until newer events or timeout)
+    feed.add_listener(callback) / feed.remove_listener(callback)   (callback() after every change)
+
+Events are plain dicts:
+    {"type": "task", "task_id": ..., "changes": {...}}   (created/updated; None = field removed)
+    {"type": "removed", "task_id": ...}
+"""
+import threading
+from collections import deque
+from typing import Callable
+
+DEFAULT_HISTORY = 1000
+
+
+class ChangeFeed:
+    """
+    Thread-safe change log with a condition variable.
+
+    Subscribers keep the last revision they have seen and ask for everything
+    after it; idle subscribers sleep in wait() and cost no CPU. If a subscriber
+    falls more than ``history`` events behind, since()/wait() return None and
+    it must resync from a full snapshot.
+    """
+
+    def __init__(self, history: int = DEFAULT_HISTORY) -> None:
+        self._cond = threading.Condition()
+        self._events: deque[tuple[int, dict]] = deque(maxlen=history)
+        self._revision = 0
+        self._listeners: list[Callable[[], None]] = []
+
+    @property
+    def revision(self) -> int:
+        with self._cond:
+            return self._revision
+
+    def publish(self, event: dict, revision: int | None = None) -> int:
+        """Append an event, wake all waiting subscribers and return the new revision.
+
+        ``revision`` (higher than the current one) is used instead of the next number
+        when revisions are assigned elsewhere; gaps only make old subscribers resync.
+        """
+        with self._cond:
+            self._revision = revision if revision is not None and revision > self._revision else self._revision + 1
+            self._events.append((self._revision, event))
+            self._cond.notify_all()
+            revision = self._revision
+        self._notify_listeners()
+        return revision
+
+    def rebase(self, revision: int) -> None:
+        """Continue at ``revision`` with an empty history: every subscriber resyncs from a snapshot."""
+        with self._cond:
+            self._events.clear()
+            self._revision = revision
+            self._cond.notify_all()
+        self._notify_listeners()
+
+    def since(self, revision: int) -> list[tuple[int, dict]] | None:
+        """Return [(revision, event), ...] newer than ``revision``; None if already evicted."""
+        with self._cond:
+            return self._since_locked(revision)
+
+    def wait(self, revision: int, timeout: float | None = None) -> list[tuple[int, dict]] | None:
+        """Block until there are events newer than ``revision`` (or timeout → empty list)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._revision > revision, timeout=timeout)
+            return self._since_locked(revision)
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call ``callback()`` after every change. It runs on the publishing thread, often
+        with the registry lock held, so it must only hand the wake-up over (e.g. call_soon_threadsafe)."""
+        with self._cond:
+            self._listeners = [*self._listeners, callback]
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        with self._cond:
+            self._listeners = [cb for cb in self._listeners if cb is not callback]
+
+    def _notify_listeners(self) -> None:
+        for callback in self._listeners:
+            callback()
+
+    def _since_locked(self, revision: int) -> list[tuple[int, dict]] | None:
+        if revision == self._revision:
+            return []
+        # Unknown (e.g. from before a restart) or already evicted → caller must resync.
+        if revision < 0 or revision > self._revision or not self._events or self._events[0][0] > revision + 1:
+            return None
+        return [(rev, event) for rev, event in self._events if rev > revision]
@@ -0,0 +1,172 @@
+"""
+Task store — durable SQLite (WAL) copy of the task registry.
+
+Owns:
+- the SQLite database file (default /data/tasks.db) and its single writer connection
+- write-behind batching: put()/delete() only record the latest version of a task in
+  memory; a background thread commits everything pending in one transaction
+- load() for restoring tasks on startup
+
+The in-memory registry in api.py stays the source of truth for reads; this store
+is only written to. Progress ticks are coalesced per task and committed at most
+every ``flush_interval`` seconds; ``urgent=True`` (status changes) wakes the
+writer immediately so terminal states reach disk within milliseconds.
+
+Public interface:
+    store.load() -> list[dict]          (tasks in insertion order)
+    store.put(task, urgent=False)
+    store.delete(task_id)
+    store.flush()
+    store.close()
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id    TEXT PRIMARY KEY,
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+# Marks a pending delete in the write-behind buffer.
+_DELETED = None
+
+
+class TaskStore:
+    """
+    SQLite-backed task persistence with a write-behind buffer.
+
+    Threading model: callers only touch the in-memory buffer under a condition
+    variable; one daemon thread owns all writes to the connection.
+    """
+
+    def __init__(self, path: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> None:
+        self._path = path
+        self._flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits survive process crashes; only an OS crash can lose the last batch.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending: dict[str, dict | None] = {}
+        self._urgent = False
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True, name="task-store-writer")
+        self._writer.start()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+
+    def load(self) -> list[dict]:
+        """Return all stored tasks in insertion order. Unreadable rows are skipped."""
+        with self._write_lock:
+            rows = self._conn.execute("SELECT task_id, data FROM tasks ORDER BY rowid").fetchall()
+        tasks = []
+        for task_id, data in rows:
+            try:
+                task = json.loads(data)
+            except json.JSONDecodeError:
+                logger.warning("[TASK-STORE] Skipping unreadable task %s", task_id)
+                continue
+            task["task_id"] = task_id
+            tasks.append(task)
+        return tasks
+
+    def put(self, task: dict, urgent: bool = False) -> None:
+        """Schedule a write of ``task`` (a snapshot is taken now). Later puts of the same task replace it."""
+        with self._cond:
+            if self._closed:
+                return
+            self._pending[task["task_id"]] = dict(task)
+            if urgent:
+                self._urgent = True
+                self._cond.notify()
+
+    def delete(self, task_id: str) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._pending[task_id] = _DELETED
+
+    def flush(self) -> None:
+        """Write everything pending now, on the calling thread."""
+        with self._cond:
+            batch, self._pending = self._pending, {}
+            self._urgent = False
+        self._write(batch)
+
+    def close(self) -> None:
+        """Flush pending writes, stop the writer thread and close the database."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._writer.join(timeout=5)
+        self.flush()
+        with self._write_lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self._flush_interval
+                while not self._closed and not self._urgent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                batch, self._pending = self._pending, {}
+                self._urgent = False
+            self._write(batch)
+
+    def _write(self, batch: dict[str, dict | None]) -> None:
+        if not batch:
+            return
+        now = time.time()
+        upserts = [(tid, json.dumps(task), now) for tid, task in batch.items() if task is not _DELETED]
+        deletes = [(tid,) for tid, task in batch.items() if task is _DELETED]
+        try:
+            with self._write_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    if upserts:
+                        self._conn.executemany(
+                            "INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT(task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                            upserts,
+                        )
+                    if deletes:
+                        self._conn.executemany("DELETE FROM tasks WHERE task_id = ?", deletes)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as exc:
+            logger.error("[TASK-STORE] Failed to write %d task(s): %s", len(batch), exc)
@@ -0,0 +1,203 @@
+"""
+Task timing — where a download's time and resources went, per task and over recent tasks.
+
+Owns:
+- TaskTimer: wall time per phase of one task run (extracting, downloading,
+  merging, transcoding, postprocessing, updating), bytes received, throughput,
+  CPU time and the peak RSS seen while it ran
+- TaskStats: rolling aggregates of the last finished tasks, per site and format,
+  including how long cancellation took in each phase
+
+Phases follow the progress fields a download reports: everything before the first
+downloaded byte is extraction (including signature solving), the Merger
+postprocessor is merging, ExtractAudio is transcoding, the other postprocessors
+are postprocessing. The API switches to "updating" around an ad-hoc yt-dlp update.
+
+CPU time is split in two: ``cpu_seconds`` is the worker thread itself (extraction,
+yt-dlp bookkeeping); ``child_cpu_seconds`` is what child processes (ffmpeg, the JS
+runtime) used while the task ran. Child usage and RSS are per process, so they
+include other downloads running at the same time. A download run by the process
+pool reports its child's CPU time and RSS through add_process_usage() instead.
+
+Public interface:
+    timer = TaskTimer(); timer.enter(phase); timer.progress(fields); timer.phase; timer.summary() -> dict
+    timer.add_process_usage({"cpu_seconds", "rss"})
+    stats.record(site, format_type, status, summary); stats.snapshot() -> dict
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows dev machines
+    resource = None
+
+PHASES = ("extracting", "downloading", "merging", "transcoding", "postprocessing", "updating")
+
+_POSTPROCESSOR_PHASES = {"Merger": "merging", "ExtractAudio": "transcoding"}
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def _rss_bytes() -> int | None:
+    """Current resident set size of this process (Linux), else None."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _children_cpu() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class TaskTimer:
+    """Phase stopwatch for one task run. Create and summarize it on the worker thread; progress() is thread-safe."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._cpu_started = time.thread_time()
+        self._children_started = _children_cpu()
+        self._phase: str | None = None
+        self._since = self._started
+        self._durations: dict[str, float] = {}
+        self._bytes = 0
+        self._peak_rss = _rss_bytes()
+        self._process_cpu = 0.0
+
+    @property
+    def phase(self) -> str | None:
+        """Phase the task is in now (None before the first enter())."""
+        with self._lock:
+            return self._phase
+
+    def enter(self, phase: str) -> None:
+        with self._lock:
+            self._enter_locked(phase)
+
+    def progress(self, fields: dict) -> None:
+        """Feed one on_progress update of download_video()."""
+        with self._lock:
+            if fields.get("phase") == "postprocessing":
+                self._enter_locked(_POSTPROCESSOR_PHASES.get(fields.get("postprocessor"), "postprocessing"))
+            elif fields.get("phase") == "downloading":
+                self._enter_locked("downloading")
+                if fields.get("downloaded_bytes") is not None:
+                    self._bytes = fields["downloaded_bytes"]
+            self._sample_rss_locked()
+
+    def add_process_usage(self, usage: dict) -> None:
+        """Account for a download run in a DownloadProcessPool child: its CPU time and RSS."""
+        with self._lock:
+            self._process_cpu += usage.get("cpu_seconds") or 0.0
+            rss = usage.get("rss")
+            if rss is not None and (self._peak_rss is None or rss > self._peak_rss):
+                self._peak_rss = rss
+
+    def _enter_locked(self, phase: str) -> None:
+        now = time.monotonic()
+        if self._phase is not None:
+            self._durations[self._phase] = self._durations.get(self._phase, 0.0) + now - self._since
+        self._phase, self._since = phase, now
+
+    def _sample_rss_locked(self) -> None:
+        rss = _rss_bytes()
+        if rss is not None and (self._peak_rss is None or rss > self._peak_rss):
+            self._peak_rss = rss
+
+    def summary(self) -> dict:
+        """Close the current phase; ``{"timings": {phase: s, "total": s}, "usage": {...}}`` for the task record."""
+        with self._lock:
+            self._enter_locked("done")
+            self._sample_rss_locked()
+            timings = {phase: round(self._durations[phase], 3) for phase in PHASES if phase in self._durations}
+            timings["total"] = round(time.monotonic() - self._started, 3)
+            downloading = self._durations.get("downloading")
+            usage = {
+                "bytes": self._bytes,
+                "throughput": round(self._bytes / downloading) if self._bytes and downloading else None,
+                "cpu_seconds": round(time.thread_time() - self._cpu_started, 3),
+                "child_cpu_seconds": round(_children_cpu() - self._children_started + self._process_cpu, 3),
+                "peak_rss_bytes": self._peak_rss,
+            }
+            return {"timings": timings, "usage": usage}
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def _distribution(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(_percentile(values, 0.5), 3),
+        "p95": round(_percentile(values, 0.95), 3),
+    }
+
+
+class TaskStats:
+    """Rolling window of the last ``window`` task summaries, aggregated on demand."""
+
+    def __init__(self, window: int = 500) -> None:
+        self._lock = threading.Lock()
+        self._records: deque[tuple[str, str, str, dict]] = deque(maxlen=max(1, window))
+
+    def record(self, site: str, format_type: str, status: str, summary: dict) -> None:
+        with self._lock:
+            self._records.append((site, format_type, status, summary))
+
+    def snapshot(self) -> dict:
+        """``{"window", "tasks", "sites": {site: aggregate}, "formats": {format: aggregate}}``.
+
+        A summary may carry ``"cancel": {"phase", "latency"}`` (set by the API for cancelled runs).
+        """
+        with self._lock:
+            records = list(self._records)
+        sites: dict[str, list] = {}
+        formats: dict[str, list] = {}
+        for record in records:
+            sites.setdefault(record[0], []).append(record)
+            formats.setdefault(record[1], []).append(record)
+        return {
+            "window": self._records.maxlen,
+            "tasks": len(records),
+            "sites": {site: self._aggregate(group) for site, group in sorted(sites.items())},
+            "formats": {fmt: self._aggregate(group) for fmt, group in sorted(formats.items())},
+        }
+
+    @staticmethod
+    def _aggregate(records: list) -> dict:
+        statuses: dict[str, int] = {}
+        phases: dict[str, list[float]] = {}
+        usage: dict[str, list[float]] = {}
+        cancels: dict[str, list[float]] = {}
+        for _, _, status, summary in records:
+            statuses[status] = statuses.get(status, 0) + 1
+            for phase, seconds in summary.get("timings", {}).items():
+                phases.setdefault(phase, []).append(seconds)
+            for key in ("throughput", "cpu_seconds", "child_cpu_seconds"):
+                value = summary.get("usage", {}).get(key)
+                if value is not None:
+                    usage.setdefault(key, []).append(value)
+            if summary.get("cancel"):
+                cancels.setdefault(summary["cancel"]["phase"], []).append(summary["cancel"]["latency"])
+        return {
+            "count": len(records),
+            "statuses": statuses,
+            "timings": {phase: _distribution(values) for phase, values in phases.items()},
+            "usage": {key: _distribution(values) for key, values in usage.items()},
+            "cancel_latency": {phase: _distribution(values) for phase, values in cancels.items()},
+        }
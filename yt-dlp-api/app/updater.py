@@ -2,7 +2,8 @@
 Updater module — sole owner of yt-dlp update logic.
 
 Owns:
-- threading.Lock for update concurrency safety
+- threading.Lock for update concurrency safety (plus an optional FileLock shared
+  with the other worker processes when several serve the API)
 - subprocess pip install call (always with timeout=120)
 - /data/update-state.json persistence
 - HA persistent notification on failure
@@ -28,6 +29,9 @@ from datetime import datetime, timezone
 
 import yt_dlp
 
+from .metrics import UPDATE_SECONDS, UPDATES
+from .process_lock import FileLock
+
 logger = logging.getLogger(__name__)
 
 # Error signals that trigger ad-hoc update — owned here, never duplicated elsewhere.
@@ -53,13 +57,17 @@ class Updater:
     Encapsulates all yt-dlp update logic.
 
     Threading model: single threading.Lock prevents concurrent updates.
-    Works correctly only in single-process Flask deployment (threaded=True).
+    With ``lock_path`` a FileLock on that path also keeps other processes (gunicorn
+    workers sharing the state file) from updating at the same time, and the state
+    file is re-read when another process changed it.
     """
 
-    def __init__(self, state_path: str = "/data/update-state.json") -> None:
+    def __init__(self, state_path: str = "/data/update-state.json", lock_path: str | None = None) -> None:
         self._state_path = state_path
         self._lock = threading.Lock()
+        self._process_lock = FileLock(lock_path) if lock_path else None
         self._state: dict = {}
+        self._state_mtime: float | None = None
         self._load_state()
 
     # ------------------------------------------------------------------
@@ -72,9 +80,11 @@ class Updater:
             try:
                 with open(self._state_path, "r", encoding="utf-8") as f:
                     self._state = json.load(f)
+                self._state_mtime = os.path.getmtime(self._state_path)
                 # Recovery: container may have crashed mid-update, leaving stale "updating" state.
                 # /health would permanently show "updating" until the next actual update — reset to "failed".
-                if self._state.get("update_status") == "updating":
+                # Not stale while another worker process holds the update lock.
+                if self._state.get("update_status") == "updating" and not self._locked_elsewhere():
                     logger.warning("[UPDATER] Stale 'updating' state detected on startup — resetting to 'failed'")
                     self._state["update_status"] = "failed"
                     self._save_state()
@@ -106,6 +116,7 @@ class Updater:
                 with os.fdopen(fd, "w", encoding="utf-8") as f:
                     json.dump(self._state, f, indent=2)
                 os.replace(tmp_path, self._state_path)
+                self._state_mtime = os.path.getmtime(self._state_path)
             except Exception:
                 try:
                     os.unlink(tmp_path)
@@ -129,6 +140,7 @@ class Updater:
         A failed update when versions are already in sync is an operational issue,
         not a user-facing service degradation.
         """
+        self._reload_if_changed()
         current = self._state.get("current_version", "")
         latest = self._state.get("latest_version", "")
         update_status = self._state.get("update_status", "ok")
@@ -149,7 +161,7 @@ class Updater:
         acquired = self._lock.acquire(blocking=False)
         if acquired:
             self._lock.release()
-            return False
+            return self._locked_elsewhere()
         return True
 
     def contains_error_signal(self, output: str) -> bool:
@@ -178,7 +190,45 @@ class Updater:
         if not acquired:
             logger.info("[UPDATER] Update already in progress, skipping (reason=%s)", reason)
             return UpdateResult(success=False, error="update already in progress")
+        if self._process_lock is not None and not self._process_lock.acquire():
+            self._lock.release()
+            logger.info("[UPDATER] Update already in progress in another process, skipping (reason=%s)", reason)
+            return UpdateResult(success=False, error="update already in progress")
+
+        started = time.monotonic()
+        try:
+            self._reload_if_changed()
+            result = self._run_update(reason)
+        finally:
+            if self._process_lock is not None:
+                self._process_lock.release()
+            self._lock.release()
+        outcome = "success" if result.success else "failure"
+        UPDATE_SECONDS.labels(reason=reason, outcome=outcome).observe(time.monotonic() - started)
+        UPDATES.labels(reason=reason, outcome=outcome).inc()
+        return result
+
+    def _locked_elsewhere(self) -> bool:
+        """True while another process holds the update lock."""
+        return self._process_lock is not None and not self._process_lock.held and self._process_lock.locked()
 
+    def _reload_if_changed(self) -> None:
+        """Re-read the state file after another process rewrote it (no stale-state recovery)."""
+        try:
+            mtime = os.path.getmtime(self._state_path)
+        except OSError:
+            return
+        if mtime == self._state_mtime:
+            return
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+            self._state_mtime = mtime
+        except (json.JSONDecodeError, OSError) as exc:
+            logger.warning("[UPDATER] Cannot re-read state file (%s), keeping the previous state", exc)
+
+    def _run_update(self, reason: str) -> UpdateResult:
+        """Body of update_if_needed(); called with self._lock held."""
         component = "AUTO-UPDATE" if reason == "scheduled" else "AD-HOC-UPDATE"
         version_before = self._state.get("current_version", "")
 
@@ -242,9 +292,6 @@ class Updater:
             self._send_ha_notification(error_msg, reason)
             return UpdateResult(success=False, version_before=version_before, error=error_msg)
 
-        finally:
-            self._lock.release()
-
     def _send_ha_notification(self, error_type: str, reason: str) -> None:
         """
         Send persistent notification to Home Assistant on update failure.
@@ -1,11 +1,27 @@
+import contextlib
+import copy
+import functools
+import glob
 import json
 import logging
+import os
+import signal
 import sys
+import tempfile
+import threading
+import time
 import urllib.error
+import urllib.parse
 import urllib.request
-from typing import Callable
+from typing import Callable, Iterator
 
 import yt_dlp
+from yt_dlp.extractor import gen_extractor_classes
+from yt_dlp.postprocessor import FFmpegExtractAudioPP
+from yt_dlp.utils import PagedList
+
+from .bandwidth import BandwidthGovernor
+from .metrics import VERSION_CHECK_SECONDS
 
 # Task status constants — single source of truth; never use inline strings in new code paths
 TASK_STATUS_DOWNLOADING = "downloading"
@@ -52,13 +68,19 @@ def check_ytdlp_version(timeout: int = 5) -> dict[str, str | bool | None]:
     is_outdated = False
     warning: str | None = None
 
+    started = time.monotonic()
     try:
         req = urllib.request.Request(
             _YTDLP_GITHUB_API,
             headers={"User-Agent": "ha-yt-dlp/version-check"},
         )
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            data = json.loads(resp.read())
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                data = json.loads(resp.read())
+        except Exception:
+            VERSION_CHECK_SECONDS.labels(outcome="error").observe(time.monotonic() - started)
+            raise
+        VERSION_CHECK_SECONDS.labels(outcome="ok").observe(time.monotonic() - started)
         latest_version = data.get("tag_name", "").lstrip("v")
         if latest_version and _parse_version(local_version) < _parse_version(latest_version):
             is_outdated = True
@@ -80,6 +102,456 @@ def check_ytdlp_version(timeout: int = 5) -> dict[str, str | bool | None]:
     return result
 
 
+# Query parameters that never change which video a URL points to (share/tracking/start time).
+_IGNORED_QUERY_PARAMS = frozenset({"si", "t", "start", "feature", "pp", "fbclid", "gclid", "igshid", "ref"})
+
+
+@functools.lru_cache(maxsize=1)
+def _extractor_classes() -> tuple:
+    """All yt-dlp extractors except the generic fallback, in yt-dlp's matching order."""
+    return tuple(ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic")
+
+
+@functools.lru_cache(maxsize=1024)
+def canonical_video_key(url: str) -> str:
+    """Stable identity of the video behind ``url``, independent of the URL form.
+
+    For URLs a yt-dlp extractor recognizes this is ``"<extractor> <video id>"`` —
+    the same form yt-dlp uses in download archives — so ``youtu.be/X``,
+    ``youtube.com/watch?v=X&t=42`` and ``youtube.com/shorts/X?si=...`` all map to
+    ``"youtube X"``. No network access. Other URLs fall back to the normalized URL
+    (lowercase host, no fragment, tracking parameters dropped, query sorted).
+    """
+    for ie in _extractor_classes():
+        if ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            if video_id:
+                return f"{ie.ie_key().lower()} {video_id}"
+            break
+    parts = urllib.parse.urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in _IGNORED_QUERY_PARAMS and not k.lower().startswith("utm_")
+    )
+    return urllib.parse.urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urllib.parse.urlencode(query), "",
+    ))
+
+
+def archive_id(info: dict) -> str | None:
+    """yt-dlp download-archive ID (``"<extractor> <id>"``) of an extracted info dict."""
+    extractor, video_id = info.get("extractor_key") or info.get("ie_key"), info.get("id")
+    return f"{extractor.lower()} {video_id}" if extractor and video_id else None
+
+
+class DownloadArchive:
+    """Persistent index of finished downloads: (archive ID, format) → file path, size, mtime, title, duration.
+
+    Same idea and IDs as yt-dlp's ``--download-archive``, but it records where the
+    file is, so an entry only counts while that file is still in the media directory
+    with the recorded size. Deleted or changed files are dropped on lookup and on
+    load. Stored as JSON with an atomic write (temp + rename), like the updater state.
+    Re-read when another process (gunicorn worker) rewrote the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._mtime: float | None = None
+        self._load()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @staticmethod
+    def _key(video_key: str, format_type: str) -> str:
+        return f"{video_key} {format_type}"
+
+    def lookup(self, video_key: str, format_type: str, directory: str) -> dict | None:
+        """Entry for a file of this video and format in ``directory``, or None."""
+        key = self._key(video_key, format_type)
+        with self._lock:
+            self._reload_locked()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if os.path.dirname(entry["path"]) == os.path.normpath(directory) and self._is_intact(entry):
+                return dict(entry)
+            del self._entries[key]
+            self._save_locked()
+        return None
+
+    def record(
+        self, video_keys: list[str], format_type: str, filepath: str, title: str = "", duration: float | None = None,
+    ) -> None:
+        """Index ``filepath`` under every key in ``video_keys`` (e.g. archive ID and URL key)."""
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return
+        entry = {"path": os.path.normpath(filepath), "size": st.st_size, "mtime": st.st_mtime, "title": title}
+        if duration is not None:
+            entry["duration"] = duration
+        with self._lock:
+            self._reload_locked()
+            for video_key in dict.fromkeys(k for k in video_keys if k):
+                self._entries[self._key(video_key, format_type)] = entry
+            self._save_locked()
+
+    def describe(self, directory: str) -> dict[str, dict]:
+        """File name → ``{"title", "duration"}`` for the recorded files in ``directory`` (not re-checked)."""
+        directory = os.path.normpath(directory)
+        with self._lock:
+            self._reload_locked()
+            return {
+                os.path.basename(e["path"]): {"title": e.get("title", ""), "duration": e.get("duration")}
+                for e in self._entries.values()
+                if os.path.dirname(e["path"]) == directory
+            }
+
+    @staticmethod
+    def _is_intact(entry: dict) -> bool:
+        try:
+            return os.stat(entry["path"]).st_size == entry["size"]
+        except OSError:
+            return False
+
+    def _reload_locked(self) -> None:
+        try:
+            mtime = os.path.getmtime(self._path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            self._mtime = os.path.getmtime(self._path)
+            with open(self._path, encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, AttributeError) as exc:
+            logging.getLogger(__name__).warning("[ARCHIVE] Ignoring unreadable %s: %s", self._path, exc)
+            return
+        self._entries = {k: e for k, e in entries.items() if isinstance(e, dict) and self._is_intact(e)}
+        if len(self._entries) != len(entries):
+            self._save_locked()
+
+    def _save_locked(self) -> None:
+        directory = os.path.dirname(self._path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": 1, "entries": self._entries}, f)
+                os.replace(tmp_path, self._path)
+                self._mtime = os.path.getmtime(self._path)
+            except Exception:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as exc:
+            logging.getLogger(__name__).error("[ARCHIVE] Failed to save %s: %s", self._path, exc)
+
+
+class ConnectionBudget:
+    """Process-wide cap on the HTTP connections that running downloads may open.
+
+    Each download takes a lease for the connections it would like (fragments ×
+    streams) and gets at most an equal share of what is left per free worker slot,
+    never less than one. A download started while another is running therefore
+    still finds its share, instead of the first one holding the whole budget.
+    """
+
+    def __init__(self, total: int, slots: int = 1) -> None:
+        self._total = max(1, total)
+        self._slots = max(1, slots)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._leases = 0
+
+    @property
+    def in_use(self) -> int:
+        with self._lock:
+            return self._in_use
+
+    @contextlib.contextmanager
+    def lease(self, want: int):
+        """Context manager yielding the number of connections granted (1..want)."""
+        with self._lock:
+            free_slots = max(1, self._slots - self._leases)
+            remaining = max(0, self._total - self._in_use)
+            granted = max(1, min(want, remaining // free_slots))
+            self._in_use += granted
+            self._leases += 1
+        try:
+            yield granted
+        finally:
+            with self._lock:
+                self._in_use -= granted
+                self._leases -= 1
+
+
+# Seconds between two looks at a running download's stop_check, for the phases without progress hooks.
+CANCEL_POLL_INTERVAL = 0.1
+
+# The _CancelScope of the download running on this thread (stream threads inherit it).
+_scope_local = threading.local()
+
+
+class _CancelScope:
+    """Cancellation of one download_video() call beyond its progress hooks.
+
+    Extraction (web pages, API calls) and ffmpeg postprocessing report no progress,
+    so the hooks never see a cancel there. While a scope is active the watcher
+    thread polls its stop_check; once that returns True the scope kills the ffmpeg
+    runs of the download and its YoutubeDL refuses further HTTP requests (see
+    _add_cancel_points()).
+    """
+
+    def __init__(self, stop_check: Callable[[], bool] | None) -> None:
+        self._stop_check = stop_check
+        self._lock = threading.Lock()
+        # Output files of the ffmpeg runs in progress; they identify the processes to kill.
+        self._ffmpeg_outputs: list[str] = []
+        self.cancelled = False
+
+    def poll(self) -> bool:
+        """Cancel if stop_check says so; True once cancelled.
+
+        Also kills ffmpeg again for as long as a run is registered: one may only just be starting.
+        """
+        if not self.cancelled and self._stop_check is not None and self._stop_check():
+            self.cancelled = True
+        if self.cancelled:
+            with self._lock:
+                outputs = list(self._ffmpeg_outputs)
+            if outputs:
+                _kill_ffmpeg(outputs)
+        return self.cancelled
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise DownloadCancelledError("Cancelled by user")
+
+    @contextlib.contextmanager
+    def ffmpeg(self, outputs: list[str]):
+        """Context manager around one ffmpeg run writing ``outputs``; raises once cancelled."""
+        self.check()
+        with self._lock:
+            self._ffmpeg_outputs.extend(outputs)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for path in outputs:
+                    self._ffmpeg_outputs.remove(path)
+        self.check()
+
+
+def _kill_ffmpeg(outputs: list[str]) -> None:
+    """Kill this process's child processes whose last argument names one of ``outputs`` (how yt-dlp runs ffmpeg)."""
+    own = os.getpid()
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                if int(f.read().rsplit(b") ", 1)[1].split()[1]) != own:
+                    continue
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                last = os.fsdecode(f.read().rstrip(b"\0").rsplit(b"\0", 1)[-1])
+            if last.endswith(tuple(outputs)):
+                os.kill(pid, signal.SIGKILL)
+        except (OSError, ValueError, IndexError):
+            continue
+
+
+class _CancelWatcher:
+    """One daemon thread polling the active cancel scopes; it only runs while downloads do."""
+
+    def __init__(self, interval: float = CANCEL_POLL_INTERVAL) -> None:
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._scopes: set[_CancelScope] = set()
+        self._thread: threading.Thread | None = None
+
+    def add(self, scope: _CancelScope) -> None:
+        with self._lock:
+            self._scopes.add(scope)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="download-cancel-watcher")
+                self._thread.start()
+
+    def discard(self, scope: _CancelScope) -> None:
+        with self._lock:
+            self._scopes.discard(scope)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._scopes:
+                    self._thread = None
+                    return
+                scopes = list(self._scopes)
+            for scope in scopes:
+                try:
+                    scope.poll()
+                except Exception:
+                    logging.getLogger(__name__).exception("[CANCEL] stop_check failed")
+
+
+_cancel_watcher = _CancelWatcher()
+
+
+def _current_scope() -> _CancelScope | None:
+    return getattr(_scope_local, "scope", None)
+
+
+def _add_cancel_points(ydl) -> None:
+    """Let the cancel scope of the thread using ``ydl`` stop its HTTP requests and ffmpeg runs.
+
+    Only the YoutubeDL objects the app builds get these (yt-dlp itself is not patched):
+    urlopen() refuses requests once the scope was cancelled, since extraction makes its
+    requests through it but calls no hooks, and run_pp() registers each ffmpeg-based
+    postprocessor's runs with the scope. A hook is left out when this yt-dlp lacks
+    the method it wraps; such a download still stops at its next progress hook.
+    """
+    urlopen, run_pp = getattr(ydl, "urlopen", None), getattr(ydl, "run_pp", None)
+    if callable(urlopen):
+        def checked_urlopen(req):
+            scope = _current_scope()
+            if scope is not None:
+                scope.check()
+            return urlopen(req)
+        ydl.urlopen = checked_urlopen
+    if callable(run_pp):
+        def tracked_run_pp(pp, infodict):
+            _track_ffmpeg(pp)
+            return run_pp(pp, infodict)
+        ydl.run_pp = tracked_run_pp
+
+
+def _track_ffmpeg(pp) -> None:
+    """Run the ffmpeg commands of postprocessor ``pp`` inside the cancel scope of the calling thread."""
+    real_run = getattr(pp, "real_run_ffmpeg", None)
+    if not callable(real_run) or getattr(real_run, "cancel_tracked", False):
+        return
+
+    def tracked(input_path_opts, output_path_opts, **kwargs):
+        scope = _current_scope()
+        if scope is None:
+            return real_run(input_path_opts, output_path_opts, **kwargs)
+        with scope.ffmpeg([path for path, _ in output_path_opts if path]):
+            return real_run(input_path_opts, output_path_opts, **kwargs)
+
+    tracked.cancel_tracked = True
+    pp.real_run_ffmpeg = tracked
+
+
+@contextlib.contextmanager
+def _cancellable(stop_check: Callable[[], bool] | None, partial_files: "PartialFiles"):
+    """Run the body in a _CancelScope for stop_check.
+
+    If the body fails after a cancel — through a hook, a refused request or a killed
+    ffmpeg — the partial files are removed and DownloadCancelledError is raised.
+    """
+    scope = _CancelScope(stop_check)
+    previous, _scope_local.scope = _current_scope(), scope
+    if stop_check is not None:
+        _cancel_watcher.add(scope)
+    try:
+        yield scope
+    except Exception as exc:
+        if not scope.poll():
+            raise
+        removed = partial_files.remove()
+        if removed:
+            logging.getLogger(__name__).info("[CANCEL] Removed %d partial file(s)", len(removed))
+        if isinstance(exc, DownloadCancelledError):
+            raise
+        raise DownloadCancelledError("Cancelled by user") from exc
+    finally:
+        _cancel_watcher.discard(scope)
+        _scope_local.scope = previous
+
+
+class _ParallelStreamsYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that fetches the video and audio components of a merged format at the same time.
+
+    yt-dlp downloads ``requested_formats`` one after the other. Here each component's
+    dl() runs in its own thread and post_process() (where FFmpegMerger runs) waits for
+    all of them first, re-raising the first failure. If one component fails, the others
+    are stopped through their progress hooks.
+    """
+
+    def __init__(self, params: dict | None = None, auto_init: bool = True) -> None:
+        super().__init__(params, auto_init)
+        self._parallel = False
+        self._streams: list[tuple[threading.Thread, list]] = []
+        self._abort = threading.Event()
+        self.add_progress_hook(self._check_abort)
+
+    def _check_abort(self, d: dict) -> None:
+        if self._abort.is_set():
+            raise DownloadCancelledError("Sibling stream failed")
+
+    def process_info(self, info_dict):
+        self._parallel = len(info_dict.get("requested_formats") or ()) > 1
+        try:
+            return super().process_info(info_dict)
+        finally:
+            self._parallel = False
+            self._abort.set()
+            self._join_streams()
+            self._abort.clear()
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if not self._parallel or subtitle or test:
+            return super().dl(name, info, subtitle, test)
+        errors: list = []
+        scope = _current_scope()
+
+        def fetch() -> None:
+            _scope_local.scope = scope
+            try:
+                super(_ParallelStreamsYoutubeDL, self).dl(name, info)
+            except BaseException as exc:  # re-raised in post_process
+                errors.append(exc)
+                self._abort.set()
+
+        thread = threading.Thread(
+            target=fetch, daemon=True, name=f"{threading.current_thread().name}-f{info.get('format_id')}",
+        )
+        thread.start()
+        self._streams.append((thread, errors))
+        return True, True
+
+    def post_process(self, filename, info, files_to_move=None):
+        errors = self._join_streams()
+        if errors:
+            # Prefer the real cause over the "Sibling stream failed" it triggered in the other stream.
+            raise next((e for e in errors if str(e) != "Sibling stream failed"), errors[0])
+        return super().post_process(filename, info, files_to_move)
+
+    def _join_streams(self) -> list:
+        errors = []
+        for thread, thread_errors in self._streams:
+            thread.join()
+            errors.extend(thread_errors)
+        self._streams = []
+        return errors
+
+
 def _yt_dlp_logger():
     """Logger that writes yt-dlp messages to stderr so they appear in addon logs."""
     log = logging.getLogger("yt-dlp")
@@ -91,27 +563,332 @@ def _yt_dlp_logger():
     return log
 
 
-def download_video(
-    url: str,
-    output_dir: str = "/config/media",
-    timeout: int = 1800,
-    stop_check: Callable[[], bool] | None = None,
-    format_type: str = "mp4",
-) -> dict:
-    """Download a video using yt-dlp and return info dict.
-    If stop_check is provided and returns True during download, raises DownloadCancelledError.
-    format_type: 'mp4' for video (default) or 'mp3' for audio-only.
+# Tasks a pooled YoutubeDL serves before it is closed and rebuilt (bounds cookie/cache growth).
+YDL_MAX_USES = 25
+
+# Options registered as hooks at construction; a pooled YoutubeDL swaps them per task.
+_HOOK_OPTIONS = {
+    "progress_hooks": "_progress_hooks",
+    "postprocessor_hooks": "_postprocessor_hooks",
+    "post_hooks": "_post_hooks",
+}
+
+
+# YoutubeDL internals rebind() resets; an instance lacking one (another yt-dlp) is not reused.
+_REBIND_ATTRS = (
+    "params", "_pps", *_HOOK_OPTIONS.values(), "_download_retcode", "_num_downloads", "_num_videos",
+    "_playlist_level", "_playlist_urls", "_printed_messages",
+)
+
+
+class _PooledYoutubeDL:
+    """One warm YoutubeDL of a pool, with the hooks of the task currently using it."""
+
+    def __init__(self, ydl_class: type, params: dict, task_params: dict) -> None:
+        self._context = ydl_class({**params, **task_params})
+        self.ydl = self._context.__enter__()
+        _add_cancel_points(self.ydl)
+        self.uses = 0
+        self.version = yt_dlp.version.__version__
+        self._task_hooks = [h for opt in _HOOK_OPTIONS for h in task_params.get(opt, ())]
+        # Params as YoutubeDL normalized them, without this task's options (profile values restored).
+        self._params = {k: v for k, v in getattr(self.ydl, "params", {}).items() if k not in task_params}
+        self._params.update({k: params[k] for k in task_params if k in params})
+
+    def can_rebind(self) -> bool:
+        """True when the yt-dlp that built this object is the one loaded and has every attribute rebind() resets."""
+        ydl = self.ydl
+        if self.version != yt_dlp.version.__version__:
+            return False
+        if not all(hasattr(ydl, attr) for attr in _REBIND_ATTRS):
+            return False
+        return all(hasattr(pp, "_progress_hooks") for pps in ydl._pps.values() for pp in pps)
+
+    def rebind(self, task_params: dict) -> None:
+        """Drop the previous task's hooks, options and per-run counters, then apply this task's options.
+
+        Call only when can_rebind() is True.
+        """
+        ydl = self.ydl
+
+        def without_task_hooks(hooks: list) -> list:
+            return [h for h in hooks if not any(h is old for old in self._task_hooks)]
+
+        for attr in _HOOK_OPTIONS.values():
+            setattr(ydl, attr, without_task_hooks(getattr(ydl, attr)))
+        for pps in ydl._pps.values():
+            for pp in pps:
+                pp._progress_hooks = without_task_hooks(pp._progress_hooks)
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls.clear()
+        ydl._printed_messages.clear()
+
+        ydl.params.clear()
+        ydl.params.update(self._params)
+        ydl.params.update(task_params)
+        for ph in task_params.get("progress_hooks", ()):
+            ydl.add_progress_hook(ph)
+        for ph in task_params.get("postprocessor_hooks", ()):
+            ydl.add_postprocessor_hook(ph)
+        for ph in task_params.get("post_hooks", ()):
+            ydl.add_post_hook(ph)
+        self._task_hooks = [h for opt in _HOOK_OPTIONS for h in task_params.get(opt, ())]
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class YoutubeDLPool:
+    """Warm YoutubeDL objects kept per worker thread, one per option profile.
+
+    Building a YoutubeDL registers every extractor, parses the output template and
+    format selector and instantiates the postprocessors; its extractors also cache
+    player JS and the HTTP connections it opens. A worker thread reuses the same
+    object for every task of a profile (e.g. mp4 into one directory), only swapping
+    the per-task options (hooks, fragment count, extractor args). Objects are rebuilt
+    after ``max_uses`` tasks, discarded when a task raises, and not reused once the
+    updater reloaded a new yt-dlp version (or one rebind() does not know how to reset).
     """
-    def progress_hook(d: dict) -> None:
-        if stop_check and stop_check():
-            raise DownloadCancelledError("Cancelled by user")
 
-    common_opts = {
-        "outtmpl": f"{output_dir}/%(title)s.%(ext)s",
+    def __init__(self, max_uses: int = YDL_MAX_USES) -> None:
+        self._max_uses = max(1, max_uses)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {"created": self._created, "reused": self._reused}
+
+    @contextlib.contextmanager
+    def checkout(self, profile: tuple, params: dict, task_params: dict | None = None, ydl_class: type | None = None):
+        """Context manager yielding this thread's YoutubeDL for ``profile``.
+
+        params: options fixed for the profile (only used when a new object is built);
+        task_params: options of this task, applied on every checkout.
+        """
+        ydl_class = ydl_class or yt_dlp.YoutubeDL
+        task_params = task_params or {}
+        entries: dict = self._local.__dict__.setdefault("entries", {})
+        key = (ydl_class, profile)
+        # Popped while in use, so a nested checkout of the same profile gets its own object.
+        entry = entries.pop(key, None)
+        if entry is not None and not entry.can_rebind():
+            # Built by a yt-dlp that has since been updated, or one whose internals changed.
+            entry.close()
+            entry = None
+        if entry is None:
+            entry = _PooledYoutubeDL(ydl_class, params, task_params)
+            with self._stats_lock:
+                self._created += 1
+        else:
+            entry.rebind(task_params)
+            with self._stats_lock:
+                self._reused += 1
+        try:
+            yield entry.ydl
+        except BaseException:
+            # A failed or cancelled task may leave half-finished state behind.
+            entry.close()
+            raise
+        entry.uses += 1
+        if entry.uses >= self._max_uses:
+            entry.close()
+        else:
+            entries[key] = entry
+
+    def clear(self) -> None:
+        """Close this thread's pooled objects."""
+        entries: dict = self._local.__dict__.pop("entries", {})
+        for entry in entries.values():
+            entry.close()
+
+
+@contextlib.contextmanager
+def _youtube_dl(pool: YoutubeDLPool | None, profile: tuple, params: dict, task_params: dict,
+                ydl_class: type | None = None):
+    """A pooled YoutubeDL for ``profile``, or a one-off one when no pool is given."""
+    if pool is not None:
+        with pool.checkout(profile, params, task_params, ydl_class) as ydl:
+            yield ydl
+    else:
+        with (ydl_class or yt_dlp.YoutubeDL)({**params, **task_params}) as ydl:
+            _add_cancel_points(ydl)
+            yield ydl
+
+
+# Minimum seconds between two "downloading" progress reports; yt-dlp calls the hook per block/fragment.
+PROGRESS_REPORT_INTERVAL = 0.5
+
+
+class _ProgressTracker:
+    """Turns yt-dlp progress/postprocessor hook dicts into rate-limited task progress fields.
+
+    Byte counts are summed over all streams of a merged download (video + audio),
+    so the reported progress does not jump back to 0 when the audio stream starts.
+    """
+
+    def __init__(self, on_progress: Callable[[dict], None], interval: float = PROGRESS_REPORT_INTERVAL) -> None:
+        self._on_progress = on_progress
+        self._interval = interval
+        self._last_report = 0.0
+        self._streams: dict[str, tuple[int, int | None]] = {}
+        # Video and audio streams may report from different threads (parallel stream fetching).
+        self._lock = threading.Lock()
+
+    def progress_hook(self, d: dict) -> None:
+        if d.get("status") not in ("downloading", "finished"):
+            return
+        with self._lock:
+            self._report(d)
+
+    def _report(self, d: dict) -> None:
+        status = d.get("status")
+        now = time.monotonic()
+        if status == "downloading" and now - self._last_report < self._interval:
+            return
+        self._last_report = now
+
+        downloaded = int(d.get("downloaded_bytes") or 0)
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if status == "finished":
+            total = total or downloaded
+        self._streams[d.get("filename") or ""] = (downloaded, int(total) if total else None)
+
+        downloaded_sum = sum(done for done, _ in self._streams.values())
+        total_sum = self._expected_total(d.get("info_dict") or {})
+        fields: dict = {
+            "phase": "downloading",
+            "downloaded_bytes": downloaded_sum,
+            "total_bytes": total_sum,
+            "speed": round(d["speed"]) if d.get("speed") else None,
+            "eta": int(d["eta"]) if d.get("eta") is not None else None,
+            "progress": round(min(100.0, 100.0 * downloaded_sum / total_sum), 1) if total_sum else None,
+        }
+        self._on_progress(fields)
+
+    def postprocessor_hook(self, d: dict) -> None:
+        if d.get("status") == "started":
+            self._on_progress({
+                "phase": "postprocessing",
+                "postprocessor": d.get("postprocessor"),
+                "speed": None,
+                "eta": None,
+            })
+
+    def _expected_total(self, info: dict) -> int | None:
+        """Size of all requested streams when yt-dlp knows them, else the sum of what was seen so far."""
+        requested = info.get("requested_formats") or []
+        sizes = [f.get("filesize") or f.get("filesize_approx") for f in requested]
+        if requested and all(sizes) and len(self._streams) <= len(requested):
+            return int(sum(sizes))
+        totals = [total for _, total in self._streams.values()]
+        return sum(totals) if totals and all(totals) else None
+
+
+class PartialFiles:
+    """What a download leaves behind if it is cancelled, learned from its hooks and removed by remove().
+
+    That is the ``.part`` file, its fragments and ``.ytdl`` state while a stream is
+    fetched, the separate streams of a merge, the ``.temp`` output of an ffmpeg step
+    and a half-written mp3. Finished files from earlier downloads are never listed.
+    Entries are glob patterns; ``on_add`` sees each new one (the process pool sends
+    them to the API process, which removes them after killing the child).
+    """
+
+    def __init__(self, on_add: Callable[[str], None] | None = None) -> None:
+        self._on_add = on_add
+        self._lock = threading.Lock()
+        self._patterns: list[str] = []
+
+    def add(self, pattern: str) -> None:
+        with self._lock:
+            if pattern in self._patterns:
+                return
+            self._patterns.append(pattern)
+        if self._on_add is not None:
+            self._on_add(pattern)
+
+    def progress_hook(self, d: dict) -> None:
+        filename, tmp = d.get("filename"), d.get("tmpfilename")
+        if not filename:
+            return
+        if tmp and tmp != filename:
+            self.add(glob.escape(tmp))
+            self.add(glob.escape(tmp) + "-Frag*")
+        self.add(glob.escape(filename) + ".ytdl")
+        format_id = (d.get("info_dict") or {}).get("format_id")
+        if format_id and f".f{format_id}." in os.path.basename(filename):
+            # One stream of a merge; yt-dlp deletes it itself once merged.
+            self.add(glob.escape(filename))
+
+    def postprocessor_hook(self, d: dict, keep_source: bool = False) -> None:
+        """keep_source: the file ExtractAudio reads stays (an mp4 that an mp3 is made from)."""
+        info = d.get("info_dict") or {}
+        path = info.get("filepath")
+        if d.get("status") != "started" or not path:
+            return
+        # Every ffmpeg step writes <name>.temp.<ext> and renames it when done.
+        self.add(glob.escape(yt_dlp.utils.prepend_extension(path, "temp")))
+        if d.get("postprocessor") == "Merger":
+            for stream in info.get("__files_to_merge") or ():
+                self.add(glob.escape(stream))
+        elif d.get("postprocessor") == "ExtractAudio":
+            mp3 = os.path.splitext(path)[0] + "." + _MP3_OPTIONS["preferredcodec"]
+            if mp3 != path and not os.path.exists(mp3):
+                self.add(glob.escape(mp3))
+            if not keep_source:
+                self.add(glob.escape(path))
+
+    def remove(self) -> list[str]:
+        """Delete what exists of the listed files; returns the removed paths."""
+        with self._lock:
+            patterns = list(self._patterns)
+        removed = []
+        for pattern in patterns:
+            for path in glob.glob(pattern):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed.append(path)
+        return removed
+
+
+_MP3_OPTIONS = {"preferredcodec": "mp3", "preferredquality": "192"}
+
+# Files each format_type produces.
+_OUTPUT_FORMATS = {"mp4": ("mp4",), "mp3": ("mp3",), "both": ("mp4", "mp3")}
+
+
+def _extract_audio_locally(
+    source: dict, tracker: _ProgressTracker | None, pool: YoutubeDLPool | None = None,
+    partial_files: PartialFiles | None = None,
+) -> str:
+    """Convert an already downloaded video file to mp3 next to it (same ffmpeg step as a download). Returns the mp3 path."""
+    with _youtube_dl(pool, ("postprocess",), {"quiet": True, "logger": _yt_dlp_logger()}, {}) as ydl:
+        pp = FFmpegExtractAudioPP(ydl, **_MP3_OPTIONS)
+        _track_ffmpeg(pp)
+        if partial_files is not None:
+            pp.add_progress_hook(functools.partial(partial_files.postprocessor_hook, keep_source=True))
+        if tracker:
+            pp.add_progress_hook(tracker.postprocessor_hook)
+        ext = os.path.splitext(source["path"])[1].lstrip(".")
+        _, info = pp.run({"filepath": source["path"], "ext": ext, "id": "", "title": source.get("title", "")})
+    return info["filepath"]
+
+
+def _extraction_options(timeout: int) -> dict:
+    """Options that decide what an extraction returns; shared by downloads and extract_info()."""
+    return {
         "quiet": True,
         "logger": _yt_dlp_logger(),
         "socket_timeout": timeout,
-        "progress_hooks": [progress_hook],
         # When URL has both v= and list= (e.g. watch?v=XXX&list=RD...), download only this video.
         "noplaylist": True,
         # Keep yt-dlp's cache in /tmp so it works even when the container runs
@@ -131,18 +908,24 @@ def download_video(
         },
     }
 
+
+def _profile_options(format_type: str, output_dir: str, timeout: int) -> dict:
+    """YoutubeDL options shared by every download of one format into one directory (no per-task hooks)."""
+    common_opts = {
+        "outtmpl": f"{output_dir}/%(title)s.%(ext)s",
+        **_extraction_options(timeout),
+    }
+
     if format_type == "mp3":
         ydl_opts = {
             **common_opts,
             # Download best audio and convert to MP3.
             "format": "bestaudio/best",
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }],
+            "postprocessors": [{"key": "FFmpegExtractAudio", **_MP3_OPTIONS}],
         }
     else:
+        # Also used for "both"; its mp3 is extracted from the merged file afterwards, because
+        # keepvideo would also keep the separate streams the Merger deletes.
         ydl_opts = {
             **common_opts,
             # Prefer MP4 for better compatibility (HA Media Browser, TVs, phones).
@@ -150,15 +933,256 @@ def download_video(
             "format": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best[ext=mp4]/best",
             "merge_output_format": "mp4",
         }
+    return ydl_opts
+
+
+def download_video(
+    url: str,
+    output_dir: str = "/config/media",
+    timeout: int = 1800,
+    stop_check: Callable[[], bool] | None = None,
+    format_type: str = "mp4",
+    on_progress: Callable[[dict], None] | None = None,
+    archive: DownloadArchive | None = None,
+    connections: int = 1,
+    bandwidth: BandwidthGovernor | None = None,
+    pool: YoutubeDLPool | None = None,
+    info: dict | None = None,
+    partial_files: PartialFiles | None = None,
+) -> dict:
+    """Download a video using yt-dlp and return info dict.
+    If stop_check is provided and returns True, raises DownloadCancelledError: at the next
+    progress hook while downloading, within CANCEL_POLL_INTERVAL otherwise (extraction makes no
+    further requests, ffmpeg is killed). The partial files are removed first.
+    format_type: 'mp4' for video (default), 'mp3' for audio-only, or 'both': the video
+    streams are fetched once, merged to mp4, and the mp3 is extracted from that file
+    locally (no second download). info["filepaths"] maps each format to its file.
+    on_progress: called (at most every PROGRESS_REPORT_INTERVAL s while downloading) with
+    phase, downloaded_bytes, total_bytes, speed, eta and progress (percent); during
+    merge/mp3 extraction with phase='postprocessing' and the postprocessor name.
+    archive: when given, a file of this video and format already in output_dir is returned
+    without any network access (info has ``already_present: True``); an mp3 is made from an
+    archived mp4 with a local ffmpeg extraction. New downloads are recorded in it.
+    connections: HTTP connections this download may use (see ConnectionBudget). With 2 or
+    more, the video and audio streams are fetched at the same time; each stream then gets
+    connections // streams concurrent fragments (YouTube formats are requested as DASH
+    fragments so this also splits otherwise single-file streams into parallel ranges).
+    bandwidth: shared governor; every received block is paid for from its token bucket,
+    which slows this download down while all downloads together are over the limit.
+    pool: when given, the calling thread's warm YoutubeDL for this format and output_dir is
+    reused instead of building a new one (see YoutubeDLPool).
+    info: a recent extract_info() result for this URL; the download starts from it instead
+    of extracting again (and extracts normally if it no longer works, e.g. expired links).
+    partial_files: collects the files to remove on cancel (default: a new PartialFiles).
+    """
+    tracker = _ProgressTracker(on_progress) if on_progress else None
+    partial_files = partial_files if partial_files is not None else PartialFiles()
+    video_key = canonical_video_key(url) if archive is not None else None
+
+    wanted = _OUTPUT_FORMATS[format_type]
+    if archive is not None:
+        present = {fmt: archive.lookup(video_key, fmt, output_dir) for fmt in wanted}
+        source = present.get("mp4") or (archive.lookup(video_key, "mp4", output_dir) if "mp3" in wanted else None)
+        if "mp3" in wanted and not present["mp3"] and source:
+            if stop_check and stop_check():
+                raise DownloadCancelledError("Cancelled by user")
+            with _cancellable(stop_check, partial_files):
+                mp3_path = _extract_audio_locally(source, tracker, pool, partial_files)
+            archive.record([video_key], "mp3", mp3_path, title=source["title"], duration=source.get("duration"))
+            present["mp3"] = {"path": mp3_path, "title": source["title"], "derived": True}
+        if all(present.values()):
+            entry = present[wanted[0]]
+            info = {"title": entry["title"], "filepath": entry["path"],
+                    "filepaths": {fmt: e["path"] for fmt, e in present.items()}}
+            if not any(e.get("derived") for e in present.values()):
+                info["already_present"] = True
+            return info
+        if format_type == "both" and present["mp3"]:
+            # Only the video is missing: fetch just that.
+            format_type = "mp4"
+
+    final_paths: list[str] = []
+
+    def pp_hook(d: dict) -> None:
+        partial_files.postprocessor_hook(d)
+        if d.get("status") == "started" and stop_check and stop_check():
+            raise DownloadCancelledError("Cancelled by user")
+        if tracker:
+            tracker.postprocessor_hook(d)
+
+    # Bytes already paid to the bandwidth governor, per stream file.
+    metered: dict[str, int] = {}
+    metered_lock = threading.Lock()
+
+    def progress_hook(d: dict) -> None:
+        partial_files.progress_hook(d)
+        if stop_check and stop_check():
+            raise DownloadCancelledError("Cancelled by user")
+        if tracker:
+            tracker.progress_hook(d)
+        if bandwidth is not None and d.get("status") == "downloading":
+            stream, done = d.get("filename") or "", int(d.get("downloaded_bytes") or 0)
+            with metered_lock:
+                delta = done - metered.get(stream, 0)
+                metered[stream] = max(done, metered.get(stream, 0))
+            bandwidth.consume(delta, stop_check)
+            if stop_check and stop_check():
+                raise DownloadCancelledError("Cancelled by user")
+
+    # "both" shares the mp4 profile (and its pooled YoutubeDL); the mp3 comes from the merged file.
+    fetch_format = "mp4" if format_type == "both" else format_type
+    ydl_opts = _profile_options(fetch_format, output_dir, timeout)
+
+    # Per-task options; ydl_opts is fixed for the (format_type, output_dir, timeout) profile.
+    task_opts: dict = {
+        "progress_hooks": [progress_hook],
+        "postprocessor_hooks": [pp_hook] if tracker or stop_check else [],
+        # Called with the final file path once all postprocessors (merge, mp3) are done.
+        "post_hooks": [final_paths.append],
+        "extractor_args": ydl_opts["extractor_args"],
+    }
+    parallel_streams = connections >= 2 and format_type != "mp3"
+    fragments = max(1, connections // (2 if parallel_streams else 1))
+    task_opts["concurrent_fragment_downloads"] = fragments
+    if fragments > 1:
+        youtube_args = ydl_opts["extractor_args"]["youtube"]
+        task_opts["extractor_args"] = {**ydl_opts["extractor_args"], "youtube": {**youtube_args, "formats": ["dashy"]}}
+
+    ydl_class = _ParallelStreamsYoutubeDL if parallel_streams else yt_dlp.YoutubeDL
+    extracted = info
+    info = None
+    with _cancellable(stop_check, partial_files), \
+            _youtube_dl(pool, (fetch_format, output_dir, timeout), ydl_opts, task_opts, ydl_class) as ydl:
+        if extracted is not None:
+            try:
+                info = ydl.process_ie_result(copy.deepcopy(extracted), download=True)
+            except yt_dlp.utils.DownloadError as exc:
+                if stop_check and stop_check():
+                    raise
+                logging.getLogger(__name__).info("[INFO-CACHE] Cached extraction failed (%s); extracting again", exc)
+        if info is None:
+            info = ydl.extract_info(url, download=True)
+    info = info or {}
+    if final_paths:
+        filepaths = {"mp3" if format_type == "mp3" else "mp4": final_paths[-1]}
+        info["filepaths"] = filepaths
+        video_keys = [archive_id(info), video_key]
+        if archive is not None:
+            for fmt, path in filepaths.items():
+                archive.record(video_keys, fmt, path, title=info.get("title", ""), duration=info.get("duration"))
+        if format_type == "both":
+            # Recorded first, so a cancel here keeps the mp4 and a retry only extracts.
+            source = {"path": final_paths[-1], "title": info.get("title", "")}
+            with _cancellable(stop_check, partial_files):
+                filepaths["mp3"] = _extract_audio_locally(source, tracker, pool, partial_files)
+            if archive is not None:
+                archive.record(
+                    video_keys, "mp3", filepaths["mp3"], title=info.get("title", ""), duration=info.get("duration"),
+                )
+    return info
+
+
+# Entries fetched per request from playlists that are paged on demand.
+_PLAYLIST_PAGE_SIZE = 50
+
+
+def _flat_entries(entries) -> Iterator[dict]:
+    """Iterate playlist entries without materializing them: generators are consumed as they come, paged lists page by page."""
+    if isinstance(entries, PagedList):
+        start = 0
+        while True:
+            page = entries.getslice(start, start + _PLAYLIST_PAGE_SIZE)
+            if not page:
+                return
+            yield from page
+            start += len(page)
+    else:
+        yield from entries or ()
+
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
-    return info or {}
+def _playlist_videos(entries) -> Iterator[dict]:
+    """{"url", "id", "title"} of each video entry; nested playlists and channel tabs are skipped."""
+    for entry in _flat_entries(entries):
+        if not entry or entry.get("_type") == "playlist":
+            continue
+        if str(entry.get("ie_key") or "").endswith(("Tab", "Playlist")):
+            continue
+        url = entry.get("url") or entry.get("webpage_url")
+        if not url:
+            continue
+        yield {"url": url, "id": entry.get("id"), "title": entry.get("title")}
 
 
-def extract_info(url: str) -> dict:
-    """Extract video info without downloading."""
-    ydl_opts = {"quiet": True, "skip_download": True}
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-    return info or {}
+@contextlib.contextmanager
+def open_playlist(url: str, timeout: int = 1800):
+    """Context manager yielding (playlist info, lazy iterator of its videos).
+
+    Uses flat extraction: videos are not resolved, and pages of the playlist are only
+    requested as the iterator is consumed, so the first videos are known within one
+    request and a long playlist is never held in memory at once. The info dict has no
+    entries; ``playlist_count`` is set when the site reports it. A URL that is not a
+    playlist yields itself as the only video.
+    """
+    with yt_dlp.YoutubeDL({**_extraction_options(timeout), "noplaylist": False}) as ydl:
+        info = ydl.extract_info(url, download=False, process=False) or {}
+        # Channel and handle URLs first resolve to one of their tabs.
+        for _ in range(3):
+            if info.get("_type") not in ("url", "url_transparent"):
+                break
+            info = ydl.extract_info(info["url"], download=False, process=False, ie_key=info.get("ie_key")) or {}
+        info = dict(info)
+        entries = info.pop("entries", None)
+        if info.get("_type") != "playlist":
+            entries = [{"url": info.get("webpage_url") or url, "id": info.get("id"), "title": info.get("title")}]
+        yield info, _playlist_videos(entries)
+
+
+# Parts of an extraction that downloads never use but that can be most of its size.
+_UNUSED_INFO_KEYS = ("automatic_captions", "subtitles", "heatmap", "thumbnails", "comments")
+
+# Per-format fields returned by summarize_info(formats=True).
+_FORMAT_SUMMARY_KEYS = (
+    "format_id", "ext", "resolution", "width", "height", "fps", "vcodec", "acodec",
+    "abr", "tbr", "filesize", "filesize_approx", "format_note",
+)
+
+
+def extract_info(url: str, pool: YoutubeDLPool | None = None, timeout: int = 1800) -> dict:
+    """Extract video info without downloading, with the same extractor options as download_video().
+
+    Formats are not selected yet, so the result can be passed to download_video(info=) for
+    any format. Bulky fields no download needs (subtitles, thumbnail lists) are dropped.
+    """
+    with _youtube_dl(pool, ("info", timeout), _extraction_options(timeout), {}) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+    info = dict(info or {})
+    if not info.get("thumbnail") and info.get("thumbnails"):
+        # Keep the best thumbnail (yt-dlp sorts them worst to best) before the list goes.
+        info["thumbnail"] = info["thumbnails"][-1].get("url")
+    for key in _UNUSED_INFO_KEYS:
+        info.pop(key, None)
+    return info
+
+
+def summarize_info(info: dict, formats: bool = False) -> dict:
+    """The parts of an extract_info() result a client shows before downloading; ``formats`` adds a compact format list."""
+    summary = {
+        "id": info.get("id"),
+        "title": info.get("title"),
+        "duration": info.get("duration"),
+        "thumbnail": info.get("thumbnail"),
+        "uploader": info.get("uploader") or info.get("channel"),
+        "upload_date": info.get("upload_date"),
+        "view_count": info.get("view_count"),
+        "webpage_url": info.get("webpage_url") or info.get("original_url"),
+        "extractor": info.get("extractor_key"),
+        "live_status": info.get("live_status"),
+    }
+    summary = {key: value for key, value in summary.items() if value is not None}
+    if formats:
+        summary["formats"] = [
+            {key: fmt[key] for key in _FORMAT_SUMMARY_KEYS if fmt.get(key) is not None}
+            for fmt in info.get("formats") or []
+            if fmt.get("vcodec") != "none" or fmt.get("acodec") != "none"
+        ]
+    return summary
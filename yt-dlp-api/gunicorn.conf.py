@@ -0,0 +1,20 @@
+"""gunicorn settings for the API (the add-on's run.sh and the standalone image use this file).
+
+WEB_WORKERS processes with WEB_THREADS threads each. More than one worker process
+switches create_app() to the shared task registry; one of the processes (the leader)
+runs the downloads, the others only serve requests. SSE streams hold a thread each
+for as long as the client stays connected, so keep WEB_THREADS above the number of
+open cards/extensions.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_WORKERS", "1"))
+threads = int(os.environ.get("WEB_THREADS", "16"))
+worker_class = "gthread"
+# Each worker builds its own app (scheduler, worker pool, registry sync thread) after the fork.
+preload_app = False
+# Lets running downloads record their last progress before a worker is replaced.
+graceful_timeout = 30
+accesslog = None
+errorlog = "-"
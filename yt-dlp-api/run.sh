@@ -11,4 +11,31 @@ export MEDIA_SUBDIR
 export DOWNLOAD_DIR="/media/${MEDIA_SUBDIR}"
 mkdir -p "$DOWNLOAD_DIR"
 
-exec python3 -m flask --app app run --host=0.0.0.0 --port="${PORT}"
+# Worker pool size: downloads beyond this limit wait in the queue.
+MAX_CONCURRENT_DOWNLOADS=$(bashio::config 'max_concurrent_downloads' '2')
+export MAX_CONCURRENT_DOWNLOADS
+
+# Parallel fetching inside a download, capped for all downloads by max_connections.
+CONCURRENT_FRAGMENTS=$(bashio::config 'concurrent_fragments' '4')
+MAX_CONNECTIONS=$(bashio::config 'max_connections' '8')
+export CONCURRENT_FRAGMENTS MAX_CONNECTIONS
+
+# Shared download rate limit (e.g. 2M) and the daily off-peak window with its own limit.
+BANDWIDTH_LIMIT=$(bashio::config 'bandwidth_limit' '')
+OFF_PEAK_WINDOW=$(bashio::config 'off_peak_window' '')
+OFF_PEAK_LIMIT=$(bashio::config 'off_peak_limit' '')
+export BANDWIDTH_LIMIT OFF_PEAK_WINDOW OFF_PEAK_LIMIT
+
+# Web server (wsgi: gunicorn, asgi: uvicorn), worker processes (one of them runs the
+# downloads) and threads per process.
+WEB_SERVER=$(bashio::config 'web_server' 'wsgi')
+WEB_WORKERS=$(bashio::config 'web_workers' '1')
+WEB_THREADS=$(bashio::config 'web_threads' '16')
+export WEB_SERVER WEB_WORKERS WEB_THREADS
+
+# Where downloads run: worker threads of the API process, or child processes that a
+# cancel can kill outright and that are replaced after a number of downloads.
+DOWNLOAD_EXECUTOR=$(bashio::config 'download_executor' 'thread')
+export DOWNLOAD_EXECUTOR
+
+exec sh serve.sh
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Starts the API under the server WEB_SERVER selects (run from the app directory):
+#   wsgi (default) — gunicorn, one thread per connection (gunicorn.conf.py)
+#   asgi           — uvicorn event loop: /tasks/stream clients cost a coroutine, not a thread (app/asgi.py)
+# Both run WEB_WORKERS processes sharing one task registry.
+if [ "${WEB_SERVER:-wsgi}" = "asgi" ]; then
+    exec uvicorn --factory app.asgi:create_asgi_app \
+        --host 0.0.0.0 --port "${PORT:-5000}" --workers "${WEB_WORKERS:-1}" --no-access-log
+fi
+exec gunicorn -c gunicorn.conf.py "app:create_app()"